@@ -0,0 +1,59 @@
+"""Compare the JSON backends on a large generated context.
+
+Run with ``python benchmarks/json_backends.py [number of services]``.
+"""
+import sys
+import timeit
+
+from cookieninja import jsonio
+
+
+def make_context(services):
+    """Build a context with a large dict of service metadata."""
+    return {
+        "cookiecutter": {
+            "project_name": "Platform",
+            "services": {
+                f"service-{i}": {
+                    "owner": f"team-{i % 40}",
+                    "port": 8000 + i,
+                    "tags": ["http", "grpc", f"tier-{i % 3}"],
+                    "enabled": i % 7 != 0,
+                    "dependencies": [f"service-{j}" for j in range(i % 5)],
+                }
+                for i in range(services)
+            },
+        }
+    }
+
+
+def bench(label, func, number):
+    """Print the mean time of ``func`` in milliseconds."""
+    seconds = timeit.timeit(func, number=number) / number
+    print(f"  {label:<28} {seconds * 1000:8.2f} ms")
+
+
+def main(services=5000, number=20):
+    """Time loading, replay dumping and jsonify with every backend."""
+    context = make_context(services)
+    document = jsonio.dumps(context, indent=2)
+    print(f"{services} services, {len(document) / 1e6:.1f} MB of JSON")
+
+    for backend in jsonio.BACKENDS:
+        try:
+            jsonio.set_backend(backend)
+        except ValueError as err:
+            print(f"{backend}: skipped, {err}")
+            continue
+        print(f"{backend}:")
+        bench("load cookiecutter.json", lambda: jsonio.loads(document), number)
+        bench("dump replay (indent=2)", lambda: jsonio.dumps(context, indent=2), number)
+        bench(
+            "jsonify (indent=4, sorted)",
+            lambda: jsonio.dumps(context, indent=4, sort_keys=True),
+            number,
+        )
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
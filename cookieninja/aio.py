@@ -0,0 +1,522 @@
+"""Asyncio counterparts of the generation API.
+
+Clones and hook scripts run as asyncio subprocesses, which are killed when the
+awaiting task is cancelled. Downloads, prompts and file rendering run in the
+default executor of the event loop. Many projects can thus be generated
+concurrently in one event loop::
+
+    projects = await asyncio.gather(
+        aio.cookiecutter(template, no_input=True, extra_context={"name": "a"}),
+        aio.cookiecutter(template, no_input=True, extra_context={"name": "b"}),
+    )
+"""
+import asyncio
+import collections
+import concurrent.futures
+import contextlib
+import contextvars
+import errno
+import functools
+import logging
+import os
+import shutil
+import subprocess  # nosec
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+from . import hooks, main, timing, utils, vcs, zipfile
+from .config import get_user_config
+from .exceptions import FailedHookException, InvalidModeException
+from .generate import generate_files as _generate_files
+from .repository import (
+    _select_repository,
+    expand_abbreviations,
+    is_repo_url,
+    is_zip_file,
+)
+
+logger = logging.getLogger(__name__)
+
+# Template directories on sys.path, with the number of runs using each
+_IMPORT_PATHS = collections.Counter()
+_IMPORT_PATHS_LOCK = threading.Lock()
+
+
+async def _in_thread(func, *args, **kwargs):
+    """Run ``func`` in the default executor of the running loop.
+
+    ``func`` runs in a copy of the current context, as with
+    :func:`asyncio.to_thread`, so that it sees the timing report of the
+    caller.
+    """
+    loop = asyncio.get_running_loop()
+    call = functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
+    return await loop.run_in_executor(None, call)
+
+
+def _timed(name, func):
+    """Return ``func`` timed as the phase ``name``, see :mod:`.timing`.
+
+    Phases of work run in the executor are timed in the executor thread, so
+    that their CPU time is that of the thread doing the work.
+    """
+
+    @functools.wraps(func)
+    def timed(*args, **kwargs):
+        with timing.phase(name):
+            return func(*args, **kwargs)
+
+    return timed
+
+
+async def _create_process(command, cwd, **kwargs):
+    """Start ``command``, through the shell on Windows like the sync API."""
+    if sys.platform.startswith("win"):
+        return await asyncio.create_subprocess_shell(
+            subprocess.list2cmdline(command), cwd=cwd, **kwargs
+        )
+    return await asyncio.create_subprocess_exec(*command, cwd=cwd, **kwargs)
+
+
+async def _wait(proc, communicate=False):
+    """Wait for ``proc`` to exit, killing it if the wait is cancelled."""
+    try:
+        if communicate:
+            return await proc.communicate()
+        return await proc.wait()
+    except asyncio.CancelledError:
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+        raise
+
+
+@contextlib.contextmanager
+def _import_path(repo_dir):
+    """Put ``repo_dir`` on ``sys.path`` while any run uses it.
+
+    Unlike :class:`cookieninja.main._patch_import_path_for_repo`, which
+    restores a copy of ``sys.path``, concurrent runs do not undo each other.
+    """
+    with _IMPORT_PATHS_LOCK:
+        if not _IMPORT_PATHS[repo_dir]:
+            sys.path.append(repo_dir)
+        _IMPORT_PATHS[repo_dir] += 1
+    try:
+        yield
+    finally:
+        with _IMPORT_PATHS_LOCK:
+            _IMPORT_PATHS[repo_dir] -= 1
+            if not _IMPORT_PATHS[repo_dir]:
+                del _IMPORT_PATHS[repo_dir]
+                with contextlib.suppress(ValueError):
+                    sys.path.remove(repo_dir)
+
+
+async def clone(
+    repo_url, checkout=None, recurse_submodules=False, clone_to_dir=".", no_input=False
+):
+    """Clone a repo, see :func:`cookieninja.vcs.clone`.
+
+    A clone that is cancelled is removed.
+
+    :returns: str with path to the new directory of the repository.
+    """
+    clone_to_dir = Path(clone_to_dir).expanduser()
+    utils.make_sure_path_exists(clone_to_dir)
+
+    repo_dir, repo_url, clone_command, checkout_command = vcs._clone_commands(
+        repo_url, checkout, recurse_submodules, clone_to_dir
+    )
+
+    if os.path.isdir(repo_dir):
+        do_clone = await _in_thread(utils.prompt_and_delete, repo_dir, no_input)
+    else:
+        do_clone = True
+    if not do_clone:
+        return repo_dir
+
+    for command, cwd in ((clone_command, clone_to_dir), (checkout_command, repo_dir)):
+        if command is None:
+            continue
+        proc = await _create_process(
+            command, cwd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT
+        )
+        try:
+            output, _ = await _wait(proc, communicate=True)
+        except asyncio.CancelledError:
+            await _in_thread(shutil.rmtree, repo_dir, ignore_errors=True)
+            raise
+        if proc.returncode:
+            output = output.decode("utf-8")
+            error = vcs._clone_error(output, repo_url, checkout)
+            if error is not None:
+                raise error
+            raise subprocess.CalledProcessError(proc.returncode, command, output)
+    return repo_dir
+
+
+async def unzip(zip_uri, is_url, clone_to_dir=".", no_input=False, password=None):
+    """Download and unpack a zipfile, see :func:`cookieninja.zipfile.unzip`.
+
+    The download and extraction run in the default executor.
+    """
+    return await _in_thread(
+        zipfile.unzip,
+        zip_uri=zip_uri,
+        is_url=is_url,
+        clone_to_dir=clone_to_dir,
+        no_input=no_input,
+        password=password,
+    )
+
+
+async def determine_repo_dir(
+    template,
+    abbreviations,
+    clone_to_dir,
+    checkout,
+    no_input,
+    recurse_submodules=False,
+    password=None,
+    directory=None,
+):
+    """Locate the repository directory from a template reference.
+
+    See :func:`cookieninja.repository.determine_repo_dir`.
+
+    :return: A tuple containing the cookiecutter template directory, and
+        a boolean describing whether that directory should be cleaned up
+        after the template has been instantiated.
+    """
+    template, abbrev_directory = expand_abbreviations(template, abbreviations)
+    directory = directory or abbrev_directory
+
+    if is_zip_file(template):
+        unzipped_dir = await unzip(
+            zip_uri=template,
+            is_url=is_repo_url(template),
+            clone_to_dir=clone_to_dir,
+            no_input=no_input,
+            password=password,
+        )
+        candidates, cleanup = [unzipped_dir], True
+    elif is_repo_url(template):
+        cloned_repo = await clone(
+            repo_url=template,
+            checkout=checkout,
+            recurse_submodules=recurse_submodules,
+            clone_to_dir=clone_to_dir,
+            no_input=no_input,
+        )
+        candidates, cleanup = [cloned_repo], False
+    else:
+        candidates, cleanup = [template, os.path.join(clone_to_dir, template)], False
+
+    return _select_repository(template, candidates, directory), cleanup
+
+
+async def run_script(script_path, cwd="."):
+    """Execute a script from a working directory.
+
+    The script is killed if the awaiting task is cancelled.
+
+    :param script_path: Absolute path to the script to run.
+    :param cwd: The directory to run the script from.
+    """
+    interpreter = hooks._script_interpreter(script_path)
+    command = [interpreter, script_path] if interpreter else [script_path]
+
+    if not interpreter and not os.access(script_path, os.X_OK):
+        utils.make_executable(script_path)
+
+    try:
+        proc = await _create_process(command, cwd)
+    except OSError as err:
+        if err.errno == errno.ENOEXEC:
+            raise FailedHookException(
+                "Hook script failed, might be an empty file or missing a shebang"
+            ) from err
+        raise FailedHookException(f"Hook script failed (error: {err})") from err
+
+    exit_status = await _wait(proc)
+    if exit_status != hooks.EXIT_SUCCESS:
+        raise FailedHookException(f"Hook script failed (exit status: {exit_status})")
+
+
+async def run_script_with_context(script_path, cwd, context):
+    """Execute a script after rendering it with Jinja.
+
+    :param script_path: Absolute path to the script to run.
+    :param cwd: The directory to run the script from.
+    :param context: Cookiecutter project template context.
+    """
+    rendered = await _in_thread(hooks._render_script, script_path, context)
+    try:
+        await run_script(rendered, cwd)
+    finally:
+        os.remove(rendered)
+
+
+async def run_hook(hook_name, project_dir, context, hook_index=None):
+    """Find and execute a hook, see :func:`cookieninja.hooks.run_hook`."""
+    if hook_index is None:
+        hook_index = await _in_thread(hooks.get_hook_index)
+    scripts = hook_index.get(hook_name)
+    if not scripts:
+        logger.debug("No %s hook found", hook_name)
+        return
+    logger.debug("Running hook %s", hook_name)
+    for script in scripts:
+        await run_script_with_context(script.path, project_dir, context)
+
+
+async def run_pre_prompt_hook(repo_dir):
+    """Run the ``pre_prompt`` hooks of a template.
+
+    See :func:`cookieninja.hooks.run_pre_prompt_hook`, hooks always run in a
+    subprocess.
+
+    :return: Path of the ``cookiecutter.json`` to build the context from.
+    """
+    context_file = os.path.join(repo_dir, "cookiecutter.json")
+    scripts = (await _in_thread(hooks.get_hook_index, repo_dir)).get("pre_prompt")
+    if not scripts:
+        logger.debug("No pre_prompt hook found")
+        return context_file
+
+    scratch_dir = tempfile.mkdtemp(prefix="cookieninja-pre-prompt-")
+    shutil.copy(context_file, scratch_dir)
+    logger.debug("Running hook pre_prompt in %s", scratch_dir)
+    try:
+        for script in scripts:
+            with hooks._runnable_copy(script.path) as path:
+                await run_script(path, scratch_dir)
+    except BaseException as err:
+        utils.rmtree(scratch_dir)
+        if isinstance(err, FailedHookException):
+            logger.error("Stopping generation because pre_prompt hook failed")
+        raise
+
+    return os.path.join(scratch_dir, "cookiecutter.json")
+
+
+async def generate_files(repo_dir, context=None, output_dir=".", **kwargs):
+    """Render the templates and save them to files.
+
+    See :func:`cookieninja.generate.generate_files` for the parameters. Files
+    are rendered in the default executor and hooks run as subprocesses of the
+    event loop.
+
+    When the awaiting task is cancelled, running hooks are killed and no
+    further hook is started, which removes the project directory if this run
+    created it. Rendering cannot be interrupted: files being rendered are
+    finished first, and without hooks the project is kept. The cancellation
+    is raised once the executor is done with the project.
+    """
+    loop = asyncio.get_running_loop()
+    cancelled = threading.Event()
+    running = set()
+
+    def hook_runner(hook_name, project_dir, context, hook_index):
+        if cancelled.is_set():
+            raise FailedHookException("Generation was cancelled")
+        future = asyncio.run_coroutine_threadsafe(
+            run_hook(hook_name, project_dir, context, hook_index), loop
+        )
+        running.add(future)
+        try:
+            return future.result()
+        except concurrent.futures.CancelledError as err:
+            raise FailedHookException("Generation was cancelled") from err
+        finally:
+            running.discard(future)
+
+    generation = asyncio.ensure_future(
+        _in_thread(
+            _timed("generate", _generate_files),
+            repo_dir,
+            context,
+            output_dir,
+            hook_runner=hook_runner,
+            **kwargs,
+        )
+    )
+    try:
+        return await asyncio.shield(generation)
+    except asyncio.CancelledError:
+        cancelled.set()
+        for future in list(running):
+            future.cancel()
+        with contextlib.suppress(Exception):
+            await generation
+        raise
+
+
+async def cookiecutter(
+    template,
+    checkout=None,
+    no_input=False,
+    recurse_submodules=False,
+    extra_context=None,
+    replay=None,
+    overwrite_if_exists=False,
+    output_dir=".",
+    config_file=None,
+    default_config=False,
+    password=None,
+    directory=None,
+    skip_if_file_exists=False,
+    accept_hooks=True,
+    keep_project_on_failure=False,
+    preflight=False,
+    render_cache=None,
+    output_cache=None,
+    sink=None,
+    staged=False,
+    compare_before_write=False,
+    durability="none",
+):
+    """Generate a project without blocking the event loop.
+
+    Takes the parameters of :func:`cookieninja.main.cookiecutter`, except
+    ``pre_prompt_in_process``: hooks always run in a subprocess. Prompts,
+    unless ``no_input`` is set, read from the terminal in the executor.
+
+    :return: Path of the generated project.
+    """
+    if replay and ((no_input is not False) or (extra_context is not None)):
+        err_msg = (
+            "You can not use both replay and no_input or extra_context "
+            "at the same time."
+        )
+        raise InvalidModeException(err_msg)
+
+    config_dict = await _in_thread(
+        _timed("config", get_user_config),
+        config_file=config_file,
+        default_config=default_config,
+    )
+
+    with timing.phase("repository"):
+        repo_dir, cleanup = await determine_repo_dir(
+            template=template,
+            abbreviations=config_dict["abbreviations"],
+            clone_to_dir=config_dict["cookiecutters_dir"],
+            checkout=checkout,
+            no_input=no_input,
+            recurse_submodules=recurse_submodules,
+            password=password,
+            directory=directory,
+        )
+
+    try:
+        return await _cookiecutter_in_repo(
+            template,
+            repo_dir,
+            config_dict,
+            no_input=no_input,
+            extra_context=extra_context,
+            replay=replay,
+            overwrite_if_exists=overwrite_if_exists,
+            output_dir=output_dir,
+            skip_if_file_exists=skip_if_file_exists,
+            accept_hooks=accept_hooks,
+            keep_project_on_failure=keep_project_on_failure,
+            preflight=preflight,
+            render_cache=render_cache,
+            output_cache=output_cache,
+            sink=sink,
+            staged=staged,
+            compare_before_write=compare_before_write,
+            durability=durability,
+        )
+    finally:
+        if cleanup:
+            await _in_thread(_timed("cleanup", utils.rmtree), repo_dir)
+
+
+async def _cookiecutter_in_repo(template, repo_dir, config_dict, **options):
+    """Generate a project from a template in an already resolved repository.
+
+    See :func:`cookieninja.main._cookiecutter_in_repo`.
+    """
+    with _import_path(repo_dir):
+        return await _generate_in_repo(template, repo_dir, config_dict, **options)
+
+
+async def _generate_in_repo(
+    template,
+    repo_dir,
+    config_dict,
+    no_input,
+    extra_context,
+    replay,
+    output_dir,
+    accept_hooks,
+    **generate_options,
+):
+    """Generate a project with ``repo_dir`` on the import path."""
+    template_name = os.path.basename(os.path.abspath(repo_dir))
+
+    if replay:
+        context, template_name = await _in_thread(
+            _timed("replay", main._load_replay), config_dict, template_name, replay
+        )
+    else:
+        context_file = os.path.join(repo_dir, "cookiecutter.json")
+        if accept_hooks:
+            with timing.phase("hooks"):
+                context_file = await run_pre_prompt_hook(repo_dir)
+        context = await _in_thread(
+            _timed("prompt", main._context_from_file),
+            repo_dir,
+            context_file,
+            config_dict,
+            no_input,
+            extra_context,
+        )
+
+        if "template" in context["cookiecutter"]:
+            nested_template, nested_repo_dir = main._nested_template(repo_dir, context)
+            return await _cookiecutter_in_repo(
+                os.path.join(template, nested_template),
+                nested_repo_dir,
+                config_dict,
+                no_input=no_input,
+                extra_context=extra_context,
+                replay=replay,
+                output_dir=output_dir,
+                accept_hooks=accept_hooks,
+                **generate_options,
+            )
+
+        main._add_template_location(context, template, repo_dir, output_dir)
+
+    entry_id = None
+    if not replay:
+        entry_id = await _in_thread(
+            _timed("replay", main._record_run),
+            config_dict,
+            template_name,
+            context,
+            repo_dir,
+        )
+
+    result = await generate_files(
+        repo_dir=repo_dir,
+        context=context,
+        output_dir=output_dir,
+        accept_hooks=accept_hooks,
+        **generate_options,
+    )
+    await _in_thread(
+        _timed("replay", main._record_project),
+        config_dict,
+        entry_id,
+        result,
+        generate_options.get("sink"),
+    )
+    return result
@@ -0,0 +1,381 @@
+"""Static analysis of the variables used by a project template."""
+import fnmatch
+import hashlib
+import logging
+import os
+import threading
+from typing import FrozenSet, NamedTuple, Optional
+
+from jinja2 import meta, nodes
+from jinja2.exceptions import TemplateSyntaxError
+
+logger = logging.getLogger(__name__)
+
+# Filters and tests that make an undefined variable safe to use
+_GUARD_FILTERS = {"default", "d"}
+_GUARD_TESTS = {"defined", "undefined"}
+
+# Analyses keyed by template dir and syntax, see ``analyze_template``
+_ANALYSIS_CACHE = {}
+_ANALYSIS_CACHE_LOCK = threading.Lock()
+
+
+def _is_cookiecutter(node):
+    return isinstance(node, nodes.Name) and node.name == "cookiecutter"
+
+
+def _lookup_name(node):
+    """Return the variable name of a ``cookiecutter.<name>`` lookup node."""
+    if not _is_cookiecutter(getattr(node, "node", None)):
+        return None
+    if isinstance(node, nodes.Getattr):
+        return node.attr
+    if (
+        isinstance(node, nodes.Getitem)
+        and isinstance(node.arg, nodes.Const)
+        and isinstance(node.arg.value, str)
+    ):
+        return node.arg.value
+    return None
+
+
+def cookiecutter_references(tree):
+    """Return the names of the ``cookiecutter`` variables a template uses.
+
+    :param tree: Jinja2 AST of the template, see ``Environment.parse``.
+    :return: Set of variable names, or ``None`` if ``cookiecutter`` is used
+        other than through a constant attribute or item lookup, e.g. iterated
+        over or with ``cookiecutter.get()``, so that the referenced variables
+        cannot be known.
+    """
+    if "cookiecutter" not in meta.find_undeclared_variables(tree):
+        return set()
+
+    methods = {
+        id(node.node)
+        for node in tree.find_all(nodes.Call)
+        if isinstance(node.node, nodes.Getattr) and _is_cookiecutter(node.node.node)
+    }
+    names = set()
+    for node in tree.find_all((nodes.Getattr, nodes.Getitem)):
+        name = _lookup_name(node)
+        if name is not None and id(node) not in methods:
+            names.add(name)
+
+    uses = sum(
+        1
+        for node in tree.find_all(nodes.Name)
+        if _is_cookiecutter(node) and node.ctx == "load"
+    )
+    lookups = sum(
+        1
+        for node in tree.find_all((nodes.Getattr, nodes.Getitem))
+        if _lookup_name(node) is not None and id(node) not in methods
+    )
+    if lookups < uses:
+        return None
+    return names
+
+
+def guarded_references(tree):
+    """Return the ``cookiecutter`` variables checked with ``defined``/``default``.
+
+    Such variables may legitimately be missing from the context.
+
+    :param tree: Jinja2 AST of the template.
+    """
+    names = set()
+    for node in tree.find_all(nodes.Test):
+        if node.name in _GUARD_TESTS and _lookup_name(node.node):
+            names.add(_lookup_name(node.node))
+    for node in tree.find_all(nodes.Filter):
+        if node.name in _GUARD_FILTERS and _lookup_name(node.node):
+            names.add(_lookup_name(node.node))
+    return names
+
+
+class FileAnalysis(NamedTuple):
+    """Variables and shared templates used by one template file."""
+
+    digest: str
+    variables: Optional[FrozenSet[str]]
+    guarded: FrozenSet[str]
+    templates: FrozenSet[str]
+    stat: tuple
+
+
+def _parse(env, source, name):
+    """Return the variables, guarded variables and templates used by a source."""
+    if env.variable_start_string not in source and (
+        env.block_start_string not in source
+    ):
+        return frozenset(), frozenset(), frozenset()
+    try:
+        tree = env.parse(source)
+    except TemplateSyntaxError:
+        logger.debug("Unable to analyze %s, it will fail to render", name)
+        return frozenset(), frozenset(), frozenset()
+    variables = cookiecutter_references(tree)
+    templates = frozenset(
+        template
+        for template in meta.find_referenced_templates(tree)
+        if template is not None
+    )
+    return (
+        None if variables is None else frozenset(variables),
+        frozenset(guarded_references(tree)),
+        templates,
+    )
+
+
+def _analyze_file(env, path, name, render_body, stat):
+    """Analyze one file, its path always and its body if it is rendered."""
+    with open(path, "rb") as fh:
+        data = fh.read()
+    variables, guarded, templates = _parse(env, name, name)
+
+    if render_body:
+        try:
+            source = data.decode("utf-8")
+        except UnicodeDecodeError:
+            source = ""
+        body_variables, body_guarded, templates = _parse(env, source, name)
+        if variables is None or body_variables is None:
+            variables = None
+        else:
+            variables = variables | body_variables
+        guarded = guarded | body_guarded
+
+    return FileAnalysis(
+        digest=hashlib.sha256(data).hexdigest(),
+        variables=variables,
+        guarded=guarded,
+        templates=templates,
+        stat=stat,
+    )
+
+
+def _is_copy_only(relpath, copy_without_render):
+    """Check whether a file or any of its parent dirs is copied unrendered."""
+    parts = relpath.split(os.sep)
+    for index in range(1, len(parts) + 1):
+        candidate = os.path.join(*parts[:index])
+        if any(fnmatch.fnmatch(candidate, pattern) for pattern in copy_without_render):
+            return True
+    return False
+
+
+def _walk_files(top):
+    """Yield ``(relpath, stat signature)`` of every file below ``top``."""
+    for dirpath, _, filenames in os.walk(top):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            stat = os.stat(path)
+            yield os.path.relpath(path, top), (stat.st_size, stat.st_mtime_ns)
+
+
+class TemplateAnalysis:
+    """Variables used by each file, shared template and hook of a template.
+
+    Paths are relative to the template directory, as in ``generate_files``.
+    """
+
+    def __init__(self, template_dir, files, hooks, shared, copy_without_render):
+        """Store the per-file analyses of a template."""
+        self.template_dir = template_dir
+        self.files = files
+        self.hooks = hooks
+        self.shared = shared
+        self.copy_without_render = copy_without_render
+
+    def variables(self, relpath):
+        """Return the variables a file uses, including in shared templates.
+
+        :param relpath: Path of the file relative to the template directory.
+        :return: Set of variable names, or ``None`` if the file may use any
+            variable.
+        """
+        file_analysis = self.files[relpath]
+        variables = set()
+        for analysis in [file_analysis, *self._shared(file_analysis).values()]:
+            if analysis.variables is None:
+                return None
+            variables |= analysis.variables
+        return variables
+
+    def _shared(self, file_analysis):
+        """Return the analyses of the shared templates a file uses, recursively."""
+        seen = {}
+        pending = list(file_analysis.templates)
+        while pending:
+            name = pending.pop()
+            if name in seen:
+                continue
+            # Same lookup order as the loader: template dir, then shared dir
+            analysis = self.files.get(name.replace("/", os.sep), self.shared.get(name))
+            if analysis is None:
+                continue
+            seen[name] = analysis
+            pending.extend(analysis.templates)
+        return seen
+
+    def undefined_variables(self, context):
+        """Report references to variables missing from the context.
+
+        Variables guarded with the ``defined`` test or the ``default`` filter
+        are not reported.
+
+        :param context: Dict for populating the template's variables.
+        :return: Dict mapping file paths (hooks prefixed with ``hooks/``) to
+            sorted lists of missing variable names.
+        """
+        defined = set(context.get("cookiecutter", {}))
+        analyses = dict(self.files)
+        analyses.update(
+            (os.path.join("hooks", name), hook) for name, hook in self.hooks.items()
+        )
+        undefined = {}
+        for relpath, analysis in analyses.items():
+            names = set(analysis.variables or ())
+            guarded = set(analysis.guarded)
+            for shared in self._shared(analysis).values():
+                names |= shared.variables or set()
+                guarded |= shared.guarded
+            missing = names - defined - guarded
+            if missing:
+                undefined[relpath] = sorted(missing)
+        return undefined
+
+    def unchanged_files(self, previous, previous_context, context):
+        """Return the files that render the same as in a previous analysis.
+
+        A file is unchanged when neither its content, nor the shared templates
+        it uses, nor the values of the variables it uses have changed.
+
+        :param previous: Analysis of the template for the previous run.
+        :param previous_context: Context of the previous run.
+        :param context: Context of this run.
+        :return: Set of paths relative to the template directory.
+        """
+        old_values = previous_context.get("cookiecutter", {})
+        new_values = context.get("cookiecutter", {})
+        unchanged = set()
+        for relpath, analysis in self.files.items():
+            old_analysis = previous.files.get(relpath)
+            if old_analysis is None or old_analysis.digest != analysis.digest:
+                continue
+            old_shared = previous._shared(old_analysis)
+            if any(
+                name not in old_shared or old_shared[name].digest != shared.digest
+                for name, shared in self._shared(analysis).items()
+            ):
+                continue
+            variables = self.variables(relpath)
+            if variables is None:
+                if old_values != new_values:
+                    continue
+            elif any(
+                old_values.get(name) != new_values.get(name) for name in variables
+            ):
+                continue
+            unchanged.add(relpath)
+        return unchanged
+
+
+def _syntax_key(env):
+    """Return the settings of ``env`` that change how templates are parsed."""
+    return (
+        env.block_start_string,
+        env.block_end_string,
+        env.variable_start_string,
+        env.variable_end_string,
+        env.comment_start_string,
+        env.comment_end_string,
+        env.line_statement_prefix,
+        env.line_comment_prefix,
+        tuple(sorted(env.extensions)),
+    )
+
+
+def _analyze_tree(env, top, previous, render_body):
+    """Analyze every file below ``top``, reusing unmodified previous results."""
+    analyses = {}
+    for relpath, stat in _walk_files(top):
+        old = previous.get(relpath)
+        if old is not None and old.stat == stat:
+            analyses[relpath] = old
+        else:
+            analyses[relpath] = _analyze_file(
+                env, os.path.join(top, relpath), relpath, render_body(relpath), stat
+            )
+    return analyses
+
+
+def analyze_template(template_dir, context, env):
+    """Analyze which context variables each file of a template uses.
+
+    Scans every path name and file body of the template, the shared templates
+    in its sibling ``templates`` directory and its hooks once. Hooks are
+    analysed with the environment they are rendered with, without the
+    ``_jinja2_env_vars`` of the context. Results are cached per template
+    directory and syntax; a later call re-reads only the files whose size or
+    mtime changed.
+
+    :param template_dir: Project template directory.
+    :param context: Dict for populating the template's variables.
+    :param env: Jinja2 environment the template is rendered with.
+    :return: A :class:`TemplateAnalysis`.
+    """
+    from binaryornot.check import is_binary
+
+    template_dir = os.path.abspath(template_dir)
+    repo_dir = os.path.dirname(template_dir)
+    copy_without_render = tuple(
+        context.get("cookiecutter", {}).get("_copy_without_render", ())
+    )
+
+    cache_key = (template_dir, _syntax_key(env))
+    with _ANALYSIS_CACHE_LOCK:
+        previous = _ANALYSIS_CACHE.get(cache_key)
+    if previous is not None and previous.copy_without_render != copy_without_render:
+        previous = None
+
+    def render_body(relpath):
+        if _is_copy_only(relpath, copy_without_render):
+            return False
+        return not is_binary(os.path.join(template_dir, relpath))
+
+    files = _analyze_tree(
+        env, template_dir, previous.files if previous else {}, render_body
+    )
+    shared = _analyze_tree(
+        env,
+        os.path.join(repo_dir, "templates"),
+        previous.shared if previous else {},
+        lambda relpath: True,
+    )
+    shared = {relpath.replace(os.sep, "/"): a for relpath, a in shared.items()}
+
+    from .environment import get_environment
+    from .hooks import get_hook_index
+
+    hook_env = get_environment(context, env_vars=False)
+    hooks = {}
+    for hook_name, scripts in get_hook_index(repo_dir).items():
+        if hook_name == "pre_prompt":
+            # Not rendered, run before the context exists
+            continue
+        for script in scripts:
+            name = os.path.basename(script.path)
+            old = previous.hooks.get(name) if previous else None
+            stat = os.stat(script.path)
+            stat = (stat.st_size, stat.st_mtime_ns)
+            if old is not None and old.stat == stat:
+                hooks[name] = old
+            else:
+                hooks[name] = _analyze_file(hook_env, script.path, "", True, stat)
+
+    analysis = TemplateAnalysis(template_dir, files, hooks, shared, copy_without_render)
+    with _ANALYSIS_CACHE_LOCK:
+        _ANALYSIS_CACHE[cache_key] = analysis
+    return analysis
@@ -0,0 +1,193 @@
+"""Generate many projects from one template.
+
+The template is fetched once and the projects are generated concurrently
+with the :mod:`cookieninja.aio` API. With ``dedup=True``, files that render
+to the same bytes in several projects are stored once on disk, see
+:class:`cookieninja.sinks.DedupStore`.
+"""
+import asyncio
+import logging
+import os
+import tempfile
+from typing import Dict, List, NamedTuple, Optional
+
+from . import aio
+from .config import get_user_config
+from .sinks import DedupSink, DedupStore
+from .utils import make_sure_path_exists, rmtree
+
+logger = logging.getLogger(__name__)
+
+
+class BatchResult(NamedTuple):
+    """Outcome of :func:`generate_batch`.
+
+    :param projects: Path of the project generated from each context, in the
+        order of the contexts, ``None`` for failed generations.
+    :param errors: Exception of each failed generation, by context index.
+    :param bytes_written: Bytes of the files written in full, with ``dedup``.
+    :param bytes_saved: Bytes of the files reflinked to an already stored
+        file instead of written again, with ``dedup``.
+    """
+
+    projects: List[Optional[str]]
+    errors: Dict[int, Exception]
+    bytes_written: int
+    bytes_saved: int
+
+
+def generate_batch(
+    template,
+    contexts,
+    output_dir=".",
+    checkout=None,
+    directory=None,
+    password=None,
+    config_file=None,
+    default_config=False,
+    overwrite_if_exists=False,
+    skip_if_file_exists=False,
+    accept_hooks=True,
+    keep_project_on_failure=False,
+    preflight=False,
+    render_cache=None,
+    output_cache=None,
+    staged=False,
+    compare_before_write=False,
+    durability="none",
+    dedup=False,
+    max_workers=None,
+):
+    """Generate a project from ``template`` for each of ``contexts``.
+
+    Projects are generated without prompting, as with ``no_input``. A failed
+    generation does not stop the others, its exception is returned in the
+    result.
+
+    :param template: A directory containing a project template directory,
+        or a URL to a git repository.
+    :param contexts: Extra context of each project, see the ``extra_context``
+        parameter of :func:`cookieninja.main.cookiecutter`.
+    :param dedup: Store each distinct file once and reflink it into the
+        projects, see :class:`cookieninja.sinks.DedupStore`. The store is
+        kept in ``output_dir`` during the batch.
+    :param max_workers: Number of projects generated at once, defaults to
+        the number of CPUs.
+
+    See :func:`cookieninja.main.cookiecutter` for the other parameters.
+
+    :return: A :class:`BatchResult`.
+    """
+    return asyncio.run(
+        _generate_batch(
+            template,
+            list(contexts),
+            output_dir,
+            checkout=checkout,
+            directory=directory,
+            password=password,
+            config_file=config_file,
+            default_config=default_config,
+            dedup=dedup,
+            max_workers=max_workers,
+            overwrite_if_exists=overwrite_if_exists,
+            skip_if_file_exists=skip_if_file_exists,
+            accept_hooks=accept_hooks,
+            keep_project_on_failure=keep_project_on_failure,
+            preflight=preflight,
+            render_cache=render_cache,
+            output_cache=output_cache,
+            staged=staged,
+            compare_before_write=compare_before_write,
+            durability=durability,
+        )
+    )
+
+
+async def _generate_batch(
+    template,
+    contexts,
+    output_dir,
+    checkout,
+    directory,
+    password,
+    config_file,
+    default_config,
+    dedup,
+    max_workers,
+    **options,
+):
+    """Generate the projects of a batch, see :func:`generate_batch`."""
+    config_dict = await aio._in_thread(
+        get_user_config, config_file=config_file, default_config=default_config
+    )
+    repo_dir, cleanup = await aio.determine_repo_dir(
+        template=template,
+        abbreviations=config_dict["abbreviations"],
+        clone_to_dir=config_dict["cookiecutters_dir"],
+        checkout=checkout,
+        no_input=True,
+        password=password,
+        directory=directory,
+    )
+
+    store = None
+    if dedup:
+        make_sure_path_exists(output_dir)
+        store = DedupStore(
+            tempfile.mkdtemp(dir=output_dir, prefix=".cookieninja-dedup-")
+        )
+    semaphore = asyncio.Semaphore(max_workers or os.cpu_count() or 1)
+
+    async def generate(extra_context):
+        sink = None
+        if store is not None:
+            sink = DedupSink(
+                store,
+                compare=options["compare_before_write"],
+                durability=options["durability"],
+            )
+        async with semaphore:
+            return await aio._cookiecutter_in_repo(
+                template,
+                repo_dir,
+                config_dict,
+                no_input=True,
+                extra_context=extra_context,
+                replay=None,
+                output_dir=output_dir,
+                sink=sink,
+                **options,
+            )
+
+    try:
+        results = await asyncio.gather(
+            *(generate(extra_context) for extra_context in contexts),
+            return_exceptions=True,
+        )
+    finally:
+        if store is not None:
+            # Reflinked files keep their contents once the store is removed
+            await aio._in_thread(rmtree, store.store_dir)
+        if cleanup:
+            await aio._in_thread(rmtree, repo_dir)
+
+    projects, errors = [], {}
+    for index, result in enumerate(results):
+        if isinstance(result, BaseException):
+            if not isinstance(result, Exception):
+                raise result
+            logger.error("Generation %d of the batch failed: %s", index, result)
+            errors[index] = result
+            projects.append(None)
+        else:
+            projects.append(result)
+    if store is None:
+        return BatchResult(projects, errors, 0, 0)
+    logger.info(
+        "Generated %d projects: %d bytes written, %d bytes saved by deduplication",
+        len(projects) - len(errors),
+        store.bytes_written,
+        store.bytes_saved,
+    )
+    return BatchResult(projects, errors, store.bytes_written, store.bytes_saved)
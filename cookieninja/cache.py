@@ -0,0 +1,485 @@
+"""Caches of generation results reused across runs."""
+import filecmp
+import hashlib
+import json
+import logging
+import os
+import shutil
+import subprocess  # nosec
+import tempfile
+import threading
+
+from jinja2 import meta, nodes
+from jinja2.defaults import DEFAULT_FILTERS, DEFAULT_NAMESPACE, DEFAULT_TESTS
+from jinja2.exceptions import TemplateNotFound, TemplateSyntaxError
+
+from . import __version__
+from .analysis import cookiecutter_references
+from .replay import _template_commit
+from .utils import reflink
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RENDER_CACHE_DIR = os.path.expanduser("~/.cookiecutter_cache/render/")
+
+# Globals and filters whose output changes from one render to the next
+_NONDETERMINISTIC_GLOBALS = {"lipsum", "random_ascii_string", "uuid4"}
+_NONDETERMINISTIC_FILTERS = {"random"}
+
+# Filters added by the default extensions that only depend on their input
+_DETERMINISTIC_FILTERS = {"jsonify", "slugify"}
+
+# Marks a template whose output cannot be cached
+_UNCACHEABLE = object()
+
+_ENV_ATTRIBUTES = (
+    "block_start_string",
+    "block_end_string",
+    "variable_start_string",
+    "variable_end_string",
+    "comment_start_string",
+    "comment_end_string",
+    "line_statement_prefix",
+    "line_comment_prefix",
+    "trim_blocks",
+    "lstrip_blocks",
+    "newline_sequence",
+    "keep_trailing_newline",
+    "datetime_format",
+)
+
+
+def is_deterministic(env, tree):
+    """Check whether a template renders the same for the same context.
+
+    Uses of ``uuid4``, ``random_ascii_string``, ``lipsum``, the ``random``
+    filter, extension tags such as ``{% now %}`` and globals, filters or tests
+    unknown to the default environment all make a template non-deterministic.
+
+    :param env: Jinja2 environment the template is rendered with.
+    :param tree: Jinja2 AST of the template.
+    """
+    if tree.find(nodes.ExtensionAttribute) is not None:
+        return False
+
+    # Context names other than ``cookiecutter`` are unknown
+    if meta.find_undeclared_variables(tree) - {"cookiecutter"}:
+        return False
+    for node in tree.find_all(nodes.Name):
+        if node.name not in env.globals:
+            continue
+        if node.name in _NONDETERMINISTIC_GLOBALS or (
+            env.globals[node.name] is not DEFAULT_NAMESPACE.get(node.name)
+        ):
+            return False
+
+    for node in tree.find_all(nodes.Filter):
+        if node.name in _NONDETERMINISTIC_FILTERS:
+            return False
+        if node.name not in _DETERMINISTIC_FILTERS and (
+            env.filters.get(node.name) is not DEFAULT_FILTERS.get(node.name)
+        ):
+            return False
+    for node in tree.find_all(nodes.Test):
+        if env.tests.get(node.name) is not DEFAULT_TESTS.get(node.name):
+            return False
+    return True
+
+
+class RenderCache:
+    """Rendered file contents keyed by template source and used variables.
+
+    The key of a file is the hash of its source, the sources of the templates
+    it includes, the environment settings and the values of only the
+    ``cookiecutter`` variables it references. Entries are stored as files
+    under ``cache_dir``, so they are shared by later runs.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_RENDER_CACHE_DIR):
+        """Use ``cache_dir`` to store rendered files."""
+        self.cache_dir = cache_dir
+        # Parse results per source digest, so each source is parsed once
+        self._plans = {}
+        self._lock = threading.Lock()
+
+    def _plan(self, env, source):
+        """Return the variables and templates a source uses, or uncacheable."""
+        digest = hashlib.sha256(source.encode("utf-8")).hexdigest()
+        with self._lock:
+            plan = self._plans.get((env, digest))
+        if plan is not None:
+            return digest, plan
+
+        try:
+            tree = env.parse(source)
+        except TemplateSyntaxError:
+            plan = _UNCACHEABLE
+        else:
+            templates = list(meta.find_referenced_templates(tree))
+            if None in templates or not is_deterministic(env, tree):
+                plan = _UNCACHEABLE
+            else:
+                plan = (cookiecutter_references(tree), templates)
+        with self._lock:
+            self._plans[(env, digest)] = plan
+        return digest, plan
+
+    def key(self, env, name, context):
+        """Return the cache key of a template, or ``None`` if not cacheable.
+
+        :param env: Jinja2 environment with the template loader.
+        :param name: Template name, as passed to ``env.get_template``.
+        :param context: Dict for populating the template's variables.
+        """
+        values = context.get("cookiecutter", {})
+        digests = []
+        variables = set()
+        pending = [name]
+        seen = set()
+        while pending:
+            template_name = pending.pop()
+            if template_name in seen:
+                continue
+            seen.add(template_name)
+            try:
+                source = env.loader.get_source(env, template_name)[0]
+            except TemplateNotFound:
+                return None
+            digest, plan = self._plan(env, source)
+            if plan is _UNCACHEABLE:
+                return None
+            template_variables, templates = plan
+            if template_variables is None:
+                variables = None
+            elif variables is not None:
+                variables |= template_variables
+            digests.append((template_name, digest))
+            pending.extend(templates)
+
+        if variables is None:
+            used = values
+        else:
+            used = {key: values[key] for key in sorted(variables) if key in values}
+        payload = json.dumps(
+            {
+                "version": __version__,
+                "env": [str(getattr(env, attr, None)) for attr in _ENV_ATTRIBUTES],
+                "extensions": sorted(env.extensions),
+                "templates": sorted(digests),
+                "variables": used,
+                "new_lines": values.get("_new_lines"),
+            },
+            sort_keys=True,
+            default=repr,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def copy_to(self, key, outfile, copy=shutil.copyfile):
+        """Copy a cached rendering to ``outfile``.
+
+        :param copy: Function copying a file to a path, e.g. the ``copy_file``
+            method of an output sink.
+        :return: ``True`` on a cache hit, ``False`` otherwise.
+        """
+        try:
+            copy(self._path(key), outfile)
+        except FileNotFoundError:
+            return False
+        logger.debug("Copied cached rendering %s to %s", key, outfile)
+        return True
+
+    def store(self, key, path):
+        """Store the rendered file at ``path`` under ``key``."""
+        entry = self._path(key)
+        tmp_path = None
+        try:
+            os.makedirs(os.path.dirname(entry), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(entry))
+            os.close(fd)
+            shutil.copyfile(path, tmp_path)
+            os.replace(tmp_path, entry)
+        except OSError:
+            logger.debug("Unable to cache rendering of %s", path, exc_info=True)
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+DEFAULT_OUTPUT_CACHE_DIR = os.path.expanduser("~/.cookiecutter_cache/output/")
+DEFAULT_OUTPUT_CACHE_SIZE = 1024**3
+
+# Context keys that depend on where a project is generated, not on what
+_LOCATION_KEYS = ("_output_dir", "_repo_dir")
+
+# How hooks are handled when a project is served from the output cache
+HOOK_POLICIES = ("skip", "replay", "bypass")
+
+
+def _git(repo_dir, *args):
+    """Return the output of a git command run in ``repo_dir``."""
+    return subprocess.run(
+        ["git", "-C", repo_dir, *args], capture_output=True, text=True, check=True
+    ).stdout
+
+
+def _git_commit(repo_dir):
+    """Return the commit and path of a template in a clean git checkout, or ``None``.
+
+    The path of the template in its repository tells apart the templates of
+    a repository holding several.
+    """
+    commit = _template_commit(repo_dir)
+    if commit is None:
+        return None
+    try:
+        prefix = _git(repo_dir, "rev-parse", "--show-prefix").strip()
+        status = _git(repo_dir, "status", "--porcelain", ".")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return None if status else f"git:{commit}:{prefix}"
+
+
+def _content_hash(repo_dir):
+    """Hash the paths, modes and contents of every file of a template."""
+    digest = hashlib.sha256()
+    for dirpath, dirnames, filenames in os.walk(repo_dir):
+        dirnames[:] = sorted(d for d in dirnames if d != ".git")
+        for filename in sorted(filenames):
+            path = os.path.join(dirpath, filename)
+            relpath = os.path.relpath(path, repo_dir).replace(os.sep, "/")
+            digest.update(f"{relpath}\0{os.stat(path).st_mode:o}\0".encode())
+            with open(path, "rb") as fh:
+                for chunk in iter(lambda: fh.read(1024 * 1024), b""):
+                    digest.update(chunk)
+    return f"sha256:{digest.hexdigest()}"
+
+
+def _same(path, other):
+    """Check whether two files have the same contents."""
+    try:
+        return filecmp.cmp(path, other, shallow=False)
+    except OSError:
+        return False
+
+
+def _template_is_deterministic(env, template_dir):
+    """Check a template with ``is_deterministic``.
+
+    Every path name and text file of ``template_dir`` is checked, and the text
+    files of the other directories ``env`` loads templates from, such as the
+    shared ``../templates``, as the template may include them.
+    """
+    from binaryornot.check import is_binary
+
+    template_dir = os.path.abspath(template_dir)
+    search_path = [
+        os.path.abspath(path) for path in getattr(env.loader, "searchpath", ())
+    ]
+    roots = [template_dir] + [path for path in search_path if path != template_dir]
+    for root in roots:
+        for dirpath, dirnames, filenames in os.walk(root):
+            for name in dirnames + filenames:
+                path = os.path.join(dirpath, name)
+                # Only the paths of the project template are rendered
+                sources = []
+                if root == template_dir:
+                    sources.append(os.path.relpath(path, root))
+                if name in filenames and not is_binary(path):
+                    with open(path, encoding="utf-8", errors="replace") as fh:
+                        sources.append(fh.read())
+                for source in sources:
+                    try:
+                        tree = env.parse(source)
+                    except TemplateSyntaxError:
+                        continue
+                    if not is_deterministic(env, tree):
+                        return False
+    return True
+
+
+class OutputCache:
+    """Generated projects keyed by template version and context.
+
+    A template version is the commit of a clean git checkout, or else a hash
+    of all its files. Entries are whole project trees, materialized with
+    reflinks when the filesystem supports them and copies otherwise. The
+    store is bounded to ``max_size`` bytes by evicting the least recently
+    used entries.
+
+    ``hooks`` sets what happens to hooks on a cache hit: ``"skip"`` does not
+    run them, as their effect on the project is already stored, ``"replay"``
+    runs them again around the materialized tree, and ``"bypass"`` does not
+    use the cache for templates that have hooks. With ``"replay"`` projects
+    are stored as they were before the ``post_gen_project`` hook, so that it
+    never runs on its own output.
+
+    With ``hardlink=True``, files are hardlinked to the store when reflinks
+    are not available. Editing such a file in place also changes the stored
+    entry, so only use it for projects that are not modified afterwards.
+    """
+
+    def __init__(
+        self,
+        cache_dir=DEFAULT_OUTPUT_CACHE_DIR,
+        max_size=DEFAULT_OUTPUT_CACHE_SIZE,
+        hooks="skip",
+        hardlink=False,
+    ):
+        """Store entries in ``cache_dir``, see the class docstring."""
+        if hooks not in HOOK_POLICIES:
+            raise ValueError(
+                f"Unknown hook policy {hooks!r}, use one of {HOOK_POLICIES}"
+            )
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.hooks = hooks
+        self.hardlink = hardlink
+        self._reflink_supported = True
+        # Determinism of template versions, see ``_template_is_deterministic``
+        self._deterministic = {}
+
+    def key(self, repo_dir, template_dir, env, context, accept_hooks=True):
+        """Return the key of a generation, or ``None`` if it cannot be cached.
+
+        :param repo_dir: Project template input directory.
+        :param template_dir: Project template directory inside ``repo_dir``.
+        :param env: Jinja2 environment the template is rendered with.
+        :param context: Context of the generation, as stored by ``replay``.
+        :param accept_hooks: Whether hooks are run.
+        """
+        from .hooks import get_hook_index
+
+        has_hooks = accept_hooks and any(get_hook_index(repo_dir).values())
+        if has_hooks and self.hooks == "bypass":
+            return None
+
+        version = _git_commit(repo_dir) or _content_hash(repo_dir)
+        if version not in self._deterministic:
+            self._deterministic[version] = _template_is_deterministic(env, template_dir)
+        if not self._deterministic[version]:
+            logger.debug("Not caching output of non-deterministic %s", repo_dir)
+            return None
+
+        values = {
+            key: value
+            for key, value in context.get("cookiecutter", {}).items()
+            if key not in _LOCATION_KEYS
+        }
+        payload = json.dumps(
+            {
+                "version": __version__,
+                "template": version,
+                "directory": os.path.basename(template_dir),
+                "context": {**context, "cookiecutter": values},
+                "accept_hooks": accept_hooks,
+            },
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _entry(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def __contains__(self, key):
+        """Check whether a project is stored under ``key``."""
+        return os.path.isfile(os.path.join(self._entry(key), "entry.json"))
+
+    def _clone(self, src, dst):
+        """Reflink ``src`` to ``dst``, falling back to a copy."""
+        if self._reflink_supported:
+            try:
+                reflink(src, dst)
+            except OSError:
+                self._reflink_supported = False
+            else:
+                shutil.copystat(src, dst)
+                return dst
+        return shutil.copy2(src, dst)
+
+    def _materialize_file(self, src, dst):
+        if os.path.lexists(dst):
+            os.remove(dst)
+        if self.hardlink and not self._reflink_supported:
+            try:
+                os.link(src, dst)
+                return dst
+            except OSError:
+                pass
+        return self._clone(src, dst)
+
+    def materialize(self, key, project_dir, skip_if_file_exists=False, compare=False):
+        """Recreate the project stored under ``key`` in ``project_dir``.
+
+        :param skip_if_file_exists: Leave the files that exist already alone.
+        :param compare: Leave the files that exist already with the stored
+            contents alone, so that their modification time does not change.
+        """
+        entry = self._entry(key)
+        logger.debug("Materializing cached project %s in %s", key, project_dir)
+
+        def materialize_file(src, dst):
+            if os.path.lexists(dst) and (
+                skip_if_file_exists or (compare and _same(src, dst))
+            ):
+                return dst
+            return self._materialize_file(src, dst)
+
+        shutil.copytree(
+            os.path.join(entry, "project"),
+            project_dir,
+            symlinks=True,
+            copy_function=materialize_file,
+            dirs_exist_ok=True,
+        )
+        # Mark as recently used for the LRU eviction
+        os.utime(os.path.join(entry, "entry.json"))
+
+    def store(self, key, project_dir):
+        """Store the generated project in ``project_dir`` under ``key``."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=self.cache_dir, prefix=".tmp-")
+        try:
+            shutil.copytree(
+                project_dir,
+                os.path.join(tmp_dir, "project"),
+                symlinks=True,
+                copy_function=self._clone,
+            )
+            size = sum(
+                os.lstat(os.path.join(dirpath, name)).st_size
+                for dirpath, _, filenames in os.walk(tmp_dir)
+                for name in filenames
+            )
+            with open(os.path.join(tmp_dir, "entry.json"), "w") as fh:
+                json.dump({"size": size}, fh)
+            os.rename(tmp_dir, self._entry(key))
+        except OSError:
+            # Stored concurrently, or not storable
+            logger.debug("Unable to cache project %s", project_dir, exc_info=True)
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used entries beyond ``max_size``."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            meta_path = os.path.join(self.cache_dir, name, "entry.json")
+            try:
+                with open(meta_path) as fh:
+                    size = json.load(fh)["size"]
+                used = os.stat(meta_path).st_mtime_ns
+            except (OSError, ValueError, KeyError):
+                continue
+            entries.append((used, size, name))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_size:
+                break
+            logger.debug("Evicting cached project %s", name)
+            shutil.rmtree(os.path.join(self.cache_dir, name), ignore_errors=True)
+            total -= size
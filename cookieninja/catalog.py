@@ -0,0 +1,224 @@
+"""Catalog of the templates kept in one repository.
+
+A repository is scanned once for every directory holding a
+``cookiecutter.json``. The listing, with the variables of each template, is
+kept for the lifetime of the process and only rebuilt when a directory of the
+repository changed, so templates can be picked from it without scanning again.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+from . import jsonio
+from .exceptions import RepositoryNotFound
+
+logger = logging.getLogger(__name__)
+
+# Directories that never hold templates
+_SKIPPED_DIRS = {"node_modules", "__pycache__"}
+
+_CATALOGS = {}
+_CATALOGS_LOCK = threading.Lock()
+
+
+class TemplateEntry(NamedTuple):
+    """A template found in a repository.
+
+    :param directory: Path of the template relative to the repository, in the
+        form expected by ``--directory``. Empty for the repository itself.
+    :param variables: Variables of ``cookiecutter.json`` with their defaults.
+    """
+
+    directory: str
+    variables: dict
+
+
+def _is_skipped(name):
+    """Check whether a directory is not searched for templates.
+
+    Hidden directories and project directories of templates, whose names
+    contain Jinja2 markup, are skipped.
+    """
+    return name.startswith(".") or "{{" in name or name in _SKIPPED_DIRS
+
+
+def _scan(repo_dir, start):
+    """Walk the directory ``start`` of ``repo_dir`` and its subdirectories.
+
+    :return: Tuple of the modification times of the walked directories and
+        the directories holding a ``cookiecutter.json``, both relative to
+        ``repo_dir``.
+    """
+    mtimes = {}
+    found = []
+    pending = [start]
+    while pending:
+        relpath = pending.pop()
+        path = os.path.join(repo_dir, relpath)
+        try:
+            mtimes[relpath] = os.stat(path).st_mtime_ns
+            with os.scandir(path) as it:
+                for entry in it:
+                    if entry.name == "cookiecutter.json" and entry.is_file():
+                        found.append(relpath)
+                    elif entry.is_dir() and not _is_skipped(entry.name):
+                        pending.append(os.path.join(relpath, entry.name))
+        except OSError:
+            logger.debug("Unable to scan %s", path, exc_info=True)
+    return mtimes, found
+
+
+def _read_variables(repo_dir, relpath):
+    """Return the variables of the template in ``relpath``, or ``None``."""
+    path = os.path.join(repo_dir, relpath, "cookiecutter.json")
+    try:
+        with open(path, "rb") as file_handle:
+            variables = jsonio.load(file_handle)
+    except (OSError, ValueError):
+        logger.warning("Unable to read %s, template skipped", path)
+        return None
+    return variables if isinstance(variables, dict) else None
+
+
+class Catalog:
+    """Templates found in a repository, see :func:`get_catalog`.
+
+    Entries are sorted by directory and can be looked up by it.
+
+    :param repo_dir: The repository the templates were found in.
+    :param entries: The :class:`TemplateEntry` of each template.
+    :param mtimes: Modification times of the scanned directories and
+        ``cookiecutter.json`` files, used to tell if the catalog is current.
+    """
+
+    def __init__(self, repo_dir, entries, mtimes):
+        """Keep the entries of ``repo_dir``, see the class docstring."""
+        self.repo_dir = repo_dir
+        self._entries = {entry.directory: entry for entry in entries}
+        self._mtimes = mtimes
+
+    def __iter__(self):
+        """Iterate over the entries."""
+        return iter(self._entries.values())
+
+    def __len__(self):
+        """Return the number of templates."""
+        return len(self._entries)
+
+    def __contains__(self, directory):
+        """Check whether there is a template in ``directory``."""
+        return directory in self._entries
+
+    def __getitem__(self, directory):
+        """Return the entry of the template in ``directory``."""
+        return self._entries[directory]
+
+    def template_dir(self, directory):
+        """Return the path of the template in ``directory``.
+
+        :raises: ``RepositoryNotFound`` if there is no template there.
+        """
+        directory = os.path.normpath(directory or "").replace(os.sep, "/")
+        directory = "" if directory == "." else directory
+        if directory not in self._entries:
+            raise RepositoryNotFound(
+                f'No template in "{directory}" of {self.repo_dir}, '
+                f"the templates are: {', '.join(self._entries) or 'none'}"
+            )
+        return os.path.join(self.repo_dir, directory) if directory else self.repo_dir
+
+    def is_current(self):
+        """Check whether no directory or template changed since the scan.
+
+        Only the scanned paths are stat'ed, nothing is listed or read.
+        """
+        for relpath, mtime in self._mtimes.items():
+            try:
+                if os.stat(os.path.join(self.repo_dir, relpath)).st_mtime_ns != mtime:
+                    return False
+            except OSError:
+                return False
+        return True
+
+
+def _scan_starts(repo_dir, starts, mtimes, found, map_):
+    """Walk the ``starts`` subdirectories and read the templates found.
+
+    ``mtimes`` and ``found`` are updated with those of the subdirectories.
+
+    :param map_: ``map`` or the ``map`` method of an executor.
+    :return: List of :class:`TemplateEntry`.
+    """
+    for sub_mtimes, sub_found in map_(lambda start: _scan(repo_dir, start), starts):
+        mtimes.update(sub_mtimes)
+        found.extend(sub_found)
+    found.sort()
+    variables = map_(lambda relpath: _read_variables(repo_dir, relpath), found)
+    return [
+        TemplateEntry(relpath.replace(os.sep, "/"), values)
+        for relpath, values in zip(found, variables)
+        if values is not None
+    ]
+
+
+def scan_repository(repo_dir, max_workers=None):
+    """Find every template in ``repo_dir``.
+
+    The subdirectories of the repository are walked in parallel by
+    ``max_workers`` threads, and the ``cookiecutter.json`` files read in
+    parallel as well. With ``max_workers=1`` the repository is scanned in
+    the current thread, without a pool. Hidden directories and the project
+    directories of templates are not searched.
+
+    :param repo_dir: Local directory of the repository.
+    :param max_workers: Number of threads, ``1`` to scan in the current one.
+    :return: A :class:`Catalog`.
+    """
+    repo_dir = os.path.abspath(repo_dir)
+    if not os.path.isdir(repo_dir):
+        raise RepositoryNotFound(f"{repo_dir} is not a directory")
+
+    # The top level is listed here, its subdirectories are walked by the pool
+    mtimes, found = {"": os.stat(repo_dir).st_mtime_ns}, []
+    starts = []
+    with os.scandir(repo_dir) as it:
+        for entry in it:
+            if entry.name == "cookiecutter.json" and entry.is_file():
+                found.append("")
+            elif entry.is_dir() and not _is_skipped(entry.name):
+                starts.append(entry.name)
+
+    if max_workers == 1:
+        entries = _scan_starts(repo_dir, starts, mtimes, found, map)
+    else:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            entries = _scan_starts(repo_dir, starts, mtimes, found, executor.map)
+
+    for relpath in found:
+        config = os.path.join(relpath, "cookiecutter.json")
+        try:
+            mtimes[config] = os.stat(os.path.join(repo_dir, config)).st_mtime_ns
+        except OSError:
+            mtimes[config] = None
+    return Catalog(repo_dir, entries, mtimes)
+
+
+def get_catalog(repo_dir, max_workers=None):
+    """Return the catalog of ``repo_dir``, scanning it only if needed.
+
+    A catalog built earlier in the process is reused as long as none of the
+    directories or ``cookiecutter.json`` files it was built from changed.
+
+    See :func:`scan_repository` for the parameters.
+    """
+    key = os.path.abspath(repo_dir)
+    with _CATALOGS_LOCK:
+        catalog = _CATALOGS.get(key)
+    if catalog is not None and catalog.is_current():
+        return catalog
+    catalog = scan_repository(key, max_workers=max_workers)
+    with _CATALOGS_LOCK:
+        _CATALOGS[key] = catalog
+    return catalog
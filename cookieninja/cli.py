@@ -1,6 +1,8 @@
 """Main `cookiecutter` CLI."""
 import collections
+import contextlib
 import json
+import logging
 import os
 import sys
 
@@ -8,21 +10,46 @@ import click
 
 from . import __version__
 from .exceptions import (
+    CircularVariableDependency,
     ContextDecodingException,
     FailedHookException,
+    GenerationServerError,
+    GenerationServerUnavailable,
     InvalidModeException,
+    InvalidReplayEntry,
+    InvalidServerAddress,
     InvalidZipRepository,
     OutputDirExistsException,
     RepositoryCloneFailed,
     RepositoryNotFound,
     UndefinedVariableInTemplate,
     UnknownExtension,
+    UnknownReplayEntry,
     InvalidBooleanExpression,
 )
 from .log import configure_logger
-from .main import cookiecutter
 from .config import get_user_config
 
+logger = logging.getLogger(__name__)
+
+
+def cookiecutter(*args, **kwargs):
+    """Run :func:`cookieninja.main.cookiecutter`, importing it on first use.
+
+    Keeps Jinja2 and the other generation dependencies out of short
+    invocations such as ``--version``, ``--help`` and ``--list-installed``.
+    """
+    from .main import cookiecutter as _cookiecutter
+
+    return _cookiecutter(*args, **kwargs)
+
+
+def generate_remote(*args, **kwargs):
+    """Run :func:`cookieninja.server.generate_remote`, importing it on first use."""
+    from .server import generate_remote as _generate_remote
+
+    return _generate_remote(*args, **kwargs)
+
 
 def version_msg():
     """Return the Cookiecutter version, location and Python powering it."""
@@ -68,6 +95,143 @@ def list_installed_templates(default_config, passed_config_file):
         click.echo(f" * {name}")
 
 
+def list_repository_templates(template, checkout, default_config, passed_config_file):
+    """List the templates of a repository. Use cookiecutter --list-templates."""
+    from .catalog import get_catalog
+    from .repository import determine_repo_root
+    from .utils import rmtree
+
+    config = get_user_config(passed_config_file, default_config)
+    try:
+        repo_dir, cleanup = determine_repo_root(
+            template=template,
+            abbreviations=config["abbreviations"],
+            clone_to_dir=config["cookiecutters_dir"],
+            checkout=checkout,
+            no_input=True,
+        )
+    except (RepositoryNotFound, RepositoryCloneFailed) as e:
+        click.echo(e)
+        sys.exit(1)
+    try:
+        catalog = get_catalog(repo_dir)
+    finally:
+        if cleanup:
+            rmtree(repo_dir)
+
+    click.echo(f"{len(catalog)} templates in {template}: ")
+    for entry in catalog:
+        variables = ", ".join(
+            name for name in entry.variables if not name.startswith("_")
+        )
+        click.echo(f" * {entry.directory or '.'}: {variables}")
+
+
+def update_generated_project(
+    project_dir,
+    template,
+    checkout,
+    directory,
+    extra_context,
+    accept_hooks,
+    default_config,
+    passed_config_file,
+):
+    """Update a project to a new template version. Use cookiecutter --update."""
+    from .exceptions import ProjectUpdateError
+    from .update import update_project
+
+    try:
+        result = update_project(
+            project_dir,
+            checkout=checkout,
+            template=template,
+            directory=directory,
+            extra_context=extra_context,
+            config_file=passed_config_file,
+            default_config=default_config,
+            accept_hooks=accept_hooks,
+        )
+    except (
+        ProjectUpdateError,
+        RepositoryCloneFailed,
+        UndefinedVariableInTemplate,
+    ) as e:
+        click.echo(e)
+        sys.exit(1)
+
+    click.echo(
+        f"Updated {result.project_dir}: {len(result.updated)} files updated, "
+        f"{len(result.added)} added, {len(result.removed)} removed"
+    )
+    if result.conflicts:
+        click.echo(f"{len(result.conflicts)} files have conflicts to resolve: ")
+        for path in result.conflicts:
+            click.echo(f" * {path}")
+        sys.exit(1)
+
+
+def watch_template(
+    template,
+    checkout,
+    directory,
+    no_input,
+    extra_context,
+    output_dir,
+    accept_hooks,
+    default_config,
+    passed_config_file,
+):
+    """Regenerate a project as its template changes. Use cookiecutter --watch."""
+    from .watch import watch
+
+    def report(run):
+        if run.error is None:
+            click.echo(
+                f"Generated {run.project_dir}: {run.files_written} files written, "
+                f"{run.files_unchanged} unchanged"
+            )
+
+    try:
+        watch(
+            template,
+            output_dir=output_dir,
+            checkout=checkout,
+            directory=directory,
+            no_input=no_input,
+            extra_context=extra_context,
+            config_file=passed_config_file,
+            default_config=default_config,
+            accept_hooks=accept_hooks,
+            callback=report,
+        )
+    except (RepositoryNotFound, RepositoryCloneFailed) as e:
+        click.echo(e)
+        sys.exit(1)
+    except KeyboardInterrupt:
+        pass
+
+
+@contextlib.contextmanager
+def profiled(profile, profile_format):
+    """Print the timing report of the block to stderr, with --profile."""
+    if not profile:
+        yield
+        return
+
+    from .timing import record
+
+    report = None
+    try:
+        with record() as report:
+            yield
+    finally:
+        if profile_format == "json":
+            click.echo(report.to_json(), err=True)
+        else:
+            click.echo(report.format(), err=True)
+
+
 @click.command(context_settings=dict(help_option_names=["-h", "--help"]))
 @click.version_option(__version__, "-V", "--version", message=version_msg())
 @click.argument("template", required=False)
@@ -110,6 +274,13 @@ def list_installed_templates(default_config, passed_config_file):
     default=None,
     help="Use this file for replay instead of the default.",
 )
+@click.option(
+    "--replay-entry",
+    type=int,
+    default=None,
+    help="Replay the run with this id from the replay history, "
+    "which must be a run of TEMPLATE.",
+)
 @click.option(
     "-f",
     "--overwrite-if-exists",
@@ -153,11 +324,56 @@ def list_installed_templates(default_config, passed_config_file):
 @click.option(
     "-l", "--list-installed", is_flag=True, help="List currently installed templates."
 )
+@click.option(
+    "--list-templates",
+    is_flag=True,
+    help="List the templates found in TEMPLATE, to pick one with --directory.",
+)
+@click.option(
+    "--update",
+    metavar="PROJECT_DIR",
+    default=None,
+    help="Update a generated project to the template version given by "
+    "--checkout, merging the template changes with local edits. TEMPLATE, "
+    "if given, replaces the template the project was generated from.",
+)
+@click.option(
+    "--watch",
+    is_flag=True,
+    help="Generate the project, then regenerate it whenever TEMPLATE changes, "
+    "rendering only the files affected by the change. Stop with Ctrl-C.",
+)
+@click.option(
+    "--profile",
+    is_flag=True,
+    help="Report the time spent in each phase of the generation, the number "
+    "of files rendered, copied and skipped, and the slowest files, to stderr",
+)
+@click.option(
+    "--profile-format",
+    type=click.Choice(["text", "json"]),
+    default="text",
+    help="Format of the --profile report",
+)
 @click.option(
     "--keep-project-on-failure",
     is_flag=True,
     help="Do not delete project folder on failure",
 )
+@click.option(
+    "--serve",
+    metavar="ADDRESS",
+    default=None,
+    help="Run a generation server on a Unix socket path or a loopback [HOST:]PORT",
+)
+@click.option(
+    "--server",
+    metavar="ADDRESS",
+    envvar="COOKIENINJA_SERVER",
+    default=None,
+    help="Send --no-input generations to the generation server at ADDRESS, "
+    "falling back to local generation if it cannot be reached",
+)
 def main(
     template,
     extra_context,
@@ -175,8 +391,16 @@ def main(
     skip_if_file_exists,
     accept_hooks,
     replay_file,
+    replay_entry,
     list_installed,
+    list_templates,
+    update,
+    watch,
+    profile,
+    profile_format,
     keep_project_on_failure,
+    serve,
+    server,
 ):
     """Create a project from a Cookieninja project template (TEMPLATE).
 
@@ -190,13 +414,30 @@ def main(
         list_installed_templates(default_config, config_file)
         sys.exit(0)
 
+    if serve:
+        from .server import serve as run_server
+
+        configure_logger(
+            stream_level="DEBUG" if verbose else "INFO", debug_file=debug_file
+        )
+        try:
+            run_server(serve)
+        except InvalidServerAddress as e:
+            click.echo(e)
+            sys.exit(1)
+        sys.exit(0)
+
     # Raising usage, after all commands that should work without args.
-    if not template or template.lower() == "help":
+    if not update and (not template or template.lower() == "help"):
         click.echo(click.get_current_context().get_help())
         sys.exit(0)
 
     configure_logger(stream_level="DEBUG" if verbose else "INFO", debug_file=debug_file)
 
+    if list_templates:
+        list_repository_templates(template, checkout, default_config, config_file)
+        sys.exit(0)
+
     # If needed, prompt the user to ask whether or not they want to execute
     # the pre/post hooks.
     if accept_hooks == "ask":
@@ -204,29 +445,87 @@ def main(
     else:
         _accept_hooks = accept_hooks == "yes"
 
-    if replay_file:
-        replay = replay_file
+    if update:
+        update_generated_project(
+            update,
+            template,
+            checkout,
+            directory,
+            extra_context,
+            _accept_hooks,
+            default_config,
+            config_file,
+        )
+        sys.exit(0)
 
-    try:
-        cookiecutter(
+    if watch:
+        watch_template(
             template,
             checkout,
+            directory,
             no_input,
-            recurse_submodules=recurse_submodules,
-            extra_context=extra_context,
-            replay=replay,
-            overwrite_if_exists=overwrite_if_exists,
-            output_dir=output_dir,
-            config_file=config_file,
-            default_config=default_config,
-            password=os.environ.get("COOKIECUTTER_REPO_PASSWORD"),
-            directory=directory,
-            skip_if_file_exists=skip_if_file_exists,
-            accept_hooks=_accept_hooks,
-            keep_project_on_failure=keep_project_on_failure,
+            extra_context,
+            output_dir,
+            _accept_hooks,
+            default_config,
+            config_file,
         )
+        sys.exit(0)
+
+    if replay_file:
+        replay = replay_file
+    if replay_entry is not None:
+        replay = replay_entry
+
+    try:
+        with profiled(profile, profile_format):
+            password = os.environ.get("COOKIECUTTER_REPO_PASSWORD")
+            # The password of a template is not sent to the server
+            if server and no_input and not replay and not password:
+                try:
+                    generate_remote(
+                        server,
+                        template,
+                        checkout=checkout,
+                        recurse_submodules=recurse_submodules,
+                        extra_context=extra_context,
+                        output_dir=output_dir,
+                        overwrite_if_exists=overwrite_if_exists,
+                        config_file=config_file,
+                        default_config=default_config,
+                        directory=directory,
+                        skip_if_file_exists=skip_if_file_exists,
+                        accept_hooks=_accept_hooks,
+                        keep_project_on_failure=keep_project_on_failure,
+                    )
+                    return
+                except GenerationServerUnavailable as err:
+                    logger.debug(
+                        "Generation server unavailable (%s), running locally", err
+                    )
+
+            cookiecutter(
+                template,
+                checkout,
+                no_input,
+                recurse_submodules=recurse_submodules,
+                extra_context=extra_context,
+                replay=replay,
+                overwrite_if_exists=overwrite_if_exists,
+                output_dir=output_dir,
+                config_file=config_file,
+                default_config=default_config,
+                password=password,
+                directory=directory,
+                skip_if_file_exists=skip_if_file_exists,
+                accept_hooks=_accept_hooks,
+                keep_project_on_failure=keep_project_on_failure,
+            )
     except (
+        CircularVariableDependency,
         ContextDecodingException,
+        GenerationServerError,
+        InvalidServerAddress,
         OutputDirExistsException,
         InvalidModeException,
         FailedHookException,
@@ -234,6 +533,8 @@ def main(
         InvalidZipRepository,
         RepositoryNotFound,
         RepositoryCloneFailed,
+        UnknownReplayEntry,
+        InvalidReplayEntry,
     ) as e:
         click.echo(e)
         sys.exit(1)
@@ -250,4 +551,4 @@ def main(
 
 
 if __name__ == "__main__":
-    main()
+    main()  # pragma: no cover
@@ -3,8 +3,7 @@ import collections
 import copy
 import logging
 import os
-
-import yaml
+import threading
 
 from .exceptions import ConfigDoesNotExistException, InvalidConfiguration
 
@@ -26,6 +25,11 @@ DEFAULT_CONFIG = {
 }
 
 
+# Parsed config files keyed by path, validated by mtime and size
+_PARSED_CONFIGS = {}
+_PARSED_CONFIGS_LOCK = threading.Lock()
+
+
 def _expand_path(path):
     """Expand both environment variables and user home in the given path."""
     path = os.path.expandvars(path)
@@ -38,8 +42,11 @@ def merge_configs(default, overwrite):
 
     Dict values that are dictionaries themselves will be updated, whilst
     preserving existing keys.
+
+    Neither ``default`` nor ``overwrite`` is changed, but the result shares
+    their values.
     """
-    new_config = copy.deepcopy(default)
+    new_config = copy.copy(default)
 
     for k, v in overwrite.items():
         # Make sure to preserve existing items in
@@ -52,21 +59,45 @@ def merge_configs(default, overwrite):
     return new_config
 
 
-def get_config(config_path):
-    """Retrieve the config from the specified path, returning a config dict."""
-    if not os.path.exists(config_path):
-        raise ConfigDoesNotExistException(f"Config file {config_path} does not exist.")
+def _load_yaml(config_path):
+    """Parse a YAML config file, reusing the result while it is unchanged.
 
-    logger.debug("config_path is %s", config_path)
+    Files are parsed with the C ``CSafeLoader`` of PyYAML if available.
+    """
+    stat = os.stat(config_path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    key = os.path.abspath(config_path)
+    with _PARSED_CONFIGS_LOCK:
+        cached = _PARSED_CONFIGS.get(key)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    import yaml
+
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
     with open(config_path, encoding="utf-8") as file_handle:
         try:
-            yaml_dict = yaml.safe_load(file_handle)
+            yaml_dict = yaml.load(file_handle, Loader=loader)
         except yaml.YAMLError as e:
             raise InvalidConfiguration(
                 f"Unable to parse YAML file {config_path}."
             ) from e
 
-    config_dict = merge_configs(DEFAULT_CONFIG, yaml_dict)
+    with _PARSED_CONFIGS_LOCK:
+        _PARSED_CONFIGS[key] = (signature, yaml_dict)
+    return yaml_dict
+
+
+def get_config(config_path):
+    """Retrieve the config from the specified path, returning a config dict."""
+    if not os.path.exists(config_path):
+        raise ConfigDoesNotExistException(f"Config file {config_path} does not exist.")
+
+    logger.debug("config_path is %s", config_path)
+    yaml_dict = _load_yaml(config_path)
+    # The parsed file is cached and the defaults are shared: copy the result
+    # once, so that changes to it do not leak into later runs
+    config_dict = copy.deepcopy(merge_configs(DEFAULT_CONFIG, yaml_dict))
 
     raw_replay_dir = config_dict["replay_dir"]
     config_dict["replay_dir"] = _expand_path(raw_replay_dir)
@@ -1,5 +1,9 @@
 """Jinja2 environment and extensions loading."""
-from jinja2 import Environment, StrictUndefined
+import json
+import os
+import threading
+
+from jinja2 import Environment, FileSystemLoader, StrictUndefined
 
 from .exceptions import UnknownExtension
 
@@ -63,3 +67,65 @@ class StrictEnvironment(ExtensionLoaderMixin, Environment):
         Also loading extensions defined in cookiecutter.json's _extensions key.
         """
         super().__init__(undefined=StrictUndefined, **kwargs)
+
+
+# Shared environments keyed by (extensions, env vars, keep_trailing_newline,
+# loader root)
+_ENVIRONMENTS = {}
+_ENVIRONMENTS_LOCK = threading.Lock()
+
+
+def get_environment(
+    context=None, template_dir=None, env_vars=True, keep_trailing_newline=True
+):
+    """Return the shared StrictEnvironment for a template configuration.
+
+    One environment is built per distinct combination of ``_extensions`` and
+    ``_jinja2_env_vars``, and reused by prompting, generation and hooks, for
+    this run and later runs in the same process.
+
+    When ``template_dir`` is given, the returned environment loads templates
+    from it and its sibling ``templates`` directory. It shares extensions and
+    the compiled template cache with the environment it is derived from.
+
+    :param context: Cookiecutter project template context.
+    :param template_dir: Project template directory to load templates from.
+    :param env_vars: Whether to apply the ``_jinja2_env_vars`` of the context.
+        Hook scripts and prompts are rendered without them, with the default
+        settings.
+    :param keep_trailing_newline: Whether rendering keeps the last newline of
+        a template. Prompts render variables without it.
+    """
+    cookiecutter_dict = (context or {}).get("cookiecutter", {})
+    jinja2_env_vars = cookiecutter_dict.get("_jinja2_env_vars", {}) if env_vars else {}
+    base_key = (
+        tuple(str(ext) for ext in cookiecutter_dict.get("_extensions", [])),
+        json.dumps(jinja2_env_vars, sort_keys=True, default=str),
+        keep_trailing_newline,
+    )
+    loader_root = os.path.abspath(template_dir) if template_dir else None
+
+    with _ENVIRONMENTS_LOCK:
+        env = _ENVIRONMENTS.get((*base_key, loader_root))
+        if env is not None:
+            return env
+
+        base_env = _ENVIRONMENTS.get((*base_key, None))
+        if base_env is None:
+            base_env = StrictEnvironment(
+                context=context,
+                keep_trailing_newline=keep_trailing_newline,
+                **jinja2_env_vars,
+            )
+            _ENVIRONMENTS[(*base_key, None)] = base_env
+        if loader_root is None:
+            return base_env
+
+        env = base_env.overlay(
+            loader=FileSystemLoader(
+                [loader_root, os.path.join(loader_root, os.pardir, "templates")]
+            )
+        )
+        env.cache = base_env.cache
+        _ENVIRONMENTS[(*base_key, loader_root)] = env
+        return env
@@ -169,3 +169,75 @@ class InvalidBooleanExpression(CookiecutterException):
 
     Raised when the specified boolean expression cannot be parsed.
     """
+
+
+class GenerationServerError(CookiecutterException):
+    """
+    Exception for generation failures reported by a generation server.
+
+    Raised by the server client when the server could not generate the
+    requested project.
+    """
+
+
+class GenerationServerUnavailable(CookiecutterException):
+    """
+    Exception for generation servers that cannot be reached.
+
+    Raised by the server client when it cannot connect to the server, so that
+    no request was sent.
+    """
+
+
+class InvalidServerAddress(CookiecutterException):
+    """
+    Exception for addresses a generation server must not listen on.
+
+    Raised when the server is asked to listen on a TCP address that is not a
+    loopback address, as requests are not authenticated, on a path holding
+    something else than a socket, or on an address that cannot be parsed.
+    """
+
+
+class CircularVariableDependency(CookiecutterException):
+    """
+    Exception for template variables that depend on each other.
+
+    Raised when the values in ``cookiecutter.json`` refer to each other in a
+    cycle, so that no rendering order exists.
+    """
+
+
+class UnknownReplayEntry(CookiecutterException):
+    """
+    Exception for a replay history entry that does not exist.
+
+    Raised when replaying an entry id that is not in the replay history.
+    """
+
+
+class InvalidReplayEntry(CookiecutterException):
+    """
+    Exception for a replay history entry of another template.
+
+    Raised when replaying an entry id that is a run of another template than
+    the one given.
+    """
+
+
+class OutputSinkError(CookiecutterException):
+    """
+    Exception for generations an output sink cannot hold.
+
+    Raised when a template with hooks is generated to a sink that does not
+    write to the filesystem, such as an archive.
+    """
+
+
+class ProjectUpdateError(CookiecutterException):
+    """
+    Exception for projects that cannot be updated to a new template version.
+
+    Raised when the generation of a project is not in the replay history, or
+    when its template is not a git repository.
+    """
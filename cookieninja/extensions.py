@@ -1,13 +1,10 @@
 """Jinja2 extensions."""
-import json
 import string
 import uuid
 from secrets import choice
 
-import arrow
 from jinja2 import nodes
 from jinja2.ext import Extension
-from slugify import slugify as pyslugify
 
 
 class JsonifyExtension(Extension):
@@ -18,7 +15,9 @@ class JsonifyExtension(Extension):
         super().__init__(environment)
 
         def jsonify(obj):
-            return json.dumps(obj, sort_keys=True, indent=4)
+            from . import jsonio
+
+            return jsonio.dumps(obj, sort_keys=True, indent=4)
 
         environment.filters["jsonify"] = jsonify
 
@@ -49,6 +48,8 @@ class SlugifyExtension(Extension):
 
         def slugify(value, **kwargs):
             """Slugifies the value."""
+            from slugify import slugify as pyslugify
+
             return pyslugify(value, **kwargs)
 
         environment.filters["slugify"] = slugify
@@ -80,6 +81,8 @@ class TimeExtension(Extension):
         environment.extend(datetime_format="%Y-%m-%d")
 
     def _datetime(self, timezone, operator, offset, datetime_format):
+        import arrow
+
         d = arrow.now(timezone)
 
         # parse shift params from offset and include operator
@@ -94,6 +97,8 @@ class TimeExtension(Extension):
         return d.strftime(datetime_format)
 
     def _now(self, timezone, datetime_format):
+        import arrow
+
         if datetime_format is None:
             datetime_format = self.environment.datetime_format
         return arrow.now(timezone).strftime(datetime_format)
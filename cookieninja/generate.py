@@ -1,30 +1,36 @@
 """Functions for generating a project from a project template."""
 import fnmatch
-import json
+import functools
 import logging
 import os
-import shutil
 import warnings
-from collections import OrderedDict
 from pathlib import Path
-from binaryornot.check import is_binary
-from jinja2 import FileSystemLoader, Environment
+from typing import List, NamedTuple, Optional
+
+from jinja2 import Environment
 from jinja2.exceptions import TemplateSyntaxError, UndefinedError
 
-from .environment import StrictEnvironment
+from . import jsonio, timing
+from .analysis import analyze_template
+from .environment import get_environment
 from .exceptions import (
     ContextDecodingException,
     FailedHookException,
     NonTemplatedInputDirException,
     OutputDirExistsException,
+    OutputSinkError,
     UndefinedVariableInTemplate,
 )
 from .find import find_template
-from .hooks import run_hook
-from .utils import make_sure_path_exists, rmtree, work_in
+from .hooks import get_hook_index, run_hook
+from .sinks import DirectorySink
+from .staging import StagedDirectory, can_clone
+from .utils import rmtree
 
 logger = logging.getLogger(__name__)
 
+_DIRECTORY_SINK = DirectorySink()
+
 
 def is_copy_only_path(path, context):
     """Check whether the given `path` should only be copied and not rendered.
@@ -89,11 +95,11 @@ def generate_context(
     :param default_context: Dictionary containing config to take into account.
     :param extra_context: Dictionary containing configuration overrides
     """
-    context = OrderedDict([])
+    context = {}
 
     try:
-        with open(context_file, encoding="utf-8") as file_handle:
-            obj = json.load(file_handle, object_pairs_hook=OrderedDict)
+        with open(context_file, "rb") as file_handle:
+            obj = jsonio.load(file_handle)
     except ValueError as e:
         # JSON decoding error.  Let's throw a new exception that is more
         # friendly for the developer or user.
@@ -124,7 +130,16 @@ def generate_context(
     return context
 
 
-def generate_file(project_dir, infile, context, env, skip_if_file_exists=False):
+def generate_file(
+    project_dir,
+    infile,
+    context,
+    env,
+    skip_if_file_exists=False,
+    render_cache=None,
+    template_dir=None,
+    sink=None,
+):
     """Render filename of infile as name of outfile, handle infile correctly.
 
     Dealing with infile appropriately:
@@ -135,43 +150,63 @@ def generate_file(project_dir, infile, context, env, skip_if_file_exists=False):
 
     Precondition:
 
-        When calling `generate_file()`, the root template dir must be the
-        current working directory. Using `utils.work_in()` is the recommended
-        way to perform this directory change.
+        When calling `generate_file()` without `template_dir`, the root
+        template dir must be the current working directory. Using
+        `utils.work_in()` is the recommended way to perform this directory
+        change.
 
     :param project_dir: Absolute path to the resulting generated project.
     :param infile: Input file to generate the file from. Relative to the root
         template dir.
     :param context: Dict for populating the cookiecutter's variables.
     :param env: Jinja2 template execution environment.
+    :param render_cache: Optional :class:`cookieninja.cache.RenderCache` to
+        copy the rendered file from, or store it in.
+    :param template_dir: The root template dir ``infile`` is relative to.
+        Defaults to the current working directory.
+    :param sink: :class:`cookieninja.sinks.OutputSink` to write to, defaults
+        to the filesystem.
     """
+    sink = sink or _DIRECTORY_SINK
     logger.debug("Processing file %s", infile)
+    source = os.path.join(template_dir, infile) if template_dir else infile
 
     # Render the path to the output file (not including the root project dir)
-    outfile_tmpl = env.from_string(infile)
-
-    outfile = os.path.join(project_dir, outfile_tmpl.render(**context))
-    file_name_is_empty = os.path.isdir(outfile)
+    outfile = os.path.join(project_dir, _render_path(env, infile, context))
+    file_name_is_empty = sink.isdir(outfile)
     if file_name_is_empty:
         logger.debug("The resulting file name is empty: %s", outfile)
+        timing.count("files_skipped")
         return
 
-    if skip_if_file_exists and os.path.exists(outfile):
+    if skip_if_file_exists and sink.exists(outfile):
         logger.debug("The resulting file already exists: %s", outfile)
+        timing.count("files_skipped")
         return
 
     logger.debug("Created file at %s", outfile)
 
     # Just copy over binary files. Don't render.
+    from binaryornot.check import is_binary
+
     logger.debug("Check %s to see if it's a binary", infile)
-    if is_binary(infile):
+    if is_binary(source):
         logger.debug("Copying binary %s to %s without rendering", infile, outfile)
-        shutil.copyfile(infile, outfile)
+        sink.copy_file(source, outfile)
+        timing.count("files_copied")
     else:
         # Force fwd slashes on Windows for get_template
         # This is a by-design Jinja issue
         infile_fwd_slashes = infile.replace(os.path.sep, "/")
 
+        cache_key = None
+        if render_cache is not None and sink.is_filesystem:
+            cache_key = render_cache.key(env, infile_fwd_slashes, context)
+            copy = functools.partial(sink.copy_file, mode=os.stat(source).st_mode)
+            if cache_key is not None and render_cache.copy_to(cache_key, outfile, copy):
+                timing.count("files_from_render_cache")
+                return
+
         # Render the file
         try:
             tmpl = env.get_template(infile_fwd_slashes)
@@ -181,25 +216,54 @@ def generate_file(project_dir, infile, context, env, skip_if_file_exists=False):
             exception.translated = False
             raise
         rendered_file = tmpl.render(**context)
+        timing.count("files_rendered")
 
-        # Detect original file newline to output the rendered file
-        # note: newline='' ensures newlines are not converted
-        with open(infile, encoding="utf-8", newline="") as rd:
-            rd.readline()  # Read the first line to load 'newlines' value
-
-            # Use `_new_lines` overwrite from context, if configured.
-            newline = rd.newlines
-            if context["cookiecutter"].get("_new_lines", False):
-                newline = context["cookiecutter"]["_new_lines"]
-                logger.debug("Overwriting end line character with %s", newline)
+        newline = _output_newline(source, context)
 
         logger.debug("Writing contents to file %s", outfile)
 
-        with open(outfile, "w", encoding="utf-8", newline=newline) as fh:
-            fh.write(rendered_file)
+        # Apply file permissions to output file
+        sink.write_file(
+            outfile, _encode_rendering(rendered_file, newline), os.stat(source).st_mode
+        )
+
+        if cache_key is not None:
+            render_cache.store(cache_key, outfile)
+
+
+def _output_newline(source, context):
+    """Return the newline to write the rendering of ``source`` with."""
+    # Detect original file newline to output the rendered file
+    # note: newline='' ensures newlines are not converted
+    with open(source, encoding="utf-8", newline="") as rd:
+        rd.readline()  # Read the first line to load 'newlines' value
+
+        # Use `_new_lines` overwrite from context, if configured.
+        newline = rd.newlines
+        if context["cookiecutter"].get("_new_lines", False):
+            newline = context["cookiecutter"]["_new_lines"]
+            logger.debug("Overwriting end line character with %s", newline)
+    return newline
+
+
+def _encode_rendering(text, newline):
+    """Encode a rendered file, translating newlines like text files do."""
+    if newline is None:
+        newline = os.linesep
+    if newline and newline != "\n":
+        text = text.replace("\n", newline)
+    return text.encode("utf-8")
 
-    # Apply file permissions to output file
-    shutil.copymode(infile, outfile)
+
+@functools.lru_cache(maxsize=4096)
+def _path_template(env, path):
+    """Compile a path template, once per environment."""
+    return env.from_string(path)
+
+
+def _render_path(env, path, context):
+    """Render a templated path."""
+    return _path_template(env, path).render(**context)
 
 
 def render_and_create_dir(
@@ -208,18 +272,25 @@ def render_and_create_dir(
     output_dir: "os.PathLike[str]",
     environment: Environment,
     overwrite_if_exists: bool = False,
+    sink=None,
 ):
     """Render name of a directory, create the directory, return its path."""
-    name_tmpl = environment.from_string(dirname)
-    rendered_dirname = name_tmpl.render(**context)
+    rendered_dirname = _render_path(environment, dirname, context)
+    return _create_dir(
+        Path(output_dir, rendered_dirname), output_dir, overwrite_if_exists, sink
+    )
 
-    dir_to_create = Path(output_dir, rendered_dirname)
+
+def _create_dir(dir_to_create, output_dir, overwrite_if_exists, sink=None):
+    """Create a rendered directory, see :func:`render_and_create_dir`."""
+    sink = sink or _DIRECTORY_SINK
+    dir_to_create = Path(dir_to_create)
 
     logger.debug(
         "Rendered dir %s must exist in output_dir %s", dir_to_create, output_dir
     )
 
-    output_dir_exists = dir_to_create.exists()
+    output_dir_exists = sink.exists(dir_to_create)
 
     if output_dir_exists:
         if overwrite_if_exists:
@@ -230,7 +301,7 @@ def render_and_create_dir(
             msg = f'Error: "{dir_to_create}" directory already exists'
             raise OutputDirExistsException(msg)
     else:
-        make_sure_path_exists(dir_to_create)
+        sink.make_dir(dir_to_create)
 
     return dir_to_create, not output_dir_exists
 
@@ -247,7 +318,13 @@ def ensure_dir_is_templated(dirname: str, environment: Environment) -> bool:
 
 
 def _run_hook_from_repo_dir(
-    repo_dir, hook_name, project_dir, context, delete_project_on_failure
+    repo_dir,
+    hook_name,
+    project_dir,
+    context,
+    delete_project_on_failure,
+    hook_index=None,
+    hook_runner=None,
 ):
     """Run hook from repo directory, clean project directory if hook fails.
 
@@ -257,19 +334,352 @@ def _run_hook_from_repo_dir(
     :param context: Cookiecutter project context.
     :param delete_project_on_failure: Delete the project directory on hook
         failure?
+    :param hook_index: Hooks of the template, see
+        :func:`cookieninja.hooks.get_hook_index`.
+    :param hook_runner: Function running the hook, with the signature of
+        :func:`cookieninja.hooks.run_hook`, which is the default.
+    """
+    if hook_index is None:
+        hook_index = get_hook_index(repo_dir)
+    if hook_runner is None:
+        hook_runner = run_hook
+    try:
+        with timing.phase("hooks"):
+            hook_runner(hook_name, project_dir, context, hook_index)
+    except (FailedHookException, UndefinedError):
+        if delete_project_on_failure:
+            rmtree(project_dir)
+        logger.error(
+            "Stopping generation because %s hook script didn't exit successfully",
+            hook_name,
+        )
+        raise
+
+
+def _raise_for_undefined_variables(analysis, context):
+    """Raise if the template refers to variables missing from the context."""
+    undefined = analysis.undefined_variables(context)
+    if not undefined:
+        return
+    details = "; ".join(
+        f"'{relpath}' uses {', '.join(names)}"
+        for relpath, names in sorted(undefined.items())
+    )
+    first_name = undefined[min(undefined)][0]
+    error = UndefinedError(f"'cookiecutter' has no attribute '{first_name}'")
+    msg = f"Undefined variables in template: {details}"
+    raise UndefinedVariableInTemplate(msg, error, context)
+
+
+def _walk_tree(template_dir, project_dir, output_dir, context, env):
+    """Classify the directories and files of a template, in generation order.
+
+    Yields ``(kind, relpath, target)`` tuples, where ``relpath`` is relative
+    to ``template_dir`` and ``target`` is the rendered output path. ``kind``
+    is one of:
+
+    * ``"copy_dir"``: directory copied without rendering;
+    * ``"dir"``: directory to create;
+    * ``"copy_file"``: file copied without rendering;
+    * ``"file"``: file generated by :func:`generate_file`.
+    """
+    for top, dirs, files in os.walk(template_dir):
+        root = os.path.relpath(top, template_dir)
+        # We must separate the two types of dirs into different lists.
+        # The reason is that we don't want ``os.walk`` to go through the
+        # unrendered directories, since they will just be copied.
+        copy_dirs = []
+        render_dirs = []
+
+        for d in dirs:
+            d_ = os.path.normpath(os.path.join(root, d))
+            # We check the full path, because that's how it can be
+            # specified in the ``_copy_without_render`` setting, but
+            # we store just the dir name
+            if is_copy_only_path(d_, context):
+                logger.debug("Found copy only path %s", d)
+                copy_dirs.append(d)
+            else:
+                render_dirs.append(d)
+
+        for copy_dir in copy_dirs:
+            indir = os.path.normpath(os.path.join(root, copy_dir))
+            outdir = os.path.normpath(os.path.join(project_dir, indir))
+            yield "copy_dir", indir, _render_path(env, outdir, context)
+
+        # We mutate ``dirs``, because we only want to go through these dirs
+        # recursively
+        dirs[:] = render_dirs
+        for d in dirs:
+            unrendered_dir = os.path.join(project_dir, root, d)
+            try:
+                outdir = _render_path(env, unrendered_dir, context)
+            except UndefinedError as err:
+                _dir = os.path.relpath(unrendered_dir, output_dir)
+                msg = f"Unable to create directory '{_dir}'"
+                raise UndefinedVariableInTemplate(msg, err, context) from err
+            yield "dir", os.path.normpath(os.path.join(root, d)), outdir
+
+        for f in files:
+            infile = os.path.normpath(os.path.join(root, f))
+            kind = "copy_file" if is_copy_only_path(infile, context) else "file"
+            try:
+                outfile = os.path.join(project_dir, _render_path(env, infile, context))
+            except UndefinedError as err:
+                if kind == "copy_file":
+                    raise
+                msg = f"Unable to create file '{infile}'"
+                raise UndefinedVariableInTemplate(msg, err, context) from err
+            yield kind, infile, outfile
+
+
+def _directory_plan(entries):
+    """Return the directories to create for the entries of :func:`_walk_tree`.
+
+    Directories are deduplicated and sorted by depth, so parents come first.
+    """
+    dirs = {os.path.normpath(target) for kind, _, target in entries if kind == "dir"}
+    return sorted(dirs, key=lambda path: (path.count(os.sep), path))
+
+
+def _render_tree(
+    template_dir,
+    project_dir,
+    output_dir,
+    context,
+    env,
+    overwrite_if_exists,
+    skip_if_file_exists,
+    delete_project_on_failure,
+    unchanged_files,
+    render_cache,
+    sink,
+):
+    """Render the directories and files of a template into ``project_dir``.
+
+    Paths are resolved against ``template_dir`` rather than by changing the
+    working directory, so several projects can be generated concurrently.
     """
-    with work_in(repo_dir):
+    try:
+        entries = list(_walk_tree(template_dir, project_dir, output_dir, context, env))
         try:
-            run_hook(hook_name, project_dir, context)
-        except (FailedHookException, UndefinedError):
-            if delete_project_on_failure:
-                rmtree(project_dir)
-            logger.error(
-                "Stopping generation because %s hook "
-                "script didn't exit successfully",
-                hook_name,
+            sink.make_dirs(_directory_plan(entries), exist_ok=overwrite_if_exists)
+        except FileExistsError as err:
+            msg = f'Error: "{err.filename}" directory already exists'
+            raise OutputDirExistsException(msg) from err
+
+        for kind, infile, target in entries:
+            if kind == "dir":
+                # Created beforehand
+                continue
+            with timing.template_file(infile):
+                _render_entry(
+                    kind,
+                    infile,
+                    target,
+                    template_dir,
+                    project_dir,
+                    context,
+                    env,
+                    skip_if_file_exists,
+                    unchanged_files,
+                    render_cache,
+                    sink,
+                )
+    except UndefinedVariableInTemplate:
+        if delete_project_on_failure:
+            sink.remove_tree(project_dir)
+        raise
+
+
+def _render_entry(
+    kind,
+    infile,
+    target,
+    template_dir,
+    project_dir,
+    context,
+    env,
+    skip_if_file_exists,
+    unchanged_files,
+    render_cache,
+    sink,
+):
+    """Render or copy one file or copied directory of :func:`_render_tree`."""
+    if kind == "copy_dir":
+        logger.debug("Copying dir %s to %s without rendering", infile, target)
+        # The outdir is not the root dir, it is the dir which marked as
+        # copy only in the config file. If it exists, which means the
+        # overwrite_if_exists = True, the sink replaces it
+        sink.copy_tree(os.path.join(template_dir, infile), target)
+        timing.count("dirs_copied")
+    elif infile in unchanged_files and sink.isfile(target):
+        logger.debug("Skipping unchanged file %s", infile)
+        sink.files_unchanged += 1
+        timing.count("files_skipped")
+    elif kind == "copy_file":
+        logger.debug("Copying file %s to %s without rendering", infile, target)
+        sink.copy_file(os.path.join(template_dir, infile), target)
+        timing.count("files_copied")
+    else:
+        try:
+            generate_file(
+                project_dir,
+                infile,
+                context,
+                env,
+                skip_if_file_exists,
+                render_cache,
+                template_dir,
+                sink,
             )
-            raise
+        except UndefinedError as err:
+            msg = f"Unable to create file '{infile}'"
+            raise UndefinedVariableInTemplate(msg, err, context) from err
+
+
+class PlannedPath(NamedTuple):
+    """A directory or file a generation would write, see :func:`plan_files`.
+
+    :param path: Rendered path, relative to the project directory.
+    :param source: Path in the template, relative to the template directory.
+    :param kind: ``"directory"`` or ``"file"``.
+    :param action: ``"create"``, ``"overwrite"`` or, for files existing with
+        ``skip_if_file_exists``, ``"skip"``. Existing directories are
+        ``"exists"``, except directories copied without rendering, which are
+        overwritten.
+    :param size: Size of the file in bytes, ``None`` for directories and for
+        rendered files unless their bodies were rendered.
+    :param rendered: Whether the body of the file is rendered, rather than
+        copied.
+    """
+
+    path: str
+    source: str
+    kind: str
+    action: str
+    size: Optional[int]
+    rendered: bool
+
+
+class GenerationPlan(NamedTuple):
+    """The output of a generation, see :func:`plan_files`.
+
+    :param project_dir: Absolute path of the project directory.
+    :param paths: The :class:`PlannedPath` of the project directory and of
+        every directory and file in it, in generation order.
+    """
+
+    project_dir: str
+    paths: List[PlannedPath]
+
+
+def _render_body_size(env, template_dir, infile, context):
+    """Render a file and return the size it would be written with."""
+    try:
+        rendered_file = env.get_template(infile.replace(os.path.sep, "/")).render(
+            **context
+        )
+    except UndefinedError as err:
+        msg = f"Unable to create file '{infile}'"
+        raise UndefinedVariableInTemplate(msg, err, context) from err
+    newline = _output_newline(os.path.join(template_dir, infile), context)
+    return len(_encode_rendering(rendered_file, newline))
+
+
+def _exists(path, action):
+    """Return ``action`` if ``path`` exists, else ``"create"``."""
+    return action if os.path.lexists(path) else "create"
+
+
+def plan_files(
+    repo_dir,
+    context=None,
+    output_dir=".",
+    overwrite_if_exists=False,
+    skip_if_file_exists=False,
+    render_bodies=False,
+):
+    """Compute what :func:`generate_files` would write, without writing.
+
+    Directories and files are classified and their paths rendered like a
+    generation does. Nothing is written and no hook is run, so files that
+    hooks would add, change or remove are not part of the plan.
+
+    :param repo_dir: Project template input directory.
+    :param context: Dict for populating the template's variables.
+    :param output_dir: Where the generated project dir would be output into.
+    :param overwrite_if_exists: Plan to overwrite the contents of the output
+        directory if it exists.
+    :param skip_if_file_exists: Plan to skip the files that already exist.
+    :param render_bodies: Render the bodies of the files to compute their
+        sizes and check them for undefined variables.
+    :return: A :class:`GenerationPlan`.
+    :raises: ``OutputDirExistsException`` and ``UndefinedVariableInTemplate``
+        as :func:`generate_files` would.
+    """
+    from binaryornot.check import is_binary
+
+    context = context or {}
+    template_dir = find_template(repo_dir, get_environment(context))
+    env = get_environment(context, template_dir)
+
+    unrendered_dir = os.path.split(template_dir)[1]
+    ensure_dir_is_templated(unrendered_dir, env)
+    try:
+        project_dir = Path(output_dir, _render_path(env, unrendered_dir, context))
+    except UndefinedError as err:
+        msg = f"Unable to create project directory '{unrendered_dir}'"
+        raise UndefinedVariableInTemplate(msg, err, context) from err
+    project_exists = project_dir.exists()
+    if project_exists and not overwrite_if_exists:
+        msg = f'Error: "{project_dir}" directory already exists'
+        raise OutputDirExistsException(msg)
+    project_dir = os.path.abspath(project_dir)
+
+    paths = [
+        PlannedPath(
+            ".", ".", "directory", "exists" if project_exists else "create", None, False
+        )
+    ]
+
+    def add(target, source, kind, action, size=None, rendered=False):
+        path = os.path.relpath(target, project_dir)
+        paths.append(PlannedPath(path, source, kind, action, size, rendered))
+
+    for kind, infile, target in _walk_tree(
+        template_dir, project_dir, output_dir, context, env
+    ):
+        source = os.path.join(template_dir, infile)
+        if kind == "copy_dir":
+            add(target, infile, "directory", _exists(target, "overwrite"))
+            for top, dirs, files in os.walk(source):
+                for name in dirs + files:
+                    relpath = os.path.relpath(os.path.join(top, name), source)
+                    path = os.path.join(target, relpath)
+                    if name in dirs:
+                        add(path, os.path.join(infile, relpath), "directory", "create")
+                    else:
+                        size = os.path.getsize(os.path.join(top, name))
+                        add(path, os.path.join(infile, relpath), "file", "create", size)
+        elif kind == "dir":
+            add(target, infile, "directory", _exists(target, "exists"))
+        elif not os.path.basename(target) or os.path.isdir(target):
+            # Empty file names generate nothing
+            continue
+        else:
+            action = _exists(target, "overwrite")
+            if kind == "file" and skip_if_file_exists and action == "overwrite":
+                action = "skip"
+            rendered = kind == "file" and not is_binary(source)
+            size = None
+            if not rendered:
+                size = os.path.getsize(source)
+            elif render_bodies and action != "skip":
+                size = _render_body_size(env, template_dir, infile, context)
+            add(target, infile, "file", action, size, rendered)
+
+    return GenerationPlan(project_dir, paths)
 
 
 def generate_files(
@@ -280,6 +690,16 @@ def generate_files(
     skip_if_file_exists=False,
     accept_hooks=True,
     keep_project_on_failure=False,
+    preflight=False,
+    previous_analysis=None,
+    previous_context=None,
+    render_cache=None,
+    output_cache=None,
+    hook_runner=None,
+    sink=None,
+    staged=False,
+    compare_before_write=False,
+    durability="none",
 ):
     """Render the templates and saves them to files.
 
@@ -293,124 +713,197 @@ def generate_files(
     :param accept_hooks: Accept pre and post hooks if set to `True`.
     :param keep_project_on_failure: If `True` keep generated project directory even when
         generation fails
+    :param preflight: Check the whole template for undefined variables before
+        anything is written.
+    :param previous_analysis: Template analysis of a previous run into the same
+        output directory, see :func:`cookieninja.analysis.analyze_template`.
+        Existing files whose template and variables did not change since are
+        not generated again.
+    :param previous_context: Context of the previous run.
+    :param render_cache: Optional :class:`cookieninja.cache.RenderCache` to
+        reuse renderings of earlier runs from.
+    :param output_cache: Optional :class:`cookieninja.cache.OutputCache` to
+        copy the whole project from when the same template version was
+        generated with the same context before.
+    :param hook_runner: Function running the pre and post generation hooks
+        instead of :func:`cookieninja.hooks.run_hook`, with the same signature.
+    :param sink: :class:`cookieninja.sinks.OutputSink` to write the project
+        to, defaults to the filesystem. With other sinks ``output_dir`` is
+        relative to the root of the sink, the caches are not used and
+        templates with pre or post generation hooks cannot be generated.
+    :param staged: Generate the project in a staging directory next to it,
+        hooks included, and rename it into place once generation succeeded.
+        A failed generation is removed in the background. With
+        ``overwrite_if_exists`` the staging directory starts as a reflinked
+        clone of the existing project, see
+        :class:`cookieninja.staging.StagedDirectory`, which is swapped with it
+        at the end. Where the filesystem has no reflinks, an existing project
+        is overwritten in place instead, as without ``staged``. Hooks run in
+        the staging directory.
+    :param compare_before_write: Leave existing files that already have the
+        generated contents untouched, so their modification time does not
+        change. Ignored when a ``sink`` is given, see
+        :class:`cookieninja.sinks.DirectorySink` instead.
+    :param durability: What is flushed to disk before returning, ``"none"``,
+        ``"file"`` or ``"commit"``, see
+        :class:`cookieninja.sinks.DirectorySink`. Ignored when a ``sink`` is
+        given.
     """
-    jinja2_env_vars = context.get("cookiecutter", {}).get("_jinja2_env_vars", {})
-    env = StrictEnvironment(
-        context=context, keep_trailing_newline=True, **jinja2_env_vars
-    )
-
-    template_dir = find_template(repo_dir, env)
+    sink = sink or DirectorySink(compare=compare_before_write, durability=durability)
+    bytes_written = sink.bytes_written
+    staged = staged and sink.is_filesystem
+    if not sink.is_filesystem:
+        render_cache = output_cache = None
+    template_dir = find_template(repo_dir, get_environment(context))
+    env = get_environment(context, template_dir)
+
+    unchanged_files = set()
+    if preflight or previous_analysis is not None:
+        analysis = analyze_template(template_dir, context, env)
+        if preflight:
+            _raise_for_undefined_variables(analysis, context)
+        if previous_analysis is not None:
+            unchanged_files = analysis.unchanged_files(
+                previous_analysis, previous_context or {}, context
+            )
     logger.debug("Generating project from %s...", template_dir)
-    context = context or OrderedDict([])
+    context = context or {}
+
+    cache_key = None
+    if output_cache is not None:
+        cache_key = output_cache.key(repo_dir, template_dir, env, context, accept_hooks)
+    cached = cache_key is not None and cache_key in output_cache
+    run_hooks = accept_hooks and not (cached and output_cache.hooks == "skip")
+
+    hook_index = get_hook_index(repo_dir) if run_hooks else {}
+    if not sink.is_filesystem and (
+        hook_index.get("pre_gen_project") or hook_index.get("post_gen_project")
+    ):
+        raise OutputSinkError(
+            "Hooks need the project on disk, they cannot run with "
+            f"{type(sink).__name__}. Disable them to generate to this sink."
+        )
 
     unrendered_dir = os.path.split(template_dir)[1]
     ensure_dir_is_templated(unrendered_dir, env)
     try:
-        project_dir, output_directory_created = render_and_create_dir(
-            unrendered_dir, context, output_dir, env, overwrite_if_exists
-        )
+        if staged:
+            project_dir = Path(output_dir, _render_path(env, unrendered_dir, context))
+            if (
+                overwrite_if_exists
+                and os.path.isdir(project_dir)
+                and not can_clone(output_dir)
+            ):
+                logger.info(
+                    "Overwriting %s in place, staging it would copy the whole "
+                    "project without reflinks",
+                    project_dir,
+                )
+                staged = False
+        if not staged:
+            project_dir, output_directory_created = render_and_create_dir(
+                unrendered_dir, context, output_dir, env, overwrite_if_exists, sink
+            )
     except UndefinedError as err:
         msg = f"Unable to create project directory '{unrendered_dir}'"
         raise UndefinedVariableInTemplate(msg, err, context) from err
 
-    # We want the Jinja path and the OS paths to match. Consequently, we'll:
-    #   + CD to the template folder
-    #   + Set Jinja's path to '.'
-    #
-    #  In order to build our files to the correct folder(s), we'll use an
-    # absolute path for the target folder (project_dir)
+    # Template paths are resolved against the template folder. In order to
+    # build our files to the correct folder(s), we'll use an absolute path
+    # for the target folder (project_dir) when writing to the filesystem
 
-    project_dir = os.path.abspath(project_dir)
+    project_dir = sink.project_path(project_dir)
     logger.debug("Project directory is %s", project_dir)
 
+    stage = None
+    work_dir = project_dir
+    if staged:
+        output_directory_created = not os.path.exists(project_dir)
+        if not output_directory_created and not overwrite_if_exists:
+            msg = f'Error: "{project_dir}" directory already exists'
+            raise OutputDirExistsException(msg)
+        stage = StagedDirectory(project_dir, overwrite=not output_directory_created)
+        work_dir = stage.path
+
     # if we created the output directory, then it's ok to remove it
-    # if rendering fails
-    delete_project_on_failure = output_directory_created and not keep_project_on_failure
+    # if rendering fails. A staging directory is discarded as a whole.
+    delete_project_on_failure = (
+        stage is None and output_directory_created and not keep_project_on_failure
+    )
+    # Only new projects hold nothing but the generated files
+    store_output = cache_key is not None and not cached and output_directory_created
 
-    if accept_hooks:
-        _run_hook_from_repo_dir(
-            repo_dir, "pre_gen_project", project_dir, context, delete_project_on_failure
-        )
+    try:
+        if run_hooks:
+            _run_hook_from_repo_dir(
+                repo_dir,
+                "pre_gen_project",
+                work_dir,
+                context,
+                delete_project_on_failure,
+                hook_index,
+                hook_runner,
+            )
 
-    with work_in(template_dir):
-        env.loader = FileSystemLoader([".", "../templates"])
-
-        for root, dirs, files in os.walk("."):
-            # We must separate the two types of dirs into different lists.
-            # The reason is that we don't want ``os.walk`` to go through the
-            # unrendered directories, since they will just be copied.
-            copy_dirs = []
-            render_dirs = []
-
-            for d in dirs:
-                d_ = os.path.normpath(os.path.join(root, d))
-                # We check the full path, because that's how it can be
-                # specified in the ``_copy_without_render`` setting, but
-                # we store just the dir name
-                if is_copy_only_path(d_, context):
-                    logger.debug("Found copy only path %s", d)
-                    copy_dirs.append(d)
-                else:
-                    render_dirs.append(d)
-
-            for copy_dir in copy_dirs:
-                indir = os.path.normpath(os.path.join(root, copy_dir))
-                outdir = os.path.normpath(os.path.join(project_dir, indir))
-                outdir = env.from_string(outdir).render(**context)
-                logger.debug("Copying dir %s to %s without rendering", indir, outdir)
-
-                # The outdir is not the root dir, it is the dir which marked as copy
-                # only in the config file. If the program hits this line, which means
-                # the overwrite_if_exists = True, and root dir exists
-                if os.path.isdir(outdir):
-                    shutil.rmtree(outdir)
-                shutil.copytree(indir, outdir)
-
-            # We mutate ``dirs``, because we only want to go through these dirs
-            # recursively
-            dirs[:] = render_dirs
-            for d in dirs:
-                unrendered_dir = os.path.join(project_dir, root, d)
-                try:
-                    render_and_create_dir(
-                        unrendered_dir, context, output_dir, env, overwrite_if_exists
-                    )
-                except UndefinedError as err:
-                    if delete_project_on_failure:
-                        rmtree(project_dir)
-                    _dir = os.path.relpath(unrendered_dir, output_dir)
-                    msg = f"Unable to create directory '{_dir}'"
-                    raise UndefinedVariableInTemplate(msg, err, context) from err
-
-            for f in files:
-                infile = os.path.normpath(os.path.join(root, f))
-                if is_copy_only_path(infile, context):
-                    outfile_tmpl = env.from_string(infile)
-                    outfile_rendered = outfile_tmpl.render(**context)
-                    outfile = os.path.join(project_dir, outfile_rendered)
-                    logger.debug(
-                        "Copying file %s to %s without rendering", infile, outfile
-                    )
-                    shutil.copyfile(infile, outfile)
-                    shutil.copymode(infile, outfile)
-                    continue
-                try:
-                    generate_file(
-                        project_dir, infile, context, env, skip_if_file_exists
-                    )
-                except UndefinedError as err:
-                    if delete_project_on_failure:
-                        rmtree(project_dir)
-                    msg = f"Unable to create file '{infile}'"
-                    raise UndefinedVariableInTemplate(msg, err, context) from err
-
-    if accept_hooks:
-        _run_hook_from_repo_dir(
-            repo_dir,
-            "post_gen_project",
-            project_dir,
-            context,
-            delete_project_on_failure,
-        )
+        if cached:
+            output_cache.materialize(
+                cache_key,
+                work_dir,
+                skip_if_file_exists=skip_if_file_exists,
+                compare=sink.compare,
+            )
+        else:
+            _render_tree(
+                template_dir,
+                work_dir,
+                output_dir,
+                context,
+                env,
+                overwrite_if_exists=overwrite_if_exists,
+                skip_if_file_exists=skip_if_file_exists,
+                delete_project_on_failure=delete_project_on_failure,
+                unchanged_files=unchanged_files,
+                render_cache=render_cache,
+                sink=sink,
+            )
+
+        if store_output and output_cache.hooks == "replay":
+            # The post generation hook runs again on each cache hit
+            output_cache.store(cache_key, work_dir)
+
+        if run_hooks:
+            _run_hook_from_repo_dir(
+                repo_dir,
+                "post_gen_project",
+                work_dir,
+                context,
+                delete_project_on_failure,
+                hook_index,
+                hook_runner,
+            )
+
+        sink.sync(work_dir)
+    except BaseException:
+        if stage is not None:
+            if keep_project_on_failure:
+                logger.info("Keeping the failed project in %s", stage.path)
+            else:
+                stage.discard()
+        raise
+
+    if stage is not None:
+        stage.commit(durable=sink.durable)
+
+    logger.log(
+        logging.INFO if compare_before_write else logging.DEBUG,
+        "Generated %s: %d files written, %d unchanged",
+        project_dir,
+        sink.files_written,
+        sink.files_unchanged,
+    )
+    timing.count("bytes_written", sink.bytes_written - bytes_written)
+
+    if store_output and output_cache.hooks != "replay":
+        output_cache.store(cache_key, project_dir)
 
     return project_dir
@@ -1,23 +1,39 @@
 """Functions for discovering and executing various cookiecutter hooks."""
+import contextlib
 import errno
 import logging
 import os
+import runpy
+import shutil
+import stat
 import subprocess  # nosec
 import sys
 import tempfile
+from typing import NamedTuple, Optional
 
 from . import utils
-from .environment import StrictEnvironment
+from .environment import get_environment
 from .exceptions import FailedHookException
 
 logger = logging.getLogger(__name__)
 
 _HOOKS = [
+    "pre_prompt",
     "pre_gen_project",
     "post_gen_project",
 ]
 EXIT_SUCCESS = 0
 
+# Hook indexes keyed by (template dir, hooks dir), with the hooks dir mtime
+_HOOK_INDEX_CACHE = {}
+
+
+class HookScript(NamedTuple):
+    """A hook script discovered in a template's hooks directory."""
+
+    path: str
+    interpreter: Optional[str]
+
 
 def valid_hook(hook_file, hook_name):
     """Determine if a hook file is valid.
@@ -36,6 +52,53 @@ def valid_hook(hook_file, hook_name):
     return matching_hook and supported_hook and not backup_file
 
 
+def _script_interpreter(script_path):
+    """Return the interpreter used to run ``script_path``, if it needs one."""
+    if script_path.endswith(".py"):
+        return sys.executable
+    return None
+
+
+def get_hook_index(repo_dir=".", hooks_dir="hooks"):
+    """Return all hook scripts of a template, grouped by hook name.
+
+    The hooks directory is listed once per template; later calls are served
+    from a cache keyed by the absolute template and hooks directory and
+    validated against the hooks directory mtime.
+
+    :param repo_dir: Project template input directory.
+    :param hooks_dir: The hook directory in the template.
+    :return: Dict mapping hook names to lists of :class:`HookScript`.
+    """
+    hooks_path = os.path.abspath(os.path.join(repo_dir, hooks_dir))
+    try:
+        hooks_stat = os.stat(hooks_path)
+    except OSError:
+        hooks_stat = None
+    if hooks_stat is None or not stat.S_ISDIR(hooks_stat.st_mode):
+        logger.debug("No hooks/dir in template_dir")
+        return {}
+
+    cache_key = (os.path.abspath(repo_dir), hooks_dir)
+    cached = _HOOK_INDEX_CACHE.get(cache_key)
+    if cached is not None and cached[0] == hooks_stat.st_mtime_ns:
+        return cached[1]
+
+    logger.debug("Indexing hooks in %s", hooks_path)
+    index = {}
+    for hook_file in os.listdir(hooks_path):
+        hook_name = os.path.splitext(hook_file)[0]
+        if not valid_hook(hook_file, hook_name):
+            continue
+        script_path = os.path.join(hooks_path, hook_file)
+        index.setdefault(hook_name, []).append(
+            HookScript(path=script_path, interpreter=_script_interpreter(script_path))
+        )
+
+    _HOOK_INDEX_CACHE[cache_key] = (hooks_stat.st_mtime_ns, index)
+    return index
+
+
 def find_hook(hook_name, hooks_dir="hooks"):
     """Return a dict of all hook scripts provided.
 
@@ -50,33 +113,29 @@ def find_hook(hook_name, hooks_dir="hooks"):
     """
     logger.debug("hooks_dir is %s", os.path.abspath(hooks_dir))
 
-    if not os.path.isdir(hooks_dir):
-        logger.debug("No hooks/dir in template_dir")
-        return None
-
-    scripts = []
-    for hook_file in os.listdir(hooks_dir):
-        if valid_hook(hook_file, hook_name):
-            scripts.append(os.path.abspath(os.path.join(hooks_dir, hook_file)))
-
-    if len(scripts) == 0:
+    scripts = get_hook_index(".", hooks_dir).get(hook_name)
+    if not scripts:
         return None
-    return scripts
+    return [script.path for script in scripts]
 
 
 def run_script(script_path, cwd="."):
     """Execute a script from a working directory.
 
+    Scripts which do not run through an interpreter are made executable,
+    unless they already are.
+
     :param script_path: Absolute path to the script to run.
     :param cwd: The directory to run the script from.
     """
     run_thru_shell = sys.platform.startswith("win")
-    if script_path.endswith(".py"):
-        script_command = [sys.executable, script_path]
+    interpreter = _script_interpreter(script_path)
+    if interpreter:
+        script_command = [interpreter, script_path]
     else:
         script_command = [script_path]
-
-    utils.make_executable(script_path)
+        if not os.access(script_path, os.X_OK):
+            utils.make_executable(script_path)
 
     try:
         proc = subprocess.Popen(script_command, shell=run_thru_shell, cwd=cwd)  # nosec
@@ -93,6 +152,54 @@ def run_script(script_path, cwd="."):
         raise FailedHookException(f"Hook script failed (error: {err})") from err
 
 
+@contextlib.contextmanager
+def _runnable_copy(script_path):
+    """Give a path to run a template's script from, leaving the script as is.
+
+    A script which needs to be executable but is not is copied to a
+    temporary file, removed on exit, so that the template is never changed.
+
+    :param script_path: Absolute path to the script.
+    """
+    if _script_interpreter(script_path) or os.access(script_path, os.X_OK):
+        yield script_path
+        return
+    _, extension = os.path.splitext(script_path)
+    fd, copy = tempfile.mkstemp(suffix=extension)
+    os.close(fd)
+    try:
+        shutil.copyfile(script_path, copy)
+        yield copy
+    finally:
+        os.remove(copy)
+
+
+def run_script_in_process(script_path, cwd="."):
+    """Execute a Python script inside the running interpreter.
+
+    Avoids the cost of spawning a new interpreter. The script runs as
+    ``__main__`` from ``cwd``; a non-zero ``sys.exit()`` or an uncaught
+    exception is reported the same way as a failing subprocess.
+
+    :param script_path: Absolute path to the Python script to run.
+    :param cwd: The directory to run the script from.
+    """
+    argv = sys.argv
+    sys.argv = [script_path]
+    try:
+        with utils.work_in(cwd):
+            runpy.run_path(script_path, run_name="__main__")
+    except SystemExit as err:
+        if err.code not in (None, EXIT_SUCCESS):
+            raise FailedHookException(
+                f"Hook script failed (exit status: {err.code})"
+            ) from err
+    except Exception as err:
+        raise FailedHookException(f"Hook script failed (error: {err})") from err
+    finally:
+        sys.argv = argv
+
+
 def run_script_with_context(script_path, cwd, context):
     """Execute a script after rendering it with Jinja.
 
@@ -100,32 +207,84 @@ def run_script_with_context(script_path, cwd, context):
     :param cwd: The directory to run the script from.
     :param context: Cookiecutter project template context.
     """
+    run_script(_render_script(script_path, context), cwd)
+
+
+def _render_script(script_path, context):
+    """Render a hook script with Jinja into a temporary file.
+
+    :return: Path of the rendered script.
+    """
     _, extension = os.path.splitext(script_path)
 
     with open(script_path, encoding="utf-8") as file:
         contents = file.read()
 
     with tempfile.NamedTemporaryFile(delete=False, mode="wb", suffix=extension) as temp:
-        env = StrictEnvironment(context=context, keep_trailing_newline=True)
+        # Hooks keep the default Jinja2 settings, whatever _jinja2_env_vars
+        env = get_environment(context, env_vars=False)
         template = env.from_string(contents)
         output = template.render(**context)
         temp.write(output.encode("utf-8"))
 
-    run_script(temp.name, cwd)
+    return temp.name
 
 
-def run_hook(hook_name, project_dir, context):
+def run_hook(hook_name, project_dir, context, hook_index=None):
     """
     Try to find and execute a hook from the specified project directory.
 
     :param hook_name: The hook to execute.
     :param project_dir: The directory to execute the script from.
     :param context: Cookiecutter project context.
+    :param hook_index: Hooks of the template as returned by
+        :func:`get_hook_index`. Defaults to the hooks of the template in the
+        current working directory.
     """
-    scripts = find_hook(hook_name)
+    if hook_index is None:
+        hook_index = get_hook_index()
+    scripts = hook_index.get(hook_name)
     if not scripts:
         logger.debug("No %s hook found", hook_name)
         return
     logger.debug("Running hook %s", hook_name)
     for script in scripts:
-        run_script_with_context(script, project_dir, context)
+        run_script_with_context(script.path, project_dir, context)
+
+
+def run_pre_prompt_hook(repo_dir, in_process=False):
+    """Run the ``pre_prompt`` hooks of a template, before any prompting.
+
+    Hooks run from a scratch directory holding a copy of the template's
+    ``cookiecutter.json``, which they may rewrite to compute or override
+    defaults. A failing hook aborts the run before anything is generated.
+
+    :param repo_dir: Project template input directory.
+    :param in_process: Run Python hooks inside the current interpreter
+        instead of a subprocess.
+    :return: Path of the ``cookiecutter.json`` to build the context from.
+        When it is not the template's own file, the caller is responsible for
+        removing its parent directory.
+    """
+    context_file = os.path.join(repo_dir, "cookiecutter.json")
+    scripts = get_hook_index(repo_dir).get("pre_prompt")
+    if not scripts:
+        logger.debug("No pre_prompt hook found")
+        return context_file
+
+    scratch_dir = tempfile.mkdtemp(prefix="cookieninja-pre-prompt-")
+    shutil.copy(context_file, scratch_dir)
+    logger.debug("Running hook pre_prompt in %s", scratch_dir)
+    try:
+        for script in scripts:
+            if in_process and script.interpreter == sys.executable:
+                run_script_in_process(script.path, scratch_dir)
+            else:
+                with _runnable_copy(script.path) as path:
+                    run_script(path, scratch_dir)
+    except FailedHookException:
+        utils.rmtree(scratch_dir)
+        logger.error("Stopping generation because pre_prompt hook failed")
+        raise
+
+    return os.path.join(scratch_dir, "cookiecutter.json")
@@ -0,0 +1,158 @@
+"""Pluggable JSON backend for contexts, replay files and the jsonify filter.
+
+`orjson <https://github.com/ijl/orjson>`_ is used when it is installed and
+produces the same result as the standard library, which is used otherwise.
+Objects are decoded to plain dicts, which keep insertion order. Set the
+``COOKIENINJA_JSON_BACKEND`` environment variable to ``stdlib`` to never use
+orjson.
+"""
+import json
+import os
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+BACKENDS = ("orjson", "stdlib")
+
+# Largest integers orjson handles, beyond that the stdlib is used
+_MAX_INT = 2**64 - 1
+_MIN_INT = -(2**63)
+_MAX_DEPTH = 254
+
+_backend = None
+
+
+def get_backend():
+    """Return the name of the JSON backend in use."""
+    global _backend
+    if _backend is None:
+        name = os.environ.get("COOKIENINJA_JSON_BACKEND", "orjson")
+        _backend = "orjson" if name == "orjson" and orjson is not None else "stdlib"
+    return _backend
+
+
+def set_backend(name):
+    """Select the JSON backend, one of :data:`BACKENDS`.
+
+    :raises: ``ValueError`` if the backend is unknown or not installed.
+    """
+    global _backend
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown JSON backend {name!r}, use one of {BACKENDS}")
+    if name == "orjson" and orjson is None:
+        raise ValueError("The orjson backend requires the orjson package")
+    _backend = name
+
+
+def loads(data):
+    """Decode a JSON document from ``str`` or ``bytes``.
+
+    Documents orjson rejects, e.g. with ``NaN`` or very large integers, are
+    decoded by the standard library, which also reports syntax errors.
+    """
+    if get_backend() == "orjson":
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(data)
+
+
+def load(fp):
+    """Decode a JSON document from a text or binary file object."""
+    return loads(fp.read())
+
+
+class _Incompatible(Exception):
+    """Raised for values orjson does not encode like the standard library."""
+
+
+def _nesting(value, depth, containers):
+    """Return the nesting depth of ``value``, see :func:`_orjson_nesting`."""
+    value_type = type(value)
+    if value_type is str or value_type is bool or value is None:
+        return depth
+    if value_type is int:
+        if not _MIN_INT <= value <= _MAX_INT:
+            raise _Incompatible
+        return depth
+    if isinstance(value, (dict, list, tuple)):
+        if depth >= _MAX_DEPTH or id(value) in containers:
+            # Too deep, shared or circular
+            raise _Incompatible
+        containers.add(id(value))
+        if isinstance(value, dict):
+            for key in value:
+                if type(key) is not str:
+                    raise _Incompatible
+            value = value.values()
+        nesting = depth + 1
+        for item in value:
+            if type(item) is not str:
+                nesting = max(nesting, _nesting(item, depth + 1, containers))
+        return nesting
+    if isinstance(value, (str, bool)):
+        return depth
+    raise _Incompatible
+
+
+def _orjson_nesting(obj):
+    """Return how deep containers are nested in ``obj``.
+
+    Returns ``None`` unless orjson encodes ``obj`` exactly like the standard
+    library: floats are formatted differently, and orjson requires string
+    keys, 64-bit integers and at most 254 levels of nesting.
+    """
+    try:
+        return _nesting(obj, 0, set())
+    except _Incompatible:
+        return None
+
+
+def _reindent(text, indent, nesting):
+    """Change the two space indentation of orjson output to ``indent``."""
+    if indent == 2:
+        return text
+    # Indentation follows a newline, and control characters never appear
+    # unescaped in JSON, so they serve as placeholders for each level.
+    # Replacing the deepest level first keeps shallower ones from matching.
+    if nesting < 32:
+        for level in range(nesting, 0, -1):
+            text = text.replace("\n" + "  " * level, "\n" + chr(level))
+        for level in range(1, nesting + 1):
+            text = text.replace("\n" + chr(level), "\n" + " " * (indent * level))
+        return text
+    lines = []
+    for line in text.split("\n"):
+        stripped = line.lstrip(" ")
+        lines.append(" " * ((len(line) - len(stripped)) // 2 * indent) + stripped)
+    return "\n".join(lines)
+
+
+def dumps(obj, indent=None, sort_keys=False, ensure_ascii=True):
+    """Encode ``obj`` as JSON text, like ``json.dumps``.
+
+    :param indent: Number of spaces to indent nested values with.
+    :param sort_keys: Sort the keys of objects.
+    :param ensure_ascii: Escape non-ASCII characters.
+    """
+    nesting = None
+    if get_backend() == "orjson" and indent:
+        nesting = _orjson_nesting(obj)
+    if nesting is not None:
+        option = orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        text = orjson.dumps(obj, option=option).decode("utf-8")
+        if not ensure_ascii or text.isascii():
+            return _reindent(text, indent, nesting)
+    return json.dumps(
+        obj, indent=indent, sort_keys=sort_keys, ensure_ascii=ensure_ascii
+    )
+
+
+def dump(obj, fp, **kwargs):
+    """Encode ``obj`` as JSON text to a file object, see :func:`dumps`."""
+    fp.write(dumps(obj, **kwargs))
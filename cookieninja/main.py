@@ -9,12 +9,14 @@ import logging
 import os
 import sys
 
+from . import timing
 from .config import get_user_config
-from .exceptions import InvalidModeException
+from .exceptions import InvalidModeException, RepositoryNotFound
 from .generate import generate_context, generate_files
+from .hooks import run_pre_prompt_hook
 from .prompt import prompt_for_config
-from .replay import dump, load
-from .repository import determine_repo_dir
+from .replay import dump, load, load_entry, load_latest, record, record_project
+from .repository import determine_repo_dir, repository_has_cookiecutter_json
 from .utils import rmtree
 import re
 
@@ -37,6 +39,14 @@ def cookiecutter(
     skip_if_file_exists=False,
     accept_hooks=True,
     keep_project_on_failure=False,
+    pre_prompt_in_process=False,
+    preflight=False,
+    render_cache=None,
+    output_cache=None,
+    sink=None,
+    staged=False,
+    compare_before_write=False,
+    durability="none",
 ):
     """
     Run Cookiecutter just as if using it from the command line.
@@ -51,8 +61,9 @@ def cookiecutter(
     :param extra_context: A dictionary of context that overrides default
         and user configuration.
     :param replay: Do not prompt for input, instead read from saved json. If
-        ``True`` read from the ``replay_dir``.
-        if it exists
+        ``True`` read the last run of the template from the replay history in
+        ``replay_dir``, if an ``int`` read the entry with this id, which must
+        be a run of the template. A path reads that replay file.
     :param overwrite_if_exists: Overwrite the contents of the output directory if
         it exists.
     :param output_dir: Where to output the generated project dir into.
@@ -63,6 +74,23 @@ def cookiecutter(
     :param accept_hooks: Accept pre and post hooks if set to `True`.
     :param keep_project_on_failure: If `True` keep generated project directory even when
         generation fails
+    :param pre_prompt_in_process: Run Python ``pre_prompt`` hooks inside the
+        current interpreter instead of a subprocess.
+    :param preflight: Check the whole template for undefined variables before
+        any file is written.
+    :param render_cache: Optional :class:`cookieninja.cache.RenderCache` to
+        reuse rendered files of earlier runs from.
+    :param output_cache: Optional :class:`cookieninja.cache.OutputCache` to
+        reuse whole projects generated before with the same context from.
+    :param sink: Optional :class:`cookieninja.sinks.OutputSink` to write the
+        project to instead of the filesystem, e.g. a tar or zip stream.
+    :param staged: Generate the project under a temporary name and rename it
+        into place once it is complete, see
+        :func:`cookieninja.generate.generate_files`.
+    :param compare_before_write: Leave existing files that already have the
+        generated contents untouched, when overwriting a project.
+    :param durability: What is flushed to disk before returning, ``"none"``,
+        ``"file"`` or ``"commit"``, see :class:`cookieninja.sinks.DirectorySink`.
     """
     if replay and ((no_input is not False) or (extra_context is not None)):
         err_msg = (
@@ -71,81 +99,137 @@ def cookiecutter(
         )
         raise InvalidModeException(err_msg)
 
-    config_dict = get_user_config(
-        config_file=config_file,
-        default_config=default_config,
-    )
+    with timing.phase("config"):
+        config_dict = get_user_config(
+            config_file=config_file,
+            default_config=default_config,
+        )
 
-    repo_dir, cleanup = determine_repo_dir(
-        template=template,
-        abbreviations=config_dict["abbreviations"],
-        clone_to_dir=config_dict["cookiecutters_dir"],
-        checkout=checkout,
+    with timing.phase("repository"):
+        repo_dir, cleanup = determine_repo_dir(
+            template=template,
+            abbreviations=config_dict["abbreviations"],
+            clone_to_dir=config_dict["cookiecutters_dir"],
+            checkout=checkout,
+            no_input=no_input,
+            recurse_submodules=recurse_submodules,
+            password=password,
+            directory=directory,
+        )
+
+    result = _cookiecutter_in_repo(
+        template,
+        repo_dir,
+        config_dict,
         no_input=no_input,
-        recurse_submodules=recurse_submodules,
-        password=password,
-        directory=directory,
+        extra_context=extra_context,
+        replay=replay,
+        overwrite_if_exists=overwrite_if_exists,
+        output_dir=output_dir,
+        skip_if_file_exists=skip_if_file_exists,
+        accept_hooks=accept_hooks,
+        keep_project_on_failure=keep_project_on_failure,
+        pre_prompt_in_process=pre_prompt_in_process,
+        preflight=preflight,
+        render_cache=render_cache,
+        output_cache=output_cache,
+        sink=sink,
+        staged=staged,
+        compare_before_write=compare_before_write,
+        durability=durability,
     )
+
+    # Cleanup (if required)
+    if cleanup:
+        with timing.phase("cleanup"):
+            rmtree(repo_dir)
+
+    return result
+
+
+def _cookiecutter_in_repo(
+    template,
+    repo_dir,
+    config_dict,
+    no_input,
+    extra_context,
+    replay,
+    overwrite_if_exists,
+    output_dir,
+    skip_if_file_exists,
+    accept_hooks,
+    keep_project_on_failure,
+    pre_prompt_in_process,
+    preflight,
+    render_cache,
+    output_cache,
+    sink,
+    staged,
+    compare_before_write,
+    durability,
+):
+    """Generate a project from a template in an already resolved repository.
+
+    Nested templates are resolved inside ``repo_dir`` and generated with the
+    same user config, so the repository is fetched only once.
+
+    :param template: The template as given by the user, stored in the context.
+    :param repo_dir: Local directory of the template.
+    :param config_dict: User config.
+
+    See :func:`cookiecutter` for the other parameters.
+    """
     import_patch = _patch_import_path_for_repo(repo_dir)
 
     template_name = os.path.basename(os.path.abspath(repo_dir))
 
     if replay:
-        with import_patch:
-            if isinstance(replay, bool):
-                context = load(config_dict["replay_dir"], template_name)
-            else:
-                path, template_name = os.path.split(os.path.splitext(replay)[0])
-                context = load(path, template_name)
+        with import_patch, timing.phase("replay"):
+            context, template_name = _load_replay(config_dict, template_name, replay)
     else:
-        context_file = os.path.join(repo_dir, "cookiecutter.json")
-        logger.debug("context_file is %s", context_file)
-
-        context = generate_context(
-            context_file=context_file,
-            default_context=config_dict["default_context"],
-            extra_context=extra_context,
-        )
-
-        # prompt the user to manually configure at the command line.
-        # except when 'no-input' flag is set
-        with import_patch:
-            context["cookiecutter"] = prompt_for_config(context, no_input)
+        with timing.phase("prompt"):
+            context = _prompt_for_context(
+                repo_dir,
+                config_dict,
+                no_input,
+                extra_context,
+                accept_hooks,
+                pre_prompt_in_process,
+            )
 
         if "template" in context["cookiecutter"]:
-            nested_template = re.search(
-                r"\((.*?)\)", context["cookiecutter"]["template"]
-            ).group(1)
-            return cookiecutter(
-                template=os.path.join(template, nested_template),
-                checkout=checkout,
+            nested_template, nested_repo_dir = _nested_template(repo_dir, context)
+            return _cookiecutter_in_repo(
+                os.path.join(template, nested_template),
+                nested_repo_dir,
+                config_dict,
                 no_input=no_input,
                 extra_context=extra_context,
                 replay=replay,
                 overwrite_if_exists=overwrite_if_exists,
                 output_dir=output_dir,
-                config_file=config_file,
-                default_config=default_config,
-                password=password,
-                directory=directory,
                 skip_if_file_exists=skip_if_file_exists,
                 accept_hooks=accept_hooks,
                 keep_project_on_failure=keep_project_on_failure,
+                pre_prompt_in_process=pre_prompt_in_process,
+                preflight=preflight,
+                render_cache=render_cache,
+                output_cache=output_cache,
+                sink=sink,
+                staged=staged,
+                compare_before_write=compare_before_write,
+                durability=durability,
             )
 
-        # include template dir or url in the context dict
-        context["cookiecutter"]["_template"] = template
-
-        # include repo dir or url in the context dict
-        context["cookiecutter"]["_repo_dir"] = repo_dir
-
-        # include output+dir in the context dict
-        context["cookiecutter"]["_output_dir"] = os.path.abspath(output_dir)
+        _add_template_location(context, template, repo_dir, output_dir)
 
-        dump(config_dict["replay_dir"], template_name, context)
+    entry_id = None
+    if not replay:
+        with timing.phase("replay"):
+            entry_id = _record_run(config_dict, template_name, context, repo_dir)
 
     # Create project from local context and project template.
-    with import_patch:
+    with import_patch, timing.phase("generate"):
         result = generate_files(
             repo_dir=repo_dir,
             context=context,
@@ -154,15 +238,137 @@ def cookiecutter(
             output_dir=output_dir,
             accept_hooks=accept_hooks,
             keep_project_on_failure=keep_project_on_failure,
+            preflight=preflight,
+            render_cache=render_cache,
+            output_cache=output_cache,
+            sink=sink,
+            staged=staged,
+            compare_before_write=compare_before_write,
+            durability=durability,
         )
-
-    # Cleanup (if required)
-    if cleanup:
-        rmtree(repo_dir)
+    with timing.phase("replay"):
+        _record_project(config_dict, entry_id, result, sink)
 
     return result
 
 
+def _load_replay(config_dict, template_name, replay):
+    """Return the replayed context and the name of the template it is for.
+
+    See :func:`cookiecutter` for the values of ``replay``.
+    """
+    if isinstance(replay, bool):
+        return load_latest(config_dict["replay_dir"], template_name), template_name
+    if isinstance(replay, int):
+        context = load_entry(config_dict["replay_dir"], replay, template_name)
+        return context, template_name
+    path, template_name = os.path.split(os.path.splitext(replay)[0])
+    return load(path, template_name), template_name
+
+
+def _add_template_location(context, template, repo_dir, output_dir):
+    """Store where the template came from and where it is generated."""
+    # include template dir or url in the context dict
+    context["cookiecutter"]["_template"] = template
+
+    # include repo dir or url in the context dict
+    context["cookiecutter"]["_repo_dir"] = repo_dir
+
+    # include output+dir in the context dict
+    context["cookiecutter"]["_output_dir"] = os.path.abspath(output_dir)
+
+
+def _record_run(config_dict, template_name, context, repo_dir):
+    """Save the context of a run to its replay file and the replay history.
+
+    :return: Id of the entry in the history, or ``None``.
+    """
+    dump(config_dict["replay_dir"], template_name, context)
+    return record(config_dict["replay_dir"], template_name, context, repo_dir)
+
+
+def _record_project(config_dict, entry_id, result, sink):
+    """Set the project generated by a run recorded in the replay history.
+
+    Projects written to other sinks than the filesystem have no directory.
+    """
+    if entry_id is not None and (sink is None or sink.is_filesystem):
+        record_project(config_dict["replay_dir"], entry_id, result)
+
+
+def _prompt_for_context(
+    repo_dir,
+    config_dict,
+    no_input,
+    extra_context,
+    accept_hooks,
+    pre_prompt_in_process=False,
+):
+    """Return the context of a template, prompting the user for its values.
+
+    The ``pre_prompt`` hook runs first, if ``accept_hooks`` is set.
+
+    See :func:`cookiecutter` for the parameters.
+    """
+    import_patch = _patch_import_path_for_repo(repo_dir)
+
+    context_file = os.path.join(repo_dir, "cookiecutter.json")
+    if accept_hooks:
+        with import_patch, timing.phase("hooks"):
+            context_file = run_pre_prompt_hook(
+                repo_dir, in_process=pre_prompt_in_process
+            )
+
+    with import_patch:
+        return _context_from_file(
+            repo_dir, context_file, config_dict, no_input, extra_context
+        )
+
+
+def _context_from_file(repo_dir, context_file, config_dict, no_input, extra_context):
+    """Return the context read from ``context_file``, prompting for its values.
+
+    A ``context_file`` outside of ``repo_dir``, written by the ``pre_prompt``
+    hook, is removed with its directory. ``repo_dir`` must be on the import
+    path.
+
+    See :func:`cookiecutter` for the other parameters.
+    """
+    logger.debug("context_file is %s", context_file)
+
+    try:
+        context = generate_context(
+            context_file=context_file,
+            default_context=config_dict["default_context"],
+            extra_context=extra_context,
+        )
+    finally:
+        if context_file != os.path.join(repo_dir, "cookiecutter.json"):
+            # Scratch copy made for the pre_prompt hook
+            rmtree(os.path.dirname(context_file))
+
+    # prompt the user to manually configure at the command line.
+    # except when 'no-input' flag is set
+    context["cookiecutter"] = prompt_for_config(context, no_input)
+    return context
+
+
+def _nested_template(repo_dir, context):
+    """Return the nested template chosen in ``context`` and its directory.
+
+    :raises: `RepositoryNotFound` if the directory holds no template.
+    """
+    nested_template = re.search(
+        r"\((.*?)\)", context["cookiecutter"]["template"]
+    ).group(1)
+    nested_repo_dir = os.path.join(repo_dir, nested_template)
+    if not repository_has_cookiecutter_json(nested_repo_dir):
+        raise RepositoryNotFound(
+            f"Nested template {nested_template} not found in {repo_dir}"
+        )
+    return nested_template, nested_repo_dir
+
+
 class _patch_import_path_for_repo:
     def __init__(self, repo_dir):
         self._repo_dir = repo_dir
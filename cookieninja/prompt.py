@@ -1,14 +1,16 @@
 """Functions for prompting the user for project info."""
 import functools
-import json
 from collections import OrderedDict
 import ast
 
 import click
-from jinja2.exceptions import UndefinedError
+from jinja2.exceptions import TemplateSyntaxError, UndefinedError
 
-from .environment import StrictEnvironment
+from . import jsonio
+from .analysis import cookiecutter_references
+from .environment import get_environment
 from .exceptions import (
+    CircularVariableDependency,
     UndefinedVariableInTemplate,
     InvalidBooleanExpression,
 )
@@ -95,7 +97,7 @@ def process_json(user_value, default_value=None):
         return default_value
 
     try:
-        user_dict = json.loads(user_value, object_pairs_hook=OrderedDict)
+        user_dict = jsonio.loads(user_value)
     except Exception as error:
         # Leave it up to click to ask the user again
         raise click.UsageError("Unable to decode to JSON.") from error
@@ -188,79 +190,199 @@ def prompt_choice_for_config(cookiecutter_dict, env, key, options, no_input):
     return read_user_choice(key, rendered_options)
 
 
+def _iter_strings(raw):
+    """Yield every string held in a raw value, including dict keys."""
+    if isinstance(raw, str):
+        yield raw
+    elif isinstance(raw, dict):
+        for key, value in raw.items():
+            yield from _iter_strings(key)
+            yield from _iter_strings(value)
+    elif isinstance(raw, list):
+        for value in raw:
+            yield from _iter_strings(value)
+
+
+def referenced_variables(env, raw):
+    """Return the names of the ``cookiecutter`` variables a raw value uses.
+
+    References are found in the Jinja2 AST of every string in ``raw``.
+
+    :param Environment env: A Jinja2 Environment object.
+    :param raw: A value from ``cookiecutter.json``.
+    :return: Set of variable names, or ``None`` if the referenced variables
+        cannot be known, see :func:`cookieninja.analysis.cookiecutter_references`.
+    """
+    names = set()
+    for source in _iter_strings(raw):
+        if env.variable_start_string not in source and (
+            env.block_start_string not in source
+        ):
+            continue
+        try:
+            tree = env.parse(source)
+        except TemplateSyntaxError:
+            # Reported when the value is rendered
+            continue
+        references = cookiecutter_references(tree)
+        if references is None:
+            return None
+        names |= references
+    return names
+
+
+def _is_private(key):
+    return key.startswith("_") and not key.startswith("__")
+
+
+def _dependencies(env, key, raw):
+    """Return the names of the variables ``key`` uses, or ``None`` if unknown.
+
+    A dependent question, ``name?{{ expression }}``, also uses the variables
+    of its expression.
+    """
+    if _is_private(key):
+        return set()
+    names = referenced_variables(env, raw)
+    if names is not None and "?" in key:
+        question_names = referenced_variables(env, key.split("?", 1)[1])
+        names = None if question_names is None else names | question_names
+    return names
+
+
+def iter_variables(env, variables):
+    """Yield template variables so that each comes after those it uses.
+
+    The references of a variable are only analysed when it is reached, so
+    callers can render every variable as it is yielded. Variables are
+    otherwise kept in declaration order, with dict variables after all other
+    variables. A variable whose references cannot be determined comes after
+    every variable declared before it.
+
+    :param Environment env: A Jinja2 Environment object.
+    :param variables: The ``cookiecutter`` dict from ``cookiecutter.json``.
+    :return: Iterator over the keys of ``variables`` in rendering order.
+    :raises: ``CircularVariableDependency`` if variables refer to each other.
+    """
+    keys = list(variables)
+    by_name = {key.split("?", 1)[0]: key for key in keys}
+    positions = {key: index for index, key in enumerate(keys)}
+    done = set()
+    resolving = []
+
+    def resolve(key):
+        if key in done:
+            return
+        if key in resolving:
+            cycle = resolving[resolving.index(key) :] + [key]
+            names = " -> ".join(key.split("?", 1)[0] for key in cycle)
+            raise CircularVariableDependency(
+                f"Template variables depend on each other: {names}"
+            )
+        resolving.append(key)
+        names = _dependencies(env, key, variables[key])
+        if names is None:
+            required = keys[: positions[key]]
+        else:
+            required = {by_name[name] for name in names if name in by_name} - {key}
+        for dependency in sorted(required, key=positions.get):
+            yield from resolve(dependency)
+        resolving.pop()
+        done.add(key)
+        yield key
+
+    def is_dict(key):
+        return isinstance(variables[key], dict) and not _is_private(key)
+
+    for last in (False, True):
+        for key in keys:
+            if is_dict(key) == last:
+                yield from resolve(key)
+
+
+def order_variables(env, variables):
+    """Return the keys of ``variables`` in rendering order.
+
+    See :func:`iter_variables`.
+    """
+    return list(iter_variables(env, variables))
+
+
+def _prompt_for_rendered_value(key, value, no_input_current, no_input):
+    """Prompt the user for a variable, offering its rendered value as default."""
+    if isinstance(value, list):
+        # A variable rendered to a list of choices
+        if no_input_current:
+            return value[0]
+        return read_user_choice(key, value)
+    if isinstance(value, bool):
+        # We are dealing with a boolean variable
+        if no_input_current:
+            return value
+        return read_user_yes_no(key, value)
+    if isinstance(value, dict):
+        # We are dealing with a dict variable
+        if no_input:
+            return value
+        return read_user_dict(key, value)
+    # We are dealing with a regular variable
+    if no_input_current:
+        return value
+    return read_user_variable(key, value)
+
+
 def prompt_for_config(context, no_input=False):
     """Prompt user to enter a new config.
 
+    Every variable is rendered once, after the variables it refers to, see
+    :func:`iter_variables`. Variables are analysed and rendered as they are
+    reached, and the expression of a dependent question is evaluated with
+    the answers given so far.
+
     :param dict context: Source for field names and sample values.
     :param no_input: Do not prompt for user input and use only values from context.
     """
     cookiecutter_dict = OrderedDict([])
-    env = StrictEnvironment(context=context)
+    env = get_environment(context, env_vars=False, keep_trailing_newline=False)
 
-    # First pass: Handle simple and raw variables, plus choices.
-    # These must be done first because the dictionaries keys and
-    # values might refer to them.
-    for key, raw in context["cookiecutter"].items():
+    for key in iter_variables(env, context["cookiecutter"]):
+        raw = context["cookiecutter"][key]
         no_input_current = no_input
 
-        try:
-            rendered_raw = render_variable(env, raw, cookiecutter_dict)
-        except UndefinedError as err:
-            msg = f"Unable to render variable '{key}'"
-            raise UndefinedVariableInTemplate(msg, err, context) from err
-
-        if key.startswith("_") and not key.startswith("__"):
+        # Private variables are passed through unrendered
+        if _is_private(key):
             cookiecutter_dict[key] = raw
             continue
-        elif key.startswith("__"):
-            cookiecutter_dict[key] = rendered_raw
-            continue
 
         if "?" in key:
             actual_key, should_present_question = parse_question_expression(
-                context, env, key
+                dict(context, cookiecutter=cookiecutter_dict), env, key
             )
-            key = actual_key
             if not should_present_question:
                 no_input_current = True
+        else:
+            actual_key = key
 
-        if isinstance(rendered_raw, list):
-            # We are dealing with a choice variable
-            val = prompt_choice_for_config(
-                cookiecutter_dict, env, key, rendered_raw, no_input_current
-            )
-            cookiecutter_dict[key] = val
-        elif isinstance(rendered_raw, bool):
-            # We are dealing with a boolean variable
-            if no_input_current:
-                cookiecutter_dict[key] = render_variable(
-                    env, rendered_raw, cookiecutter_dict
+        try:
+            if key.startswith("__"):
+                val = render_variable(env, raw, cookiecutter_dict)
+            elif isinstance(raw, list):
+                # We are dealing with a choice variable
+                val = prompt_choice_for_config(
+                    cookiecutter_dict, env, actual_key, raw, no_input_current
                 )
             else:
-                cookiecutter_dict[key] = read_user_yes_no(key, rendered_raw)
-        elif not isinstance(rendered_raw, dict):
-            # We are dealing with a regular variable
-            val = render_variable(env, rendered_raw, cookiecutter_dict)
-
-            if not no_input_current:
-                val = read_user_variable(key, val)
-
-            cookiecutter_dict[key] = val
-
-    # Second pass; handle the dictionaries.
-    for key, raw in context["cookiecutter"].items():
-        # Skip private type dicts not to be rendered.
-        if key.startswith("_") and not key.startswith("__"):
-            continue
-
-        if isinstance(raw, dict):
-            # We are dealing with a dict variable
-            val = render_variable(env, raw, cookiecutter_dict)
-
-            if not no_input and not key.startswith("__"):
-                val = read_user_dict(key, val)
+                val = _prompt_for_rendered_value(
+                    actual_key,
+                    render_variable(env, raw, cookiecutter_dict),
+                    no_input_current,
+                    no_input,
+                )
+        except UndefinedError as err:
+            msg = f"Unable to render variable '{key}'"
+            raise UndefinedVariableInTemplate(msg, err, context) from err
 
-            cookiecutter_dict[key] = val
+        cookiecutter_dict[actual_key] = val
 
     return cookiecutter_dict
 
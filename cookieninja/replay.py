@@ -3,11 +3,39 @@ cookiecutter.replay.
 
 -------------------
 """
-import json
+import logging
 import os
+import sqlite3
+import subprocess  # nosec
+import tempfile
+import time
+import zlib
 
+from . import jsonio
+from .exceptions import InvalidReplayEntry, UnknownReplayEntry
+from .repository import is_zip_file
 from .utils import make_sure_path_exists
 
+logger = logging.getLogger(__name__)
+
+STORE_FILE_NAME = "replay.sqlite3"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    template_name TEXT NOT NULL,
+    template TEXT,
+    commit_id TEXT,
+    project_name TEXT,
+    output_dir TEXT,
+    created REAL NOT NULL,
+    context BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_template ON runs (template_name, created);
+CREATE INDEX IF NOT EXISTS runs_project ON runs (project_name, created);
+CREATE INDEX IF NOT EXISTS runs_created ON runs (created);
+"""
+
 
 def get_file_name(replay_dir, template_name):
     """Get the name of file."""
@@ -17,7 +45,11 @@ def get_file_name(replay_dir, template_name):
 
 
 def dump(replay_dir: "os.PathLike[str]", template_name: str, context: dict):
-    """Write json data to file."""
+    """Write json data to file.
+
+    The file is replaced atomically, so concurrent runs never leave a partly
+    written file behind.
+    """
     make_sure_path_exists(replay_dir)
 
     if not isinstance(template_name, str):
@@ -31,8 +63,14 @@ def dump(replay_dir: "os.PathLike[str]", template_name: str, context: dict):
 
     replay_file = get_file_name(replay_dir, template_name)
 
-    with open(replay_file, "w") as outfile:
-        json.dump(context, outfile, indent=2)
+    fd, tmp_file = tempfile.mkstemp(dir=replay_dir, suffix=".tmp")
+    try:
+        with open(fd, "w", encoding="utf-8") as outfile:
+            jsonio.dump(context, outfile, indent=2, ensure_ascii=False)
+        os.replace(tmp_file, replay_file)
+    except BaseException:
+        os.remove(tmp_file)
+        raise
 
 
 def load(replay_dir, template_name):
@@ -42,10 +80,278 @@ def load(replay_dir, template_name):
 
     replay_file = get_file_name(replay_dir, template_name)
 
-    with open(replay_file) as infile:
-        context = json.load(infile)
+    with open(replay_file, "rb") as infile:
+        context = jsonio.load(infile)
 
     if "cookiecutter" not in context:
         raise ValueError("Context is required to contain a cookiecutter key")
 
     return context
+
+
+class ReplayStore:
+    """History of the contexts of every run, in a SQLite database.
+
+    Each entry keeps the context with the template, its commit, the time of
+    the run and where the project was generated. Entries are indexed by
+    template name, project name and time. The database uses write-ahead
+    logging so concurrent runs can add entries while others read.
+
+    :param replay_dir: Directory of the ``replay.sqlite3`` database.
+    """
+
+    def __init__(self, replay_dir):
+        """Open the store in ``replay_dir``, creating it if needed."""
+        self.path = os.path.join(replay_dir, STORE_FILE_NAME)
+
+    def _connect(self):
+        make_sure_path_exists(os.path.dirname(self.path))
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript(_SCHEMA)
+        return connection
+
+    def add(
+        self,
+        template_name,
+        context,
+        template=None,
+        commit=None,
+        project_dir=None,
+        created=None,
+    ):
+        """Add the context of a run and return the id of its entry.
+
+        :param template_name: Name the replay file of the run is saved as.
+        :param context: Context the project was generated with.
+        :param template: Template path or URL as given by the user.
+        :param commit: Commit of the template repository.
+        :param project_dir: Path of the generated project.
+        :param created: Time of the run, defaults to now.
+        """
+        project_name = output_dir = None
+        if project_dir is not None:
+            project_dir = os.path.abspath(project_dir)
+            output_dir, project_name = os.path.split(project_dir)
+        data = zlib.compress(jsonio.dumps(context, ensure_ascii=False).encode())
+        connection = self._connect()
+        try:
+            with connection:
+                cursor = connection.execute(
+                    "INSERT INTO runs (template_name, template, commit_id,"
+                    " project_name, output_dir, created, context)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        template_name,
+                        template,
+                        commit,
+                        project_name,
+                        output_dir,
+                        time.time() if created is None else created,
+                        data,
+                    ),
+                )
+            return cursor.lastrowid
+        finally:
+            connection.close()
+
+    def history(
+        self, template_name=None, project_name=None, since=None, until=None, limit=None
+    ):
+        """Return entries, most recent first, without their contexts.
+
+        :param template_name: Only entries of this template.
+        :param project_name: Only entries generating this project.
+        :param since: Only entries created at or after this timestamp.
+        :param until: Only entries created before this timestamp.
+        :param limit: Maximum number of entries.
+        :return: List of dicts with the columns of each entry.
+        """
+        clauses, params = [], []
+        for clause, value in (
+            ("template_name = ?", template_name),
+            ("project_name = ?", project_name),
+            ("created >= ?", since),
+            ("created < ?", until),
+        ):
+            if value is not None:
+                clauses.append(clause)
+                params.append(value)
+        query = (
+            "SELECT id, template_name, template, commit_id, project_name,"
+            " output_dir, created FROM runs"
+        )
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY created DESC, id DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        connection = self._connect()
+        try:
+            return [dict(row) for row in connection.execute(query, params)]
+        finally:
+            connection.close()
+
+    def set_project_dir(self, entry_id, project_dir):
+        """Set the path of the project generated by the run ``entry_id``."""
+        project_dir = os.path.abspath(project_dir)
+        output_dir, project_name = os.path.split(project_dir)
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute(
+                    "UPDATE runs SET project_name = ?, output_dir = ? WHERE id = ?",
+                    (project_name, output_dir, entry_id),
+                )
+        finally:
+            connection.close()
+
+    def get(self, entry_id, template_name=None):
+        """Return the context of the entry ``entry_id``.
+
+        :param template_name: Check that the entry is a run of this template.
+        :raises: ``UnknownReplayEntry`` if there is no such entry,
+            ``InvalidReplayEntry`` if it is a run of another template.
+        """
+        connection = self._connect()
+        try:
+            row = connection.execute(
+                "SELECT template_name, context FROM runs WHERE id = ?", (entry_id,)
+            ).fetchone()
+        finally:
+            connection.close()
+        if row is None:
+            raise UnknownReplayEntry(f"No replay entry {entry_id} in {self.path}")
+        if template_name is not None and row["template_name"] != template_name:
+            raise InvalidReplayEntry(
+                f"Replay entry {entry_id} is a run of {row['template_name']}, "
+                f"not of {template_name}"
+            )
+        return jsonio.loads(zlib.decompress(row["context"]))
+
+    def latest(self, template_name):
+        """Return the context of the last run of a template, or ``None``."""
+        connection = self._connect()
+        try:
+            row = connection.execute(
+                "SELECT context FROM runs WHERE template_name = ?"
+                " ORDER BY created DESC, id DESC LIMIT 1",
+                (template_name,),
+            ).fetchone()
+        finally:
+            connection.close()
+        if row is None:
+            return None
+        return jsonio.loads(zlib.decompress(row["context"]))
+
+
+def _repository_root(path):
+    """Return the nearest directory holding ``.git`` at or above ``path``."""
+    path = os.path.abspath(path)
+    while not os.path.exists(os.path.join(path, ".git")):
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+    return path
+
+
+def _template_commit(repo_dir):
+    """Return the commit checked out in the git repository of a template.
+
+    Templates outside of any git repository, or in one without commits, get
+    ``None``.
+    """
+    try:
+        return subprocess.run(
+            ["git", "-C", repo_dir, "rev-parse", "--verify", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _replay_commit(repo_dir, template):
+    """Return the template commit to record in the replay history.
+
+    The commit is read when the repository itself is the template, a local
+    repository or one cloned from a URL. Templates in a subdirectory of it,
+    given with ``directory`` or nested, get its commit. A local template that
+    merely lies in a directory of another repository gets ``None``, as do
+    templates outside of any git repository, without running git.
+
+    :param template: The template as given by the user.
+    """
+    if not template or is_zip_file(template):
+        return None
+    repo_root = _repository_root(repo_dir)
+    if repo_root is None:
+        return None
+    if os.path.isdir(template) and not os.path.samefile(template, repo_root):
+        return None
+    return _template_commit(repo_root)
+
+
+def record(replay_dir, template_name, context, repo_dir, project_dir=None, commit=None):
+    """Add a run to the replay history of ``replay_dir``.
+
+    A history that cannot be written is logged, it does not fail the run.
+    Runs are recorded before generation, so that failed runs can be replayed,
+    and their project is set by :func:`record_project` once generated.
+
+    :param commit: Commit of the template repository, read from ``repo_dir``
+        by default.
+    :return: Id of the entry, or ``None``.
+    """
+    template = context["cookiecutter"].get("_template")
+    try:
+        return ReplayStore(replay_dir).add(
+            template_name,
+            context,
+            template=template,
+            commit=commit or _replay_commit(repo_dir, template),
+            project_dir=project_dir,
+        )
+    except (OSError, TypeError, ValueError, sqlite3.Error):
+        # Unwritable history, or a context that cannot be serialized
+        logger.warning("Unable to record the run in the replay history", exc_info=True)
+        return None
+
+
+def record_project(replay_dir, entry_id, project_dir):
+    """Set the project generated by the run ``entry_id`` of the history.
+
+    Like :func:`record`, a history that cannot be written is logged.
+    """
+    try:
+        ReplayStore(replay_dir).set_project_dir(entry_id, project_dir)
+    except (OSError, sqlite3.Error):
+        logger.warning(
+            "Unable to record the project in the replay history", exc_info=True
+        )
+
+
+def load_entry(replay_dir, entry_id, template_name=None):
+    """Read the context of an entry of the replay history.
+
+    :param template_name: Check that the entry is a run of this template.
+    :raises: ``UnknownReplayEntry`` if there is no such entry,
+        ``InvalidReplayEntry`` if it is a run of another template.
+    """
+    return ReplayStore(replay_dir).get(entry_id, template_name)
+
+
+def load_latest(replay_dir, template_name):
+    """Read the context of the last run of a template.
+
+    Falls back to the replay file of the template, see :func:`load`, for
+    templates that were last run before the history was kept.
+    """
+    context = ReplayStore(replay_dir).latest(template_name)
+    if context is None:
+        return load(replay_dir, template_name)
+    return context
@@ -68,6 +68,35 @@ def repository_has_cookiecutter_json(repo_directory):
     return repo_directory_exists and repo_config_exists
 
 
+def _fetch_repository(
+    template, clone_to_dir, checkout, no_input, recurse_submodules, password
+):
+    """Clone or unzip ``template`` if needed.
+
+    :return: A tuple of the candidate repository directories, and a boolean
+        describing whether the repository should be cleaned up after use.
+    """
+    if is_zip_file(template):
+        unzipped_dir = unzip(
+            zip_uri=template,
+            is_url=is_repo_url(template),
+            clone_to_dir=clone_to_dir,
+            no_input=no_input,
+            password=password,
+        )
+        return [unzipped_dir], True
+    if is_repo_url(template):
+        cloned_repo = clone(
+            repo_url=template,
+            checkout=checkout,
+            recurse_submodules=recurse_submodules,
+            clone_to_dir=clone_to_dir,
+            no_input=no_input,
+        )
+        return [cloned_repo], False
+    return [template, os.path.join(clone_to_dir, template)], False
+
+
 def determine_repo_dir(
     template,
     abbreviations,
@@ -104,30 +133,20 @@ def determine_repo_dir(
     template, abbrev_directory = expand_abbreviations(template, abbreviations)
     directory = directory or abbrev_directory
 
-    if is_zip_file(template):
-        unzipped_dir = unzip(
-            zip_uri=template,
-            is_url=is_repo_url(template),
-            clone_to_dir=clone_to_dir,
-            no_input=no_input,
-            password=password,
-        )
-        repository_candidates = [unzipped_dir]
-        cleanup = True
-    elif is_repo_url(template):
-        cloned_repo = clone(
-            repo_url=template,
-            checkout=checkout,
-            recurse_submodules=recurse_submodules,
-            clone_to_dir=clone_to_dir,
-            no_input=no_input,
-        )
-        repository_candidates = [cloned_repo]
-        cleanup = False
-    else:
-        repository_candidates = [template, os.path.join(clone_to_dir, template)]
-        cleanup = False
+    repository_candidates, cleanup = _fetch_repository(
+        template, clone_to_dir, checkout, no_input, recurse_submodules, password
+    )
+    return _select_repository(template, repository_candidates, directory), cleanup
 
+
+def _select_repository(template, repository_candidates, directory=None):
+    """Return the first candidate holding a ``cookiecutter.json``.
+
+    :param template: The template reference, for the error message.
+    :param repository_candidates: Directories the template may be in.
+    :param directory: Directory within the candidates to look in.
+    :raises: `RepositoryNotFound` if no candidate holds a template.
+    """
     if directory:
         repository_candidates = [
             os.path.join(s, directory) for s in repository_candidates
@@ -135,9 +154,44 @@ def determine_repo_dir(
 
     for repo_candidate in repository_candidates:
         if repository_has_cookiecutter_json(repo_candidate):
-            return repo_candidate, cleanup
+            return repo_candidate
 
     raise RepositoryNotFound(
         'A valid repository for "{}" could not be found in the following '
         "locations:\n{}".format(template, "\n".join(repository_candidates))
     )
+
+
+def determine_repo_root(
+    template,
+    abbreviations,
+    clone_to_dir,
+    checkout,
+    no_input,
+    recurse_submodules=False,
+    password=None,
+):
+    """
+    Locate the root directory of a repository holding several templates.
+
+    Unlike :func:`determine_repo_dir` the directory does not need a
+    ``cookiecutter.json`` of its own. See it for the parameters.
+
+    :return: A tuple containing the repository directory, and a boolean
+        describing whether that directory should be cleaned up after use.
+    :raises: `RepositoryNotFound` if a repository directory could not be found.
+    """
+    template, _ = expand_abbreviations(template, abbreviations)
+
+    repository_candidates, cleanup = _fetch_repository(
+        template, clone_to_dir, checkout, no_input, recurse_submodules, password
+    )
+
+    for repo_candidate in repository_candidates:
+        if os.path.isdir(repo_candidate):
+            return repo_candidate, cleanup
+
+    raise RepositoryNotFound(
+        'A repository for "{}" could not be found in the following '
+        "locations:\n{}".format(template, "\n".join(repository_candidates))
+    )
@@ -0,0 +1,311 @@
+"""Long-lived generation server and its client.
+
+The server keeps warm worker processes, with imports, Jinja2 environments and
+hook indexes already loaded, and accepts generation requests as JSON over a
+Unix socket or localhost HTTP.
+
+Requests are not authenticated: the server only listens on loopback addresses
+and on Unix sockets accessible to the user running it.
+"""
+import http.client
+import ipaddress
+import json
+import logging
+import os
+import socket
+import socketserver
+import stat
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .exceptions import (
+    CookiecutterException,
+    GenerationServerError,
+    GenerationServerUnavailable,
+    InvalidServerAddress,
+)
+
+logger = logging.getLogger(__name__)
+
+GENERATE_PATH = "/generate"
+
+# Request keys forwarded to ``cookiecutter()``, besides ``template``
+REQUEST_OPTIONS = (
+    "checkout",
+    "recurse_submodules",
+    "extra_context",
+    "output_dir",
+    "directory",
+    "overwrite_if_exists",
+    "skip_if_file_exists",
+    "accept_hooks",
+    "keep_project_on_failure",
+    "config_file",
+    "default_config",
+)
+
+
+def parse_address(address):
+    """Split a server address into its family and socket address.
+
+    ``unix:PATH`` or anything that looks like a path is a Unix socket,
+    ``HOST:PORT`` or a bare ``PORT`` is a TCP address on localhost by default.
+
+    :param address: Server address as given on the command line.
+    :return: Tuple of ``"unix"`` and a path, or ``"tcp"`` and ``(host, port)``.
+    :raises: ``InvalidServerAddress`` if ``address`` is neither.
+    """
+    if address.startswith("unix:"):
+        return "unix", address[len("unix:") :]
+    if os.sep in address or address.endswith(".sock"):
+        return "unix", address
+    host, _, port = address.rpartition(":")
+    try:
+        port = int(port)
+    except ValueError:
+        port = -1
+    if not 0 <= port <= 65535:
+        raise InvalidServerAddress(
+            f"Invalid server address {address!r}, expected unix:PATH, "
+            f"a socket path, HOST:PORT or PORT"
+        )
+    return "tcp", (host or "127.0.0.1", port)
+
+
+def _is_socket(path):
+    """Tell whether ``path`` is a Unix socket, without following links."""
+    try:
+        return stat.S_ISSOCK(os.lstat(path).st_mode)
+    except FileNotFoundError:
+        return False
+
+
+def _is_loopback(host):
+    """Tell whether every address ``host`` resolves to is a loopback address."""
+    try:
+        addresses = socket.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+    except socket.gaierror:
+        return False
+    return all(
+        ipaddress.ip_address(address[4][0].partition("%")[0]).is_loopback
+        for address in addresses
+    )
+
+
+def _warm_up():
+    """Import the generation code path and build the default environment."""
+    from .environment import get_environment
+    from .main import cookiecutter  # noqa: F401
+
+    get_environment({})
+
+
+def run_generation(request):
+    """Generate a project in a worker process.
+
+    :param request: Decoded generation request.
+    :return: Dict holding either ``project_dir`` or ``error`` and ``type``.
+    """
+    from .main import cookiecutter
+
+    options = {key: request[key] for key in REQUEST_OPTIONS if key in request}
+    try:
+        project_dir = cookiecutter(request["template"], no_input=True, **options)
+    except CookiecutterException as err:
+        return {"error": str(err), "type": type(err).__name__}
+    return {"project_dir": os.path.abspath(project_dir)}
+
+
+class GenerationRequestHandler(BaseHTTPRequestHandler):
+    """Handle generation requests, one per HTTP ``POST``."""
+
+    def do_POST(self):
+        """Decode a request, run it on the server's executor, reply in JSON."""
+        if self.path != GENERATE_PATH:
+            self._reply(404, {"error": f"Unknown path {self.path}"})
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length).decode("utf-8"))
+            if not isinstance(request, dict) or "template" not in request:
+                raise ValueError("Request requires a 'template'")
+        except ValueError as err:
+            self._reply(400, {"error": f"Invalid request: {err}"})
+            return
+
+        try:
+            result = self.server.executor.submit(run_generation, request).result()
+        except Exception as err:
+            logger.exception("Generation request failed")
+            self._reply(500, {"error": str(err), "type": type(err).__name__})
+            return
+        self._reply(400 if "error" in result else 200, result)
+
+    def do_GET(self):
+        """Reply to health checks."""
+        self._reply(200, {"status": "ok"})
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """Log requests through the module logger instead of stderr."""
+        logger.debug(format, *args)
+
+
+class ThreadingUnixHTTPServer(
+    socketserver.ThreadingMixIn, socketserver.UnixStreamServer
+):
+    """HTTP server listening on a Unix socket."""
+
+    daemon_threads = True
+
+    def server_bind(self):
+        """Create the socket accessible to the current user only."""
+        umask = os.umask(0o177)
+        try:
+            super().server_bind()
+        finally:
+            os.umask(umask)
+
+
+def make_server(address, executor):
+    """Create a generation server bound to ``address``.
+
+    Unix sockets are created with mode ``0600``.
+
+    :param address: Server address, see :func:`parse_address`.
+    :param executor: Executor that runs :func:`run_generation`.
+    :raises: ``InvalidServerAddress`` if ``address`` is a TCP address that is
+        not a loopback address, or the path of a Unix socket holding something
+        else than a socket.
+    """
+    family, sock_address = parse_address(address)
+    if family == "tcp" and not _is_loopback(sock_address[0]):
+        raise InvalidServerAddress(
+            f"The generation server only listens on loopback addresses, "
+            f"not on {sock_address[0]}"
+        )
+    if family == "unix":
+        if os.path.lexists(sock_address):
+            if not _is_socket(sock_address):
+                raise InvalidServerAddress(
+                    f"{sock_address} exists and is not a socket, "
+                    f"refusing to replace it"
+                )
+            # Left behind by a server that was not shut down
+            os.remove(sock_address)
+        server = ThreadingUnixHTTPServer(sock_address, GenerationRequestHandler)
+    else:
+        server = ThreadingHTTPServer(sock_address, GenerationRequestHandler)
+    server.executor = executor
+    return server
+
+
+def serve(address, max_workers=None):
+    """Serve generation requests on ``address`` until interrupted.
+
+    Requests are handled concurrently by a pool of warm worker processes.
+
+    :param address: Server address, see :func:`parse_address`.
+    :param max_workers: Number of worker processes. Defaults to the number of
+        processors on the machine.
+    """
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_warm_up) as pool:
+        server = make_server(address, pool)
+        logger.info("Serving generation requests on %s", address)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            logger.info("Shutting down generation server")
+        finally:
+            server.server_close()
+            family, sock_address = parse_address(address)
+            if family == "unix" and _is_socket(sock_address):
+                os.remove(sock_address)
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTP connection over a Unix socket."""
+
+    def __init__(self, path, timeout=None):
+        super().__init__("localhost", timeout=timeout)
+        self._socket_path = path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            sock.settimeout(self.timeout)
+        sock.connect(self._socket_path)
+        self.sock = sock
+
+
+def generate_remote(address, template, timeout=None, **options):
+    """Ask a generation server to generate a project.
+
+    Relative local paths are resolved against the caller's working
+    directory before being sent.
+
+    :param address: Server address, see :func:`parse_address`.
+    :param template: A directory containing a project template directory,
+        or a URL to a git repository.
+    :param timeout: Socket timeout in seconds.
+    :param options: Other request keys, see ``REQUEST_OPTIONS``.
+    :return: Absolute path of the generated project.
+    :raises: ``GenerationServerUnavailable`` if the server cannot be reached,
+        in which case no request was sent, ``GenerationServerError`` if the
+        generation failed or its reply was lost, in which case the project may
+        have been generated.
+    """
+    if os.path.exists(template):
+        template = os.path.abspath(template)
+    for key in ("output_dir", "config_file"):
+        if options.get(key):
+            options[key] = os.path.abspath(options[key])
+    body = json.dumps({"template": template, **options})
+
+    family, sock_address = parse_address(address)
+    if family == "unix":
+        connection = _UnixHTTPConnection(sock_address, timeout=timeout)
+    else:
+        connection = http.client.HTTPConnection(*sock_address, timeout=timeout)
+    try:
+        try:
+            connection.connect()
+        except OSError as err:
+            raise GenerationServerUnavailable(
+                f"Cannot connect to the generation server at {address}: {err}"
+            ) from err
+        try:
+            connection.request(
+                "POST",
+                GENERATE_PATH,
+                body=body,
+                headers={"Content-Type": "application/json"},
+            )
+            response = connection.getresponse()
+            result = json.loads(response.read().decode("utf-8"))
+        except (OSError, http.client.HTTPException) as err:
+            raise GenerationServerError(
+                f"No reply from the generation server at {address}: {err}"
+            ) from err
+        except ValueError as err:
+            raise GenerationServerError(
+                f"Invalid reply from the generation server at {address}: {err}"
+            ) from err
+    finally:
+        connection.close()
+
+    if not isinstance(result, dict) or not {"error", "project_dir"} & result.keys():
+        raise GenerationServerError(
+            f"Invalid reply from the generation server at {address}: {result!r}"
+        )
+    if "error" in result:
+        raise GenerationServerError(result["error"])
+    return result["project_dir"]
@@ -0,0 +1,774 @@
+"""Output sinks that generated projects are written to.
+
+:class:`DirectorySink` writes to the filesystem, which is what generation
+does by default. :class:`TarSink` and :class:`ZipSink` stream an archive to a
+file object such as ``sys.stdout.buffer`` or a socket file, and
+:class:`MemorySink` keeps the files in a mapping of path to bytes. These
+three never touch the disk, beyond reading the template.
+
+Paths given to the archive and in-memory sinks are relative to the root of
+the sink.
+"""
+import abc
+import errno
+import filecmp
+import hashlib
+import io
+import logging
+import os
+import posixpath
+import shutil
+import stat
+import tarfile
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from .utils import fsync_path, make_sure_path_exists, reflink, rmtree, syncfs
+
+logger = logging.getLogger(__name__)
+
+# Mode of generated files and directories when no mode is given
+_FILE_MODE = 0o644
+_DIR_MODE = 0o755
+
+_COPY_BUFSIZE = 1024 * 1024
+
+#: Durability levels of :class:`DirectorySink`
+DURABILITY_LEVELS = ("none", "file", "commit")
+
+
+class OutputSink(abc.ABC):
+    """Base class of the output sinks.
+
+    Subclasses that do not write to the filesystem implement
+    :meth:`make_dir` and :meth:`write_file` and keep track of the paths they
+    wrote, which is all a generation needs.
+
+    Sinks are context managers, which :meth:`close` the sink on exit.
+
+    ``files_written`` and ``files_unchanged`` count the files written since
+    the sink was created, and those left untouched because they already had
+    the generated contents. ``bytes_written`` counts the bytes of the files
+    written.
+    """
+
+    #: Whether the sink writes to the filesystem, which hooks and caches need
+    is_filesystem = False
+
+    #: Whether :meth:`sync` flushes the project to disk
+    durable = False
+
+    def __init__(self):
+        """Start with an empty sink."""
+        self._dirs = set()
+        self._files = set()
+        self.files_written = 0
+        self.files_unchanged = 0
+        self.bytes_written = 0
+
+    def __enter__(self):
+        """Return the sink."""
+        return self
+
+    def __exit__(self, *exc_info):
+        """Close the sink."""
+        self.close()
+
+    @staticmethod
+    def _name(path):
+        """Return the normalized name of ``path`` in the sink."""
+        name = posixpath.normpath(os.fspath(path).replace(os.sep, "/"))
+        return name.lstrip("/")
+
+    def _add_parents(self, name):
+        """Create the missing parent directories of ``name``."""
+        parent = posixpath.dirname(name)
+        if parent and parent not in self._dirs:
+            self.make_dir(parent)
+
+    def project_path(self, path):
+        """Return the path of a generated project, as returned to callers."""
+        return self._name(path)
+
+    def exists(self, path):
+        """Check whether a directory or file was written at ``path``."""
+        name = self._name(path)
+        return name in self._dirs or name in self._files
+
+    def isdir(self, path):
+        """Check whether a directory was written at ``path``."""
+        return self._name(path) in self._dirs
+
+    def isfile(self, path):
+        """Check whether a file was written at ``path``."""
+        return self._name(path) in self._files
+
+    def _written(self, size):
+        """Count a file of ``size`` bytes as written."""
+        self.files_written += 1
+        self.bytes_written += size
+
+    @abc.abstractmethod
+    def make_dir(self, path, mode=_DIR_MODE):
+        """Create a directory and its parents, if missing."""
+
+    def make_dirs(self, paths, exist_ok=True):
+        """Create several directories, each after its parent.
+
+        :param paths: Directories sorted parents first.
+        :param exist_ok: Accept directories that already exist, otherwise
+            raise ``FileExistsError``.
+        """
+        for path in paths:
+            if not exist_ok and self.exists(path):
+                raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), path)
+            self.make_dir(path)
+
+    @abc.abstractmethod
+    def write_file(self, path, data, mode=_FILE_MODE):
+        """Write a file with the ``bytes`` ``data`` and permission ``mode``."""
+
+    def copy_file(self, source, path, mode=None):
+        """Copy the file ``source`` from the template.
+
+        :param mode: Permission bits of the copy, defaults to those of
+            ``source``.
+        """
+        with open(source, "rb") as file_handle:
+            self.write_file(path, file_handle.read(), mode or os.stat(source).st_mode)
+
+    def copy_tree(self, source, path):
+        """Copy the directory ``source`` from the template recursively.
+
+        A directory already written at ``path`` is replaced.
+        """
+        if self.isdir(path):
+            self.remove_tree(path)
+        self.make_dir(path, os.stat(source).st_mode)
+        for top, dirs, files in os.walk(source):
+            target = os.path.join(path, os.path.relpath(top, source))
+            for name in dirs:
+                self.make_dir(
+                    os.path.join(target, name), os.stat(os.path.join(top, name)).st_mode
+                )
+            for name in files:
+                self.copy_file(os.path.join(top, name), os.path.join(target, name))
+
+    def remove_tree(self, path):
+        """Remove a directory written to the sink, if the sink allows it."""
+
+    def sync(self, path):
+        """Flush the project generated at ``path`` to disk, if the sink does."""
+
+    def close(self):
+        """Finish writing the sink."""
+
+
+def _has_contents(path, data):
+    """Check whether the file ``path`` holds exactly ``data``."""
+    try:
+        if os.stat(path).st_size != len(data):
+            return False
+        with open(path, "rb") as file_handle:
+            return file_handle.read() == data
+    except OSError:
+        return False
+
+
+def _same_contents(source, path):
+    """Check whether the file ``path`` is a byte for byte copy of ``source``."""
+    try:
+        return filecmp.cmp(source, path, shallow=False)
+    except OSError:
+        return False
+
+
+def _is_hardlinked(path):
+    """Check whether ``path`` is a file sharing its inode with other links."""
+    try:
+        st = os.lstat(path)
+    except FileNotFoundError:
+        return False
+    return stat.S_ISREG(st.st_mode) and st.st_nlink > 1
+
+
+class DirectorySink(OutputSink):
+    """Write projects to the filesystem, the default of a generation.
+
+    :param compare: Compare files that already exist with the generated
+        contents, sizes first, and leave identical files untouched so their
+        modification time does not change.
+    :param mkdir_workers: Number of threads creating the directories of a
+        project. Directories of the same depth are then created concurrently,
+        which pays off on network filesystems.
+    :param durability: What is flushed to disk before the generation
+        returns, one of :data:`DURABILITY_LEVELS`. ``"none"`` leaves it to the
+        operating system. ``"file"`` calls ``fsync`` on each file as it is
+        written, then on the directories of the project. ``"commit"`` flushes
+        the project once it is complete, hooks included, with a single
+        ``syncfs`` on Linux and one ``fsync`` per file and directory
+        elsewhere. Both survive a crash once generation returned, ``"commit"``
+        at a fraction of the cost.
+    """
+
+    is_filesystem = True
+
+    def __init__(self, compare=False, mkdir_workers=1, durability="none"):
+        """Write to the filesystem, see the class docstring."""
+        if durability not in DURABILITY_LEVELS:
+            raise ValueError(
+                f"Unknown durability {durability!r}, "
+                f"expected one of {', '.join(DURABILITY_LEVELS)}"
+            )
+        super().__init__()
+        self.compare = compare
+        self.mkdir_workers = mkdir_workers
+        self.durability = durability
+
+    @property
+    def durable(self):
+        """Whether :meth:`sync` flushes the project to disk."""
+        return self.durability != "none"
+
+    def _sync_file(self, path):
+        """Flush a file just written, with the ``"file"`` durability."""
+        if self.durability == "file":
+            fsync_path(path)
+
+    def project_path(self, path):
+        """Return the absolute path of a generated project."""
+        return os.path.abspath(path)
+
+    def exists(self, path):
+        """Check whether ``path`` exists."""
+        return os.path.exists(path)
+
+    def isdir(self, path):
+        """Check whether ``path`` is a directory."""
+        return os.path.isdir(path)
+
+    def isfile(self, path):
+        """Check whether ``path`` is a file."""
+        return os.path.isfile(path)
+
+    def make_dir(self, path, mode=None):
+        """Create a directory and its parents, if missing."""
+        make_sure_path_exists(path)
+
+    @staticmethod
+    def _mkdir(path, exist_ok):
+        """Create a directory with a single ``mkdir`` when its parent exists."""
+        try:
+            os.mkdir(path)
+        except FileExistsError:
+            if not exist_ok or not os.path.isdir(path):
+                raise
+        except FileNotFoundError:
+            # A rendered name with several path components
+            os.makedirs(path, exist_ok=exist_ok)
+
+    def make_dirs(self, paths, exist_ok=True):
+        """Create several directories, each after its parent.
+
+        Each directory costs one ``mkdir``, as its parent was created before.
+        """
+        if self.mkdir_workers <= 1:
+            for path in paths:
+                self._mkdir(path, exist_ok)
+            return
+        levels = {}
+        for path in paths:
+            levels.setdefault(os.path.normpath(path).count(os.sep), []).append(path)
+        with ThreadPoolExecutor(max_workers=self.mkdir_workers) as executor:
+            for depth in sorted(levels):
+                for future in [
+                    executor.submit(self._mkdir, path, exist_ok)
+                    for path in levels[depth]
+                ]:
+                    future.result()
+
+    def _replace(self, path, write, mode):
+        """Write a file next to ``path`` and rename it over ``path``.
+
+        :param write: Function writing the contents to a given path.
+        :param mode: Permission bits of the file.
+        """
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(path), prefix=f".{os.path.basename(path)}."
+        )
+        os.close(fd)
+        try:
+            write(tmp_path)
+            os.chmod(tmp_path, stat.S_IMODE(mode))
+            self._sync_file(tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def write_file(self, path, data, mode=None):
+        """Write a file and apply the permission bits of ``mode``.
+
+        A file sharing its inode with other links, e.g. hardlinked by an
+        older deduplicated batch, is replaced rather than written through.
+        """
+        if self.compare and _has_contents(path, data):
+            self.files_unchanged += 1
+        elif _is_hardlinked(path):
+
+            def write(tmp_path):
+                with open(tmp_path, "wb") as file_handle:
+                    file_handle.write(data)
+
+            self._replace(path, write, os.stat(path).st_mode if mode is None else mode)
+            self._written(len(data))
+            return
+        else:
+            with open(path, "wb") as file_handle:
+                file_handle.write(data)
+                if self.durability == "file":
+                    file_handle.flush()
+                    os.fsync(file_handle.fileno())
+            self._written(len(data))
+        if mode is not None:
+            os.chmod(path, stat.S_IMODE(mode))
+
+    def copy_file(self, source, path, mode=None):
+        """Copy a file with its permission bits, or those of ``mode``.
+
+        A hardlinked file is replaced, as by :meth:`write_file`.
+        """
+        if self.compare and _same_contents(source, path):
+            self.files_unchanged += 1
+        elif _is_hardlinked(path):
+            self._replace(
+                path,
+                lambda tmp_path: shutil.copyfile(source, tmp_path),
+                os.stat(source).st_mode if mode is None else mode,
+            )
+            self._written(os.path.getsize(path))
+            return
+        else:
+            shutil.copyfile(source, path)
+            self._sync_file(path)
+            self._written(os.path.getsize(path))
+        if mode is None:
+            shutil.copymode(source, path)
+        else:
+            os.chmod(path, stat.S_IMODE(mode))
+
+    def _copy(self, source, path):
+        shutil.copy2(source, path)
+        self._sync_file(path)
+        self._written(os.path.getsize(path))
+
+    def copy_tree(self, source, path):
+        """Copy a directory recursively, replacing an existing one."""
+        if not os.path.isdir(path):
+            shutil.copytree(source, path, copy_function=self._copy)
+        elif self.compare:
+            self._sync_tree(source, path)
+        else:
+            rmtree(path)
+            shutil.copytree(source, path, copy_function=self._copy)
+
+    def _sync_tree(self, source, path):
+        """Make ``path`` a copy of ``source``, leaving identical files alone."""
+        comparison = filecmp.dircmp(source, path, ignore=[], hide=[])
+        for name in comparison.right_only + comparison.common_funny:
+            target = os.path.join(path, name)
+            if os.path.isdir(target) and not os.path.islink(target):
+                rmtree(target)
+            else:
+                os.remove(target)
+        for name in comparison.left_only + comparison.common_funny:
+            if os.path.isdir(os.path.join(source, name)):
+                self.copy_tree(os.path.join(source, name), os.path.join(path, name))
+            else:
+                self._copy(os.path.join(source, name), os.path.join(path, name))
+        for name in comparison.common_files:
+            self.copy_file(os.path.join(source, name), os.path.join(path, name))
+        for name in comparison.common_dirs:
+            self._sync_tree(os.path.join(source, name), os.path.join(path, name))
+
+    def remove_tree(self, path):
+        """Remove a directory and all its contents."""
+        rmtree(path)
+
+    def sync(self, path):
+        """Flush the project at ``path`` to disk, as ``durability`` asks.
+
+        The parent directory is flushed as well, so that the project itself
+        is found after a crash.
+        """
+        if not self.durable:
+            return
+        if self.durability == "commit" and syncfs(path):
+            return
+        for top, _, files in os.walk(path, topdown=False):
+            if self.durability == "commit":
+                for name in files:
+                    if not os.path.islink(os.path.join(top, name)):
+                        fsync_path(os.path.join(top, name))
+            fsync_path(top)
+        fsync_path(os.path.dirname(os.path.abspath(path)))
+
+
+class DedupStore:
+    """Files shared by the projects of a batch, stored by contents and mode.
+
+    Each distinct file is written to the first project needing it, and a
+    reflink of it is kept in ``store_dir``. Later projects get a reflink of
+    the stored file instead of writing it again. ``store_dir`` should thus
+    be on the filesystem of the projects. Files are never hardlinked: hooks
+    and later regenerations edit the files of one project, which must not
+    change the others.
+
+    Where the filesystem does not support reflinks, nothing is stored and
+    each file is written straight to its project, as without a store.
+
+    ``bytes_written`` counts the bytes of the files written in full,
+    ``bytes_saved`` those of the files reflinked to an already stored file
+    instead of written again.
+
+    :param store_dir: Directory of the stored files.
+    """
+
+    def __init__(self, store_dir):
+        """Store files in ``store_dir``."""
+        self.store_dir = store_dir
+        self.bytes_written = 0
+        self.bytes_saved = 0
+        self._lock = threading.Lock()
+        self._reflink_supported = True
+
+    def _unsupported(self):
+        """Stop storing files, the filesystem cannot reflink them."""
+        with self._lock:
+            if self._reflink_supported:
+                logger.warning(
+                    "Reflinks are not supported in %s, files are not deduplicated",
+                    self.store_dir,
+                )
+            self._reflink_supported = False
+
+    def _link(self, stored_path, path, size):
+        """Make ``path`` a reflink of a stored file.
+
+        :return: Whether ``path`` was linked.
+        """
+        try:
+            reflink(stored_path, path)
+        except OSError:
+            self._unsupported()
+            return False
+        os.chmod(path, os.stat(stored_path).st_mode)
+        with self._lock:
+            self.bytes_saved += size
+        return True
+
+    def _store(self, path, stored_path):
+        """Keep a reflink of the file just written to ``path``."""
+        make_sure_path_exists(os.path.dirname(stored_path))
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(stored_path))
+        os.close(fd)
+        try:
+            reflink(path, tmp_path)
+        except OSError:
+            os.remove(tmp_path)
+            self._unsupported()
+            return
+        os.chmod(tmp_path, os.stat(path).st_mode)
+        with self._lock:
+            if os.path.exists(stored_path):
+                # Another project stored the same file meanwhile
+                os.remove(tmp_path)
+            else:
+                os.rename(tmp_path, stored_path)
+
+    def _write(self, digest, mode, size, path, write):
+        """Give ``path`` the contents written by ``write``, through the store.
+
+        :param digest: Hash of the contents, ``None`` once reflinks turned
+            out to be unsupported.
+        :param write: Function writing the contents to a given path.
+        """
+        mode = stat.S_IMODE(mode)
+        if os.path.lexists(path):
+            # Never write through an existing link
+            os.remove(path)
+        stored_path = None
+        if digest is not None and self._reflink_supported:
+            stored_path = os.path.join(self.store_dir, digest[:2], f"{digest}-{mode:o}")
+            if os.path.exists(stored_path) and self._link(stored_path, path, size):
+                return
+        write(path)
+        os.chmod(path, mode)
+        with self._lock:
+            self.bytes_written += size
+        if stored_path is not None and self._reflink_supported:
+            self._store(path, stored_path)
+
+    def write_bytes(self, path, data, mode):
+        """Write ``data`` to ``path`` through the store."""
+        digest = None
+        if self._reflink_supported:
+            digest = hashlib.sha256(data).hexdigest()
+
+        def write(path):
+            with open(path, "wb") as file_handle:
+                file_handle.write(data)
+
+        self._write(digest, mode, len(data), path, write)
+
+    def copy_file(self, source, path, mode):
+        """Copy the file ``source`` to ``path`` through the store."""
+        digest = None
+        if self._reflink_supported:
+            digest = hashlib.sha256()
+            with open(source, "rb") as file_handle:
+                for chunk in iter(lambda: file_handle.read(_COPY_BUFSIZE), b""):
+                    digest.update(chunk)
+            digest = digest.hexdigest()
+        self._write(
+            digest,
+            mode,
+            os.stat(source).st_size,
+            path,
+            lambda path: shutil.copyfile(source, path),
+        )
+
+
+class DedupSink(DirectorySink):
+    """Write projects to the filesystem, sharing identical files.
+
+    Rendered, copied and binary files all go through a :class:`DedupStore`,
+    so that projects of a batch with the same file share it on disk.
+
+    :param store: The :class:`DedupStore` shared by the projects.
+
+    See :class:`DirectorySink` for the other parameters.
+    """
+
+    def __init__(self, store, compare=False, mkdir_workers=1, durability="none"):
+        """Write through ``store``, see the class docstring."""
+        super().__init__(
+            compare=compare, mkdir_workers=mkdir_workers, durability=durability
+        )
+        self.store = store
+
+    def write_file(self, path, data, mode=None):
+        """Write a file through the store."""
+        if self.compare and _has_contents(path, data):
+            self.files_unchanged += 1
+            return
+        self.store.write_bytes(path, data, _FILE_MODE if mode is None else mode)
+        self._sync_file(path)
+        self._written(len(data))
+
+    def copy_file(self, source, path, mode=None):
+        """Copy a file through the store."""
+        if self.compare and _same_contents(source, path):
+            self.files_unchanged += 1
+            return
+        self.store.copy_file(source, path, mode or os.stat(source).st_mode)
+        self._sync_file(path)
+        self._written(os.path.getsize(path))
+
+    def _copy(self, source, path):
+        self.store.copy_file(source, path, os.stat(source).st_mode)
+        self._sync_file(path)
+        self._written(os.path.getsize(path))
+
+
+class MemorySink(OutputSink):
+    """Keep generated files in memory.
+
+    ``files`` maps the path of each file to its contents, ``modes`` maps the
+    path of each file and directory to its permission bits.
+    """
+
+    def __init__(self):
+        """Start with no files."""
+        super().__init__()
+        self.files = {}
+        self.modes = {}
+
+    def make_dir(self, path, mode=_DIR_MODE):
+        """Record a directory and its parents."""
+        name = self._name(path)
+        if name in self._dirs or name == ".":
+            return
+        self._add_parents(name)
+        self._dirs.add(name)
+        self.modes[name] = stat.S_IMODE(mode or _DIR_MODE)
+
+    def write_file(self, path, data, mode=_FILE_MODE):
+        """Keep the contents of a file."""
+        name = self._name(path)
+        self._add_parents(name)
+        self._files.add(name)
+        self.files[name] = bytes(data)
+        self._written(len(data))
+        self.modes[name] = stat.S_IMODE(mode or _FILE_MODE)
+
+    def remove_tree(self, path):
+        """Forget a directory and everything in it."""
+        name = self._name(path)
+        prefix = name + "/"
+        for paths in (self._dirs, self._files):
+            for entry in [p for p in paths if p == name or p.startswith(prefix)]:
+                paths.discard(entry)
+                self.files.pop(entry, None)
+                self.modes.pop(entry, None)
+
+
+class _ArchiveSink(OutputSink):
+    """Base class of the sinks streaming an archive.
+
+    Entries cannot be removed or replaced once written. Rather than adding
+    duplicate entries, a file written again, for instance when overwriting a
+    project or a directory copied without rendering, keeps its first
+    contents.
+    """
+
+    def _new_file(self, path):
+        """Return the entry name of a file about to be written to ``path``.
+
+        :return: ``None`` if the archive holds the file already.
+        """
+        name = self._name(path)
+        if name in self._files:
+            logger.warning("%s is already in the archive, keeping it", name)
+            self.files_unchanged += 1
+            return None
+        self._add_parents(name)
+        self._files.add(name)
+        return name
+
+    def remove_tree(self, path):
+        """Keep the entries of a directory, they cannot be removed."""
+
+
+class TarSink(_ArchiveSink):
+    """Stream a tar archive to a file object.
+
+    The archive is written in stream mode, so ``fileobj`` does not need to
+    be seekable. Permission bits are stored in the archive. Entries cannot
+    be removed or replaced once written: a file written again keeps its
+    first contents, and when a generation fails, discard the stream.
+
+    :param fileobj: Binary file object to write the archive to.
+    :param compression: ``""``, ``"gz"``, ``"bz2"`` or ``"xz"``.
+    """
+
+    def __init__(self, fileobj, compression=""):
+        """Start an archive on ``fileobj``."""
+        super().__init__()
+        self._tar = tarfile.open(fileobj=fileobj, mode=f"w|{compression}")
+        self._mtime = time.time()
+
+    def _info(self, name, mode, size=0, type_=tarfile.REGTYPE):
+        info = tarfile.TarInfo(name)
+        info.type = type_
+        info.mode = stat.S_IMODE(mode)
+        info.size = size
+        info.mtime = self._mtime
+        return info
+
+    def make_dir(self, path, mode=_DIR_MODE):
+        """Add a directory entry, and entries for its parents."""
+        name = self._name(path)
+        if name in self._dirs or name == ".":
+            return
+        self._add_parents(name)
+        self._dirs.add(name)
+        self._tar.addfile(self._info(name, mode or _DIR_MODE, type_=tarfile.DIRTYPE))
+
+    def write_file(self, path, data, mode=_FILE_MODE):
+        """Add a file entry, unless the archive holds the file already."""
+        name = self._new_file(path)
+        if name is None:
+            return
+        info = self._info(name, mode or _FILE_MODE, len(data))
+        self._tar.addfile(info, io.BytesIO(data))
+        self._written(len(data))
+
+    def copy_file(self, source, path, mode=None):
+        """Add a file entry, streaming its contents from ``source``."""
+        name = self._new_file(path)
+        if name is None:
+            return
+        source_stat = os.stat(source)
+        with open(source, "rb") as file_handle:
+            info = self._info(name, mode or source_stat.st_mode, source_stat.st_size)
+            self._tar.addfile(info, file_handle)
+        self._written(source_stat.st_size)
+
+    def close(self):
+        """Write the end of the archive."""
+        self._tar.close()
+
+
+class ZipSink(_ArchiveSink):
+    """Stream a zip archive to a file object.
+
+    ``fileobj`` does not need to be seekable. Permission bits are stored as
+    Unix attributes of the entries. Entries cannot be removed or replaced
+    once written: a file written again keeps its first contents, and when a
+    generation fails, discard the stream.
+
+    :param fileobj: Binary file object to write the archive to.
+    :param compression: Compression method of the :mod:`zipfile` module.
+    """
+
+    def __init__(self, fileobj, compression=zipfile.ZIP_DEFLATED):
+        """Start an archive on ``fileobj``."""
+        super().__init__()
+        self._zip = zipfile.ZipFile(fileobj, "w", compression=compression)
+        self._date_time = time.localtime(time.time())[:6]
+
+    def _info(self, name, mode):
+        info = zipfile.ZipInfo(name, self._date_time)
+        info.compress_type = self._zip.compression
+        info.external_attr = mode << 16
+        return info
+
+    def make_dir(self, path, mode=_DIR_MODE):
+        """Add a directory entry, and entries for its parents."""
+        name = self._name(path)
+        if name in self._dirs or name == ".":
+            return
+        self._add_parents(name)
+        self._dirs.add(name)
+        info = self._info(name + "/", stat.S_IFDIR | stat.S_IMODE(mode or _DIR_MODE))
+        info.external_attr |= 0x10  # MS-DOS directory flag
+        self._zip.writestr(info, b"")
+
+    def write_file(self, path, data, mode=_FILE_MODE):
+        """Add a file entry, unless the archive holds the file already."""
+        name = self._new_file(path)
+        if name is None:
+            return
+        info = self._info(name, stat.S_IFREG | stat.S_IMODE(mode or _FILE_MODE))
+        self._zip.writestr(info, data)
+        self._written(len(data))
+
+    def copy_file(self, source, path, mode=None):
+        """Add a file entry, streaming its contents from ``source``."""
+        name = self._new_file(path)
+        if name is None:
+            return
+        mode = stat.S_IFREG | stat.S_IMODE(mode or os.stat(source).st_mode)
+        with open(source, "rb") as src, self._zip.open(
+            self._info(name, mode), "w"
+        ) as dst:
+            shutil.copyfileobj(src, dst, _COPY_BUFSIZE)
+        self._written(os.path.getsize(source))
+
+    def close(self):
+        """Write the central directory of the archive."""
+        self._zip.close()
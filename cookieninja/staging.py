@@ -0,0 +1,211 @@
+"""Staged generation: write a project aside, then rename it into place.
+
+The staging directory is created next to the project directory, on the same
+filesystem, so that the final rename is atomic. Readers thus never see a
+half-written project, and a failed generation is removed in the background
+instead of while the caller waits.
+
+Background removals run in daemon threads, which do not hold the interpreter
+up on exit: a removal still running then is abandoned, leaving a hidden
+``.<name>.*.staging`` directory behind. Call :func:`wait_for_cleanups` before
+exiting to finish them.
+"""
+import ctypes
+import errno
+import logging
+import os
+import shutil
+import tempfile
+import threading
+
+from .exceptions import OutputDirExistsException
+from .utils import fsync_path, make_sure_path_exists, reflink, rmtree
+
+logger = logging.getLogger(__name__)
+
+_AT_FDCWD = -100
+_RENAME_EXCHANGE = 2
+
+_cleanups = set()
+_cleanups_lock = threading.Lock()
+_renameat2 = None
+
+
+def _remove(path):
+    try:
+        rmtree(path)
+    except OSError:
+        logger.warning("Unable to remove %s", path, exc_info=True)
+    finally:
+        with _cleanups_lock:
+            _cleanups.discard(threading.current_thread())
+
+
+def remove_in_background(path):
+    """Remove a directory tree in a background thread.
+
+    The thread is a daemon, see :func:`wait_for_cleanups` to wait for it.
+
+    :return: The started thread.
+    """
+    thread = threading.Thread(
+        target=_remove, args=(path,), name=f"cookieninja-remove-{path}", daemon=True
+    )
+    with _cleanups_lock:
+        _cleanups.add(thread)
+    thread.start()
+    return thread
+
+
+def wait_for_cleanups(timeout=None):
+    """Wait until the background removals started so far are done."""
+    with _cleanups_lock:
+        threads = list(_cleanups)
+    for thread in threads:
+        thread.join(timeout)
+
+
+def _get_renameat2():
+    """Return the ``renameat2`` function of the C library, or ``None``."""
+    global _renameat2
+    if _renameat2 is None:
+        try:
+            function = ctypes.CDLL(None, use_errno=True).renameat2
+        except (AttributeError, OSError, TypeError):
+            function = False
+        else:
+            function.argtypes = [
+                ctypes.c_int,
+                ctypes.c_char_p,
+                ctypes.c_int,
+                ctypes.c_char_p,
+                ctypes.c_uint,
+            ]
+            function.restype = ctypes.c_int
+        _renameat2 = function
+    return _renameat2 or None
+
+
+def exchange(path, other):
+    """Swap two directories.
+
+    Uses ``renameat2(RENAME_EXCHANGE)`` where the platform and filesystem
+    support it, which swaps both atomically. Elsewhere the directories are
+    swapped with three renames, leaving a short window where ``other`` does
+    not exist.
+    """
+    renameat2 = _get_renameat2()
+    if renameat2 is not None:
+        result = renameat2(
+            _AT_FDCWD,
+            os.fsencode(path),
+            _AT_FDCWD,
+            os.fsencode(other),
+            _RENAME_EXCHANGE,
+        )
+        if result == 0:
+            return
+        error = ctypes.get_errno()
+        if error not in (errno.ENOSYS, errno.EINVAL, errno.ENOTSUP):
+            raise OSError(error, os.strerror(error), path, None, other)
+    aside = f"{path}.old"
+    os.rename(other, aside)
+    os.rename(path, other)
+    os.rename(aside, path)
+
+
+def can_clone(directory):
+    """Tell whether files in ``directory`` can be reflinked.
+
+    Tries to reflink a one byte file, which is removed again.
+    """
+    fd, path = tempfile.mkstemp(prefix=".cookieninja-", dir=directory)
+    clone = f"{path}.clone"
+    try:
+        os.write(fd, b"\0")
+        os.close(fd)
+        reflink(path, clone)
+    except OSError:
+        return False
+    else:
+        return True
+    finally:
+        for name in (path, clone):
+            if os.path.lexists(name):
+                os.remove(name)
+
+
+class StagedDirectory:
+    """A project directory generated under a temporary name.
+
+    :param target: Final path of the project directory.
+    :param overwrite: Start from a clone of the existing ``target``, and
+        replace it on :meth:`commit`. Files are reflinked where the
+        filesystem supports it, which shares their data until either copy is
+        written, and copied otherwise, which costs a copy of the whole
+        project. See :func:`can_clone` to tell both apart beforehand.
+    """
+
+    def __init__(self, target, overwrite=False):
+        """Create the staging directory next to ``target``."""
+        self.target = os.path.abspath(target)
+        parent, name = os.path.split(self.target)
+        make_sure_path_exists(parent)
+        self.path = tempfile.mkdtemp(prefix=f".{name}.", suffix=".staging", dir=parent)
+        self.overwrite = overwrite
+        self._reflink_supported = True
+        if overwrite:
+            # The existing project is the base that is rendered over
+            os.rmdir(self.path)
+            shutil.copytree(
+                self.target, self.path, symlinks=True, copy_function=self._clone
+            )
+        logger.debug("Staging %s in %s", self.target, self.path)
+
+    def _clone(self, src, dst):
+        """Reflink ``src`` to ``dst`` if the filesystem can, copy it otherwise.
+
+        Unlike hardlinks, reflinks never let writes to the staged project
+        reach the existing one.
+        """
+        if self._reflink_supported:
+            try:
+                reflink(src, dst)
+            except OSError:
+                self._reflink_supported = False
+            else:
+                shutil.copystat(src, dst)
+                return dst
+        return shutil.copy2(src, dst)
+
+    def commit(self, durable=False):
+        """Move the staged project into place.
+
+        An existing project is swapped with the staged one and removed in
+        the background.
+
+        :param durable: Flush the parent directory after the rename, so that
+            the project is in place after a crash. The staged project should
+            be flushed before.
+
+        :raises: ``OutputDirExistsException`` if the project directory was
+            created by someone else meanwhile.
+        """
+        if self.overwrite:
+            exchange(self.path, self.target)
+            remove_in_background(self.path)
+        else:
+            try:
+                os.rename(self.path, self.target)
+            except OSError as error:
+                if error.errno not in (errno.EEXIST, errno.ENOTEMPTY):
+                    raise
+                self.discard()
+                msg = f'Error: "{self.target}" directory already exists'
+                raise OutputDirExistsException(msg) from error
+        if durable:
+            fsync_path(os.path.dirname(self.target))
+
+    def discard(self):
+        """Remove the staged project in the background."""
+        remove_in_background(self.path)
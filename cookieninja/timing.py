@@ -0,0 +1,206 @@
+"""Timing of the phases of a generation, as reported by ``--profile``.
+
+Wrap a generation in :func:`record` to get a :class:`TimingReport` of it::
+
+    from cookieninja import timing
+    from cookieninja.main import cookiecutter
+
+    with timing.record() as report:
+        cookiecutter('cookiecutter-pypackage/', no_input=True)
+    print(report.format())
+
+Phases are exclusive: the time of a nested phase, such as the hooks run
+while generating files, is not counted in the enclosing phase, so that the
+phases add up to the total. Outside of :func:`record` the instrumentation
+does nothing.
+
+The report follows the context, so generations run by :mod:`cookieninja.aio`
+and :mod:`cookieninja.batch`, in tasks and executor threads, are recorded
+too. The CPU time of a phase is that of the thread running it, plus that of
+the subprocesses which finished meanwhile; the total CPU time is that of the
+whole process. Concurrent generations overlap, so their phases can add up to
+more than the total.
+"""
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import time
+from typing import NamedTuple
+
+# Report of the generation running in the current context, if recorded
+_REPORT = contextvars.ContextVar("cookieninja_timing_report", default=None)
+# Phase running in the current context: start times and time spent in nested
+# phases
+_RUNNING = contextvars.ContextVar("cookieninja_timing_phase", default=None)
+
+
+def _process_cpu_time():
+    """Return the CPU time of the process and of its finished subprocesses."""
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+def _cpu_time():
+    """Return the CPU time of the thread and of the finished subprocesses."""
+    times = os.times()
+    return time.thread_time() + times.children_user + times.children_system
+
+
+class PhaseTiming(NamedTuple):
+    """Time spent in one phase, in seconds.
+
+    :param wall: Elapsed time.
+    :param cpu: CPU time of the threads running the phase, hooks and other
+        subprocesses included.
+    :param calls: Number of times the phase ran.
+    """
+
+    wall: float
+    cpu: float
+    calls: int
+
+
+class TimingReport:
+    """Where the time of a generation went.
+
+    ``phases`` maps phase names to :class:`PhaseTiming`, in the order they
+    first ran. ``counts`` maps counter names, such as ``files_rendered`` or
+    ``bytes_written``, to their values. ``files`` maps template files to the
+    time spent generating them. ``wall`` and ``cpu`` are the totals.
+    """
+
+    def __init__(self):
+        """Start an empty report."""
+        self.phases = {}
+        self.counts = {}
+        self.files = {}
+        self.wall = 0.0
+        self.cpu = 0.0
+        # Generations may run in several threads
+        self._lock = threading.Lock()
+
+    def _add_phase(self, name, wall, cpu):
+        with self._lock:
+            previous = self.phases.get(name, PhaseTiming(0.0, 0.0, 0))
+            self.phases[name] = PhaseTiming(
+                previous.wall + wall, previous.cpu + cpu, previous.calls + 1
+            )
+
+    @property
+    def other(self):
+        """Return the wall and CPU time spent outside of any phase."""
+        return PhaseTiming(
+            max(self.wall - sum(phase.wall for phase in self.phases.values()), 0.0),
+            max(self.cpu - sum(phase.cpu for phase in self.phases.values()), 0.0),
+            0,
+        )
+
+    def slowest_files(self, top=10):
+        """Return the ``top`` slowest files, as ``(path, seconds)`` pairs."""
+        return sorted(self.files.items(), key=lambda item: item[1], reverse=True)[:top]
+
+    def as_dict(self, top=10):
+        """Return the report as a dict of JSON serializable values."""
+        return {
+            "wall": self.wall,
+            "cpu": self.cpu,
+            "phases": {name: phase._asdict() for name, phase in self.phases.items()},
+            "counts": dict(self.counts),
+            "slowest_files": [
+                {"path": path, "wall": wall} for path, wall in self.slowest_files(top)
+            ],
+        }
+
+    def to_json(self, top=10):
+        """Return the report as a JSON document."""
+        return json.dumps(self.as_dict(top), indent=2)
+
+    def format(self, top=10):
+        """Return the report as human readable text."""
+        lines = [f"{'Phase':<20}{'Wall (s)':>10}{'CPU (s)':>10}{'Calls':>7}"]
+        for name, phase in [*self.phases.items(), ("other", self.other)]:
+            lines.append(
+                f"{name:<20}{phase.wall:>10.3f}{phase.cpu:>10.3f}{phase.calls:>7}"
+            )
+        lines.append(f"{'total':<20}{self.wall:>10.3f}{self.cpu:>10.3f}")
+        if self.counts:
+            lines.append("")
+            lines.extend(f"{name}: {value}" for name, value in self.counts.items())
+        slowest = self.slowest_files(top)
+        if slowest:
+            lines.append("")
+            lines.append("Slowest files:")
+            lines.extend(f"{wall:>10.3f}  {path}" for path, wall in slowest)
+        return "\n".join(lines)
+
+
+@contextlib.contextmanager
+def record():
+    """Record the timing of the generations run in the block.
+
+    :return: A context manager giving the :class:`TimingReport`, complete
+        once the block exits.
+    """
+    report = TimingReport()
+    token = _REPORT.set(report)
+    running_token = _RUNNING.set(None)
+    wall, cpu = time.perf_counter(), _process_cpu_time()
+    try:
+        yield report
+    finally:
+        report.wall = time.perf_counter() - wall
+        report.cpu = _process_cpu_time() - cpu
+        _RUNNING.reset(running_token)
+        _REPORT.reset(token)
+
+
+@contextlib.contextmanager
+def phase(name):
+    """Time the block as the phase ``name``."""
+    report = _REPORT.get()
+    if report is None:
+        yield
+        return
+    with report._lock:
+        # Phases are listed in the order they started
+        report.phases.setdefault(name, PhaseTiming(0.0, 0.0, 0))
+    parent = _RUNNING.get()
+    running = [time.perf_counter(), _cpu_time(), 0.0, 0.0]
+    token = _RUNNING.set(running)
+    try:
+        yield
+    finally:
+        _RUNNING.reset(token)
+        wall = time.perf_counter() - running[0]
+        cpu = _cpu_time() - running[1]
+        report._add_phase(name, wall - running[2], cpu - running[3])
+        if parent is not None:
+            with report._lock:
+                parent[2] += wall
+                parent[3] += cpu
+
+
+@contextlib.contextmanager
+def template_file(path):
+    """Time the block as the generation of the template file ``path``."""
+    report = _REPORT.get()
+    if report is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        wall = time.perf_counter() - start
+        with report._lock:
+            report.files[path] = report.files.get(path, 0.0) + wall
+
+
+def count(name, value=1):
+    """Add ``value`` to the counter ``name`` of the recorded generation."""
+    report = _REPORT.get()
+    if report is not None:
+        with report._lock:
+            report.counts[name] = report.counts.get(name, 0) + value
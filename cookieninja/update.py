@@ -0,0 +1,386 @@
+"""Update generated projects to a new version of their template.
+
+The replay history keeps the context and the template commit of every
+generation. An update renders the project again from the recorded version,
+the baseline, and from the new one, then merges the template changes between
+the two into the project with a three-way merge, keeping local edits.
+
+Each template version is checked out once under the ``.versions`` directory
+of ``cookiecutters_dir``. Given an output cache, baselines are stored in it,
+so updating many projects generated from the same template renders each
+version only once per context.
+"""
+import errno
+import filecmp
+import logging
+import os
+import shutil
+import subprocess  # nosec
+import tempfile
+import threading
+from typing import List, NamedTuple
+
+from .config import get_user_config
+from .exceptions import ProjectUpdateError
+from .generate import apply_overwrites_to_context, generate_context, generate_files
+from .main import _patch_import_path_for_repo
+from .prompt import prompt_for_config
+from .replay import ReplayStore, load_entry, record
+from .repository import expand_abbreviations, is_repo_url
+from .utils import make_sure_path_exists, rmtree
+from .vcs import clone
+
+logger = logging.getLogger(__name__)
+
+VERSIONS_DIR = ".versions"
+
+# Local clones of remote templates, made once per process
+_SOURCES = {}
+_SOURCES_LOCK = threading.Lock()
+
+
+class UpdateResult(NamedTuple):
+    """Outcome of :func:`update_project`.
+
+    Paths are relative to the project directory.
+
+    :param project_dir: The updated project.
+    :param context: Context of the new template version, as recorded.
+    :param updated: Files changed by the template, updated in the project.
+    :param added: Files added by the template.
+    :param removed: Files removed by the template and not edited locally.
+    :param conflicts: Files whose local edits conflict with the template
+        changes. Text files hold conflict markers, other files are left as
+        they were.
+    """
+
+    project_dir: str
+    context: dict
+    updated: List[str]
+    added: List[str]
+    removed: List[str]
+    conflicts: List[str]
+
+
+def _git(*args, cwd=None):
+    """Run a git command and return its output."""
+    try:
+        return subprocess.run(
+            ["git", *args], cwd=cwd, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except OSError as error:
+        raise ProjectUpdateError("git is needed to update projects") from error
+    except subprocess.CalledProcessError as error:
+        raise ProjectUpdateError(
+            f"git {args[0]} failed: {error.stderr.strip()}"
+        ) from error
+
+
+def _baseline_entry(replay_dir, project_dir):
+    """Return the latest replay history entry of ``project_dir``."""
+    output_dir, project_name = os.path.split(project_dir)
+    for entry in ReplayStore(replay_dir).history(project_name=project_name):
+        if entry["output_dir"] == output_dir:
+            return entry
+    raise ProjectUpdateError(
+        f"{project_dir} is not in the replay history, it cannot be updated"
+    )
+
+
+def _template_source(template, config_dict):
+    """Return a local git repository of ``template`` and the template's path in it.
+
+    Remote templates are cloned once per process.
+    """
+    template, _ = expand_abbreviations(template, config_dict["abbreviations"])
+    if is_repo_url(template):
+        with _SOURCES_LOCK:
+            source = _SOURCES.get(template)
+            if source is None:
+                source = clone(
+                    template,
+                    clone_to_dir=os.path.join(
+                        config_dict["cookiecutters_dir"], VERSIONS_DIR, ".sources"
+                    ),
+                    no_input=True,
+                )
+                _SOURCES[template] = source
+        return source, ""
+    if not os.path.isdir(template):
+        raise ProjectUpdateError(
+            f"{template} is not a git repository, "
+            "projects generated from it cannot be updated"
+        )
+    source = _git("rev-parse", "--show-toplevel", cwd=template)
+    return source, _git("rev-parse", "--show-prefix", cwd=template)
+
+
+def _resolve_commit(source, checkout):
+    """Return the commit of ``checkout`` in ``source``, ``HEAD`` by default."""
+    if checkout is None:
+        return _git("rev-parse", "--verify", "HEAD^{commit}", cwd=source)
+    try:
+        return _git("rev-parse", "--verify", f"{checkout}^{{commit}}", cwd=source)
+    except ProjectUpdateError:
+        # Branches of a fresh clone only exist as remote branches
+        return _git(
+            "rev-parse", "--verify", f"origin/{checkout}^{{commit}}", cwd=source
+        )
+
+
+def _checkout(source, commit, versions_dir):
+    """Return a checkout of ``commit``, made the first time it is asked for."""
+    path = os.path.join(versions_dir, commit)
+    if os.path.isdir(path):
+        return path
+    make_sure_path_exists(versions_dir)
+    tmp_dir = tempfile.mkdtemp(dir=versions_dir, prefix=".tmp-")
+    try:
+        _git("clone", "--quiet", "--no-checkout", source, tmp_dir)
+        _git("checkout", "--quiet", "--detach", commit, cwd=tmp_dir)
+        os.rename(tmp_dir, path)
+    except OSError as error:
+        rmtree(tmp_dir)
+        if error.errno not in (errno.EEXIST, errno.ENOTEMPTY):
+            raise
+        # Checked out concurrently
+    except BaseException:
+        rmtree(tmp_dir)
+        raise
+    return path
+
+
+def _question_keys(variables):
+    """Map the variable names of a template to their keys in its context.
+
+    Dependent questions, ``name?{{ expression }}``, store their answer as
+    ``name``.
+    """
+    return {key.split("?", 1)[0]: key for key in variables}
+
+
+def _new_context(repo_dir, old_context, config_dict, extra_context):
+    """Return the context of the new template version.
+
+    The answers of the previous generation are reused, new variables get
+    their defaults and private variables come from the new version.
+    """
+    answers = {
+        key: value
+        for key, value in old_context["cookiecutter"].items()
+        if not key.startswith("_")
+    }
+    answers.update(extra_context or {})
+    try:
+        context = generate_context(
+            context_file=os.path.join(repo_dir, "cookiecutter.json"),
+            default_context=config_dict["default_context"],
+        )
+        keys = _question_keys(context["cookiecutter"])
+        apply_overwrites_to_context(
+            context["cookiecutter"],
+            {keys.get(name, name): value for name, value in answers.items()},
+        )
+    except ValueError as error:
+        raise ProjectUpdateError(
+            f"The answers do not fit the new template version: {error}"
+        ) from error
+    with _patch_import_path_for_repo(repo_dir):
+        context["cookiecutter"] = prompt_for_config(context, no_input=True)
+    return context
+
+
+def _render(repo_dir, context, output_dir, **options):
+    """Generate ``repo_dir`` in ``output_dir`` and return the project path."""
+    context = {
+        **context,
+        "cookiecutter": {
+            **context["cookiecutter"],
+            "_repo_dir": repo_dir,
+            "_output_dir": output_dir,
+        },
+    }
+    with _patch_import_path_for_repo(repo_dir):
+        return generate_files(repo_dir, context, output_dir, **options)
+
+
+def _tree_files(root):
+    """Return the files under ``root``, by path relative to it."""
+    files = {}
+    for top, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(top, name)
+            files[os.path.relpath(path, root)] = path
+    return files
+
+
+def _same(path, other):
+    """Check whether two files have the same contents."""
+    try:
+        return filecmp.cmp(path, other, shallow=False)
+    except OSError:
+        return False
+
+
+def _copy(source, path):
+    make_sure_path_exists(os.path.dirname(path))
+    shutil.copyfile(source, path)
+    shutil.copymode(source, path)
+
+
+def _merge_file(path, base, new):
+    """Merge the changes from ``base`` to ``new`` into ``path`` in place.
+
+    :return: Whether the merge is free of conflicts.
+    """
+    from binaryornot.check import is_binary
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if base is None:
+            base = os.path.join(tmp_dir, "empty")
+            open(base, "wb").close()
+        if any(is_binary(p) for p in (path, base, new)):
+            return False
+        try:
+            result = subprocess.run(
+                ["git", "merge-file", "-L", "project", "-L", "baseline"]
+                + ["-L", "template", path, base, new],
+                capture_output=True,
+                text=True,
+            )
+        except OSError as error:
+            raise ProjectUpdateError("git is needed to update projects") from error
+    if not 0 <= result.returncode < 128:
+        raise ProjectUpdateError(f"Unable to merge {path}: {result.stderr.strip()}")
+    return result.returncode == 0
+
+
+def merge_trees(base_dir, new_dir, project_dir):
+    """Apply the changes from ``base_dir`` to ``new_dir`` to ``project_dir``.
+
+    Files of the project that are in neither tree are left alone.
+
+    :return: Tuple of the updated, added, removed and conflicting files,
+        relative to ``project_dir``.
+    """
+    base, new = _tree_files(base_dir), _tree_files(new_dir)
+    updated, added, removed, conflicts = [], [], [], []
+    for relpath in sorted(base.keys() | new.keys()):
+        base_file, new_file = base.get(relpath), new.get(relpath)
+        path = os.path.join(project_dir, relpath)
+        if base_file and new_file and _same(base_file, new_file):
+            # Not changed by the template
+            continue
+        if not os.path.lexists(path):
+            if base_file is None:
+                _copy(new_file, path)
+                added.append(relpath)
+            elif new_file is not None:
+                # Deleted locally, changed by the template
+                conflicts.append(relpath)
+        elif new_file is None:
+            if _same(path, base_file):
+                os.remove(path)
+                removed.append(relpath)
+            else:
+                # Edited locally, removed by the template
+                conflicts.append(relpath)
+        elif _same(path, new_file):
+            continue
+        elif base_file is not None and _same(path, base_file):
+            _copy(new_file, path)
+            updated.append(relpath)
+        elif _merge_file(path, base_file, new_file):
+            updated.append(relpath)
+        else:
+            conflicts.append(relpath)
+    return updated, added, removed, conflicts
+
+
+def update_project(
+    project_dir,
+    checkout=None,
+    template=None,
+    directory=None,
+    extra_context=None,
+    config_file=None,
+    default_config=False,
+    accept_hooks=False,
+    output_cache=None,
+    render_cache=None,
+):
+    """Update a generated project to another version of its template.
+
+    :param project_dir: The project, as generated by Cookieninja.
+    :param checkout: Branch, tag or commit of the new template version,
+        defaults to ``HEAD``.
+    :param template: Template to update from, defaults to the one the project
+        was generated from. Must be a git repository.
+    :param directory: Relative path to the template in the repository,
+        defaults to the path of a local ``template`` in its repository.
+    :param extra_context: Answers to change, or to give to new variables.
+        The others are kept from the previous generation.
+    :param config_file: User configuration file path.
+    :param default_config: Use default values rather than a config file.
+    :param accept_hooks: Run the hooks when rendering both versions.
+    :param output_cache: :class:`cookieninja.cache.OutputCache` storing the
+        rendered versions, none by default.
+    :param render_cache: :class:`cookieninja.cache.RenderCache` reused across
+        contexts, none by default.
+    :return: An :class:`UpdateResult`.
+    :raises: ``ProjectUpdateError`` if the project cannot be updated.
+    """
+    project_dir = os.path.abspath(project_dir)
+    if not os.path.isdir(project_dir):
+        raise ProjectUpdateError(f"{project_dir} is not a directory")
+    config_dict = get_user_config(
+        config_file=config_file, default_config=default_config
+    )
+    replay_dir = config_dict["replay_dir"]
+    entry = _baseline_entry(replay_dir, project_dir)
+    if entry["commit_id"] is None:
+        raise ProjectUpdateError(
+            f"The template commit of {project_dir} is unknown, it cannot be updated"
+        )
+    old_context = load_entry(replay_dir, entry["id"])
+
+    template = template or entry["template"]
+    source, prefix = _template_source(template, config_dict)
+    directory = prefix if directory is None else directory
+    versions_dir = os.path.join(config_dict["cookiecutters_dir"], VERSIONS_DIR)
+    commit = _resolve_commit(source, checkout)
+    logger.debug("Updating %s from %s to %s", project_dir, entry["commit_id"], commit)
+    old_repo_dir = os.path.normpath(
+        os.path.join(_checkout(source, entry["commit_id"], versions_dir), directory)
+    )
+    new_repo_dir = os.path.normpath(
+        os.path.join(_checkout(source, commit, versions_dir), directory)
+    )
+    new_context = _new_context(new_repo_dir, old_context, config_dict, extra_context)
+
+    options = {
+        "accept_hooks": accept_hooks,
+        "output_cache": output_cache,
+        "render_cache": render_cache,
+    }
+    with tempfile.TemporaryDirectory(prefix="cookieninja-update-") as work_dir:
+        base_dir = _render(
+            old_repo_dir, old_context, os.path.join(work_dir, "base"), **options
+        )
+        new_dir = _render(
+            new_repo_dir, new_context, os.path.join(work_dir, "new"), **options
+        )
+        updated, added, removed, conflicts = merge_trees(base_dir, new_dir, project_dir)
+
+    new_context["cookiecutter"]["_template"] = template
+    new_context["cookiecutter"]["_repo_dir"] = new_repo_dir
+    new_context["cookiecutter"]["_output_dir"] = os.path.dirname(project_dir)
+    record(
+        replay_dir,
+        entry["template_name"],
+        new_context,
+        new_repo_dir,
+        project_dir,
+        commit=commit,
+    )
+    return UpdateResult(project_dir, new_context, updated, added, removed, conflicts)
@@ -1,5 +1,6 @@
 """Helper functions used throughout Cookiecutter."""
 import contextlib
+import ctypes
 import logging
 import os
 import shutil
@@ -13,6 +14,11 @@ from .prompt import read_user_yes_no
 
 logger = logging.getLogger(__name__)
 
+# ``ioctl`` request cloning a file on Linux filesystems with reflinks
+_FICLONE = 0x40049409
+
+_syncfs = None
+
 
 def force_delete(func, path, exc_info):
     """Error handler for `shutil.rmtree()` equivalent to `rm -rf`.
@@ -44,6 +50,74 @@ def make_sure_path_exists(path: "os.PathLike[str]") -> None:
         raise OSError(f"Unable to create directory at {path}") from error
 
 
+def reflink(src, dst):
+    """Clone the file ``src`` to ``dst``, sharing its data on disk.
+
+    :raises: ``OSError`` if the platform or the filesystem cannot clone files.
+    """
+    try:
+        import fcntl
+    except ImportError as error:
+        raise OSError("Reflinks are not supported on this platform") from error
+
+    with open(src, "rb") as src_fh, open(dst, "wb") as dst_fh:
+        fcntl.ioctl(dst_fh.fileno(), _FICLONE, src_fh.fileno())
+
+
+def fsync_path(path):
+    """Flush a file or a directory to disk.
+
+    Directories cannot be opened or flushed on every platform, Windows for
+    one, which is ignored.
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        if os.path.isdir(path):
+            return
+        raise
+    try:
+        os.fsync(fd)
+    except OSError:
+        if not os.path.isdir(path):
+            raise
+    finally:
+        os.close(fd)
+
+
+def _get_syncfs():
+    """Return the ``syncfs`` function of the C library, or ``None``."""
+    global _syncfs
+    if _syncfs is None:
+        try:
+            function = ctypes.CDLL(None, use_errno=True).syncfs
+        except (AttributeError, OSError, TypeError):
+            function = False
+        else:
+            function.argtypes = [ctypes.c_int]
+            function.restype = ctypes.c_int
+        _syncfs = function
+    return _syncfs or None
+
+
+def syncfs(path):
+    """Flush the whole filesystem holding ``path`` to disk, in one call.
+
+    :return: Whether the platform supports it, Linux does.
+    """
+    function = _get_syncfs()
+    if function is None:
+        return False
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        if function(fd) != 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error), path)
+    finally:
+        os.close(fd)
+    return True
+
+
 @contextlib.contextmanager
 def work_in(dirname=None):
     """Context manager version of os.chdir.
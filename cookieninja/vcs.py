@@ -58,28 +58,14 @@ def is_vcs_installed(repo_type):
     return bool(which(repo_type))
 
 
-def clone(
-    repo_url: str,
-    checkout: Optional[str] = None,
-    recurse_submodules: bool = False,
-    clone_to_dir: "os.PathLike[str]" = ".",
-    no_input: bool = False,
-):
-    """Clone a repo to the current directory.
+def _clone_commands(repo_url, checkout, recurse_submodules, clone_to_dir):
+    """Work out where and how to clone a repo.
 
-    :param repo_url: Repo URL of unknown type.
-    :param checkout: The branch, tag or commit ID to checkout after clone.
-    :param recurse_submodules: Clone submodules if set to `True`
-    :param clone_to_dir: The directory to clone to.
-                         Defaults to the current directory.
-    :param no_input: Do not prompt for user input and eventually force a refresh of
-        cached resources.
-    :returns: str with path to the new directory of the repository.
+    :return: A tuple of the path of the new directory of the repository, its
+        URL without the VCS prefix, the command cloning it from
+        ``clone_to_dir`` and the command checking out ``checkout`` in it, or
+        ``None``.
     """
-    # Ensure that clone_to_dir exists
-    clone_to_dir = Path(clone_to_dir).expanduser()
-    make_sure_path_exists(clone_to_dir)
-
     # identify the repo_type
     repo_type, repo_url = identify_repo(repo_url)
 
@@ -115,6 +101,60 @@ def clone(
     clone_command.append(repo_url)
     logger.debug(f"repo_dir is {repo_dir}")
 
+    checkout_command = None
+    if checkout is not None:
+        checkout_params = [checkout]
+        # Avoid Mercurial "--config" and "--debugger" injection vulnerability
+        if repo_type == "hg":
+            checkout_params.insert(0, "--")
+        checkout_command = [repo_type, "checkout", *checkout_params]
+    return repo_dir, repo_url, clone_command, checkout_command
+
+
+def _clone_error(output, repo_url, checkout):
+    """Return the exception to raise for the output of a failed clone, if any.
+
+    :param output: Output of the failed clone or checkout command.
+    """
+    if "not found" in output.lower():
+        return RepositoryNotFound(
+            f"The repository {repo_url} could not be found, " "have you made a typo?"
+        )
+    if any(error in output for error in BRANCH_ERRORS):
+        return RepositoryCloneFailed(
+            f"The {checkout} branch of repository "
+            f"{repo_url} could not found, have you made a typo?"
+        )
+    logger.error("git clone failed with error: %s", output)
+    return None
+
+
+def clone(
+    repo_url: str,
+    checkout: Optional[str] = None,
+    recurse_submodules: bool = False,
+    clone_to_dir: "os.PathLike[str]" = ".",
+    no_input: bool = False,
+):
+    """Clone a repo to the current directory.
+
+    :param repo_url: Repo URL of unknown type.
+    :param checkout: The branch, tag or commit ID to checkout after clone.
+    :param recurse_submodules: Clone submodules if set to `True`
+    :param clone_to_dir: The directory to clone to.
+                         Defaults to the current directory.
+    :param no_input: Do not prompt for user input and eventually force a refresh of
+        cached resources.
+    :returns: str with path to the new directory of the repository.
+    """
+    # Ensure that clone_to_dir exists
+    clone_to_dir = Path(clone_to_dir).expanduser()
+    make_sure_path_exists(clone_to_dir)
+
+    repo_dir, repo_url, clone_command, checkout_command = _clone_commands(
+        repo_url, checkout, recurse_submodules, clone_to_dir
+    )
+
     if os.path.isdir(repo_dir):
         clone = prompt_and_delete(repo_dir, no_input=no_input)
     else:
@@ -127,29 +167,17 @@ def clone(
                 cwd=clone_to_dir,
                 stderr=subprocess.STDOUT,
             )
-            if checkout is not None:
-                checkout_params = [checkout]
-                # Avoid Mercurial "--config" and "--debugger" injection vulnerability
-                if repo_type == "hg":
-                    checkout_params.insert(0, "--")
+            if checkout_command is not None:
                 subprocess.check_output(  # nosec
-                    [repo_type, "checkout", *checkout_params],
+                    checkout_command,
                     cwd=repo_dir,
                     stderr=subprocess.STDOUT,
                 )
         except subprocess.CalledProcessError as clone_error:
             output = clone_error.output.decode("utf-8")
-            if "not found" in output.lower():
-                raise RepositoryNotFound(
-                    f"The repository {repo_url} could not be found, "
-                    "have you made a typo?"
-                ) from clone_error
-            if any(error in output for error in BRANCH_ERRORS):
-                raise RepositoryCloneFailed(
-                    f"The {checkout} branch of repository "
-                    f"{repo_url} could not found, have you made a typo?"
-                ) from clone_error
-            logger.error("git clone failed with error: %s", output)
+            error = _clone_error(output, repo_url, checkout)
+            if error is not None:
+                raise error from clone_error
             raise
 
     return repo_dir
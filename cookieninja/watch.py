@@ -0,0 +1,275 @@
+"""Regenerate a project whenever its template changes.
+
+Meant for template authors: :func:`watch` generates a project, then polls the
+template for changes and regenerates the project after each one. The Jinja2
+environment, its compiled templates and the template analysis are kept
+between runs, so only the files whose template, shared templates under
+``../templates`` or variables changed are rendered again, see
+:meth:`cookieninja.analysis.TemplateAnalysis.unchanged_files`.
+
+The context is prompted for again only when ``cookiecutter.json`` changes,
+and hooks run again only then or when a hook changes.
+"""
+import logging
+import os
+import time
+from typing import List, NamedTuple, Optional
+
+from .analysis import analyze_template
+from .config import get_user_config
+from .environment import get_environment
+from .find import find_template
+from .generate import _render_path, generate_files
+from .main import (
+    _add_template_location,
+    _nested_template,
+    _patch_import_path_for_repo,
+    _prompt_for_context,
+)
+from .repository import determine_repo_dir
+from .sinks import DirectorySink
+from .utils import rmtree
+
+logger = logging.getLogger(__name__)
+
+#: Directories of a template that are not watched
+IGNORED_DIRS = frozenset({".git", ".hg", ".svn", "__pycache__"})
+
+
+class WatchRun(NamedTuple):
+    """One generation of :func:`watch`.
+
+    :param project_dir: The generated project, ``None`` if generation failed.
+    :param changed: Paths changed since the previous run, relative to the
+        template repository, empty for the first run.
+    :param prompted: Whether the context was prompted for again.
+    :param files_written: Files rendered or copied to the project.
+    :param files_unchanged: Files left untouched, as they did not change.
+    :param error: The exception of a failed generation.
+    """
+
+    project_dir: Optional[str]
+    changed: List[str]
+    prompted: bool
+    files_written: int
+    files_unchanged: int
+    error: Optional[Exception]
+
+
+def snapshot(repo_dir, exclude=()):
+    """Return the size and modification time of each file of a template.
+
+    :param exclude: Absolute paths of directories that are not watched.
+    :return: Dict mapping paths relative to ``repo_dir`` to ``(size, mtime)``.
+    """
+    files = {}
+    for top, dirs, names in os.walk(os.path.abspath(repo_dir)):
+        dirs[:] = [
+            name
+            for name in dirs
+            if name not in IGNORED_DIRS and os.path.join(top, name) not in exclude
+        ]
+        for name in names:
+            path = os.path.join(top, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                # Removed while walking, e.g. an editor's swap file
+                continue
+            files[os.path.relpath(path, repo_dir)] = (stat.st_size, stat.st_mtime_ns)
+    return files
+
+
+def changed_paths(old, new):
+    """Return the paths added, removed or modified between two snapshots."""
+    return sorted(
+        path for path in old.keys() | new.keys() if old.get(path) != new.get(path)
+    )
+
+
+class _Watcher:
+    """Generation state kept between the runs of :func:`watch`."""
+
+    def __init__(self, template, repo_dir, config_dict, output_dir, options):
+        self.template = template
+        self.repo_dir = repo_dir
+        self.config_dict = config_dict
+        self.output_dir = output_dir
+        self.options = options
+        self.context = None
+        self.analysis = None
+        self.analysis_context = None
+        #: Directory of the template generated, a nested template of
+        #: ``repo_dir`` or ``repo_dir`` itself
+        self.template_repo_dir = repo_dir
+        #: Directory the project is generated to, even by failed runs
+        self.project_dir = None
+
+    def _prompt(self):
+        template, repo_dir = self.template, self.repo_dir
+        while True:
+            context = _prompt_for_context(
+                repo_dir,
+                self.config_dict,
+                self.options["no_input"],
+                self.options["extra_context"],
+                self.options["accept_hooks"],
+            )
+            if "template" not in context["cookiecutter"]:
+                break
+            nested_template, repo_dir = _nested_template(repo_dir, context)
+            template = os.path.join(template, nested_template)
+        _add_template_location(context, template, repo_dir, self.output_dir)
+        self.template_repo_dir = repo_dir
+        return context
+
+    def run(self, changed):
+        """Regenerate the project after ``changed`` paths changed."""
+        prompted = self.context is None or any(
+            os.path.basename(path) == "cookiecutter.json" for path in changed
+        )
+        hooks_dir = os.path.relpath(
+            os.path.join(self.template_repo_dir, "hooks"), self.repo_dir
+        )
+        hooks_changed = any(path.startswith(hooks_dir + os.sep) for path in changed)
+        sink = DirectorySink(compare=True)
+        try:
+            if prompted:
+                self.context = self._prompt()
+            template_dir = find_template(
+                self.template_repo_dir, get_environment(self.context)
+            )
+            env = get_environment(self.context, template_dir)
+            self.project_dir = os.path.abspath(
+                os.path.join(
+                    self.output_dir,
+                    _render_path(env, os.path.basename(template_dir), self.context),
+                )
+            )
+            # Analyzed before rendering, so that changes made meanwhile are
+            # rendered by the next run
+            analysis = analyze_template(template_dir, self.context, env)
+            with _patch_import_path_for_repo(self.template_repo_dir):
+                project_dir = generate_files(
+                    self.template_repo_dir,
+                    self.context,
+                    self.output_dir,
+                    overwrite_if_exists=True,
+                    accept_hooks=self.options["accept_hooks"]
+                    and (prompted or hooks_changed),
+                    keep_project_on_failure=True,
+                    previous_analysis=self.analysis,
+                    previous_context=self.analysis_context,
+                    sink=sink,
+                )
+        except Exception as error:
+            # Template authors fix their template and save again
+            logger.error("Generation failed: %s", error)
+            return WatchRun(
+                None,
+                changed,
+                prompted,
+                sink.files_written,
+                sink.files_unchanged,
+                error,
+            )
+        self.analysis, self.analysis_context = analysis, self.context
+        return WatchRun(
+            project_dir,
+            changed,
+            prompted,
+            sink.files_written,
+            sink.files_unchanged,
+            None,
+        )
+
+
+def watch(
+    template,
+    output_dir=".",
+    checkout=None,
+    directory=None,
+    no_input=False,
+    extra_context=None,
+    config_file=None,
+    default_config=False,
+    accept_hooks=True,
+    interval=0.5,
+    callback=None,
+    max_runs=None,
+):
+    """Generate a project, then regenerate it whenever its template changes.
+
+    The template is polled every ``interval`` seconds. Generation errors,
+    such as syntax errors in the template, are logged and reported to
+    ``callback``, and the next change is generated again. Files removed from
+    the template are left in the project.
+
+    :param template: A directory containing a project template directory,
+        or a URL to a git repository, which is cloned once.
+    :param interval: Seconds between two polls of the template.
+    :param callback: Function called with the :class:`WatchRun` of each
+        generation.
+    :param max_runs: Stop after this number of generations, runs until
+        interrupted by default.
+
+    See :func:`cookieninja.main.cookiecutter` for the other parameters.
+    """
+    config_dict = get_user_config(
+        config_file=config_file, default_config=default_config
+    )
+    repo_dir, cleanup = determine_repo_dir(
+        template=template,
+        abbreviations=config_dict["abbreviations"],
+        clone_to_dir=config_dict["cookiecutters_dir"],
+        checkout=checkout,
+        no_input=no_input,
+        directory=directory,
+    )
+    watcher = _Watcher(
+        template,
+        repo_dir,
+        config_dict,
+        output_dir,
+        {
+            "no_input": no_input,
+            "extra_context": extra_context,
+            "accept_hooks": accept_hooks,
+        },
+    )
+    logger.debug("Watching %s", repo_dir)
+    # The project is not watched when generated inside the repository, as
+    # with the default output_dir and a template in the working directory.
+    # Failed runs may leave a partial project, so it is excluded as soon as
+    # its directory is known.
+    exclude = set()
+    try:
+        files = snapshot(repo_dir)
+        changed = []
+        runs = 0
+        while True:
+            run = watcher.run(changed)
+            runs += 1
+            if callback is not None:
+                callback(run)
+            if max_runs is not None and runs >= max_runs:
+                return
+            project_dir = watcher.project_dir
+            if project_dir is not None and project_dir not in exclude:
+                exclude.add(project_dir)
+                prefix = os.path.relpath(project_dir, repo_dir) + os.sep
+                files = {
+                    path: signature
+                    for path, signature in files.items()
+                    if not path.startswith(prefix)
+                }
+            while True:
+                time.sleep(interval)
+                current = snapshot(repo_dir, exclude)
+                changed = changed_paths(files, current)
+                if changed:
+                    files = current
+                    break
+    finally:
+        if cleanup:
+            rmtree(repo_dir)
@@ -5,8 +5,6 @@ from pathlib import Path
 from typing import Optional
 from zipfile import BadZipFile, ZipFile
 
-import requests
-
 from .exceptions import InvalidZipRepository
 from .prompt import read_repo_password
 from .utils import make_sure_path_exists, prompt_and_delete
@@ -49,6 +47,8 @@ def unzip(
 
         if download:
             # (Re) download the zipfile
+            import requests
+
             r = requests.get(zip_uri, stream=True)
             with open(zip_path, "wb") as f:
                 for chunk in r.iter_content(chunk_size=1024):
@@ -34,6 +34,7 @@ setup(
     include_package_data=True,
     python_requires=">=3.7",
     install_requires=requirements,
+    extras_require={"fast": ["orjson>=3.6"]},
     license="BSD",
     zip_safe=False,
     classifiers=[
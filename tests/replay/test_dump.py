@@ -1,10 +1,9 @@
 """test_dump."""
-import json
 import os
 
 import pytest
 
-from cookieninja import replay
+from cookieninja import jsonio, replay
 
 
 @pytest.fixture
@@ -87,11 +86,11 @@ def test_run_json_dump(
     replay_test_dir,
     replay_file,
 ):
-    """Test that replay.dump runs json.dump under the hood and that the context \
+    """Test that replay.dump runs jsonio.dump under the hood and that the context \
     is correctly written to the expected file in the replay_dir."""
     spy_get_replay_file = mocker.spy(replay, "get_file_name")
 
-    mock_json_dump = mocker.patch("json.dump", side_effect=json.dump)
+    mock_json_dump = mocker.patch("cookieninja.jsonio.dump", side_effect=jsonio.dump)
 
     replay.dump(replay_test_dir, template_name, context)
 
@@ -101,5 +100,17 @@ def test_run_json_dump(
 
     assert mock_json_dump.call_count == 1
     (dumped_context, outfile_handler), kwargs = mock_json_dump.call_args
-    assert outfile_handler.name == replay_file
     assert dumped_context == context
+    assert replay.load(replay_test_dir, template_name) == context
+    assert not [name for name in os.listdir(replay_test_dir) if name.endswith(".tmp")]
+
+
+def test_failed_json_dump_leaves_no_file(mocker, tmp_path, template_name):
+    """Test that a context that cannot be written leaves no temporary file."""
+    mocker.patch("cookieninja.jsonio.dump", side_effect=TypeError("not JSON"))
+    replay_dir = tmp_path / "replay"
+
+    with pytest.raises(TypeError):
+        replay.dump(str(replay_dir), template_name, {"cookiecutter": {}})
+
+    assert list(replay_dir.iterdir()) == []
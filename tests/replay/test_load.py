@@ -1,10 +1,9 @@
 """test_load."""
-import json
 import os
 
 import pytest
 
-from cookieninja import replay
+from cookieninja import jsonio, replay
 
 
 @pytest.fixture
@@ -42,11 +41,11 @@ def test_io_error_if_no_replay_file(mocker, replay_test_dir):
 def test_run_json_load(
     mocker, mock_user_config, template_name, context, replay_test_dir, replay_file
 ):
-    """Test that replay.load runs json.load under the hood and that the context \
+    """Test that replay.load runs jsonio.load under the hood and that the context \
     is correctly loaded from the file in replay_dir."""
     spy_get_replay_file = mocker.spy(replay, "get_file_name")
 
-    mock_json_load = mocker.patch("json.load", side_effect=json.load)
+    mock_json_load = mocker.patch("cookieninja.jsonio.load", side_effect=jsonio.load)
 
     loaded_context = replay.load(replay_test_dir, template_name)
 
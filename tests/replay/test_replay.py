@@ -34,13 +34,15 @@ def test_main_does_not_invoke_dump_but_load(mocker):
     mock_gen_context = mocker.patch("cookieninja.main.generate_context")
     mock_gen_files = mocker.patch("cookieninja.main.generate_files")
     mock_replay_dump = mocker.patch("cookieninja.main.dump")
-    mock_replay_load = mocker.patch("cookieninja.main.load")
+    mock_replay_record = mocker.patch("cookieninja.main.record")
+    mock_replay_load = mocker.patch("cookieninja.main.load_latest")
 
     main.cookiecutter("tests/fake-repo-tmpl/", replay=True)
 
     assert not mock_prompt.called
     assert not mock_gen_context.called
     assert not mock_replay_dump.called
+    assert not mock_replay_record.called
     assert mock_replay_load.called
     assert mock_gen_files.called
 
@@ -51,12 +53,14 @@ def test_main_does_not_invoke_load_but_dump(mocker):
     mock_gen_context = mocker.patch("cookieninja.main.generate_context")
     mock_gen_files = mocker.patch("cookieninja.main.generate_files")
     mock_replay_dump = mocker.patch("cookieninja.main.dump")
-    mock_replay_load = mocker.patch("cookieninja.main.load")
+    mock_replay_record = mocker.patch("cookieninja.main.record")
+    mock_replay_load = mocker.patch("cookieninja.main.load_latest")
 
     main.cookiecutter("tests/fake-repo-tmpl/", replay=False)
 
     assert mock_prompt.called
     assert mock_gen_context.called
     assert mock_replay_dump.called
+    assert mock_replay_record.called
     assert not mock_replay_load.called
     assert mock_gen_files.called
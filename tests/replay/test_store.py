@@ -0,0 +1,199 @@
+"""test_store."""
+import json
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from cookieninja import main, replay
+from cookieninja.exceptions import (
+    InvalidReplayEntry,
+    OutputDirExistsException,
+    UnknownReplayEntry,
+)
+
+
+@pytest.fixture
+def store(tmp_path):
+    """Fixture to return an empty replay store."""
+    return replay.ReplayStore(str(tmp_path / "replay"))
+
+
+def test_add_and_get_entry(store, context):
+    """Test that an added context is read back from its entry."""
+    entry_id = store.add("cookiedozer", context, project_dir="/tmp/out/foobar")
+
+    assert store.get(entry_id) == context
+    [entry] = store.history()
+    assert entry["id"] == entry_id
+    assert entry["project_name"] == "foobar"
+    assert entry["output_dir"] == "/tmp/out"
+
+
+def test_history_filters_by_template_project_and_time(store, context):
+    """Test indexed lookups, most recent entry first."""
+    first = store.add("cookiedozer", context, project_dir="/a", created=100)
+    second = store.add("cookiedozer", context, project_dir="/b", created=200)
+    other = store.add("pypackage", context, project_dir="/a", created=300)
+
+    ids = [entry["id"] for entry in store.history(template_name="cookiedozer")]
+    assert ids == [second, first]
+    ids = [entry["id"] for entry in store.history(project_name="a")]
+    assert ids == [other, first]
+    ids = [entry["id"] for entry in store.history(since=150, until=300)]
+    assert ids == [second]
+    assert [entry["id"] for entry in store.history(limit=1)] == [other]
+
+
+def test_concurrent_adds_keep_every_entry(store, context):
+    """Test that concurrent runs do not lose each other's entries."""
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        ids = list(pool.map(lambda i: store.add(f"t{i}", context), range(32)))
+
+    assert len(set(ids)) == 32
+    assert len(store.history()) == 32
+
+
+def test_get_unknown_entry(store):
+    """Test that a missing entry raises a dedicated exception."""
+    with pytest.raises(UnknownReplayEntry):
+        store.get(42)
+
+
+def test_cookiecutter_records_and_replays_entries(tmp_path):
+    """Test that every run is recorded and can be replayed by id."""
+    replay_dir = main.get_user_config()["replay_dir"]
+    main.cookiecutter(
+        "tests/fake-repo-pre/",
+        no_input=True,
+        extra_context={"repo_name": "first"},
+        output_dir=str(tmp_path),
+    )
+    main.cookiecutter(
+        "tests/fake-repo-pre/",
+        no_input=True,
+        extra_context={"repo_name": "second"},
+        output_dir=str(tmp_path),
+    )
+    history = replay.ReplayStore(replay_dir).history(template_name="fake-repo-pre")
+    assert [entry["project_name"] for entry in history] == ["second", "first"]
+
+    project_dir = main.cookiecutter(
+        "tests/fake-repo-pre/",
+        replay=history[1]["id"],
+        output_dir=str(tmp_path / "replayed"),
+    )
+
+    assert project_dir.endswith("first")
+
+
+def test_replay_entry_of_another_template(tmp_path):
+    """Test that entries are only replayed for the template they ran."""
+    replay_dir = main.get_user_config()["replay_dir"]
+    entry_id = replay.ReplayStore(replay_dir).add(
+        "fake-repo-tmpl", {"cookiecutter": {"repo_name": "other"}}
+    )
+
+    with pytest.raises(InvalidReplayEntry, match="run of fake-repo-tmpl"):
+        main.cookiecutter(
+            "tests/fake-repo-pre/", replay=entry_id, output_dir=str(tmp_path)
+        )
+    assert list(tmp_path.iterdir()) == [tmp_path / "home"]
+
+
+def test_replay_last_run(tmp_path):
+    """Test that ``replay=True`` replays the last run, or the replay file."""
+    replay_dir = main.get_user_config()["replay_dir"]
+    with open("tests/fake-repo-pre/cookiecutter.json") as file_handle:
+        context = {"cookiecutter": dict(json.load(file_handle), repo_name="file")}
+    replay.dump(replay_dir, "fake-repo-pre", context)
+    output_dir = tmp_path / "out"
+
+    project_dir = main.cookiecutter(
+        "tests/fake-repo-pre/", replay=True, output_dir=str(output_dir)
+    )
+    assert project_dir.endswith("file")
+
+    main.cookiecutter(
+        "tests/fake-repo-pre/",
+        no_input=True,
+        extra_context={"repo_name": "last"},
+        output_dir=str(output_dir),
+    )
+    project_dir = main.cookiecutter(
+        "tests/fake-repo-pre/", replay=True, output_dir=str(tmp_path / "replayed")
+    )
+    assert project_dir.endswith("last")
+    # The replay file is still written, for tools reading it
+    assert replay.load(replay_dir, "fake-repo-pre")["cookiecutter"]["repo_name"] == (
+        "last"
+    )
+
+
+def test_failed_runs_are_recorded(tmp_path):
+    """Test that runs are recorded before generation, projects once generated."""
+    replay_dir = main.get_user_config()["replay_dir"]
+    (tmp_path / "fake-project").mkdir()
+
+    with pytest.raises(OutputDirExistsException):
+        main.cookiecutter(
+            "tests/fake-repo-pre/",
+            no_input=True,
+            extra_context={"repo_name": "fake-project"},
+            output_dir=str(tmp_path),
+        )
+
+    [entry] = replay.ReplayStore(replay_dir).history()
+    assert entry["project_name"] is None
+    project_dir = main.cookiecutter(
+        "tests/fake-repo-pre/", replay=True, output_dir=str(tmp_path / "replayed")
+    )
+    assert project_dir.endswith("fake-project")
+    # Replays are not recorded again
+    assert len(replay.ReplayStore(replay_dir).history()) == 1
+
+    main.cookiecutter(
+        "tests/fake-repo-pre/",
+        no_input=True,
+        extra_context={"repo_name": "fake-project"},
+        output_dir=str(tmp_path / "generated"),
+    )
+    entry = replay.ReplayStore(replay_dir).history()[0]
+    assert entry["project_name"] == "fake-project"
+    assert entry["output_dir"] == str(tmp_path / "generated")
+
+
+def test_record_project_failure(tmp_path, monkeypatch, caplog):
+    """Test that an unwritable history does not fail the run."""
+
+    def set_project_dir(self, entry_id, project_dir):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(replay.ReplayStore, "set_project_dir", set_project_dir)
+
+    replay.record_project(str(tmp_path), 1, str(tmp_path / "project"))
+
+    assert "Unable to record the project" in caplog.text
+
+
+def test_record_failure(tmp_path, caplog):
+    """Test that a context the history cannot store does not fail the run."""
+    context = {"cookiecutter": {"_template": None, "value": object()}}
+
+    assert replay.record(str(tmp_path), "fake", context, str(tmp_path)) is None
+    assert "Unable to record the run" in caplog.text
+
+
+def test_replay_commit_of_local_templates(tmp_path, monkeypatch):
+    """Test that git only runs for templates at the root of a repository."""
+    monkeypatch.setattr(replay, "_template_commit", lambda repo_dir: repo_dir)
+    (tmp_path / "repo" / ".git").mkdir(parents=True)
+    (tmp_path / "repo" / "sub").mkdir()
+    repo, sub = str(tmp_path / "repo"), str(tmp_path / "repo" / "sub")
+
+    assert replay._replay_commit(repo, repo) == repo
+    assert replay._replay_commit(sub, repo) == repo
+    assert replay._replay_commit(sub, sub) is None
+    assert replay._replay_commit(sub, "gh:owner/repo") == repo
+    assert replay._replay_commit(sub, "template.zip") is None
+    assert replay._replay_commit(str(tmp_path), str(tmp_path)) is None
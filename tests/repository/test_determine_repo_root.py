@@ -0,0 +1,35 @@
+"""Tests for locating a repository holding several templates."""
+
+import pytest
+
+from cookieninja import repository, exceptions
+
+
+def test_finds_cloned_repo_root(tmp_path):
+    """A repository in the clone directory needs no cookiecutter.json."""
+    (tmp_path / "monorepo").mkdir()
+
+    repo_dir, cleanup = repository.determine_repo_root(
+        "monorepo",
+        abbreviations={},
+        clone_to_dir=str(tmp_path),
+        checkout=None,
+        no_input=True,
+    )
+
+    assert repo_dir == str(tmp_path / "monorepo")
+    assert not cleanup
+
+
+def test_repo_root_not_found(tmp_path):
+    """A missing repository raises `RepositoryNotFound`."""
+    with pytest.raises(exceptions.RepositoryNotFound) as err:
+        repository.determine_repo_root(
+            "missing-monorepo",
+            abbreviations={},
+            clone_to_dir=str(tmp_path),
+            checkout=None,
+            no_input=True,
+        )
+
+    assert "missing-monorepo" in str(err.value)
@@ -0,0 +1,11 @@
+#!/usr/bin/env python
+"""Compute a default before prompting by rewriting cookiecutter.json."""
+import json
+
+with open("cookiecutter.json") as fh:
+    context = json.load(fh)
+
+context["project_slug"] = "computed-by-hook"
+
+with open("cookiecutter.json", "w") as fh:
+    json.dump(context, fh)
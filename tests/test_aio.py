@@ -0,0 +1,396 @@
+"""Tests for the asyncio generation API."""
+import asyncio
+import os
+import shutil
+import subprocess
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from cookieninja import aio
+from cookieninja.exceptions import (
+    FailedHookException,
+    InvalidModeException,
+    RepositoryCloneFailed,
+)
+
+
+def test_cookiecutter_generates_concurrently(tmp_path):
+    """Several projects are generated concurrently in one event loop."""
+
+    async def generate_all():
+        return await asyncio.gather(
+            *(
+                aio.cookiecutter(
+                    "tests/fake-repo-pre",
+                    no_input=True,
+                    extra_context={"repo_name": name},
+                    output_dir=str(tmp_path),
+                )
+                for name in ("one", "two", "three")
+            )
+        )
+
+    project_dirs = asyncio.run(generate_all())
+
+    assert [os.path.basename(p) for p in project_dirs] == ["one", "two", "three"]
+    for project_dir in project_dirs:
+        assert "Fake Project" in Path(project_dir, "README.rst").read_text()
+
+
+def test_generate_files_runs_hooks(tmp_path):
+    """Pre and post generation hooks run as subprocesses of the loop."""
+    project_dir = asyncio.run(
+        aio.generate_files(
+            "tests/test-pyhooks",
+            {"cookiecutter": {"pyhooks": "pyhooks"}},
+            output_dir=str(tmp_path),
+        )
+    )
+
+    assert Path(project_dir, "python_pre.txt").exists()
+    assert Path(project_dir, "python_post.txt").exists()
+
+
+def test_run_script_failure(tmp_path):
+    """A failing script raises FailedHookException."""
+    script = tmp_path / "hook.py"
+    script.write_text("import sys; sys.exit(3)")
+
+    with pytest.raises(FailedHookException, match="exit status: 3"):
+        asyncio.run(aio.run_script(str(script), str(tmp_path)))
+
+
+def test_run_script_cancellation_kills_script(tmp_path):
+    """Cancelling the task kills the running script."""
+    script = tmp_path / "hook.py"
+    script.write_text("import time; open('started', 'w').close(); time.sleep(30)")
+
+    async def cancel():
+        task = asyncio.ensure_future(aio.run_script(str(script), str(tmp_path)))
+        while not (tmp_path / "started").exists():
+            await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    start = time.monotonic()
+    asyncio.run(cancel())
+
+    assert time.monotonic() - start < 10
+
+
+@pytest.fixture
+def git_repo(tmp_path):
+    """Fixture. Local git repository holding a template."""
+    repo_dir = tmp_path / "template-repo"
+    repo_dir.mkdir()
+    (repo_dir / "cookiecutter.json").write_text('{"name": "demo"}')
+
+    def git(*args):
+        subprocess.run(
+            ["git", "-c", "user.name=t", "-c", "user.email=t@t", *args],
+            cwd=str(repo_dir),
+            check=True,
+            capture_output=True,
+        )
+
+    git("init", "-q")
+    git("add", ".")
+    git("commit", "-q", "-m", "Initial")
+    return repo_dir
+
+
+def test_clone(git_repo, tmp_path):
+    """A repository is cloned with an asyncio subprocess."""
+    repo_dir = asyncio.run(
+        aio.clone(f"git+file://{git_repo}", clone_to_dir=str(tmp_path / "clones"))
+    )
+
+    assert Path(repo_dir, "cookiecutter.json").read_text() == '{"name": "demo"}'
+
+
+def test_clone_unknown_branch(git_repo, tmp_path):
+    """A missing branch is reported like in the sync API."""
+    with pytest.raises(RepositoryCloneFailed):
+        asyncio.run(
+            aio.clone(
+                f"git+file://{git_repo}",
+                checkout="no-such-branch",
+                clone_to_dir=str(tmp_path / "clones"),
+            )
+        )
+
+
+def test_generate_files_cancellation_removes_project(tmp_path):
+    """Cancelling during a hook kills it and removes the new project."""
+    repo_dir = tmp_path / "repo"
+    (repo_dir / "hooks").mkdir(parents=True)
+    (repo_dir / "{{cookiecutter.name}}").mkdir()
+    (repo_dir / "hooks" / "pre_gen_project.py").write_text(
+        "import time; open('started', 'w').close(); time.sleep(30)"
+    )
+    output_dir = tmp_path / "out"
+
+    async def cancel():
+        task = asyncio.ensure_future(
+            aio.generate_files(
+                str(repo_dir), {"cookiecutter": {"name": "demo"}}, str(output_dir)
+            )
+        )
+        while not (output_dir / "demo" / "started").exists():
+            await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel())
+
+    assert not (output_dir / "demo").exists()
+
+
+def test_cookiecutter_replay_and_nested_templates(tmp_path, mocker):
+    """Replays and nested templates are handled like in the sync API."""
+    output_dir = str(tmp_path / "out")
+    project_dir = asyncio.run(
+        aio.cookiecutter("tests/fake-repo-pre", no_input=True, output_dir=output_dir)
+    )
+    Path(project_dir, "README.rst").unlink()
+
+    asyncio.run(
+        aio.cookiecutter(
+            "tests/fake-repo-pre",
+            replay=True,
+            overwrite_if_exists=True,
+            output_dir=output_dir,
+        )
+    )
+
+    assert Path(project_dir, "README.rst").exists()
+    generate = mocker.patch("cookieninja.aio._generate_files", return_value="done")
+    result = asyncio.run(
+        aio.cookiecutter(
+            "tests/fake-nested-templates", no_input=True, accept_hooks=False
+        )
+    )
+    assert result == "done"
+    assert generate.call_args[0][0] == os.path.join(
+        "tests", "fake-nested-templates", "fake-project"
+    )
+
+
+def test_cookiecutter_invalid_mode():
+    """Replays do not take input."""
+    with pytest.raises(InvalidModeException):
+        asyncio.run(aio.cookiecutter("tests/fake-repo-pre", replay=True, no_input=True))
+
+
+def test_cookiecutter_from_zip(tmp_path):
+    """Zip files are unpacked in the executor and removed afterwards."""
+    project_dir = asyncio.run(
+        aio.cookiecutter(
+            "tests/files/fake-repo-tmpl.zip",
+            no_input=True,
+            output_dir=str(tmp_path / "out"),
+        )
+    )
+
+    assert Path(project_dir, "README.rst").exists()
+    assert not list(Path(tmp_path, "home").glob("**/fake-repo-tmpl"))
+
+
+def test_cookiecutter_pre_prompt_hook(tmp_path):
+    """The pre_prompt hook computes the defaults, its scratch copy is removed."""
+    project_dir = asyncio.run(
+        aio.cookiecutter(
+            "tests/test-pre-prompt-hook",
+            no_input=True,
+            output_dir=str(tmp_path / "out"),
+        )
+    )
+
+    assert os.path.basename(project_dir) == "computed-by-hook"
+
+
+def test_pre_prompt_hook_leaves_template_unchanged(tmp_path):
+    """A hook script needing the executable bit runs from a copy."""
+    (tmp_path / "cookiecutter.json").write_text('{"name": "x"}')
+    (tmp_path / "hooks").mkdir()
+    script = tmp_path / "hooks" / "pre_prompt.sh"
+    script.write_text('#!/bin/sh\necho \'{"name": "y"}\' > cookiecutter.json\n')
+    script.chmod(0o644)
+
+    context_file = asyncio.run(aio.run_pre_prompt_hook(str(tmp_path)))
+
+    assert Path(context_file).read_text() == '{"name": "y"}\n'
+    assert script.stat().st_mode & 0o777 == 0o644
+    shutil.rmtree(os.path.dirname(context_file))
+
+
+@pytest.mark.parametrize(
+    "error", [FailedHookException("failed"), asyncio.CancelledError()]
+)
+def test_pre_prompt_hook_failure(error, monkeypatch, tmp_path):
+    """The scratch copy is removed when a pre_prompt hook fails."""
+    scratch_dir = tmp_path / "scratch"
+    scratch_dir.mkdir()
+    monkeypatch.setattr(aio.tempfile, "mkdtemp", lambda prefix: str(scratch_dir))
+
+    async def run_script(script_path, cwd):
+        raise error
+
+    monkeypatch.setattr(aio, "run_script", run_script)
+
+    with pytest.raises(type(error)):
+        asyncio.run(aio.run_pre_prompt_hook("tests/test-pre-prompt-hook"))
+    assert not scratch_dir.exists()
+
+
+def test_generate_files_cancelled_while_rendering(monkeypatch):
+    """Hooks are not started once rendering finished after a cancellation."""
+    events = []
+    errors = []
+
+    class Event(threading.Event):
+        def __init__(self):
+            super().__init__()
+            events.append(self)
+
+    def generate_files(repo_dir, context, output_dir, hook_runner):
+        events[0].wait()
+        try:
+            hook_runner("post_gen_project", output_dir, context, {})
+        except FailedHookException as err:
+            errors.append(err)
+            raise
+
+    monkeypatch.setattr(aio.threading, "Event", Event)
+    monkeypatch.setattr(aio, "_generate_files", generate_files)
+
+    async def cancel():
+        task = asyncio.ensure_future(aio.generate_files("repo", {}, "out"))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel())
+
+    assert [str(err) for err in errors] == ["Generation was cancelled"]
+
+
+def test_run_hook_without_hooks(tmp_path, monkeypatch):
+    """Templates without the hook run nothing."""
+    monkeypatch.chdir(tmp_path)
+
+    asyncio.run(aio.run_hook("pre_gen_project", str(tmp_path), {}))
+
+
+def test_run_script_cannot_start(tmp_path, monkeypatch):
+    """Scripts that cannot be started raise FailedHookException."""
+    script = tmp_path / "hook.sh"
+    script.write_text("echo no shebang\n")
+
+    with pytest.raises(FailedHookException, match="missing a shebang"):
+        asyncio.run(aio.run_script(str(script), str(tmp_path)))
+
+    async def create_process(command, cwd):
+        raise PermissionError("denied")
+
+    monkeypatch.setattr(aio, "_create_process", create_process)
+    with pytest.raises(FailedHookException, match="error: denied"):
+        asyncio.run(aio.run_script(str(script), str(tmp_path)))
+
+
+def test_create_process_on_windows(monkeypatch):
+    """Commands run through the shell on Windows."""
+    calls = []
+
+    async def create_subprocess_shell(command, cwd):
+        calls.append((command, cwd))
+
+    monkeypatch.setattr(aio.sys, "platform", "win32")
+    monkeypatch.setattr(aio.asyncio, "create_subprocess_shell", create_subprocess_shell)
+
+    asyncio.run(aio._create_process(["hook", "a b"], "dir"))
+
+    assert calls == [('hook "a b"', "dir")]
+
+
+def test_wait_cancelled_after_exit():
+    """Processes that already exited are not killed."""
+
+    class Process:
+        returncode = 0
+
+        async def wait(self):
+            raise asyncio.CancelledError
+
+        def kill(self):
+            raise AssertionError("killed")
+
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(aio._wait(Process()))
+
+
+def test_clone_existing(git_repo, tmp_path, monkeypatch):
+    """Existing clones are replaced or kept as the user chooses."""
+    url = f"git+file://{git_repo}"
+    clones = str(tmp_path / "clones")
+    repo_dir = asyncio.run(aio.clone(url, clone_to_dir=clones))
+    Path(repo_dir, "local").write_text("local")
+
+    assert asyncio.run(aio.clone(url, clone_to_dir=clones, no_input=True)) == repo_dir
+    assert not Path(repo_dir, "local").exists()
+
+    Path(repo_dir, "local").write_text("local")
+    monkeypatch.setattr(aio.utils, "prompt_and_delete", lambda *args: False)
+    assert asyncio.run(aio.clone(url, clone_to_dir=clones)) == repo_dir
+    assert Path(repo_dir, "local").exists()
+
+
+def test_clone_failures(git_repo, tmp_path, monkeypatch):
+    """Unknown clone errors are raised, cancelled clones are removed."""
+    url = f"git+file://{git_repo}"
+    clones = tmp_path / "clones"
+    monkeypatch.setattr(aio.vcs, "_clone_error", lambda *args: None)
+
+    with pytest.raises(subprocess.CalledProcessError):
+        asyncio.run(aio.clone(url, checkout="no-such-branch", clone_to_dir=clones))
+
+    async def wait(proc, communicate=False):
+        await proc.communicate()
+        raise asyncio.CancelledError
+
+    monkeypatch.setattr(aio, "_wait", wait)
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(aio.clone(url, clone_to_dir=clones, no_input=True))
+    assert not (clones / "template-repo").exists()
+
+
+def test_cookiecutter_from_repository(git_repo, mocker):
+    """Repositories are cloned to the cookiecutters directory and kept."""
+    generate = mocker.patch("cookieninja.aio._generate_files", return_value="done")
+
+    asyncio.run(aio.cookiecutter(f"git+file://{git_repo}", no_input=True))
+
+    repo_dir = generate.call_args[0][0]
+    assert os.path.basename(repo_dir) == "template-repo"
+    assert os.path.isdir(repo_dir)
+
+
+def test_run_script_skips_chmod(mocker, tmp_path):
+    """Executable scripts, or scripts run by an interpreter, are not changed."""
+    make_executable = mocker.patch("cookieninja.utils.make_executable")
+    script = tmp_path / "pre_prompt.sh"
+    script.write_text("#!/bin/sh\n")
+    script.chmod(0o755)
+    asyncio.run(aio.run_script(str(script), str(tmp_path)))
+
+    python_script = tmp_path / "pre_prompt.py"
+    python_script.write_text("")
+    asyncio.run(aio.run_script(str(python_script), str(tmp_path)))
+
+    make_executable.assert_not_called()
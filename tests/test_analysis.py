@@ -0,0 +1,236 @@
+"""Tests for the static analysis of template variables."""
+import os
+from pathlib import Path
+
+import pytest
+
+from cookieninja import analysis, generate
+from cookieninja.environment import get_environment, StrictEnvironment
+from cookieninja.exceptions import UndefinedVariableInTemplate
+
+
+@pytest.fixture
+def env():
+    """Fixture. Plain environment to parse templates with."""
+    return StrictEnvironment(keep_trailing_newline=True)
+
+
+@pytest.mark.parametrize(
+    "source, expected",
+    [
+        ("plain text", set()),
+        ("{{ cookiecutter.name }}", {"name"}),
+        ("{{ cookiecutter['name'] }}-{{ cookiecutter.version }}", {"name", "version"}),
+        ("{% for k in cookiecutter %}{{ k }}{% endfor %}", None),
+        ("{{ cookiecutter.get('name') }}", None),
+        ("{{ cookiecutter[key] }}", None),
+    ],
+)
+def test_cookiecutter_references(env, source, expected):
+    """Constant lookups are listed, any other use is dynamic."""
+    assert analysis.cookiecutter_references(env.parse(source)) == expected
+
+
+def test_guarded_references(env):
+    """Variables tested for definition or defaulted are guarded."""
+    tree = env.parse(
+        "{% if cookiecutter.a is defined %}{{ cookiecutter.a }}{% endif %}"
+        "{{ cookiecutter.b|default('x') }}{{ cookiecutter.c }}"
+    )
+    assert analysis.guarded_references(tree) == {"a", "b"}
+
+
+def test_analyze_template_includes_shared_templates():
+    """Variables used in included shared templates count for the includer."""
+    template_dir = "tests/test-templates/include/{{cookiecutter.project_slug}}"
+    context = {"cookiecutter": {"project_slug": "foobar"}}
+
+    result = analysis.analyze_template(template_dir, context, get_environment(context))
+
+    assert result.variables("requirements.txt") == {
+        "command_line_interface",
+        "use_pytest",
+    }
+    assert result.undefined_variables(context) == {
+        "requirements.txt": ["command_line_interface", "use_pytest"]
+    }
+
+
+def test_analyze_template_reuses_unmodified_files(tmp_path):
+    """A second analysis only re-reads files whose stat changed."""
+    template_dir = tmp_path / "{{cookiecutter.name}}"
+    template_dir.mkdir()
+    (template_dir / "a.txt").write_text("{{ cookiecutter.a }}")
+    (template_dir / "b.txt").write_text("{{ cookiecutter.b }}")
+    context = {"cookiecutter": {"name": "x", "a": 1, "b": 2}}
+    env = get_environment(context)
+
+    first = analysis.analyze_template(str(template_dir), context, env)
+    (template_dir / "b.txt").write_text("{{ cookiecutter.c }}")
+    os.utime(template_dir / "b.txt", ns=(1, 1))
+    second = analysis.analyze_template(str(template_dir), context, env)
+
+    assert second.files["a.txt"] is first.files["a.txt"]
+    assert second.variables("b.txt") == {"c"}
+    assert second.unchanged_files(first, context, context) == {"a.txt"}
+
+
+def test_unchanged_files_tracks_variable_values(tmp_path):
+    """Only files using a changed variable are reported as changed."""
+    template_dir = tmp_path / "{{cookiecutter.name}}"
+    template_dir.mkdir()
+    (template_dir / "a.txt").write_text("{{ cookiecutter.a }}")
+    (template_dir / "b.txt").write_text("{{ cookiecutter.b }}")
+    old_context = {"cookiecutter": {"name": "x", "a": 1, "b": 2}}
+    new_context = {"cookiecutter": {"name": "x", "a": 1, "b": 3}}
+
+    result = analysis.analyze_template(
+        str(template_dir), new_context, get_environment(new_context)
+    )
+
+    assert result.unchanged_files(result, old_context, new_context) == {"a.txt"}
+
+
+def test_generate_files_preflight_writes_nothing(tmp_path):
+    """Undefined variables are reported before the project dir is created."""
+    context = {"cookiecutter": {"project_slug": "testproject"}}
+    output_dir = tmp_path / "out"
+
+    with pytest.raises(UndefinedVariableInTemplate) as err:
+        generate.generate_files(
+            repo_dir="tests/undefined-variable/file-content/",
+            output_dir=str(output_dir),
+            context=context,
+            preflight=True,
+        )
+
+    assert "'README.rst' uses foobar, github_username" in err.value.message
+    assert not output_dir.exists()
+
+
+def test_generate_files_skips_unchanged_files(tmp_path):
+    """Files whose inputs did not change since the last run are not rewritten."""
+    repo_dir = tmp_path / "repo"
+    template_dir = repo_dir / "{{cookiecutter.name}}"
+    template_dir.mkdir(parents=True)
+    (template_dir / "a.txt").write_text("{{ cookiecutter.a }}")
+    (template_dir / "b.txt").write_text("{{ cookiecutter.b }}")
+    output_dir = tmp_path / "out"
+    context = {"cookiecutter": {"name": "x", "a": "1", "b": "2"}}
+    generate.generate_files(str(repo_dir), context, output_dir=str(output_dir))
+    previous = analysis.analyze_template(
+        str(template_dir), context, get_environment(context)
+    )
+
+    Path(output_dir, "x", "a.txt").write_text("edited")
+    new_context = {"cookiecutter": {"name": "x", "a": "1", "b": "3"}}
+    generate.generate_files(
+        str(repo_dir),
+        new_context,
+        output_dir=str(output_dir),
+        overwrite_if_exists=True,
+        previous_analysis=previous,
+        previous_context=context,
+    )
+
+    assert Path(output_dir, "x", "a.txt").read_text() == "edited"
+    assert Path(output_dir, "x", "b.txt").read_text() == "3"
+
+
+def test_guarded_references_ignore_other_names(env):
+    """Only ``cookiecutter`` variables are guarded."""
+    tree = env.parse("{% if name is defined %}{{ name|default('x') }}{% endif %}")
+    assert analysis.guarded_references(tree) == set()
+
+
+def test_analyze_file_dynamic_name_and_undecodable_body(env, tmp_path):
+    """A file whose name uses the whole context may use any variable."""
+    path = tmp_path / "file.txt"
+    path.write_bytes(b"\xff{{ cookiecutter.a }}")
+
+    result = analysis._analyze_file(
+        env, str(path), "{{ cookiecutter|length }}", True, (0, 0)
+    )
+
+    assert result.variables is None
+
+
+@pytest.fixture
+def template(tmp_path):
+    """Fixture. Template with shared templates, a copied file and hooks."""
+    repo_dir = tmp_path / "repo"
+    template_dir = repo_dir / "{{cookiecutter.name}}"
+    template_dir.mkdir(parents=True)
+    (repo_dir / "templates").mkdir()
+    (repo_dir / "hooks").mkdir()
+    (template_dir / "main.txt").write_text(
+        "{% include 'shared.txt' %}{% include 'inner.txt' %}"
+        "{% include 'missing.txt' ignore missing %}"
+    )
+    (template_dir / "all.txt").write_text("{{ cookiecutter|length }}")
+    (template_dir / "plain.txt").write_text("plain")
+    (template_dir / "copied.txt").write_text("{{ cookiecutter.copied }}")
+    (repo_dir / "templates" / "shared.txt").write_text("{% include 'inner.txt' %}")
+    (repo_dir / "templates" / "inner.txt").write_text("{{ cookiecutter.inner }}")
+    (repo_dir / "hooks" / "post_gen_project.py").write_text("{{ cookiecutter.hook }}")
+    (repo_dir / "hooks" / "pre_prompt.py").write_text("{{ cookiecutter.prompt }}")
+    return template_dir
+
+
+def test_analyze_template_shared_copied_and_hooks(template):
+    """Shared templates are followed once, copied files are not analysed."""
+    context = {
+        "cookiecutter": {"name": "x", "_copy_without_render": ["copied.txt"]},
+    }
+    env = get_environment(context)
+
+    first = analysis.analyze_template(str(template), context, env)
+    second = analysis.analyze_template(str(template), context, env)
+
+    assert first.variables("main.txt") == {"inner"}
+    assert first.variables("all.txt") is None
+    assert first.variables("copied.txt") == set()
+    assert second.hooks["post_gen_project.py"] is first.hooks["post_gen_project.py"]
+    assert "pre_prompt.py" not in first.hooks
+    assert first.undefined_variables(context) == {
+        "main.txt": ["inner"],
+        os.path.join("hooks", "post_gen_project.py"): ["hook"],
+    }
+
+    context["cookiecutter"]["_copy_without_render"] = []
+    third = analysis.analyze_template(str(template), context, env)
+    assert third.files["plain.txt"] is not first.files["plain.txt"]
+    assert third.variables("copied.txt") == {"copied"}
+
+
+def test_unchanged_files_with_dynamic_variables(template):
+    """Files that may use any variable change with any value of the context."""
+    context = {"cookiecutter": {"name": "x", "inner": 1}}
+    result = analysis.analyze_template(str(template), context, get_environment(context))
+
+    assert "all.txt" in result.unchanged_files(result, context, context)
+    changed = {"cookiecutter": {"name": "x", "inner": 2}}
+    unchanged = result.unchanged_files(result, context, changed)
+    assert unchanged == {"plain.txt", "copied.txt"}
+
+
+def test_analyze_template_with_custom_delimiters(template):
+    """Hooks keep the default delimiters, analyses are cached per syntax."""
+    context = {
+        "cookiecutter": {
+            "name": "x",
+            "_jinja2_env_vars": {
+                "variable_start_string": "[[",
+                "variable_end_string": "]]",
+            },
+        }
+    }
+    default = analysis.analyze_template(
+        str(template), context, get_environment(context, env_vars=False)
+    )
+
+    result = analysis.analyze_template(str(template), context, get_environment(context))
+
+    assert result.variables("copied.txt") == set()
+    assert default.variables("copied.txt") == {"copied"}
+    assert result.hooks["post_gen_project.py"].variables == {"hook"}
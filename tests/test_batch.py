@@ -0,0 +1,157 @@
+"""Tests for generating a batch of projects."""
+import asyncio
+import os
+import shutil
+
+import pytest
+
+from cookieninja.batch import generate_batch
+
+LICENSE = "Permission is hereby granted, free of charge.\n" * 20
+LOGO = bytes(range(256)) * 4
+
+
+@pytest.fixture
+def template(tmp_path):
+    """Return a template with shared rendered, binary and copied files."""
+    path = tmp_path / "template"
+    project = path / "{{cookiecutter.name}}"
+    (project / "assets").mkdir(parents=True)
+    (path / "cookiecutter.json").write_text(
+        '{"name": "a", "_copy_without_render": ["assets"]}'
+    )
+    (project / "LICENSE").write_text(LICENSE)
+    (project / "README.md").write_text("# {{ cookiecutter.name }}\n")
+    (project / "logo.png").write_bytes(LOGO)
+    (project / "assets" / "style.css").write_text("{{ not rendered }}\n")
+    return str(path)
+
+
+def test_generate_batch(template, tmp_path):
+    """Each context gives a project, failures are returned."""
+    output_dir = tmp_path / "output"
+
+    result = generate_batch(
+        template,
+        [{"name": "one"}, {"name": "two"}, {"name": "one"}],
+        output_dir=str(output_dir),
+        default_config=True,
+        max_workers=1,
+    )
+
+    assert result.projects == [str(output_dir / "one"), str(output_dir / "two"), None]
+    assert list(result.errors) == [2]
+    assert (output_dir / "two" / "README.md").read_text() == "# two\n"
+    assert (result.bytes_written, result.bytes_saved) == (0, 0)
+
+
+def test_generate_batch_dedup(template, tmp_path, monkeypatch):
+    """Identical files are stored once and reflinked into every project."""
+    # Stands for a filesystem with reflinks
+    monkeypatch.setattr("cookieninja.sinks.reflink", shutil.copyfile)
+    output_dir = tmp_path / "output"
+    names = ["one", "two", "three"]
+
+    result = generate_batch(
+        template,
+        [{"name": name} for name in names],
+        output_dir=str(output_dir),
+        default_config=True,
+        dedup=True,
+    )
+
+    assert result.errors == {}
+    assert sorted(os.listdir(output_dir)) == sorted(names)
+    shared = len(LICENSE) + len(LOGO) + len("{{ not rendered }}\n")
+    readmes = sum(len(f"# {name}\n") for name in names)
+    assert result.bytes_written == shared + readmes
+    assert result.bytes_saved == 2 * shared
+    for name in names:
+        project = output_dir / name
+        assert (project / "LICENSE").read_text() == LICENSE
+        assert (project / "logo.png").read_bytes() == LOGO
+        assert (project / "assets" / "style.css").read_text() == "{{ not rendered }}\n"
+        assert (project / "README.md").read_text() == f"# {name}\n"
+
+
+def test_generate_batch_dedup_without_reflinks(template, tmp_path, monkeypatch):
+    """Without reflinks files are written to each project, never shared."""
+
+    def reflink(src, dst):
+        raise OSError("Reflinks are not supported")
+
+    monkeypatch.setattr("cookieninja.sinks.reflink", reflink)
+    output_dir = tmp_path / "output"
+
+    result = generate_batch(
+        template,
+        [{"name": "one"}, {"name": "two"}],
+        output_dir=str(output_dir),
+        default_config=True,
+        dedup=True,
+    )
+
+    assert result.errors == {}
+    shared = len(LICENSE) + len(LOGO) + len("{{ not rendered }}\n")
+    readmes = len("# one\n") + len("# two\n")
+    assert (result.bytes_written, result.bytes_saved) == (2 * shared + readmes, 0)
+    one, two = output_dir / "one" / "LICENSE", output_dir / "two" / "LICENSE"
+    assert os.stat(one).st_nlink == 1
+    assert not os.path.samefile(one, two)
+    one.write_text("edited\n")
+    assert two.read_text() == LICENSE
+
+
+def test_generate_batch_removes_unpacked_template(tmp_path):
+    """A template unpacked for the batch is removed once it is done."""
+    output_dir = tmp_path / "output"
+
+    result = generate_batch(
+        "tests/files/fake-repo-tmpl.zip",
+        [{"project_name": "one"}],
+        output_dir=str(output_dir),
+        config_file=None,
+        default_config=True,
+    )
+
+    assert result.errors == {}
+    assert not os.path.exists(os.path.expanduser("~/.cookiecutters/fake-repo-tmpl"))
+
+
+def test_generate_batch_cancelled(template, tmp_path, monkeypatch):
+    """Cancellations are raised instead of being returned as failures."""
+
+    async def cancelled(*args, **kwargs):
+        raise asyncio.CancelledError
+
+    monkeypatch.setattr("cookieninja.aio._cookiecutter_in_repo", cancelled)
+
+    with pytest.raises(asyncio.CancelledError):
+        generate_batch(
+            template,
+            [{"name": "one"}],
+            output_dir=str(tmp_path / "output"),
+            default_config=True,
+        )
+
+
+def test_generate_batch_dedup_regenerate(template, tmp_path):
+    """Regenerating a deduplicated batch leaves unchanged files alone."""
+    output_dir = tmp_path / "output"
+    contexts = [{"name": "one"}, {"name": "two"}]
+    options = {"output_dir": str(output_dir), "default_config": True, "dedup": True}
+    generate_batch(template, contexts, **options)
+    (output_dir / "one" / "LICENSE").write_text("edited\n")
+
+    result = generate_batch(
+        template,
+        contexts,
+        overwrite_if_exists=True,
+        compare_before_write=True,
+        **options,
+    )
+
+    assert result.errors == {}
+    assert result.bytes_written == len(LICENSE)
+    assert (output_dir / "one" / "LICENSE").read_text() == LICENSE
+    assert (output_dir / "two" / "LICENSE").read_text() == LICENSE
@@ -0,0 +1,418 @@
+"""Tests for the caches of generation results."""
+import os
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+from jinja2 import FileSystemLoader
+
+from cookieninja import cache as cache_module
+from cookieninja import generate
+from cookieninja.cache import OutputCache, RenderCache, is_deterministic
+from cookieninja.environment import StrictEnvironment, get_environment
+
+
+@pytest.fixture
+def env(tmp_path):
+    """Fixture. Environment loading templates from a temporary directory."""
+    environment = StrictEnvironment(keep_trailing_newline=True)
+    environment.loader = FileSystemLoader(str(tmp_path / "template"))
+    return environment
+
+
+@pytest.fixture
+def template_dir(tmp_path):
+    """Fixture. Empty template directory."""
+    path = tmp_path / "template"
+    path.mkdir()
+    return path
+
+
+@pytest.mark.parametrize(
+    "source, expected",
+    [
+        ("{{ cookiecutter.name|upper }}", True),
+        ("{{ cookiecutter.name|slugify }}", True),
+        ("{% for i in range(3) %}{{ i }}{% endfor %}", True),
+        ("{{ uuid4() }}", False),
+        ("{{ random_ascii_string(8) }}", False),
+        ("{% now 'utc' %}", False),
+        ("{{ [1, 2]|random }}", False),
+        ("{{ unknown_global }}", False),
+        ("{{ cookiecutter.name is defined }}", True),
+    ],
+)
+def test_is_deterministic(env, source, expected):
+    """Random values, times and unknown names are non-deterministic."""
+    assert is_deterministic(env, env.parse(source)) is expected
+
+
+def test_render_cache_key_depends_on_used_variables_only(env, template_dir, tmp_path):
+    """Changing a variable the template does not use keeps the key."""
+    (template_dir / "a.txt").write_text("{{ cookiecutter.a }}")
+    cache = RenderCache(str(tmp_path / "cache"))
+
+    key = cache.key(env, "a.txt", {"cookiecutter": {"a": 1, "b": 2}})
+
+    assert key == cache.key(env, "a.txt", {"cookiecutter": {"a": 1, "b": 3}})
+    assert key != cache.key(env, "a.txt", {"cookiecutter": {"a": 2, "b": 2}})
+
+
+def test_render_cache_key_follows_includes(env, template_dir, tmp_path):
+    """Included templates are part of the key."""
+    (template_dir / "a.txt").write_text("{% include 'inc.txt' %}")
+    (template_dir / "inc.txt").write_text("{{ cookiecutter.b }}")
+    cache = RenderCache(str(tmp_path / "cache"))
+    context = {"cookiecutter": {"b": 1}}
+    key = cache.key(env, "a.txt", context)
+
+    (template_dir / "inc.txt").write_text("{{ cookiecutter.b }}!")
+
+    assert cache.key(env, "a.txt", context) != key
+    assert cache.key(env, "a.txt", {"cookiecutter": {"b": 2}}) != key
+
+
+def test_render_cache_skips_nondeterministic_templates(env, template_dir, tmp_path):
+    """Templates using random values get no key."""
+    (template_dir / "a.txt").write_text("{{ uuid4() }}")
+    cache = RenderCache(str(tmp_path / "cache"))
+
+    assert cache.key(env, "a.txt", {"cookiecutter": {}}) is None
+
+
+def test_generate_file_copies_cached_rendering(env, template_dir, tmp_path, mocker):
+    """A cache hit copies the stored output instead of rendering."""
+    (template_dir / "a.txt").write_text("Hello {{ cookiecutter.name }}")
+    cache = RenderCache(str(tmp_path / "cache"))
+    context = {"cookiecutter": {"name": "world"}}
+    first = tmp_path / "first"
+    second = tmp_path / "second"
+    first.mkdir()
+    second.mkdir()
+
+    generate.generate_file(
+        str(first),
+        "a.txt",
+        context,
+        env,
+        render_cache=cache,
+        template_dir=str(template_dir),
+    )
+    get_template = mocker.patch.object(env, "get_template")
+    generate.generate_file(
+        str(second),
+        "a.txt",
+        context,
+        env,
+        render_cache=cache,
+        template_dir=str(template_dir),
+    )
+
+    assert not get_template.called
+    assert Path(second, "a.txt").read_text() == "Hello world"
+
+
+@pytest.fixture
+def template_repo(tmp_path):
+    """Fixture. Template repository with one rendered file."""
+    repo_dir = tmp_path / "repo"
+    project = repo_dir / "{{cookiecutter.name}}"
+    project.mkdir(parents=True)
+    (project / "README.txt").write_text("{{ cookiecutter.name }}")
+    return repo_dir
+
+
+def test_output_cache_materializes_stored_project(template_repo, tmp_path, mocker):
+    """Generating twice with the same context renders once."""
+    cache = OutputCache(str(tmp_path / "cache"))
+    context = {"cookiecutter": {"name": "demo"}}
+    generate.generate_files(
+        str(template_repo), context, output_dir=str(tmp_path / "a"), output_cache=cache
+    )
+
+    render_tree = mocker.patch("cookieninja.generate._render_tree")
+    project_dir = generate.generate_files(
+        str(template_repo), context, output_dir=str(tmp_path / "b"), output_cache=cache
+    )
+
+    assert not render_tree.called
+    assert Path(project_dir, "README.txt").read_text() == "demo"
+
+
+def test_output_cache_key_ignores_output_location(template_repo, tmp_path):
+    """The output directory is not part of the key, the answers are."""
+    cache = OutputCache(str(tmp_path / "cache"))
+    template_dir = str(template_repo / "{{cookiecutter.name}}")
+    env = StrictEnvironment()
+
+    def key(**values):
+        return cache.key(
+            str(template_repo), template_dir, env, {"cookiecutter": values}
+        )
+
+    assert key(name="a", _output_dir="x") == key(name="a", _output_dir="y")
+    assert key(name="a") != key(name="b")
+
+
+def test_output_cache_skips_nondeterministic_templates(template_repo, tmp_path):
+    """Templates rendering random values are never cached."""
+    template_dir = template_repo / "{{cookiecutter.name}}"
+    (template_dir / "id.txt").write_text("{{ uuid4() }}")
+    cache = OutputCache(str(tmp_path / "cache"))
+
+    key = cache.key(
+        str(template_repo),
+        str(template_dir),
+        StrictEnvironment(),
+        {"cookiecutter": {"name": "demo"}},
+    )
+
+    assert key is None
+
+
+def test_output_cache_bypass_policy_ignores_templates_with_hooks(tmp_path):
+    """With the bypass policy, templates with hooks are not cached."""
+    cache = OutputCache(str(tmp_path / "cache"), hooks="bypass")
+    template_dir = "tests/test-pyhooks/input{{cookiecutter.pyhooks}}"
+
+    key = cache.key(
+        "tests/test-pyhooks", template_dir, StrictEnvironment(), {"cookiecutter": {}}
+    )
+
+    assert key is None
+
+
+def test_output_cache_evicts_least_recently_used(template_repo, tmp_path):
+    """Entries beyond the size bound are evicted, oldest use first."""
+    cache = OutputCache(str(tmp_path / "cache"), max_size=10)
+    for name in ("first", "second"):
+        generate.generate_files(
+            str(template_repo),
+            {"cookiecutter": {"name": name}},
+            output_dir=str(tmp_path / "out"),
+            output_cache=cache,
+        )
+
+    assert len(os.listdir(cache.cache_dir)) == 1
+    remaining = Path(cache.cache_dir, os.listdir(cache.cache_dir)[0])
+    assert (remaining / "project" / "README.txt").read_text() == "second"
+
+
+def test_is_deterministic_custom_filters_and_tests(env):
+    """Filters and tests unknown to the default environment may be random."""
+    env.filters["shout"] = str.upper
+    env.tests["lucky"] = lambda value: True
+
+    assert not is_deterministic(env, env.parse("{{ cookiecutter.a|shout }}"))
+    assert not is_deterministic(env, env.parse("{{ cookiecutter.a is lucky }}"))
+
+
+def test_render_cache_key_edge_cases(env, template_dir, tmp_path):
+    """Broken templates get no key, dynamic lookups use every variable."""
+    (template_dir / "broken.txt").write_text("{{ cookiecutter.a ")
+    (template_dir / "missing.txt").write_text("{% include 'unknown.txt' %}")
+    (template_dir / "twice.txt").write_text(
+        "{% include 'one.txt' %}{% include 'all.txt' %}{% include 'all.txt' %}"
+    )
+    (template_dir / "all.txt").write_text("{{ cookiecutter|length }}")
+    (template_dir / "one.txt").write_text("{{ cookiecutter.a }}")
+    cache = RenderCache(str(tmp_path / "cache"))
+
+    assert cache.key(env, "broken.txt", {"cookiecutter": {}}) is None
+    assert cache.key(env, "missing.txt", {"cookiecutter": {}}) is None
+    key = cache.key(env, "twice.txt", {"cookiecutter": {"a": 1, "b": 2}})
+    assert key != cache.key(env, "twice.txt", {"cookiecutter": {"a": 1, "b": 3}})
+
+
+def test_render_cache_store_failure(tmp_path):
+    """Renderings that cannot be stored are not cached."""
+    cache = RenderCache(str(tmp_path / "cache"))
+
+    cache.store("ab" * 32, str(tmp_path / "missing.txt"))
+
+    assert os.listdir(tmp_path / "cache" / "ab") == []
+    assert not cache.copy_to("ab" * 32, str(tmp_path / "copy"))
+    (tmp_path / "file").write_text("not a directory")
+    RenderCache(str(tmp_path / "file")).store("ab" * 32, str(tmp_path / "copy"))
+
+
+def _git(repo, *args):
+    subprocess.run(
+        ["git", "-c", "user.name=test", "-c", "user.email=test@example.com", *args],
+        cwd=repo,
+        check=True,
+        capture_output=True,
+    )
+
+
+def test_output_cache_key_of_git_templates(template_repo, tmp_path, monkeypatch):
+    """Clean checkouts are keyed by commit and path, others by contents."""
+    root = tmp_path / "repo"
+    (root / "other").mkdir()
+    _git(root, "init", "-q")
+    _git(root, "add", "-A")
+    _git(root, "commit", "-q", "-m", "template")
+
+    commit = cache_module._git_commit(str(root))
+    assert commit.startswith("git:") and commit.endswith(":")
+    (root / "other" / "{{cookiecutter.name}}").mkdir()
+    assert cache_module._git_commit(str(root / "other")) != commit
+
+    (root / "untracked.txt").write_text("untracked")
+    assert cache_module._git_commit(str(root)) is None
+    assert cache_module._git_commit(str(tmp_path)) is None
+
+    def run(*args, **kwargs):
+        raise subprocess.CalledProcessError(1, "git")
+
+    monkeypatch.setattr(cache_module, "_template_commit", lambda path: "abc")
+    monkeypatch.setattr(subprocess, "run", run)
+    assert cache_module._git_commit(str(root)) is None
+
+
+def test_output_cache_checks_shared_templates(template_repo, tmp_path):
+    """Templates included from ``../templates`` are checked as well."""
+    project = template_repo / "{{cookiecutter.name}}"
+    (project / "README.txt").write_text("{% include 'date.txt' %}")
+    (project / "broken.txt").write_text("{{ cookiecutter.name ")
+    (project / "logo.png").write_bytes(bytes(range(256)))
+    shared = template_repo / "templates"
+    shared.mkdir()
+    (shared / "date.txt").write_text("{% now 'utc' %}")
+    context = {"cookiecutter": {"name": "demo"}}
+    cache = OutputCache(str(tmp_path / "cache"))
+
+    def key():
+        return cache.key(
+            str(template_repo),
+            str(project),
+            get_environment({}, str(project)),
+            context,
+        )
+
+    assert key() is None
+    (shared / "date.txt").write_text("{{ cookiecutter.name }}")
+    assert key() is not None
+
+
+def test_output_cache_unknown_hook_policy():
+    """Hook policies are checked."""
+    with pytest.raises(ValueError):
+        OutputCache(hooks="sometimes")
+
+
+@pytest.mark.parametrize("hardlink", [False, True])
+def test_output_cache_materialize(template_repo, tmp_path, monkeypatch, hardlink):
+    """Stored projects are reflinked, or else hardlinked or copied."""
+    cache = OutputCache(str(tmp_path / "cache"), hardlink=hardlink)
+    project = tmp_path / "project"
+    project.mkdir()
+    (project / "README.txt").write_text("stored")
+    monkeypatch.setattr("cookieninja.cache.reflink", shutil.copyfile)
+    cache.store("key", str(project))
+    cache._reflink_supported = False
+    target = tmp_path / "target"
+    target.mkdir()
+    (target / "README.txt").write_text("previous")
+    cache.materialize("key", str(target))
+
+    assert (target / "README.txt").read_text() == "stored"
+    assert os.stat(target / "README.txt").st_nlink == (2 if hardlink else 1)
+
+
+def test_output_cache_materialize_hardlink_failure(tmp_path, monkeypatch):
+    """Files that cannot be hardlinked are copied."""
+    cache = OutputCache(str(tmp_path / "cache"), hardlink=True)
+    cache._reflink_supported = False
+    (tmp_path / "src").write_text("stored")
+
+    def link(src, dst):
+        raise OSError("Cross-device link")
+
+    monkeypatch.setattr(os, "link", link)
+    cache._materialize_file(str(tmp_path / "src"), str(tmp_path / "dst"))
+
+    assert (tmp_path / "dst").read_text() == "stored"
+
+
+def test_output_cache_materialize_existing_files(tmp_path):
+    """Existing files are skipped or compared, as generation would."""
+    cache = OutputCache(str(tmp_path / "cache"))
+    project = tmp_path / "project"
+    project.mkdir()
+    for name in ("same.txt", "changed.txt", "link"):
+        (project / name).write_text("stored")
+    cache.store("key", str(project))
+    target = tmp_path / "target"
+    target.mkdir()
+    (target / "same.txt").write_text("stored")
+    (target / "changed.txt").write_text("local")
+    os.symlink("missing", target / "link")
+    os.utime(target / "same.txt", (0, 0))
+
+    cache.materialize("key", str(target), compare=True)
+    assert os.stat(target / "same.txt").st_mtime == 0
+    assert (target / "changed.txt").read_text() == "stored"
+    assert (target / "link").read_text() == "stored"
+
+    (target / "changed.txt").write_text("local")
+    cache.materialize("key", str(target), skip_if_file_exists=True)
+    assert (target / "changed.txt").read_text() == "local"
+
+
+def test_output_cache_store_twice(tmp_path):
+    """A project stored concurrently is kept."""
+    cache = OutputCache(str(tmp_path / "cache"))
+    project = tmp_path / "project"
+    project.mkdir()
+    (project / "README.txt").write_text("first")
+    cache.store("key", str(project))
+    (project / "README.txt").write_text("second")
+
+    cache.store("key", str(project))
+
+    assert os.listdir(cache.cache_dir) == ["key"]
+    assert Path(cache.cache_dir, "key", "project", "README.txt").read_text() == "first"
+
+
+def test_output_cache_evicts_everything(tmp_path):
+    """Entries are all evicted when none fits, broken entries are ignored."""
+    cache = OutputCache(str(tmp_path / "cache"), max_size=0)
+    Path(cache.cache_dir, "broken").mkdir(parents=True)
+    project = tmp_path / "project"
+    project.mkdir()
+    (project / "README.txt").write_text("stored")
+
+    cache.store("key", str(project))
+
+    assert os.listdir(cache.cache_dir) == ["broken"]
+
+
+@pytest.fixture
+def hooked_repo(tmp_path):
+    """Fixture. Template repository whose post hook appends to a file."""
+    repo_dir = tmp_path / "hooked"
+    project = repo_dir / "{{cookiecutter.name}}"
+    project.mkdir(parents=True)
+    (project / "log.txt").write_text("rendered\n")
+    (repo_dir / "hooks").mkdir()
+    (repo_dir / "hooks" / "post_gen_project.py").write_text(
+        "with open('log.txt', 'a') as fh:\n    fh.write('post hook\\n')\n"
+    )
+    return repo_dir
+
+
+@pytest.mark.parametrize("hooks", ["skip", "replay"])
+def test_output_cache_hook_policies(hooked_repo, tmp_path, hooks):
+    """Hooks run once on each project, whether it was cached or not."""
+    cache = OutputCache(str(tmp_path / "cache"), hooks=hooks)
+    context = {"cookiecutter": {"name": "demo"}}
+    for output_dir in ("a", "b"):
+        project_dir = generate.generate_files(
+            str(hooked_repo),
+            context,
+            output_dir=str(tmp_path / output_dir),
+            output_cache=cache,
+        )
+        assert Path(project_dir, "log.txt").read_text() == "rendered\npost hook\n"
@@ -0,0 +1,135 @@
+"""Tests for the catalog of the templates in a repository."""
+import json
+import os
+
+import pytest
+
+from cookieninja import catalog
+from cookieninja.exceptions import RepositoryNotFound
+
+
+@pytest.fixture
+def monorepo(tmp_path):
+    """Fixture. Repository holding two templates and other directories."""
+    repo_dir = tmp_path / "repo"
+    for directory, variables in (
+        ("python", {"name": "demo", "license": ["MIT", "BSD"]}),
+        ("web/react", {"app": "web"}),
+    ):
+        template_dir = repo_dir / directory
+        (template_dir / "{{cookiecutter.name}}").mkdir(parents=True)
+        (template_dir / "cookiecutter.json").write_text(json.dumps(variables))
+    (repo_dir / "docs").mkdir()
+    # Not searched: hidden and project directories
+    (repo_dir / ".git").mkdir()
+    (repo_dir / ".git" / "cookiecutter.json").write_text("{}")
+    (repo_dir / "python" / "{{cookiecutter.name}}" / "cookiecutter.json").write_text(
+        "{}"
+    )
+    return repo_dir
+
+
+@pytest.mark.parametrize("max_workers", [1, 4])
+def test_scan_repository_finds_every_template(monorepo, max_workers):
+    """Every directory with a cookiecutter.json is listed with its variables."""
+    result = catalog.scan_repository(str(monorepo), max_workers=max_workers)
+
+    assert [entry.directory for entry in result] == ["python", "web/react"]
+    assert result["python"].variables == {"name": "demo", "license": ["MIT", "BSD"]}
+    assert result.template_dir("web/react/") == os.path.join(
+        str(monorepo), "web", "react"
+    )
+
+
+def test_scan_repository_single_worker(monorepo, mocker):
+    """A single worker scans in the current thread, without a pool."""
+    executor = mocker.patch("cookieninja.catalog.ThreadPoolExecutor")
+
+    result = catalog.scan_repository(str(monorepo), max_workers=1)
+
+    assert [entry.directory for entry in result] == ["python", "web/react"]
+    executor.assert_not_called()
+
+
+def test_scan_repository_nested_templates():
+    """A template holding nested templates is listed with them."""
+    result = catalog.scan_repository("tests/fake-nested-templates")
+
+    assert [entry.directory for entry in result] == ["", "fake-project"]
+    assert result.template_dir(".") == os.path.abspath("tests/fake-nested-templates")
+
+
+def test_template_dir_unknown_directory(monorepo):
+    """Picking a directory without a template is an error."""
+    with pytest.raises(RepositoryNotFound) as err:
+        catalog.scan_repository(str(monorepo)).template_dir("docs")
+
+    assert "the templates are: python, web/react" in str(err.value)
+
+
+def test_get_catalog_reuses_current_catalog(monorepo, mocker):
+    """The repository is only scanned again after it changed."""
+    first = catalog.get_catalog(str(monorepo))
+    scan = mocker.spy(catalog, "scan_repository")
+
+    assert catalog.get_catalog(str(monorepo)) is first
+    assert not scan.called
+
+    (monorepo / "docs" / "cookiecutter.json").write_text('{"title": "Docs"}')
+    os.utime(monorepo / "docs", ns=(1, 1))
+    second = catalog.get_catalog(str(monorepo))
+
+    assert scan.call_count == 1
+    assert second["docs"].variables == {"title": "Docs"}
+
+
+def test_scan_repository_skips_unreadable(monorepo, mocker):
+    """Unreadable directories and cookiecutter.json files are skipped."""
+    (monorepo / "docs" / "cookiecutter.json").write_text("{not json")
+    (monorepo / "lists" / "data").mkdir(parents=True)
+    (monorepo / "lists" / "cookiecutter.json").write_text("[]")
+    scandir = os.scandir
+
+    def failing_scandir(path):
+        if path.endswith("data"):
+            raise PermissionError(path)
+        return scandir(path)
+
+    mocker.patch("os.scandir", side_effect=failing_scandir)
+
+    result = catalog.scan_repository(str(monorepo))
+
+    assert len(result) == 2
+    assert "docs" not in result
+
+
+def test_scan_repository_not_a_directory(tmp_path):
+    """Only directories can be scanned."""
+    with pytest.raises(RepositoryNotFound):
+        catalog.scan_repository(str(tmp_path / "missing"))
+
+
+def test_catalog_removed_paths(monorepo, mocker):
+    """Templates removed during or after the scan make the catalog stale."""
+    read_variables = catalog._read_variables
+
+    def remove_web(repo_dir, relpath):
+        if relpath.startswith("web"):
+            os.remove(os.path.join(repo_dir, relpath, "cookiecutter.json"))
+        return read_variables(repo_dir, relpath)
+
+    mocker.patch("cookieninja.catalog._read_variables", side_effect=remove_web)
+    result = catalog.scan_repository(str(monorepo), max_workers=1)
+
+    assert [entry.directory for entry in result] == ["python"]
+    assert not result.is_current()
+
+
+def test_catalog_removed_directory(monorepo):
+    """A scanned directory that no longer exists makes the catalog stale."""
+    result = catalog.scan_repository(str(monorepo))
+    stat = os.stat(monorepo)
+    (monorepo / "docs").rmdir()
+    os.utime(monorepo, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    assert not result.is_current()
@@ -10,9 +10,11 @@ from click.testing import CliRunner
 
 from cookieninja import utils
 from cookieninja.__main__ import main
+from cookieninja.config import get_user_config
 from cookieninja.environment import StrictEnvironment
 from cookieninja.exceptions import UnknownExtension
 from cookieninja.main import cookiecutter
+from cookieninja.replay import ReplayStore
 
 
 @pytest.fixture(scope="session")
@@ -621,6 +623,40 @@ def test_debug_list_installed_templates_failure(
     assert result.exit_code == -1
 
 
+def test_list_templates(cli_runner):
+    """Verify --list-templates lists the templates of a repository."""
+    result = cli_runner("tests/fake-nested-templates", "--list-templates")
+
+    assert result.exit_code == 0
+    assert "2 templates in tests/fake-nested-templates:" in result.output
+    assert " * fake-project: " in result.output
+
+
+def test_update(mocker, cli_runner):
+    """Verify --update reports the merged files and the conflicts."""
+    from cookieninja.update import UpdateResult
+
+    mock_update = mocker.patch(
+        "cookieninja.update.update_project",
+        return_value=UpdateResult("/tmp/demo", {}, ["a"], ["b"], [], ["c"]),
+    )
+    result = cli_runner("--update", "demo", "--checkout", "v2", "--accept-hooks=no")
+
+    assert result.exit_code == 1
+    assert "Updated /tmp/demo: 1 files updated, 1 added, 0 removed" in result.output
+    assert " * c" in result.output
+    mock_update.assert_called_once_with(
+        "demo",
+        checkout="v2",
+        template=None,
+        directory=None,
+        extra_context=None,
+        config_file=None,
+        default_config=False,
+        accept_hooks=False,
+    )
+
+
 @pytest.mark.usefixtures("remove_fake_project_dir")
 def test_directory_repo(cli_runner):
     """Test cli invocation works with `directory` option."""
@@ -701,3 +737,120 @@ def test_cli_with_json_decoding_error(cli_runner):
     # this point.
     path = os.path.sep.join(["tests", "fake-repo-bad-json", "cookiecutter.json"])
     assert path in result.output
+
+
+def test_watch(mocker, cli_runner):
+    """Verify --watch reports each generation."""
+    from cookieninja.watch import WatchRun
+
+    def watch(template, callback, **kwargs):
+        callback(WatchRun("/tmp/demo", [], True, 3, 0, None))
+        raise KeyboardInterrupt
+
+    mock_watch = mocker.patch("cookieninja.watch.watch", side_effect=watch)
+    result = cli_runner("demo", "--watch", "--no-input", "--accept-hooks=no")
+
+    assert result.exit_code == 0
+    assert "Generated /tmp/demo: 3 files written, 0 unchanged" in result.output
+    assert mock_watch.call_args.kwargs["accept_hooks"] is False
+
+
+@pytest.mark.usefixtures("remove_fake_project_dir")
+def test_profile(cli_runner):
+    """Verify --profile reports the phases of the generation."""
+    result = cli_runner("tests/fake-repo-pre/", "--no-input", "--profile")
+
+    assert result.exit_code == 0
+    assert "generate" in result.output
+    assert "files_rendered" in result.output
+
+
+def test_cli_replay_entry_of_another_template(cli_runner):
+    """Entries of other templates are not replayed."""
+    replay_dir = get_user_config()["replay_dir"]
+    entry_id = ReplayStore(replay_dir).add("other", {"cookiecutter": {}})
+
+    result = cli_runner("tests/fake-repo-pre/", "--replay-entry", str(entry_id))
+
+    assert result.exit_code == 1
+    assert f"Replay entry {entry_id} is a run of other" in result.output
+
+
+def test_list_templates_not_found(cli_runner):
+    """Verify --list-templates reports a missing repository."""
+    result = cli_runner("tests/no-such-repo", "--list-templates")
+
+    assert result.exit_code == 1
+    assert "could not be found" in result.output
+
+
+def test_list_templates_removes_clone(mocker, cli_runner, tmp_path):
+    """Verify --list-templates removes the repository it downloaded."""
+    repo_dir = tmp_path / "clone"
+    (repo_dir / "python").mkdir(parents=True)
+    (repo_dir / "python" / "cookiecutter.json").write_text('{"name": "demo"}')
+    mocker.patch(
+        "cookieninja.repository.determine_repo_root",
+        return_value=(str(repo_dir), True),
+    )
+
+    result = cli_runner("https://example.com/templates.zip", "--list-templates")
+
+    assert result.exit_code == 0
+    assert " * python: name" in result.output
+    assert not repo_dir.exists()
+
+
+def test_update_without_conflicts(mocker, cli_runner):
+    """Verify --update succeeds when every file merged cleanly."""
+    from cookieninja.update import UpdateResult
+
+    mocker.patch(
+        "cookieninja.update.update_project",
+        return_value=UpdateResult("/tmp/demo", {}, ["a"], [], [], []),
+    )
+    result = cli_runner("--update", "demo")
+
+    assert result.exit_code == 0
+    assert "conflicts" not in result.output
+
+
+def test_update_failure(mocker, cli_runner):
+    """Verify --update reports projects that cannot be updated."""
+    from cookieninja.exceptions import ProjectUpdateError
+
+    mocker.patch(
+        "cookieninja.update.update_project",
+        side_effect=ProjectUpdateError("No replay entry"),
+    )
+    result = cli_runner("--update", "demo")
+
+    assert result.exit_code == 1
+    assert "No replay entry" in result.output
+
+
+def test_watch_failures(mocker, cli_runner):
+    """Verify --watch reports missing templates, and not failed runs."""
+    from cookieninja.exceptions import RepositoryNotFound
+    from cookieninja.watch import WatchRun
+
+    def watch(template, callback, **kwargs):
+        callback(WatchRun(None, [], True, 0, 0, ValueError("broken")))
+        raise RepositoryNotFound("Template gone")
+
+    mocker.patch("cookieninja.watch.watch", side_effect=watch)
+    result = cli_runner("demo", "--watch", "--no-input")
+
+    assert result.exit_code == 1
+    assert result.output == "Template gone\n"
+
+
+@pytest.mark.usefixtures("remove_fake_project_dir")
+def test_profile_json(cli_runner):
+    """Verify --profile-format=json reports the phases as JSON."""
+    result = cli_runner(
+        "tests/fake-repo-pre/", "--no-input", "--profile", "--profile-format=json"
+    )
+
+    assert result.exit_code == 0
+    assert '"phases": {' in result.output
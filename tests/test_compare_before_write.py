@@ -0,0 +1,90 @@
+"""Tests for leaving unchanged files untouched when regenerating a project."""
+import logging
+import os
+
+import pytest
+
+from cookieninja import generate
+from cookieninja.sinks import DirectorySink
+
+COPY_REPO = "tests/test-generate-copy-without-render"
+COPY_CONTEXT = {
+    "cookiecutter": {
+        "repo_name": "demo",
+        "render_test": "I have been rendered!",
+        "_copy_without_render": ["*not-rendered"],
+    }
+}
+
+
+def _age(path):
+    """Set the modification time of ``path`` an hour back and return it."""
+    mtime = os.stat(path).st_mtime_ns - 3600 * 10**9
+    os.utime(path, ns=(mtime, mtime))
+    return mtime
+
+
+@pytest.fixture
+def project(tmp_path):
+    """Return the project generated once from the copy without render repo."""
+    generate.generate_files(COPY_REPO, COPY_CONTEXT, output_dir=str(tmp_path))
+    return tmp_path / "demo"
+
+
+def test_unchanged_files_are_not_written(tmp_path, project, caplog):
+    """Identical files keep their modification time, others are rewritten."""
+    unchanged = project / "README.txt"
+    changed = project / "README.rst"
+    unchanged_mtime = _age(unchanged)
+    _age(changed)
+    changed.write_text("edited")
+    changed_mtime = _age(changed)
+    caplog.set_level(logging.INFO)
+
+    generate.generate_files(
+        COPY_REPO,
+        COPY_CONTEXT,
+        output_dir=str(tmp_path),
+        overwrite_if_exists=True,
+        compare_before_write=True,
+    )
+
+    assert os.stat(unchanged).st_mtime_ns == unchanged_mtime
+    assert os.stat(changed).st_mtime_ns != changed_mtime
+    assert "edited" not in changed.read_text()
+    assert f"Generated {project}: 1 files written, 6 unchanged" in caplog.messages
+
+
+def test_copied_directories_are_synced(tmp_path, project):
+    """Directories copied without rendering only get their changed files."""
+    copied = project / "demo-not-rendered"
+    readme_mtime = _age(copied / "README.rst")
+    (copied / "stale.txt").write_text("stale")
+    (copied / "stale").mkdir()
+
+    generate.generate_files(
+        COPY_REPO,
+        COPY_CONTEXT,
+        output_dir=str(tmp_path),
+        overwrite_if_exists=True,
+        compare_before_write=True,
+    )
+
+    assert sorted(os.listdir(copied)) == ["README.rst"]
+    assert os.stat(copied / "README.rst").st_mtime_ns == readme_mtime
+
+
+def test_directory_sink_counts(tmp_path):
+    """Writes are counted whether or not files are compared."""
+    path = tmp_path / "file.txt"
+
+    sink = DirectorySink()
+    sink.write_file(path, b"same")
+    sink.write_file(path, b"same")
+    assert (sink.files_written, sink.files_unchanged) == (2, 0)
+
+    sink = DirectorySink(compare=True)
+    sink.write_file(path, b"same")
+    sink.write_file(path, b"different")
+    assert (sink.files_written, sink.files_unchanged) == (1, 1)
+    assert path.read_bytes() == b"different"
@@ -1,7 +1,10 @@
 """Test cookiecutter invocation with nested configuration structure."""
 from os import path
 
+import pytest
+
 from cookieninja import main
+from cookieninja.exceptions import RepositoryNotFound
 
 
 def test_cookiecutter_nested_templates(mocker):
@@ -12,3 +15,24 @@ def test_cookiecutter_nested_templates(mocker):
     assert mock_generate_files.call_args[1]["repo_dir"] == path.join(
         main_dir, "fake-project"
     )
+
+
+def test_cookiecutter_nested_templates_resolve_repo_once(mocker):
+    """Verify the nested template is resolved inside the fetched repository."""
+    mocker.patch("cookieninja.main.generate_files")
+    spy_determine_repo_dir = mocker.spy(main, "determine_repo_dir")
+    spy_get_user_config = mocker.spy(main, "get_user_config")
+
+    main.cookiecutter(path.join("tests", "fake-nested-templates"), no_input=True)
+
+    assert spy_determine_repo_dir.call_count == 1
+    assert spy_get_user_config.call_count == 1
+
+
+def test_cookiecutter_nested_template_not_found(mocker, tmp_path):
+    """Verify a nested template missing from the repository is reported."""
+    mocker.patch("cookieninja.main.generate_files")
+    (tmp_path / "cookiecutter.json").write_text('{"template": ["x (missing)"]}')
+
+    with pytest.raises(RepositoryNotFound):
+        main.cookiecutter(str(tmp_path), no_input=True)
@@ -1,7 +1,7 @@
 """Collection of tests around loading extensions."""
 import pytest
 
-from cookieninja.environment import StrictEnvironment
+from cookieninja.environment import StrictEnvironment, get_environment
 from cookieninja.exceptions import UnknownExtension
 
 
@@ -23,3 +23,56 @@ def test_env_should_come_with_default_extensions():
     assert "cookieninja.extensions.SlugifyExtension" in env.extensions
     assert "cookieninja.extensions.TimeExtension" in env.extensions
     assert "cookieninja.extensions.UUIDExtension" in env.extensions
+
+
+def test_get_environment_is_shared():
+    """Same extensions and env vars return the same environment."""
+    context = {"cookiecutter": {"project": "foo"}}
+    env = get_environment(context)
+
+    assert get_environment({"cookiecutter": {"other": "bar"}}) is env
+    assert env.keep_trailing_newline
+
+
+def test_get_environment_per_configuration():
+    """Different ``_jinja2_env_vars`` produce different environments."""
+    context = {"cookiecutter": {"_jinja2_env_vars": {"variable_start_string": "[["}}}
+    env = get_environment(context)
+
+    assert env is not get_environment({"cookiecutter": {}})
+    assert env.variable_start_string == "[["
+
+
+def test_get_environment_with_template_dir(tmp_path):
+    """Template dir environments share extensions and the template cache."""
+    template_dir = tmp_path.joinpath("{{cookiecutter.project}}")
+    template_dir.mkdir()
+    template_dir.joinpath("README").write_text("{{ cookiecutter.project }}")
+    base_env = get_environment({})
+
+    env = get_environment({}, str(template_dir))
+    assert get_environment({}, str(template_dir)) is env
+    assert env.cache is base_env.cache
+    assert "cookieninja.extensions.TimeExtension" in env.extensions
+
+    template = env.get_template("README")
+    assert env.get_template("README") is template
+    assert template.render(cookiecutter={"project": "foo"}) == "foo"
+
+
+def test_get_environment_without_env_vars():
+    """The ``_jinja2_env_vars`` of a context can be left out."""
+    context = {"cookiecutter": {"_jinja2_env_vars": {"trim_blocks": True}}}
+
+    assert get_environment(context).trim_blocks
+    assert not get_environment(context, env_vars=False).trim_blocks
+    assert get_environment(context, env_vars=False) is get_environment({})
+
+
+def test_get_environment_without_trailing_newline():
+    """Environments keeping the last newline of templates are kept apart."""
+    env = get_environment({}, keep_trailing_newline=False)
+
+    assert not env.keep_trailing_newline
+    assert get_environment({}).keep_trailing_newline
+    assert get_environment({}, keep_trailing_newline=False) is env
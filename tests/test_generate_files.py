@@ -439,3 +439,60 @@ def test_raise_undefined_variable_project_dir(tmp_path):
     assert error.context == {}
 
     assert not Path(tmp_path, "testproject").exists()
+
+
+def test_raise_undefined_variable_copied_file_name(tmp_path):
+    """Verify undefined variables in the names of copied files are raised as is."""
+    from jinja2.exceptions import UndefinedError
+
+    project = tmp_path / "repo" / "{{cookiecutter.name}}"
+    project.mkdir(parents=True)
+    (project / "{{cookiecutter.missing}}.txt").write_text("raw")
+    context = {"cookiecutter": {"name": "demo", "_copy_without_render": ["*.txt"]}}
+
+    with pytest.raises(UndefinedError):
+        generate.generate_files(
+            str(tmp_path / "repo"), context, output_dir=str(tmp_path / "out")
+        )
+
+
+def test_generate_files_directory_created_by_hook(tmp_path):
+    """Verify directories the pre generation hook created are not overwritten."""
+    repo_dir = tmp_path / "repo"
+    (repo_dir / "{{cookiecutter.name}}" / "src").mkdir(parents=True)
+    (repo_dir / "hooks").mkdir()
+    (repo_dir / "hooks" / "pre_gen_project.py").write_text(
+        "import os\nos.mkdir('src')\n"
+    )
+
+    with pytest.raises(exceptions.OutputDirExistsException, match="src"):
+        generate.generate_files(
+            str(repo_dir),
+            {"cookiecutter": {"name": "demo"}},
+            output_dir=str(tmp_path / "out"),
+        )
+
+
+def test_generate_files_preflight_passes(tmp_path):
+    """Verify a complete context passes the preflight check."""
+    project_dir = generate.generate_files(
+        "tests/test-generate-files",
+        {"cookiecutter": {"food": "pizzä"}},
+        output_dir=str(tmp_path),
+        preflight=True,
+    )
+
+    assert Path(project_dir, "simple.txt").is_file()
+
+
+def test_run_hook_from_repo_dir_finds_hooks(tmp_path):
+    """Verify hooks are looked up when no hook index is given."""
+    generate._run_hook_from_repo_dir(
+        "tests/test-pyhooks",
+        "pre_gen_project",
+        str(tmp_path),
+        {"cookiecutter": {"pyhooks": "pyhooks"}},
+        delete_project_on_failure=False,
+    )
+
+    assert Path(tmp_path, "python_pre.txt").exists()
@@ -120,3 +120,49 @@ def test_get_config_with_defaults():
         },
     }
     assert conf == expected_conf
+
+
+def test_get_config_parses_unchanged_file_once(tmp_path, mocker):
+    """The parsed file is reused until its mtime or size changes."""
+    config_file = tmp_path / "config.yaml"
+    config_file.write_text("default_context:\n  full_name: First\n")
+    spy_load = mocker.spy(yaml, "load")
+
+    first = config.get_config(str(config_file))
+    second = config.get_config(str(config_file))
+    config_file.write_text("default_context:\n  full_name: Second\n")
+    third = config.get_config(str(config_file))
+
+    assert spy_load.call_count == 2
+    assert first == second
+    assert third["default_context"] == {"full_name": "Second"}
+
+
+def test_merge_configs_leaves_inputs_alone():
+    """Merging configs changes neither the defaults nor the parsed file."""
+    default = {"abbreviations": {"gh": "github"}, "default_context": {"a": 1}}
+    overwrite = {"abbreviations": {"gl": "gitlab"}, "_extensions": ["ext"]}
+
+    merged = config.merge_configs(default, overwrite)
+
+    assert merged == {
+        "abbreviations": {"gh": "github", "gl": "gitlab"},
+        "default_context": {"a": 1},
+        "_extensions": ["ext"],
+    }
+    assert default == {"abbreviations": {"gh": "github"}, "default_context": {"a": 1}}
+    assert overwrite == {"abbreviations": {"gl": "gitlab"}, "_extensions": ["ext"]}
+
+
+def test_get_config_changes_do_not_leak(tmp_path):
+    """Changing a config in place leaves the next runs alone."""
+    config_file = tmp_path / "config.yaml"
+    config_file.write_text("default_context:\n  choices: [a, b]\n")
+
+    first = config.get_config(str(config_file))
+    first["default_context"]["choices"].append("c")
+    first["abbreviations"]["x"] = "y"
+
+    second = config.get_config(str(config_file))
+    assert second["default_context"] == {"choices": ["a", "b"]}
+    assert "x" not in second["abbreviations"]
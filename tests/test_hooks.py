@@ -272,3 +272,91 @@ def test_ignore_hook_backup_files(monkeypatch, dir_with_hooks):
     monkeypatch.chdir(dir_with_hooks)
     assert hooks.find_hook("pre_gen_project") is None
     assert hooks.find_hook("post_gen_project") is None
+
+
+def test_hook_index_is_cached(mocker, tmp_path):
+    """Hooks directory is listed once until its mtime changes."""
+    hooks_dir = tmp_path.joinpath("hooks")
+    hooks_dir.mkdir()
+    hooks_dir.joinpath("pre_gen_project.py").write_text("print('pre')\n")
+    hooks_dir.joinpath("post_gen_project.sh").write_text("#!/bin/sh\n")
+    os.utime(hooks_dir, ns=(1_000_000_000, 1_000_000_000))
+    listdir = mocker.spy(hooks.os, "listdir")
+
+    index = hooks.get_hook_index(str(tmp_path))
+    assert hooks.get_hook_index(str(tmp_path)) is index
+    assert listdir.call_count == 1
+
+    pre = index["pre_gen_project"][0]
+    assert pre.path == str(hooks_dir.joinpath("pre_gen_project.py"))
+    assert pre.interpreter == sys.executable
+    assert index["post_gen_project"][0].interpreter is None
+    assert "pre_prompt" not in index
+
+    hooks_dir.joinpath("pre_prompt.py").write_text("print('prompt')\n")
+    os.utime(hooks_dir, ns=(2_000_000_000, 2_000_000_000))
+    assert "pre_prompt" in hooks.get_hook_index(str(tmp_path))
+    assert listdir.call_count == 2
+
+
+def test_run_hook_uses_given_index(mocker, tmp_path):
+    """`run_hook` does no discovery when handed a hook index."""
+    run_script_with_context = mocker.patch("cookieninja.hooks.run_script_with_context")
+    get_hook_index = mocker.spy(hooks, "get_hook_index")
+    script = hooks.HookScript("/abs/pre_gen_project.py", sys.executable)
+
+    hooks.run_hook("pre_gen_project", str(tmp_path), {}, {"pre_gen_project": [script]})
+
+    get_hook_index.assert_not_called()
+    run_script_with_context.assert_called_once_with(script.path, str(tmp_path), {})
+
+
+def test_hooks_ignore_jinja2_env_vars(tmp_path):
+    """Hook scripts are rendered with the default Jinja2 settings."""
+    script = tmp_path / "post_gen_project.py"
+    script.write_text("name = '{{ cookiecutter.name }}'  # [[ cookiecutter.name ]]")
+    context = {
+        "cookiecutter": {
+            "name": "demo",
+            "_jinja2_env_vars": {
+                "variable_start_string": "[[",
+                "variable_end_string": "]]",
+            },
+        }
+    }
+
+    rendered = hooks._render_script(str(script), context)
+
+    try:
+        assert Path(rendered).read_text() == (
+            "name = 'demo'  # [[ cookiecutter.name ]]"
+        )
+    finally:
+        os.remove(rendered)
+
+
+def test_run_script_skips_chmod(mocker, tmp_path):
+    """Executable scripts, or scripts run by an interpreter, are not changed."""
+    make_executable = mocker.patch("cookieninja.utils.make_executable")
+    script = tmp_path / "pre_prompt.sh"
+    script.write_text("#!/bin/sh\n")
+    script.chmod(0o755)
+    hooks.run_script(str(script), str(tmp_path))
+
+    python_script = tmp_path / "pre_prompt.py"
+    python_script.write_text("")
+    hooks.run_script(str(python_script), str(tmp_path))
+
+    make_executable.assert_not_called()
+
+
+def test_runnable_copy_of_executable_script(tmp_path):
+    """Executable scripts are run in place, as found when they run."""
+    script = tmp_path / "pre_prompt.sh"
+    script.write_text("#!/bin/sh\n")
+    script.chmod(0o644)
+    index = hooks.get_hook_index(str(tmp_path), ".")
+    script.chmod(0o755)
+
+    with hooks._runnable_copy(index["pre_prompt"][0].path) as path:
+        assert path == str(script)
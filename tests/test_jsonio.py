@@ -0,0 +1,95 @@
+"""Tests for the pluggable JSON backend."""
+import json
+
+import pytest
+
+from cookieninja import jsonio
+
+
+@pytest.fixture(params=jsonio.BACKENDS)
+def backend(request, monkeypatch):
+    """Fixture. Run a test with each JSON backend."""
+    if request.param == "orjson":
+        pytest.importorskip("orjson")
+    monkeypatch.setattr(jsonio, "_backend", request.param)
+    return request.param
+
+
+class _Name(str):
+    """A string subclass."""
+
+
+_SHARED = ["shared"]
+
+
+def _nested(depth):
+    """Return lists nested ``depth`` levels deep."""
+    obj = ["leaf"]
+    for _ in range(depth):
+        obj = [obj]
+    return obj
+
+
+@pytest.mark.parametrize(
+    "obj",
+    [
+        {"b": 1, "a": [True, None, "x"], "c": {}},
+        {"nested": {"list": [[], {"k": "v"}], "big": 2**70}},
+        {"float": 1e16, "nan": float("nan")},
+        {"unicode": "Köln", "1": {2: "int key"}},
+        {"unicode": "Köln"},
+        ["top", "level", ("tuple",)],
+        {"subclass": _Name("name"), "shared": [_SHARED, _SHARED]},
+        _nested(40),
+    ],
+)
+@pytest.mark.parametrize("indent", [2, 4])
+def test_dumps_matches_stdlib(backend, obj, indent):
+    """Every backend produces the output of ``json.dumps``."""
+    expected = json.dumps(obj, indent=indent, sort_keys=True)
+    assert jsonio.dumps(obj, indent=indent, sort_keys=True) == expected
+
+
+def test_dumps_without_ensure_ascii_keeps_unicode(backend):
+    """Non-ASCII characters are written as is when requested."""
+    assert jsonio.dumps({"city": "Köln"}, indent=2, ensure_ascii=False) == (
+        '{\n  "city": "Köln"\n}'
+    )
+
+
+def test_loads_keeps_order_in_plain_dicts(backend):
+    """Objects are plain dicts in document order."""
+    result = jsonio.loads('{"z": 1, "a": {"y": 2, "b": 3}}')
+    assert type(result) is dict
+    assert list(result) == ["z", "a"]
+    assert list(result["a"]) == ["y", "b"]
+
+
+def test_loads_falls_back_to_stdlib(backend):
+    """Documents only the standard library accepts are still decoded."""
+    assert jsonio.loads(b'{"big": 100000000000000000000000, "n": NaN}')["big"] == (
+        10**23
+    )
+
+
+def test_loads_reports_stdlib_errors(backend):
+    """Syntax errors carry the standard library message."""
+    with pytest.raises(ValueError, match="Expecting ':' delimiter"):
+        jsonio.loads('{"key" "value"}')
+
+
+def test_set_backend_rejects_unknown_backend():
+    """Only known backends can be selected."""
+    with pytest.raises(ValueError):
+        jsonio.set_backend("simplejson")
+
+
+def test_set_backend(monkeypatch):
+    """Installed backends can be selected."""
+    monkeypatch.setattr(jsonio, "_backend", None)
+    jsonio.set_backend("stdlib")
+    assert jsonio.get_backend() == "stdlib"
+
+    monkeypatch.setattr(jsonio, "orjson", None)
+    with pytest.raises(ValueError, match="requires the orjson package"):
+        jsonio.set_backend("orjson")
@@ -0,0 +1,42 @@
+"""Startup regression tests: heavy dependencies are imported lazily."""
+import json
+import subprocess
+import sys
+
+import pytest
+
+HEAVY_MODULES = ["arrow", "binaryornot", "jinja2", "requests", "slugify", "yaml"]
+
+
+def imported_heavy_modules(code):
+    """Run ``code`` in a fresh interpreter, return the heavy modules it loaded."""
+    script = (
+        f"import sys\n{code}\n"
+        "import json\n"
+        f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    )
+    output = subprocess.check_output([sys.executable, "-c", script])
+    return json.loads(output.decode().splitlines()[-1])
+
+
+def test_cli_import_budget():
+    """Importing the CLI (--version, --help) loads no heavy dependency."""
+    assert imported_heavy_modules("import cookieninja.cli") == []
+
+
+@pytest.mark.parametrize("option", ["--version", "--help"])
+def test_short_invocations_import_budget(option):
+    """Short CLI invocations finish without loading heavy dependencies."""
+    code = (
+        "from cookieninja.cli import main\n"
+        "try:\n"
+        f"    main([{option!r}])\n"
+        "except SystemExit:\n"
+        "    pass"
+    )
+    assert imported_heavy_modules(code) == []
+
+
+def test_library_import_budget():
+    """Only Jinja2 is needed to import the generation entry point."""
+    assert imported_heavy_modules("import cookieninja.main") == ["jinja2"]
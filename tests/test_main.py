@@ -2,10 +2,10 @@
 from cookieninja.main import cookiecutter
 
 
-def test_replay_dump_template_name(
+def test_replay_record_template_name(
     monkeypatch, mocker, user_config_data, user_config_file
 ):
-    """Check that replay_dump is called with a valid template_name.
+    """Check that the run is recorded with a valid template_name.
 
     Template name must not be a relative path.
 
@@ -18,7 +18,7 @@ def test_replay_dump_template_name(
     """
     monkeypatch.chdir("tests/fake-repo-tmpl")
 
-    mock_replay_dump = mocker.patch("cookieninja.main.dump")
+    mock_replay_record = mocker.patch("cookieninja.main.record")
     mocker.patch("cookieninja.main.generate_files")
 
     cookiecutter(
@@ -28,10 +28,11 @@ def test_replay_dump_template_name(
         config_file=user_config_file,
     )
 
-    mock_replay_dump.assert_called_once_with(
+    mock_replay_record.assert_called_once_with(
         user_config_data["replay_dir"],
         "fake-repo-tmpl",
         mocker.ANY,
+        ".",
     )
 
 
@@ -47,7 +48,7 @@ def test_replay_load_template_name(
     """
     monkeypatch.chdir("tests/fake-repo-tmpl")
 
-    mock_replay_load = mocker.patch("cookieninja.main.load")
+    mock_replay_load = mocker.patch("cookieninja.main.load_latest")
     mocker.patch("cookieninja.main.generate_files")
 
     cookiecutter(
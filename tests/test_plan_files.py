@@ -0,0 +1,134 @@
+"""Tests for planning a generation without writing anything."""
+from pathlib import Path
+
+import pytest
+
+from cookieninja import generate
+from cookieninja.exceptions import OutputDirExistsException, UndefinedVariableInTemplate
+
+
+@pytest.fixture
+def template_repo(tmp_path):
+    """Fixture. Template repository with rendered, copied and binary files."""
+    repo_dir = tmp_path / "repo"
+    project = repo_dir / "{{cookiecutter.name}}"
+    (project / "src").mkdir(parents=True)
+    (project / "README.txt").write_text("Hello {{ cookiecutter.name }}\n")
+    (project / "src" / "{{cookiecutter.name}}.py").write_text("# {{ cookiecutter.x }}")
+    (project / "raw.txt").write_text("{{ not rendered }}")
+    (project / "logo.png").write_bytes(b"\x89PNG\r\n\x1a\n\x00\x00\x00")
+    return repo_dir
+
+
+@pytest.fixture
+def context():
+    """Fixture. Context of the template repository."""
+    return {
+        "cookiecutter": {"name": "demo", "x": "1", "_copy_without_render": ["raw.txt"]}
+    }
+
+
+def test_plan_files_writes_nothing(template_repo, context, tmp_path):
+    """Paths are rendered and classified, nothing is created."""
+    output_dir = tmp_path / "out"
+
+    plan = generate.plan_files(str(template_repo), context, output_dir=str(output_dir))
+
+    assert plan.project_dir == str(output_dir / "demo")
+    assert not output_dir.exists()
+    paths = {entry.path: entry for entry in plan.paths}
+    assert sorted(paths) == [
+        ".",
+        "README.txt",
+        "logo.png",
+        "raw.txt",
+        "src",
+        "src/demo.py",
+    ]
+    assert {entry.action for entry in plan.paths} == {"create"}
+    assert paths["src/demo.py"].source == "src/{{cookiecutter.name}}.py"
+    assert paths["README.txt"].rendered and paths["README.txt"].size is None
+    assert not paths["raw.txt"].rendered and paths["raw.txt"].size == 18
+    assert not paths["logo.png"].rendered and paths["logo.png"].size == 11
+
+
+def test_plan_files_render_bodies(template_repo, context, tmp_path):
+    """Rendering the bodies gives the sizes of the generated files."""
+    plan = generate.plan_files(
+        str(template_repo), context, output_dir=str(tmp_path), render_bodies=True
+    )
+    project_dir = generate.generate_files(
+        str(template_repo), context, output_dir=str(tmp_path)
+    )
+
+    for entry in plan.paths:
+        if entry.kind == "file":
+            assert entry.size == Path(project_dir, entry.path).stat().st_size
+
+
+def test_plan_files_existing_project(template_repo, context, tmp_path):
+    """Existing files are overwritten or skipped, like generate_files would."""
+    generate.generate_files(str(template_repo), context, output_dir=str(tmp_path))
+    (tmp_path / "demo" / "README.txt").unlink()
+
+    with pytest.raises(OutputDirExistsException):
+        generate.plan_files(str(template_repo), context, output_dir=str(tmp_path))
+    plan = generate.plan_files(
+        str(template_repo),
+        context,
+        output_dir=str(tmp_path),
+        overwrite_if_exists=True,
+        skip_if_file_exists=True,
+    )
+
+    actions = {entry.path: entry.action for entry in plan.paths}
+    assert actions == {
+        ".": "exists",
+        "README.txt": "create",
+        "logo.png": "skip",
+        "raw.txt": "overwrite",
+        "src": "exists",
+        "src/demo.py": "skip",
+    }
+
+
+def test_plan_files_undefined_variable(template_repo, context, tmp_path):
+    """Undefined variables in bodies are reported when they are rendered."""
+    del context["cookiecutter"]["x"]
+
+    plan = generate.plan_files(str(template_repo), context, output_dir=str(tmp_path))
+    with pytest.raises(UndefinedVariableInTemplate):
+        generate.plan_files(
+            str(template_repo), context, output_dir=str(tmp_path), render_bodies=True
+        )
+
+    assert len(plan.paths) == 6
+
+
+def test_plan_files_copied_directories_and_empty_names(tmp_path):
+    """Copied directories are listed with their contents, empty names skipped."""
+    repo_dir = tmp_path / "repo"
+    project = repo_dir / "{{cookiecutter.name}}"
+    (project / "assets" / "img").mkdir(parents=True)
+    (project / "assets" / "img" / "logo.txt").write_text("{{ raw }}")
+    (project / "{% if cookiecutter.extra %}extra.txt{% endif %}").write_text("")
+    context = {
+        "cookiecutter": {
+            "name": "demo",
+            "extra": "",
+            "_copy_without_render": ["assets"],
+        }
+    }
+
+    plan = generate.plan_files(str(repo_dir), context, output_dir=str(tmp_path))
+
+    paths = {entry.path: entry for entry in plan.paths}
+    assert sorted(paths) == [".", "assets", "assets/img", "assets/img/logo.txt"]
+    assert paths["assets"].kind == "directory"
+    assert paths["assets/img/logo.txt"].size == 9
+
+
+def test_plan_files_undefined_project_dir(template_repo, tmp_path):
+    """A project directory name that cannot be rendered is reported."""
+    with pytest.raises(UndefinedVariableInTemplate, match="project directory"):
+        generate.plan_files(str(template_repo), {}, output_dir=str(tmp_path))
@@ -0,0 +1,115 @@
+"""Tests for the ``pre_prompt`` hook stage."""
+import json
+import os
+import sys
+
+import pytest
+
+from cookieninja import exceptions, hooks, main
+
+REPO_DIR = os.path.join("tests", "test-pre-prompt-hook")
+
+
+@pytest.mark.parametrize("in_process", [False, True])
+def test_run_pre_prompt_hook(in_process):
+    """Hook rewrites a scratch copy of cookiecutter.json, never the template."""
+    context_file = hooks.run_pre_prompt_hook(REPO_DIR, in_process=in_process)
+    try:
+        assert context_file != os.path.join(REPO_DIR, "cookiecutter.json")
+        with open(context_file) as fh:
+            assert json.load(fh)["project_slug"] == "computed-by-hook"
+    finally:
+        os.remove(context_file)
+        os.rmdir(os.path.dirname(context_file))
+
+    with open(os.path.join(REPO_DIR, "cookiecutter.json")) as fh:
+        assert json.load(fh)["project_slug"] == "fake-project"
+
+
+def test_run_pre_prompt_hook_without_hook():
+    """Templates without a pre_prompt hook use their own cookiecutter.json."""
+    repo_dir = os.path.join("tests", "fake-repo")
+    context_file = hooks.run_pre_prompt_hook(repo_dir)
+    assert context_file == os.path.join(repo_dir, "cookiecutter.json")
+
+
+@pytest.fixture
+def shell_hook_template(tmp_path):
+    """Return a template whose pre_prompt hook is a non executable script."""
+    tmp_path.joinpath("cookiecutter.json").write_text('{"name": "x"}')
+    hooks_dir = tmp_path.joinpath("hooks")
+    hooks_dir.mkdir()
+    script = hooks_dir.joinpath("pre_prompt.sh")
+    script.write_text('#!/bin/sh\necho \'{"name": "from-hook"}\' > cookiecutter.json\n')
+    script.chmod(0o644)
+    return tmp_path
+
+
+@pytest.mark.skipif(sys.platform.startswith("win"), reason="Linux only test")
+def test_run_pre_prompt_hook_leaves_template_unchanged(shell_hook_template):
+    """A hook script needing the executable bit runs from a copy."""
+    context_file = hooks.run_pre_prompt_hook(str(shell_hook_template))
+    try:
+        with open(context_file) as fh:
+            assert json.load(fh)["name"] == "from-hook"
+    finally:
+        os.remove(context_file)
+        os.rmdir(os.path.dirname(context_file))
+
+    script = shell_hook_template / "hooks" / "pre_prompt.sh"
+    assert script.stat().st_mode & 0o777 == 0o644
+
+
+@pytest.mark.parametrize("in_process", [False, True])
+def test_run_pre_prompt_hook_rejects(tmp_path, in_process):
+    """A failing pre_prompt hook raises and leaves no scratch directory."""
+    tmp_path.joinpath("cookiecutter.json").write_text('{"name": "x"}')
+    hooks_dir = tmp_path.joinpath("hooks")
+    hooks_dir.mkdir()
+    hooks_dir.joinpath("pre_prompt.py").write_text(
+        "#!/usr/bin/env python\nimport sys\nsys.exit(3)\n"
+    )
+
+    with pytest.raises(exceptions.FailedHookException) as excinfo:
+        hooks.run_pre_prompt_hook(str(tmp_path), in_process=in_process)
+    assert "exit status: 3" in str(excinfo.value)
+
+
+def test_run_script_in_process_exception(tmp_path):
+    """Uncaught exceptions in an in-process hook are reported as failures."""
+    script = tmp_path.joinpath("hook.py")
+    script.write_text("raise ValueError('bad value')\n")
+    argv = list(sys.argv)
+
+    with pytest.raises(exceptions.FailedHookException) as excinfo:
+        hooks.run_script_in_process(str(script), str(tmp_path))
+    assert "bad value" in str(excinfo.value)
+    assert sys.argv == argv
+
+
+def test_cookiecutter_uses_pre_prompt_defaults(mocker):
+    """Values computed by the pre_prompt hook become the prompt defaults."""
+    mock_generate_files = mocker.patch("cookieninja.main.generate_files")
+    main.cookiecutter(REPO_DIR, no_input=True)
+
+    context = mock_generate_files.call_args[1]["context"]
+    assert context["cookiecutter"]["project_slug"] == "computed-by-hook"
+
+
+def test_cookiecutter_skips_pre_prompt_without_hooks(mocker):
+    """Declining hooks also skips the pre_prompt stage."""
+    mock_generate_files = mocker.patch("cookieninja.main.generate_files")
+    main.cookiecutter(REPO_DIR, no_input=True, accept_hooks=False)
+
+    context = mock_generate_files.call_args[1]["context"]
+    assert context["cookiecutter"]["project_slug"] == "fake-project"
+
+
+def test_run_script_in_process_exit_success(tmp_path):
+    """In-process hooks may exit with a success status."""
+    script = tmp_path.joinpath("hook.py")
+    script.write_text("import sys\nopen('ran', 'w').close()\nsys.exit(0)\n")
+
+    hooks.run_script_in_process(str(script), str(tmp_path))
+
+    assert tmp_path.joinpath("ran").exists()
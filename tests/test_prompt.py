@@ -31,7 +31,8 @@ class TestRenderVariable:
         """Verify simple items correctly rendered to strings."""
         env = environment.StrictEnvironment()
         from_string = mocker.patch(
-            "cookieninja.prompt.StrictEnvironment.from_string", wraps=env.from_string
+            "cookieninja.environment.StrictEnvironment.from_string",
+            wraps=env.from_string,
         )
         context = {"project": "foobar"}
 
@@ -123,6 +124,19 @@ class TestPrompt:
         cookiecutter_dict = prompt.prompt_for_config(context, no_input=True)
         assert cookiecutter_dict == expected_dict
 
+    def test_prompt_for_config_default_settings(self):
+        """Variables are rendered without the ``_jinja2_env_vars`` of the context."""
+        context = {
+            "cookiecutter": {
+                "_jinja2_env_vars": {"variable_start_string": "[["},
+                "name": "demo",
+                "slug": "{{ cookiecutter.name }}\n",
+            }
+        }
+
+        cookiecutter_dict = prompt.prompt_for_config(context, no_input=True)
+        assert cookiecutter_dict["slug"] == "demo"
+
     def test_prompt_for_config_dict(self, monkeypatch):
         """Verify `prompt_for_config` call `read_user_variable` on dict request."""
         monkeypatch.setattr(
@@ -572,3 +586,171 @@ class TestParseQuestionExpression(object):
         context = None
         with pytest.raises(exceptions.InvalidBooleanExpression):
             prompt.parse_question_expression(context, env, key)
+
+
+class TestVariableDependencies:
+    """Class to unite tests of the variable dependency ordering."""
+
+    def test_forward_reference(self):
+        """Variables may refer to variables declared after them."""
+        context = {
+            "cookiecutter": OrderedDict(
+                [
+                    ("repo_name", "{{ cookiecutter.project_name|lower }}"),
+                    ("project_name", "Slartibartfast"),
+                ]
+            )
+        }
+
+        cookiecutter_dict = prompt.prompt_for_config(context, no_input=True)
+        assert cookiecutter_dict == {
+            "repo_name": "slartibartfast",
+            "project_name": "Slartibartfast",
+        }
+        assert list(cookiecutter_dict) == ["project_name", "repo_name"]
+
+    def test_dicts_refer_to_each_other(self):
+        """Dict variables may refer to dict variables declared after them."""
+        context = {
+            "cookiecutter": OrderedDict(
+                [
+                    ("service", {"url": "{{ cookiecutter.hosts['primary'] }}/api"}),
+                    ("hosts", {"primary": "{{ cookiecutter.domain }}"}),
+                    ("domain", "example.com"),
+                ]
+            )
+        }
+
+        cookiecutter_dict = prompt.prompt_for_config(context, no_input=True)
+        assert cookiecutter_dict["service"] == {"url": "example.com/api"}
+
+    def test_prompts_in_dependency_order(self, mocker):
+        """A variable is prompted for after the variables it refers to."""
+        read_user_variable = mocker.patch(
+            "cookieninja.prompt.read_user_variable",
+            side_effect=lambda var, default: default,
+        )
+        context = {
+            "cookiecutter": OrderedDict(
+                [
+                    ("repo_name", "{{ cookiecutter.project_name|lower }}"),
+                    ("project_name", "Foo"),
+                    ("author", "me"),
+                ]
+            )
+        }
+
+        prompt.prompt_for_config(context)
+        assert [c[0][0] for c in read_user_variable.call_args_list] == [
+            "project_name",
+            "repo_name",
+            "author",
+        ]
+
+    def test_renders_each_variable_once(self, mocker):
+        """Each template string is compiled exactly once."""
+        env = environment.get_environment(
+            {}, env_vars=False, keep_trailing_newline=False
+        )
+        from_string = mocker.spy(env, "from_string")
+        context = {
+            "cookiecutter": OrderedDict(
+                [
+                    ("project_name", "Foo"),
+                    ("repo_name", "{{ cookiecutter.project_name|lower }}"),
+                    ("details", {"name": "{{ cookiecutter.repo_name }}"}),
+                ]
+            )
+        }
+
+        prompt.prompt_for_config(context, no_input=True)
+        assert from_string.call_count == 4
+
+    def test_cycle_is_reported(self):
+        """Variables referring to each other raise a clear error."""
+        context = {
+            "cookiecutter": OrderedDict(
+                [
+                    ("first", "{{ cookiecutter.second }}"),
+                    ("second", "{{ cookiecutter['first'] }}"),
+                ]
+            )
+        }
+
+        with pytest.raises(exceptions.CircularVariableDependency) as err:
+            prompt.prompt_for_config(context, no_input=True)
+        assert "first -> second -> first" in str(err.value)
+
+    def test_dynamic_reference_depends_on_previous(self):
+        """Whole-context use of `cookiecutter` keeps declaration order."""
+        env = environment.get_environment({})
+        variables = OrderedDict(
+            [
+                ("a", "1"),
+                ("b", "{{ cookiecutter|length }}"),
+                ("c", "{{ cookiecutter.a }}"),
+            ]
+        )
+
+        assert prompt.referenced_variables(env, variables["b"]) is None
+        assert prompt.referenced_variables(env, variables["c"]) == {"a"}
+        assert prompt.order_variables(env, variables) == ["a", "b", "c"]
+
+    def test_question_depends_on_its_expression(self):
+        """A dependent question is asked after the variables it refers to."""
+        env = environment.get_environment({})
+        variables = OrderedDict(
+            [
+                ("access_mode?{{ cookiecutter.is_storage == 'yes' }}", "rw"),
+                ("is_storage", "yes"),
+            ]
+        )
+
+        assert prompt.order_variables(env, variables) == [
+            "is_storage",
+            "access_mode?{{ cookiecutter.is_storage == 'yes' }}",
+        ]
+
+    def test_question_uses_answers(self, mocker):
+        """The expression of a dependent question sees the answers given."""
+        mocker.patch(
+            "cookieninja.prompt.read_user_variable",
+            side_effect=lambda var, default: "no" if var == "is_storage" else "ro",
+        )
+        context = {
+            "cookiecutter": OrderedDict(
+                [
+                    ("access_mode?{{ cookiecutter.is_storage == 'yes' }}", "rw"),
+                    ("is_storage", "yes"),
+                ]
+            )
+        }
+
+        cookiecutter_dict = prompt.prompt_for_config(context)
+        assert cookiecutter_dict == {"is_storage": "no", "access_mode": "rw"}
+
+    def test_variables_are_analysed_on_demand(self, mocker):
+        """A variable is yielded before later variables are analysed."""
+        env = environment.get_environment({})
+        analysed = mocker.spy(prompt, "referenced_variables")
+        variables = OrderedDict([("a", "1"), ("b", "{{ cookiecutter.a }}")])
+
+        keys = prompt.iter_variables(env, variables)
+        assert next(keys) == "a"
+        assert analysed.call_count == 1
+        assert list(keys) == ["b"]
+
+    def test_syntax_errors_are_left_to_rendering(self):
+        """Values that do not parse refer to no variable."""
+        env = environment.get_environment({})
+        assert prompt.referenced_variables(env, "{{ cookiecutter.name") == set()
+
+    def test_rendered_list_is_a_choice(self, mocker):
+        """A value rendering to a list is prompted for as a choice."""
+        read_user_choice = mocker.patch(
+            "cookieninja.prompt.read_user_choice", return_value="b"
+        )
+        context = {"cookiecutter": {"letter": "{{ ['a', 'b'] }}"}}
+
+        assert prompt.prompt_for_config(context) == {"letter": "b"}
+        read_user_choice.assert_called_once_with("letter", ["a", "b"])
@@ -0,0 +1,375 @@
+"""Tests for the generation server and its client."""
+import http.client
+import json
+import os
+import socket
+import stat
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+
+import pytest
+from click.testing import CliRunner
+
+from cookieninja import server
+from cookieninja.__main__ import main
+from cookieninja.exceptions import (
+    GenerationServerError,
+    GenerationServerUnavailable,
+    InvalidServerAddress,
+)
+
+
+@pytest.fixture
+def running_server():
+    """Start a generation server in a thread, yield a factory for addresses."""
+    servers = []
+
+    def start(address, executor):
+        generation_server = server.make_server(address, executor)
+        thread = threading.Thread(target=generation_server.serve_forever)
+        thread.start()
+        servers.append((generation_server, thread, executor))
+        return generation_server
+
+    yield start
+
+    for generation_server, thread, executor in servers:
+        generation_server.shutdown()
+        generation_server.server_close()
+        thread.join()
+        executor.shutdown()
+
+
+@pytest.mark.parametrize(
+    "address, expected",
+    [
+        ("unix:/tmp/gen.sock", ("unix", "/tmp/gen.sock")),
+        ("/run/cookieninja.sock", ("unix", "/run/cookieninja.sock")),
+        ("8765", ("tcp", ("127.0.0.1", 8765))),
+        ("localhost:8765", ("tcp", ("localhost", 8765))),
+    ],
+)
+def test_parse_address(address, expected):
+    """Unix socket paths and TCP ports are told apart."""
+    assert server.parse_address(address) == expected
+
+
+@pytest.mark.parametrize("address", ["localhost", "localhost:http", "70000"])
+def test_parse_invalid_address(address):
+    """Addresses without a valid port are reported clearly."""
+    with pytest.raises(InvalidServerAddress, match="HOST:PORT"):
+        server.parse_address(address)
+
+
+def test_generate_over_tcp(running_server, tmp_path):
+    """A generation request over localhost HTTP generates the project."""
+    generation_server = running_server("127.0.0.1:0", ThreadPoolExecutor(1))
+    address = "127.0.0.1:{}".format(generation_server.server_address[1])
+
+    project_dir = server.generate_remote(
+        address,
+        "tests/fake-repo-pre",
+        extra_context={"project_name": "Remote"},
+        output_dir=str(tmp_path),
+    )
+
+    assert project_dir == str(tmp_path.joinpath("fake-project"))
+    readme = Path(project_dir, "README.rst").read_text()
+    assert "Project name: **Remote**" in readme
+
+
+def test_generate_error_is_reported(running_server, tmp_path):
+    """Generation failures are raised on the client side."""
+    generation_server = running_server("127.0.0.1:0", ThreadPoolExecutor(1))
+    address = "127.0.0.1:{}".format(generation_server.server_address[1])
+
+    with pytest.raises(GenerationServerError) as excinfo:
+        server.generate_remote(address, "tests/unknown-repo", output_dir=str(tmp_path))
+    assert "could not be found" in str(excinfo.value)
+
+
+@pytest.mark.skipif(sys.platform.startswith("win"), reason="Needs Unix sockets")
+def test_generate_over_unix_socket(running_server, tmp_path):
+    """Concurrent requests over a Unix socket are served by worker processes."""
+    address = str(tmp_path.joinpath("gen.sock"))
+    running_server(address, ProcessPoolExecutor(2, initializer=server._warm_up))
+
+    with ThreadPoolExecutor(2) as clients:
+        futures = [
+            clients.submit(
+                server.generate_remote,
+                address,
+                "tests/fake-repo-pre",
+                output_dir=str(tmp_path.joinpath(name)),
+            )
+            for name in ("one", "two")
+        ]
+        project_dirs = [future.result() for future in futures]
+    project_dirs.append(
+        server.generate_remote(
+            address,
+            "tests/fake-repo-pre",
+            timeout=30,
+            output_dir=str(tmp_path.joinpath("three")),
+        )
+    )
+
+    for project_dir in project_dirs:
+        assert os.path.isfile(os.path.join(project_dir, "README.rst"))
+
+
+@pytest.mark.parametrize("address", ["0.0.0.0:0", "192.0.2.1:0", "unknown.invalid:0"])
+def test_server_listens_on_loopback_only(address):
+    """Unauthenticated requests are only accepted from the machine."""
+    with pytest.raises(InvalidServerAddress):
+        server.make_server(address, None)
+
+
+@pytest.mark.skipif(sys.platform.startswith("win"), reason="Needs Unix sockets")
+def test_unix_socket_is_private(tmp_path):
+    """The socket is accessible to the user running the server only."""
+    address = tmp_path.joinpath("gen.sock")
+    # Left behind by a server that was killed
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(str(address))
+    stale.close()
+
+    generation_server = server.make_server(str(address), None)
+    try:
+        assert stat.S_IMODE(os.stat(address).st_mode) == 0o600
+    finally:
+        generation_server.server_close()
+
+
+@pytest.mark.parametrize("kind", ["file", "link"])
+def test_server_keeps_other_files(tmp_path, kind):
+    """Only sockets are replaced by the server's socket."""
+    target = tmp_path.joinpath("data")
+    target.write_text("data")
+    address = tmp_path.joinpath("gen.sock")
+    if kind == "file":
+        address.write_text("data")
+    else:
+        address.symlink_to(target)
+
+    with pytest.raises(InvalidServerAddress, match="not a socket"):
+        server.make_server(str(address), None)
+
+    assert address.read_text() == "data"
+    assert target.read_text() == "data"
+
+
+def test_server_errors(running_server, tmp_path):
+    """Invalid requests and generation crashes are replied to as errors."""
+
+    class CrashingExecutor(ThreadPoolExecutor):
+        def submit(self, fn, *args):
+            raise RuntimeError("Worker crashed")
+
+    generation_server = running_server("localhost:0", CrashingExecutor(1))
+    port = generation_server.server_address[1]
+
+    def request(method, path, body=None):
+        connection = http.client.HTTPConnection("127.0.0.1", port)
+        try:
+            connection.request(method, path, body=body)
+            response = connection.getresponse()
+            return response.status, json.loads(response.read())
+        finally:
+            connection.close()
+
+    assert request("GET", "/") == (200, {"status": "ok"})
+    assert request("POST", "/unknown", "{}")[0] == 404
+    assert request("POST", server.GENERATE_PATH, "[]")[0] == 400
+    assert request("POST", server.GENERATE_PATH, "{")[0] == 400
+    assert request("POST", server.GENERATE_PATH, '{"template": "t"}') == (
+        500,
+        {"error": "Worker crashed", "type": "RuntimeError"},
+    )
+
+
+@pytest.fixture
+def replying_server():
+    """Start a server replying ``body`` to any request, yield its address."""
+    servers = []
+
+    def start(body):
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if body is None:
+                    # Drop the connection without replying
+                    return
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        http_server = HTTPServer(("127.0.0.1", 0), Handler)
+        thread = threading.Thread(target=http_server.serve_forever)
+        thread.start()
+        servers.append((http_server, thread))
+        return "127.0.0.1:{}".format(http_server.server_address[1])
+
+    yield start
+
+    for http_server, thread in servers:
+        http_server.shutdown()
+        http_server.server_close()
+        thread.join()
+
+
+@pytest.mark.parametrize("body", [None, b"<html>", b"[]", b"{}"])
+def test_generate_remote_invalid_reply(replying_server, body):
+    """Lost and invalid replies are reported as generation server errors."""
+    address = replying_server(body)
+
+    with pytest.raises(GenerationServerError):
+        server.generate_remote(address, "tests/fake-repo-pre")
+
+
+def test_generate_remote_unavailable(tmp_path):
+    """Servers that cannot be reached are told apart from failures."""
+    with pytest.raises(GenerationServerUnavailable):
+        server.generate_remote(
+            str(tmp_path.joinpath("missing.sock")), "tests/fake-repo-pre"
+        )
+
+
+@pytest.mark.parametrize("unix", [True, False])
+def test_serve(mocker, tmp_path, unix):
+    """The server runs until interrupted, then removes its socket."""
+    address = str(tmp_path.joinpath("gen.sock")) if unix else "127.0.0.1:0"
+    serve_forever = mocker.patch(
+        "socketserver.BaseServer.serve_forever", side_effect=KeyboardInterrupt
+    )
+
+    server.serve(address, max_workers=1)
+
+    assert serve_forever.called
+    assert not os.path.exists(tmp_path.joinpath("gen.sock"))
+
+
+@pytest.mark.parametrize("replaced", [True, False])
+def test_serve_keeps_replaced_socket(mocker, tmp_path, replaced):
+    """A file that replaced or removed the socket meanwhile is left alone."""
+    address = tmp_path.joinpath("gen.sock")
+
+    def serve_forever(self):
+        address.unlink()
+        if replaced:
+            address.write_text("data")
+        raise KeyboardInterrupt
+
+    mocker.patch("socketserver.BaseServer.serve_forever", serve_forever)
+
+    server.serve(str(address), max_workers=1)
+
+    assert address.exists() is replaced
+
+
+def test_warm_up():
+    """Worker processes import the generation code before any request."""
+    server._warm_up()
+
+
+def test_cli_uses_server(mocker):
+    """With --server and --no-input the CLI delegates to the server."""
+    generate_remote = mocker.patch("cookieninja.cli.generate_remote")
+    cookiecutter = mocker.patch("cookieninja.cli.cookiecutter")
+
+    result = CliRunner().invoke(
+        main, ["--server", "/tmp/gen.sock", "--no-input", "tests/fake-repo-pre"]
+    )
+
+    assert result.exit_code == 0
+    assert generate_remote.call_args[0] == ("/tmp/gen.sock", "tests/fake-repo-pre")
+    assert generate_remote.call_args[1]["keep_project_on_failure"] is False
+    assert generate_remote.call_args[1]["recurse_submodules"] is False
+    assert not cookiecutter.called
+
+
+def test_cli_keeps_passwords_local(mocker, monkeypatch):
+    """Templates needing a password are generated locally."""
+    monkeypatch.setenv("COOKIECUTTER_REPO_PASSWORD", "sekrit")
+    generate_remote = mocker.patch("cookieninja.cli.generate_remote")
+    cookiecutter = mocker.patch("cookieninja.cli.cookiecutter")
+
+    result = CliRunner().invoke(
+        main, ["--server", "/tmp/gen.sock", "--no-input", "tests/fake-repo-pre"]
+    )
+
+    assert result.exit_code == 0
+    assert not generate_remote.called
+    assert cookiecutter.call_args[1]["password"] == "sekrit"
+
+
+def test_cli_reports_invalid_server_address(mocker):
+    """An unusable --server address is reported, not raised."""
+    cookiecutter = mocker.patch("cookieninja.cli.cookiecutter")
+
+    result = CliRunner().invoke(
+        main, ["--server", "localhost", "--no-input", "tests/fake-repo-pre"]
+    )
+
+    assert result.exit_code == 1
+    assert "Invalid server address" in result.output
+    assert not cookiecutter.called
+
+
+def test_cli_reports_lost_replies(mocker):
+    """Once the request was sent, errors are not followed by a local run."""
+    mocker.patch(
+        "cookieninja.cli.generate_remote",
+        side_effect=GenerationServerError("No reply from the generation server"),
+    )
+    cookiecutter = mocker.patch("cookieninja.cli.cookiecutter")
+
+    result = CliRunner().invoke(
+        main, ["--server", "/tmp/gen.sock", "--no-input", "tests/fake-repo-pre"]
+    )
+
+    assert result.exit_code == 1
+    assert "No reply" in result.output
+    assert not cookiecutter.called
+
+
+def test_cli_serve_rejects_public_address():
+    """The CLI refuses to serve on an address reachable from the network."""
+    result = CliRunner().invoke(main, ["--serve", "0.0.0.0:8765"])
+
+    assert result.exit_code == 1
+    assert "loopback" in result.output
+
+
+def test_cli_serve(mocker):
+    """The CLI serves until the server stops."""
+    serve = mocker.patch("cookieninja.server.serve")
+
+    result = CliRunner().invoke(main, ["--serve", "127.0.0.1:8765"])
+
+    assert result.exit_code == 0
+    serve.assert_called_once_with("127.0.0.1:8765")
+
+
+def test_cli_falls_back_without_server(mocker, tmp_path):
+    """An unreachable server falls back to local generation."""
+    cookiecutter = mocker.patch("cookieninja.cli.cookiecutter")
+
+    result = CliRunner().invoke(
+        main,
+        [
+            "--server",
+            str(tmp_path.joinpath("missing.sock")),
+            "--no-input",
+            "tests/fake-repo-pre",
+        ],
+    )
+
+    assert result.exit_code == 0
+    assert cookiecutter.called
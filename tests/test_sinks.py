@@ -0,0 +1,542 @@
+"""Tests for generating projects to output sinks."""
+import io
+import os
+import shutil
+import stat
+import tarfile
+import zipfile
+
+import pytest
+
+from cookieninja import generate
+from cookieninja.analysis import analyze_template
+from cookieninja.environment import get_environment
+from cookieninja.exceptions import OutputSinkError
+from cookieninja.sinks import (
+    DedupStore,
+    DirectorySink,
+    MemorySink,
+    OutputSink,
+    TarSink,
+    ZipSink,
+)
+
+PERMISSIONS_REPO = os.path.abspath("tests/test-generate-files-permissions")
+PERMISSIONS_CONTEXT = {"cookiecutter": {"permissions": "permissions"}}
+
+
+class Stream(io.RawIOBase):
+    """Write-only stream that cannot seek, like a pipe or a socket."""
+
+    def __init__(self):
+        """Collect the written bytes."""
+        self.data = bytearray()
+
+    def writable(self):
+        """Accept writes."""
+        return True
+
+    def write(self, data):
+        """Collect ``data``."""
+        self.data += data
+        return len(data)
+
+
+def test_memory_sink(tmp_path, monkeypatch):
+    """Files are kept in memory with their modes, nothing is written."""
+    monkeypatch.chdir(tmp_path)
+    sink = MemorySink()
+
+    project_dir = generate.generate_files(
+        PERMISSIONS_REPO, PERMISSIONS_CONTEXT, sink=sink
+    )
+
+    assert project_dir == "inputpermissions"
+    assert not (tmp_path / "inputpermissions").exists()
+    assert sorted(sink.files) == [
+        "inputpermissions/script.sh",
+        "inputpermissions/simple.txt",
+    ]
+    assert sink.modes["inputpermissions/script.sh"] & stat.S_IXUSR
+    assert not sink.modes["inputpermissions/simple.txt"] & stat.S_IXUSR
+
+
+def test_memory_sink_copy_without_render():
+    """Directories copied without rendering are copied into the sink."""
+    sink = MemorySink()
+
+    generate.generate_files(
+        "tests/test-generate-copy-without-render",
+        {
+            "cookiecutter": {
+                "repo_name": "demo",
+                "render_test": "rendered",
+                "_copy_without_render": ["*not-rendered"],
+            }
+        },
+        sink=sink,
+    )
+
+    assert sink.files["demo/rendered/not_rendered.yml"] == b"---\n- name: rendered\n"
+    assert b"{{cookiecutter.render_test}}" in (
+        sink.files["demo/demo-not-rendered/README.rst"]
+    )
+
+
+def test_tar_sink_streams_archive():
+    """A tar archive is streamed, with the modes of the files."""
+    stream = Stream()
+    with TarSink(stream, compression="gz") as sink:
+        generate.generate_files(PERMISSIONS_REPO, PERMISSIONS_CONTEXT, sink=sink)
+
+    with tarfile.open(fileobj=io.BytesIO(stream.data)) as tar:
+        members = {member.name: member for member in tar.getmembers()}
+        assert members["inputpermissions"].isdir()
+        assert members["inputpermissions/script.sh"].mode & stat.S_IXUSR
+        content = tar.extractfile("inputpermissions/simple.txt").read()
+    assert content == b"Some static text"
+
+
+def test_zip_sink_streams_archive():
+    """A zip archive is streamed, with the modes of the files."""
+    stream = Stream()
+    with ZipSink(stream) as sink:
+        generate.generate_files(PERMISSIONS_REPO, PERMISSIONS_CONTEXT, sink=sink)
+
+    with zipfile.ZipFile(io.BytesIO(stream.data)) as archive:
+        mode = archive.getinfo("inputpermissions/script.sh").external_attr >> 16
+        assert mode & stat.S_IXUSR
+        assert archive.getinfo("inputpermissions/").is_dir()
+        assert archive.read("inputpermissions/simple.txt") == b"Some static text"
+
+
+def test_sink_without_filesystem_rejects_hooks():
+    """Hooks need the project on disk."""
+    with pytest.raises(OutputSinkError):
+        generate.generate_files(
+            "tests/test-pyhooks",
+            {"cookiecutter": {"pyhooks": "pyhooks"}},
+            sink=MemorySink(),
+        )
+
+    generate.generate_files(
+        "tests/test-pyhooks",
+        {"cookiecutter": {"pyhooks": "pyhooks"}},
+        accept_hooks=False,
+        sink=MemorySink(),
+    )
+
+
+@pytest.mark.parametrize("workers", (1, 4))
+def test_directory_sink_make_dirs(tmp_path, workers):
+    """Directories are created parents first, with several threads or one."""
+    sink = DirectorySink(mkdir_workers=workers)
+    paths = [tmp_path / "a", tmp_path / "c", tmp_path / "a" / "b", tmp_path / "d/e"]
+
+    sink.make_dirs(paths)
+    sink.make_dirs(paths)
+
+    assert all(path.is_dir() for path in paths)
+    with pytest.raises(FileExistsError):
+        sink.make_dirs(paths, exist_ok=False)
+
+
+def test_concurrent_directory_creation(tmp_path):
+    """A project generated with concurrent directory creation is complete."""
+    project_dir = generate.generate_files(
+        "tests/test-generate-copy-without-render",
+        {
+            "cookiecutter": {
+                "repo_name": "demo",
+                "render_test": "rendered",
+                "_copy_without_render": ["*not-rendered"],
+            }
+        },
+        output_dir=str(tmp_path),
+        sink=DirectorySink(mkdir_workers=4),
+    )
+
+    assert sorted(os.listdir(project_dir)) == [
+        "README.rst",
+        "README.txt",
+        "demo-not-rendered",
+        "demo-rendered",
+        "rendered",
+    ]
+
+
+@pytest.fixture
+def fsynced(monkeypatch):
+    """Record the paths flushed to disk, without flushing them."""
+    paths = []
+    monkeypatch.setattr(
+        os, "fsync", lambda fd: paths.append(os.readlink(f"/proc/self/fd/{fd}"))
+    )
+    return paths
+
+
+PROJECT_CONTEXT = {
+    "cookiecutter": {
+        "repo_name": "demo",
+        "render_test": "rendered",
+        "_copy_without_render": ["*not-rendered"],
+    }
+}
+
+
+def _tree(path):
+    """Return the files and directories under ``path``, ``path`` included."""
+    paths = {str(path)}
+    for top, dirs, files in os.walk(path):
+        paths.update(os.path.join(top, name) for name in dirs + files)
+    return paths
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc/self/fd"), reason="Needs /proc")
+@pytest.mark.parametrize("staged", [False, True])
+def test_durability_file(tmp_path, fsynced, staged):
+    """Each file is flushed as written, then the directories and the parent."""
+    project_dir = generate.generate_files(
+        "tests/test-generate-copy-without-render",
+        PROJECT_CONTEXT,
+        output_dir=str(tmp_path),
+        durability="file",
+        staged=staged,
+    )
+
+    assert str(tmp_path) in fsynced
+    if not staged:
+        assert set(fsynced) == _tree(project_dir) | {str(tmp_path)}
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc/self/fd"), reason="Needs /proc")
+def test_durability_commit(tmp_path, fsynced, monkeypatch):
+    """The project is flushed once complete, with ``syncfs`` where available."""
+    calls = []
+    monkeypatch.setattr("cookieninja.sinks.syncfs", lambda path: calls.append(path))
+
+    project_dir = generate.generate_files(
+        "tests/test-generate-copy-without-render",
+        PROJECT_CONTEXT,
+        output_dir=str(tmp_path),
+        durability="commit",
+    )
+
+    # Without syncfs, each file and directory is flushed once, at the end
+    assert calls == [project_dir]
+    assert sorted(fsynced) == sorted(_tree(project_dir) | {str(tmp_path)})
+
+
+def test_durability_commit_syncfs(tmp_path, monkeypatch):
+    """A single ``syncfs`` replaces the ``fsync`` calls."""
+    monkeypatch.setattr("cookieninja.sinks.syncfs", lambda path: True)
+    monkeypatch.setattr(os, "fsync", pytest.fail)
+
+    generate.generate_files(
+        "tests/test-generate-copy-without-render",
+        PROJECT_CONTEXT,
+        output_dir=str(tmp_path),
+        durability="commit",
+    )
+
+
+def test_durability_none(tmp_path, monkeypatch):
+    """Nothing is flushed by default."""
+    monkeypatch.setattr(os, "fsync", pytest.fail)
+
+    generate.generate_files(
+        "tests/test-generate-copy-without-render",
+        PROJECT_CONTEXT,
+        output_dir=str(tmp_path),
+    )
+
+
+def test_unknown_durability():
+    """Durability levels are checked."""
+    with pytest.raises(ValueError):
+        DirectorySink(durability="always")
+
+
+def test_directory_sink_replaces_files(tmp_path):
+    """Files are replaced, never written through another link to them."""
+    directory = tmp_path / "files"
+    directory.mkdir()
+    original = directory / "original"
+    original.write_text("original\n")
+    target = directory / "target"
+    os.link(original, target)
+
+    copy = directory / "copy"
+    copy.write_text("previous\n")
+    os.link(copy, directory / "copy-link")
+
+    sink = DirectorySink()
+    sink.write_file(str(target), b"new\n")
+    sink.copy_file(str(original), str(copy))
+
+    assert target.read_text() == "new\n"
+    assert original.read_text() == "original\n"
+    assert copy.read_text() == "original\n"
+    assert (directory / "copy-link").read_text() == "previous\n"
+    assert sorted(os.listdir(directory)) == ["copy", "copy-link", "original", "target"]
+
+
+def test_directory_sink_writes_files_in_place(tmp_path):
+    """Files with a single link are written in place, keeping their inode."""
+    target = tmp_path / "target"
+    target.write_text("previous\n")
+    inode = os.stat(target).st_ino
+    link = tmp_path / "link"
+    link.symlink_to(target)
+
+    DirectorySink().write_file(str(link), b"new\n")
+
+    assert link.is_symlink()
+    assert target.read_text() == "new\n"
+    assert os.stat(target).st_ino == inode
+
+
+def test_directory_sink_failed_write(tmp_path, monkeypatch):
+    """A failed write leaves the previous file and no temporary file."""
+    directory = tmp_path / "files"
+    directory.mkdir()
+    target = directory / "target"
+    target.write_text("previous\n")
+    os.link(target, directory / "link")
+
+    def replace(src, dst):
+        raise OSError("Disk full")
+
+    monkeypatch.setattr(os, "replace", replace)
+    with pytest.raises(OSError):
+        DirectorySink().write_file(str(target), b"new\n")
+
+    assert target.read_text() == "previous\n"
+    assert sorted(os.listdir(directory)) == ["link", "target"]
+
+
+def test_dedup_store(tmp_path, monkeypatch):
+    """Files are written once and reflinked, replacing existing files."""
+    monkeypatch.setattr("cookieninja.sinks.reflink", shutil.copyfile)
+    store = DedupStore(str(tmp_path / "store"))
+    target = tmp_path / "target"
+    target.write_text("previous\n")
+    other = tmp_path / "other"
+    os.link(target, other)
+
+    store.write_bytes(str(target), b"new\n", 0o644)
+    store.write_bytes(str(tmp_path / "copy"), b"new\n", 0o600)
+    store.write_bytes(str(tmp_path / "reflink"), b"new\n", 0o644)
+
+    assert target.read_text() == "new\n"
+    assert other.read_text() == "previous\n"
+    assert (tmp_path / "copy").read_text() == "new\n"
+    assert stat.S_IMODE(os.stat(tmp_path / "copy").st_mode) == 0o600
+    assert (tmp_path / "reflink").read_text() == "new\n"
+    assert store.bytes_written == 2 * len(b"new\n")
+    assert store.bytes_saved == len(b"new\n")
+
+
+def test_dedup_store_without_reflinks(tmp_path, monkeypatch, caplog):
+    """Without reflinks files are written straight to their path, not stored."""
+
+    def reflink(src, dst):
+        raise OSError("Reflinks are not supported")
+
+    monkeypatch.setattr("cookieninja.sinks.reflink", reflink)
+    store = DedupStore(str(tmp_path / "store"))
+    source = tmp_path / "source"
+    source.write_text("new\n")
+
+    store.write_bytes(str(tmp_path / "one"), b"new\n", 0o644)
+    store.write_bytes(str(tmp_path / "two"), b"new\n", 0o644)
+    store.copy_file(str(source), str(tmp_path / "three"), 0o600)
+
+    assert (tmp_path / "two").read_text() == "new\n"
+    assert (tmp_path / "three").read_text() == "new\n"
+    assert stat.S_IMODE(os.stat(tmp_path / "three").st_mode) == 0o600
+    assert (store.bytes_written, store.bytes_saved) == (3 * len(b"new\n"), 0)
+    assert not any(files for _, _, files in os.walk(tmp_path / "store"))
+    assert caplog.text.count("Reflinks are not supported") == 1
+
+
+def test_dedup_store_link_fails(tmp_path, monkeypatch, caplog):
+    """A file that cannot be reflinked from the store is written instead."""
+    store_dir = tmp_path / "store"
+
+    def reflink(src, dst):
+        # Stored, but on another filesystem than the projects
+        if not dst.startswith(str(store_dir)):
+            raise OSError("Invalid cross-device link")
+        shutil.copyfile(src, dst)
+
+    monkeypatch.setattr("cookieninja.sinks.reflink", reflink)
+    store = DedupStore(str(store_dir))
+
+    store.write_bytes(str(tmp_path / "one"), b"new\n", 0o644)
+    store.write_bytes(str(tmp_path / "two"), b"new\n", 0o644)
+    store._unsupported()
+
+    assert (tmp_path / "two").read_text() == "new\n"
+    assert (store.bytes_written, store.bytes_saved) == (2 * len(b"new\n"), 0)
+    assert caplog.text.count("Reflinks are not supported") == 1
+
+
+def test_dedup_store_concurrent(tmp_path, monkeypatch):
+    """A file stored meanwhile by another thread is kept."""
+    store = DedupStore(str(tmp_path / "store"))
+    stored_path = tmp_path / "store" / "ab" / "stored"
+    path = tmp_path / "path"
+    path.write_text("second\n")
+
+    def reflink(src, dst):
+        # Another thread stores the same file first
+        stored_path.write_text("first\n")
+        shutil.copyfile(src, dst)
+
+    monkeypatch.setattr("cookieninja.sinks.reflink", reflink)
+    store._store(str(path), str(stored_path))
+
+    assert os.listdir(stored_path.parent) == ["stored"]
+    assert stored_path.read_text() == "first\n"
+
+
+def _archive_files(kind, data):
+    """Return the names of the members of an archive and their contents."""
+    if kind == "tar":
+        with tarfile.open(fileobj=io.BytesIO(data)) as tar:
+            return [
+                (member.name, member.isfile() and tar.extractfile(member).read())
+                for member in tar.getmembers()
+            ]
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        return [(info.filename, archive.read(info)) for info in archive.infolist()]
+
+
+@pytest.mark.parametrize("kind", ["tar", "zip"])
+def test_archive_sink_keeps_written_files(tmp_path, kind):
+    """Files written again keep their first entry, no duplicate is added."""
+    source = tmp_path / "source"
+    (source / "sub").mkdir(parents=True)
+    (source / "sub" / "copied.txt").write_bytes(b"copied")
+    stream = Stream()
+
+    with (TarSink if kind == "tar" else ZipSink)(stream) as sink:
+        sink.make_dir(".")
+        sink.write_file("project/a.txt", b"first")
+        sink.write_file("project/a.txt", b"second")
+        sink.copy_file(str(source / "sub" / "copied.txt"), "project/a.txt")
+        sink.copy_file(str(source / "sub" / "copied.txt"), "project/b.txt")
+        sink.copy_tree(str(source), "project/tree")
+        sink.copy_tree(str(source), "project/tree")
+
+    files = dict(_archive_files(kind, stream.data))
+    names = [name.rstrip("/") for name, _ in _archive_files(kind, stream.data)]
+    assert len(names) == len(set(names))
+    assert files["project/a.txt"] == b"first"
+    assert files["project/b.txt"] == b"copied"
+    assert files["project/tree/sub/copied.txt"] == b"copied"
+    assert (sink.files_written, sink.files_unchanged) == (3, 3)
+    assert sink.isfile("project/a.txt") and not sink.isfile("project")
+
+
+def test_memory_sink_overwrite():
+    """Directories copied again replace the first copy."""
+    sink = MemorySink()
+    context = {
+        "cookiecutter": {
+            "repo_name": "demo",
+            "render_test": "rendered",
+            "_copy_without_render": ["*not-rendered"],
+        }
+    }
+    generate.generate_files(
+        "tests/test-generate-copy-without-render", context, sink=sink
+    )
+    sink.files["demo/demo-not-rendered/extra.txt"] = b"extra"
+    sink.write_file("demo/demo-not-rendered/extra.txt", b"extra")
+
+    generate.generate_files(
+        "tests/test-generate-copy-without-render",
+        context,
+        overwrite_if_exists=True,
+        sink=sink,
+    )
+
+    assert "demo/demo-not-rendered/extra.txt" not in sink.files
+    assert "demo/demo-not-rendered/README.rst" in sink.files
+    with pytest.raises(FileExistsError):
+        sink.make_dirs(["demo"], exist_ok=False)
+
+
+def test_output_sink_is_abstract():
+    """Sinks implement at least make_dir and write_file."""
+    with pytest.raises(TypeError):
+        OutputSink()
+
+
+def test_directory_sink_compare_tree(tmp_path):
+    """Trees copied over existing ones only write what differs."""
+    source = tmp_path / "source"
+    (source / "common").mkdir(parents=True)
+    (source / "new").mkdir()
+    (source / "common" / "same.txt").write_text("same")
+    (source / "common" / "added.txt").write_text("added")
+    (source / "new" / "file.txt").write_text("new")
+    target = tmp_path / "target"
+    (target / "common").mkdir(parents=True)
+    (target / "common" / "same.txt").write_text("same")
+    (target / "common" / "removed.txt").write_text("removed")
+    sink = DirectorySink(compare=True)
+
+    sink.copy_tree(str(source), str(target))
+    sink.copy_file(str(source / "new" / "file.txt"), str(target / "missing.txt"))
+
+    assert _tree(target) == {
+        str(target),
+        str(target / "common"),
+        str(target / "common" / "same.txt"),
+        str(target / "common" / "added.txt"),
+        str(target / "new"),
+        str(target / "new" / "file.txt"),
+        str(target / "missing.txt"),
+    }
+    assert (sink.files_written, sink.files_unchanged) == (3, 1)
+
+
+def test_durability_commit_skips_links(tmp_path, monkeypatch):
+    """Without syncfs, links are not flushed, their target is."""
+    fsynced = []
+    monkeypatch.setattr("cookieninja.sinks.syncfs", lambda path: False)
+    monkeypatch.setattr("cookieninja.sinks.fsync_path", fsynced.append)
+    project = tmp_path / "project"
+    project.mkdir()
+    (project / "file.txt").touch()
+    os.symlink("file.txt", project / "link")
+
+    DirectorySink(durability="commit").sync(str(project))
+
+    assert fsynced == [str(project / "file.txt"), str(project), str(tmp_path)]
+
+
+def test_unchanged_files_are_looked_up_in_the_sink(tmp_path, monkeypatch):
+    """Files on disk are not taken for unchanged files of another sink."""
+    monkeypatch.chdir(tmp_path)
+    repo_dir = tmp_path / "repo"
+    template_dir = repo_dir / "{{cookiecutter.name}}"
+    template_dir.mkdir(parents=True)
+    (template_dir / "a.txt").write_text("{{ cookiecutter.a }}")
+    context = {"cookiecutter": {"name": "x", "a": "1"}}
+    generate.generate_files(str(repo_dir), context)
+    previous = analyze_template(str(template_dir), context, get_environment(context))
+    sink = MemorySink()
+
+    generate.generate_files(
+        str(repo_dir),
+        context,
+        previous_analysis=previous,
+        previous_context=context,
+        sink=sink,
+    )
+
+    assert sink.files == {"x/a.txt": b"1"}
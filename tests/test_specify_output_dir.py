@@ -42,6 +42,7 @@ def mock_prompt(mocker):
 def mock_replay(mocker):
     """Fixture. Automatically mock cookiecutter's function with expected output."""
     mocker.patch("cookieninja.main.dump")
+    mocker.patch("cookieninja.main.record")
 
 
 def test_api_invocation(mocker, template, output_dir, context):
@@ -58,6 +59,13 @@ def test_api_invocation(mocker, template, output_dir, context):
         output_dir=output_dir,
         accept_hooks=True,
         keep_project_on_failure=False,
+        preflight=False,
+        render_cache=None,
+        output_cache=None,
+        sink=None,
+        staged=False,
+        compare_before_write=False,
+        durability="none",
     )
 
 
@@ -75,4 +83,11 @@ def test_default_output_dir(mocker, template, context):
         output_dir=".",
         accept_hooks=True,
         keep_project_on_failure=False,
+        preflight=False,
+        render_cache=None,
+        output_cache=None,
+        sink=None,
+        staged=False,
+        compare_before_write=False,
+        durability="none",
     )
@@ -0,0 +1,291 @@
+"""Tests for staged generation."""
+import errno
+import os
+import shutil
+
+import pytest
+
+from cookieninja import generate, staging
+from cookieninja.exceptions import FailedHookException, OutputDirExistsException
+
+FILES_REPO = "tests/test-generate-files"
+FILES_CONTEXT = {"cookiecutter": {"food": "pizzä"}}
+
+
+@pytest.fixture
+def output_dir(tmp_path):
+    """Return an empty directory to generate into."""
+    path = tmp_path / "output"
+    path.mkdir()
+    return path
+
+
+def _abort_context(abort_pre_gen="no", abort_post_gen="no"):
+    return {
+        "cookiecutter": {
+            "repo_dir": "foobar",
+            "abort_pre_gen": abort_pre_gen,
+            "abort_post_gen": abort_post_gen,
+        }
+    }
+
+
+def test_staged_generation(output_dir):
+    """The project is renamed into place, no staging directory is left."""
+    project_dir = generate.generate_files(
+        FILES_REPO, FILES_CONTEXT, output_dir=str(output_dir), staged=True
+    )
+
+    assert project_dir == str(output_dir / "inputpizzä")
+    assert (output_dir / "inputpizzä" / "simple.txt").read_text() == "I eat pizzä"
+    assert [path.name for path in output_dir.iterdir()] == ["inputpizzä"]
+
+
+@pytest.mark.parametrize(
+    ("abort_pre_gen", "abort_post_gen"), (("yes", "no"), ("no", "yes"))
+)
+def test_staged_generation_hook_failure(output_dir, abort_pre_gen, abort_post_gen):
+    """A failed generation never shows up and is removed in the background."""
+    with pytest.raises(FailedHookException):
+        generate.generate_files(
+            "tests/hooks-abort-render",
+            _abort_context(abort_pre_gen, abort_post_gen),
+            output_dir=str(output_dir),
+            staged=True,
+        )
+
+    assert not (output_dir / "foobar").exists()
+    staging.wait_for_cleanups()
+    assert list(output_dir.iterdir()) == []
+
+
+def test_staged_generation_keep_project_on_failure(output_dir):
+    """A failed generation is kept in its staging directory if asked to."""
+    with pytest.raises(FailedHookException):
+        generate.generate_files(
+            "tests/hooks-abort-render",
+            _abort_context(abort_post_gen="yes"),
+            output_dir=str(output_dir),
+            keep_project_on_failure=True,
+            staged=True,
+        )
+
+    assert not (output_dir / "foobar").exists()
+    (staging_dir,) = output_dir.iterdir()
+    assert staging_dir.name.startswith(".foobar.")
+    assert (staging_dir / "README.rst").is_file()
+
+
+def test_staged_generation_existing_project(output_dir):
+    """An existing project is left alone without ``overwrite_if_exists``."""
+    (output_dir / "inputpizzä").mkdir()
+
+    with pytest.raises(OutputDirExistsException):
+        generate.generate_files(
+            FILES_REPO, FILES_CONTEXT, output_dir=str(output_dir), staged=True
+        )
+
+    assert [path.name for path in output_dir.iterdir()] == ["inputpizzä"]
+
+
+@pytest.mark.parametrize("renameat2", (True, False), ids=("renameat2", "renames"))
+def test_staged_generation_overwrite(output_dir, monkeypatch, renameat2):
+    """The existing project is swapped with the generated one."""
+    if not renameat2:
+        monkeypatch.setattr(staging, "_get_renameat2", lambda: None)
+    monkeypatch.setattr(staging, "reflink", shutil.copyfile)
+    project = output_dir / "inputpizzä"
+    project.mkdir()
+    (project / "simple.txt").write_text("old")
+    (project / "extra.txt").write_text("kept")
+
+    generate.generate_files(
+        FILES_REPO,
+        FILES_CONTEXT,
+        output_dir=str(output_dir),
+        overwrite_if_exists=True,
+        staged=True,
+    )
+
+    assert (project / "simple.txt").read_text() == "I eat pizzä"
+    assert (project / "extra.txt").read_text() == "kept"
+    staging.wait_for_cleanups()
+    assert [path.name for path in output_dir.iterdir()] == ["inputpizzä"]
+
+
+def test_staged_generation_overwrites_in_place_without_reflinks(
+    output_dir, monkeypatch
+):
+    """An existing project is not copied into staging without reflinks."""
+    monkeypatch.setattr(generate, "can_clone", lambda directory: False)
+    monkeypatch.setattr(
+        generate,
+        "StagedDirectory",
+        lambda *args, **kwargs: pytest.fail("project staged"),
+    )
+    project = output_dir / "inputpizzä"
+    project.mkdir()
+    (project / "simple.txt").write_text("old")
+    (project / "extra.txt").write_text("kept")
+
+    generate.generate_files(
+        FILES_REPO,
+        FILES_CONTEXT,
+        output_dir=str(output_dir),
+        overwrite_if_exists=True,
+        staged=True,
+    )
+
+    assert (project / "simple.txt").read_text() == "I eat pizzä"
+    assert (project / "extra.txt").read_text() == "kept"
+    assert [path.name for path in output_dir.iterdir()] == ["inputpizzä"]
+
+
+def test_can_clone(output_dir, monkeypatch):
+    """The probe tells whether reflinks work, and leaves no file behind."""
+
+    def reflink(src, dst):
+        raise OSError(errno.EOPNOTSUPP, "Operation not supported")
+
+    monkeypatch.setattr(staging, "reflink", reflink)
+    assert not staging.can_clone(output_dir)
+    monkeypatch.setattr(staging, "reflink", shutil.copyfile)
+    assert staging.can_clone(output_dir)
+    assert list(output_dir.iterdir()) == []
+
+
+def test_exchange(output_dir):
+    """Two directories swap their contents."""
+    first, second = output_dir / "first", output_dir / "second"
+    first.mkdir()
+    second.mkdir()
+    (first / "one").touch()
+    (second / "two").touch()
+
+    staging.exchange(str(first), str(second))
+
+    assert [path.name for path in first.iterdir()] == ["two"]
+    assert [path.name for path in second.iterdir()] == ["one"]
+
+
+def test_staged_directory_reflinks_existing_project(output_dir, monkeypatch):
+    """The existing project is reflinked, keeping the metadata of its files."""
+    reflinked = []
+
+    def reflink(src, dst):
+        reflinked.append(os.path.basename(src))
+        shutil.copyfile(src, dst)
+
+    monkeypatch.setattr(staging, "reflink", reflink)
+    project = output_dir / "project"
+    project.mkdir()
+    (project / "script.sh").write_text("old")
+    (project / "script.sh").chmod(0o750)
+    os.utime(project / "script.sh", (1000, 1000))
+
+    stage = staging.StagedDirectory(str(project), overwrite=True)
+
+    staged = os.path.join(stage.path, "script.sh")
+    assert reflinked == ["script.sh"]
+    assert os.stat(staged).st_mode & 0o777 == 0o750
+    assert os.stat(staged).st_mtime == 1000
+    with open(staged, "a") as fh:
+        fh.write(" and new")
+    assert (project / "script.sh").read_text() == "old"
+
+
+def test_staged_directory_copies_without_reflinks(output_dir, monkeypatch):
+    """Files are copied once reflinks failed."""
+    calls = []
+
+    def reflink(src, dst):
+        calls.append(src)
+        raise OSError("not supported")
+
+    monkeypatch.setattr(staging, "reflink", reflink)
+    project = output_dir / "project"
+    project.mkdir()
+    for name in ("one", "two"):
+        (project / name).write_text(name)
+    os.utime(project / "one", (1000, 1000))
+
+    stage = staging.StagedDirectory(str(project), overwrite=True)
+
+    assert len(calls) == 1
+    assert sorted(os.listdir(stage.path)) == ["one", "two"]
+    assert os.stat(os.path.join(stage.path, "one")).st_mtime == 1000
+
+
+def test_staged_directory_commit(output_dir, monkeypatch):
+    """Commits fail if the project appeared meanwhile, and can be flushed."""
+    synced = []
+    monkeypatch.setattr(staging, "fsync_path", synced.append)
+    target = output_dir / "project"
+
+    staging.StagedDirectory(str(target)).commit(durable=True)
+
+    assert target.is_dir()
+    assert synced == [str(output_dir)]
+    (target / "file").touch()
+    stage = staging.StagedDirectory(str(target))
+    with pytest.raises(OutputDirExistsException):
+        stage.commit()
+    staging.wait_for_cleanups()
+    assert [path.name for path in output_dir.iterdir()] == ["project"]
+
+    def rename(src, dst):
+        raise PermissionError(errno.EACCES, "Permission denied")
+
+    stage = staging.StagedDirectory(str(output_dir / "other"))
+    monkeypatch.setattr(os, "rename", rename)
+    with pytest.raises(PermissionError):
+        stage.commit()
+
+
+def test_remove_in_background_failure(output_dir, monkeypatch, caplog):
+    """Failed removals are logged by their daemon thread."""
+
+    def rmtree(path):
+        raise PermissionError(errno.EACCES, "Permission denied")
+
+    monkeypatch.setattr(staging, "rmtree", rmtree)
+
+    thread = staging.remove_in_background(str(output_dir))
+    staging.wait_for_cleanups()
+
+    assert thread.daemon
+    assert "Unable to remove" in caplog.text
+    assert output_dir.is_dir()
+
+
+@pytest.mark.parametrize(
+    ("error", "raised"), ((errno.ENOSYS, False), (errno.EACCES, True))
+)
+def test_exchange_renameat2_failure(output_dir, monkeypatch, error, raised):
+    """Unsupported exchanges fall back to renames, other errors are raised."""
+    monkeypatch.setattr(staging, "_get_renameat2", lambda: lambda *args: -1)
+    monkeypatch.setattr(staging.ctypes, "get_errno", lambda: error)
+    first, second = output_dir / "first", output_dir / "second"
+    first.mkdir()
+    second.mkdir()
+    (first / "one").touch()
+
+    if raised:
+        with pytest.raises(PermissionError):
+            staging.exchange(str(first), str(second))
+    else:
+        staging.exchange(str(first), str(second))
+        assert [path.name for path in second.iterdir()] == ["one"]
+
+
+def test_get_renameat2_missing(monkeypatch):
+    """Platforms without renameat2 use renames."""
+
+    def cdll(name, use_errno):
+        raise OSError("no C library")
+
+    monkeypatch.setattr(staging, "_renameat2", None)
+    monkeypatch.setattr(staging.ctypes, "CDLL", cdll)
+
+    assert staging._get_renameat2() is None
+    assert staging._renameat2 is False
@@ -0,0 +1,152 @@
+"""Tests for the timing report of a generation."""
+import asyncio
+import contextvars
+import json
+import threading
+import time
+
+import pytest
+
+from cookieninja import aio, timing
+from cookieninja.batch import generate_batch
+from cookieninja.main import cookiecutter
+
+
+@pytest.fixture
+def template(tmp_path):
+    """Return a template with rendered and binary files and a hook."""
+    path = tmp_path / "template"
+    project = path / "{{cookiecutter.name}}"
+    project.mkdir(parents=True)
+    (path / "hooks").mkdir()
+    (path / "cookiecutter.json").write_text('{"name": "demo"}')
+    (project / "README.md").write_text("# {{ cookiecutter.name }}\n")
+    (project / "logo.png").write_bytes(bytes(range(256)))
+    (path / "hooks" / "post_gen_project.py").write_text("print('done')\n")
+    return str(path)
+
+
+def test_record_generation(template, tmp_path):
+    """Phases, counts and files of a generation are reported."""
+    with timing.record() as report:
+        cookiecutter(
+            template,
+            no_input=True,
+            output_dir=str(tmp_path / "output"),
+            default_config=True,
+        )
+
+    assert list(report.phases) == [
+        "config",
+        "repository",
+        "prompt",
+        "hooks",
+        "replay",
+        "generate",
+    ]
+    assert report.phases["replay"].calls == 2
+    assert report.counts["files_rendered"] == 1
+    assert report.counts["files_copied"] == 1
+    assert report.counts["bytes_written"] == len("# demo\n") + 256
+    assert {path for path, _ in report.slowest_files()} == {
+        "README.md",
+        "logo.png",
+    }
+    phases = sum(phase.wall for phase in report.phases.values())
+    assert phases + report.other.wall == pytest.approx(report.wall)
+
+
+def test_nested_phases_are_exclusive():
+    """A nested phase is not counted in the enclosing one."""
+    with timing.record() as report:
+        with timing.phase("outer"):
+            with timing.phase("inner"):
+                time.sleep(0.05)
+
+    assert report.phases["inner"].wall >= 0.05
+    assert report.phases["outer"].wall < 0.05
+
+
+def test_record_aio_generation(template, tmp_path):
+    """Generations run in executor threads and tasks are recorded."""
+    with timing.record() as report:
+        asyncio.run(
+            aio.cookiecutter(
+                template,
+                no_input=True,
+                output_dir=str(tmp_path / "output"),
+                default_config=True,
+            )
+        )
+
+    assert {"config", "prompt", "hooks", "generate"} <= set(report.phases)
+    assert report.counts["files_rendered"] == 1
+
+
+def test_record_batch(template, tmp_path):
+    """Each generation of a batch is recorded."""
+    with timing.record() as report:
+        generate_batch(
+            template,
+            [{"name": "one"}, {"name": "two"}],
+            output_dir=str(tmp_path / "output"),
+            default_config=True,
+        )
+
+    assert report.phases["generate"].calls == 2
+    assert report.counts["files_rendered"] == 2
+
+
+def test_phases_of_concurrent_threads():
+    """Phases running in other threads do not nest in each other."""
+    started = threading.Barrier(2)
+
+    def work():
+        with timing.phase("inner"):
+            started.wait()
+            time.sleep(0.05)
+
+    with timing.record() as report:
+        threads = [
+            threading.Thread(target=contextvars.copy_context().run, args=(work,))
+            for _ in range(2)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert report.phases["inner"].calls == 2
+    assert report.phases["inner"].wall >= 0.1
+    assert report.phases["inner"].cpu < 0.05
+
+
+def test_instrumentation_without_record():
+    """Outside of a recording, the instrumentation does nothing."""
+    with timing.phase("phase"), timing.template_file("file"):
+        timing.count("files_rendered")
+
+
+def test_report_formats():
+    """Reports are available as text and JSON."""
+    with timing.record() as report:
+        with timing.phase("generate"), timing.template_file("README.md"):
+            timing.count("files_rendered")
+
+    text = report.format()
+    assert "generate" in text and "files_rendered: 1" in text
+    assert "README.md" in text
+    data = json.loads(report.to_json())
+    assert data["counts"] == {"files_rendered": 1}
+    assert data["phases"]["generate"]["calls"] == 1
+    assert data["slowest_files"][0]["path"] == "README.md"
+
+
+def test_report_format_without_counts_or_files():
+    """Reports without counts or template files only list the phases."""
+    with timing.record() as report:
+        with timing.phase("prompt"):
+            pass
+
+    assert "Slowest files" not in report.format()
+    assert report.format().splitlines()[-1].startswith("total")
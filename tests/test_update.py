@@ -0,0 +1,415 @@
+"""Tests for updating generated projects to a new template version."""
+import errno
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from cookieninja import update
+from cookieninja.cache import OutputCache, RenderCache
+from cookieninja.config import get_user_config
+from cookieninja.exceptions import ProjectUpdateError
+from cookieninja.main import cookiecutter
+from cookieninja.replay import ReplayStore
+
+BINARY = bytes(range(256))
+README = "{{ cookiecutter.greeting }} from {{ cookiecutter.name }}\n2\n3\n4\n5\n"
+
+
+def _git(repo, *args):
+    subprocess.run(
+        ["git", "-c", "user.name=test", "-c", "user.email=test@example.com", *args],
+        cwd=repo,
+        check=True,
+        capture_output=True,
+    )
+
+
+def _rev_parse(repo):
+    return subprocess.run(
+        ["git", "rev-parse", "HEAD"],
+        cwd=repo,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.strip()
+
+
+def _commit(template, files):
+    """Write ``files`` to the template and commit them."""
+    for name, text in files.items():
+        path = template / "{{cookiecutter.name}}" / name
+        if text is None:
+            path.unlink()
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(text)
+    _git(template, "add", "-A")
+    _git(template, "commit", "-q", "-m", "version")
+
+
+@pytest.fixture
+def template(tmp_path):
+    """Return a git template at its first version."""
+    path = tmp_path / "template"
+    path.mkdir()
+    _git(path, "init", "-q")
+    (path / "cookiecutter.json").write_text(
+        '{"name": "demo", "greeting": "hello"}', encoding="utf-8"
+    )
+    _commit(
+        path,
+        {"README.txt": README, "setup.cfg": "[metadata]\n", "old.txt": "old\n"},
+    )
+    return path
+
+
+@pytest.fixture
+def project(template, tmp_path):
+    """Return the project generated from the first version of the template."""
+    return cookiecutter(
+        str(template), no_input=True, output_dir=str(tmp_path), default_config=True
+    )
+
+
+@pytest.fixture
+def caches(tmp_path):
+    """Return caches kept in the test directory."""
+    return {
+        "output_cache": OutputCache(str(tmp_path / "output-cache")),
+        "render_cache": RenderCache(str(tmp_path / "render-cache")),
+    }
+
+
+def test_update_project(template, project, tmp_path, caches):
+    """Template changes are merged with the local edits of the project."""
+    project_dir = tmp_path / "demo"
+    (project_dir / "README.txt").write_text("hello from demo\n2\n3\n4\nlocal\n")
+    (project_dir / "notes.txt").write_text("local file\n")
+    _commit(
+        template,
+        {
+            "README.txt": README.replace("2", "changed"),
+            "old.txt": None,
+            "new.txt": "new {{ cookiecutter.greeting }}\n",
+        },
+    )
+
+    result = update.update_project(project, default_config=True, **caches)
+
+    assert result.updated == ["README.txt"]
+    assert result.added == ["new.txt"]
+    assert result.removed == ["old.txt"]
+    assert result.conflicts == []
+    assert (project_dir / "README.txt").read_text() == (
+        "hello from demo\nchanged\n3\n4\nlocal\n"
+    )
+    assert (project_dir / "new.txt").read_text() == "new hello\n"
+    assert not (project_dir / "old.txt").exists()
+    assert (project_dir / "notes.txt").read_text() == "local file\n"
+
+
+def test_update_project_conflict(template, project, tmp_path, caches):
+    """Conflicting changes are left with conflict markers."""
+    project_dir = tmp_path / "demo"
+    (project_dir / "setup.cfg").write_text("[options]\n")
+    _commit(template, {"setup.cfg": "[tool]\n"})
+
+    result = update.update_project(project, default_config=True, **caches)
+
+    assert result.conflicts == ["setup.cfg"]
+    text = (project_dir / "setup.cfg").read_text()
+    assert "<<<<<<< project" in text and ">>>>>>> template" in text
+
+
+def test_update_project_new_variable(template, project, tmp_path, caches):
+    """New variables get their defaults, answers can be changed."""
+    (template / "cookiecutter.json").write_text(
+        '{"name": "demo", "greeting": "hello", "license": "MIT"}'
+    )
+    _commit(template, {"LICENSE": "{{ cookiecutter.license }}\n"})
+
+    result = update.update_project(
+        project, default_config=True, extra_context={"greeting": "hi"}, **caches
+    )
+
+    assert result.context["cookiecutter"]["license"] == "MIT"
+    assert result.added == ["LICENSE"]
+    assert (tmp_path / "demo" / "README.txt").read_text().startswith("hi from demo")
+
+
+def test_update_project_dependent_question(template, tmp_path, caches):
+    """Answers to dependent questions are kept, and can be changed."""
+    (template / "cookiecutter.json").write_text(
+        '{"name": "demo", "greeting": "hello",'
+        ' "license?{{ cookiecutter.greeting == \'hello\' }}": "MIT"}'
+    )
+    _commit(template, {"LICENSE": "{{ cookiecutter.license }}\n"})
+    output_dir = tmp_path / "licensed"
+    project = cookiecutter(
+        str(template),
+        no_input=True,
+        output_dir=str(output_dir),
+        extra_context={"license?{{ cookiecutter.greeting == 'hello' }}": "BSD"},
+    )
+    _commit(template, {"new.txt": "new\n"})
+
+    result = update.update_project(project, default_config=True, **caches)
+
+    assert result.context["cookiecutter"]["license"] == "BSD"
+    assert result.added == ["new.txt"]
+    assert (output_dir / "demo" / "LICENSE").read_text() == "BSD\n"
+
+    result = update.update_project(
+        project, default_config=True, extra_context={"license": "GPL"}, **caches
+    )
+
+    assert result.context["cookiecutter"]["license"] == "GPL"
+    assert (output_dir / "demo" / "LICENSE").read_text() == "GPL\n"
+
+
+def test_update_project_without_caches(template, project, mocker):
+    """Versions are rendered without the default caches."""
+    generate_files = mocker.spy(update, "generate_files")
+    _commit(template, {"new.txt": "new\n"})
+
+    result = update.update_project(project, default_config=True)
+
+    assert result.added == ["new.txt"]
+    for call in generate_files.call_args_list:
+        assert call.kwargs["output_cache"] is None
+        assert call.kwargs["render_cache"] is None
+
+
+def test_update_project_twice(template, project, caches):
+    """An update is recorded, the next one starts from its version."""
+    _commit(template, {"new.txt": "new\n"})
+    update.update_project(project, default_config=True, **caches)
+
+    result = update.update_project(project, default_config=True, **caches)
+
+    assert result[2:] == ([], [], [], [])
+
+
+def test_update_unknown_project(tmp_path):
+    """Projects that are not in the replay history cannot be updated."""
+    with pytest.raises(ProjectUpdateError):
+        update.update_project(str(tmp_path), default_config=True)
+
+
+def test_update_project_in_subdirectory(tmp_path, caches):
+    """Templates given with ``directory`` record the commit of the repository."""
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    _git(repo, "init", "-q")
+    template = repo / "templates" / "demo"
+    template.mkdir(parents=True)
+    (template / "cookiecutter.json").write_text('{"name": "demo", "greeting": "hi"}')
+    _commit(template, {"README.txt": README})
+    output_dir = tmp_path / "output"
+    project = cookiecutter(
+        str(repo),
+        no_input=True,
+        output_dir=str(output_dir),
+        directory="templates/demo",
+    )
+    commit = _rev_parse(repo)
+    _commit(template, {"new.txt": "new\n"})
+
+    result = update.update_project(
+        project, default_config=True, directory="templates/demo", **caches
+    )
+
+    assert result.added == ["new.txt"]
+    history = ReplayStore(get_user_config()["replay_dir"]).history()
+    assert [entry["commit_id"] for entry in history] == [_rev_parse(repo), commit]
+    assert (output_dir / "demo" / "new.txt").read_text() == "new\n"
+
+
+def test_template_in_another_repository(tmp_path):
+    """Templates lying in a directory of another repository record no commit."""
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    _git(repo, "init", "-q")
+    template = repo / "templates" / "demo"
+    template.mkdir(parents=True)
+    (template / "cookiecutter.json").write_text('{"name": "demo", "greeting": "hi"}')
+    _commit(template, {"README.txt": README})
+
+    project = cookiecutter(
+        str(template), no_input=True, output_dir=str(tmp_path / "output")
+    )
+
+    [entry] = ReplayStore(get_user_config()["replay_dir"]).history()
+    assert entry["commit_id"] is None
+    with pytest.raises(ProjectUpdateError, match="commit .* is unknown"):
+        update.update_project(project, default_config=True)
+
+
+def test_update_project_from_remote_branch(
+    template, project, tmp_path, caches, monkeypatch
+):
+    """Remote templates are cloned once, branches are found in the clone."""
+    monkeypatch.setattr(update, "_SOURCES", {})
+    # A project of the same name elsewhere is not the baseline
+    other = cookiecutter(
+        str(template), no_input=True, output_dir=str(tmp_path / "other")
+    )
+    _git(template, "checkout", "-q", "-b", "next")
+    _commit(template, {"new.txt": "new\n"})
+    _git(template, "checkout", "-q", "-")
+    url = f"git+file://{template}"
+
+    result = update.update_project(
+        project, checkout="next", template=url, default_config=True, **caches
+    )
+
+    assert result.added == ["new.txt"]
+    assert list(update._SOURCES) == [url]
+    assert update.update_project(other, template=url, default_config=True).added == []
+    assert len(update._SOURCES) == 1
+
+
+def test_update_project_incompatible_answers(template, project, caches):
+    """Answers that the new version rejects fail the update."""
+    (template / "cookiecutter.json").write_text(
+        '{"name": "demo", "greeting": ["hi", "hey"]}'
+    )
+    _commit(template, {})
+
+    with pytest.raises(ProjectUpdateError, match="do not fit"):
+        update.update_project(project, default_config=True, **caches)
+
+
+def test_update_project_without_commit(tmp_path):
+    """Projects of templates outside of git cannot be updated."""
+    template = tmp_path / "template"
+    (template / "{{cookiecutter.name}}").mkdir(parents=True)
+    (template / "cookiecutter.json").write_text('{"name": "demo"}')
+    project = cookiecutter(str(template), no_input=True, output_dir=str(tmp_path))
+
+    with pytest.raises(ProjectUpdateError, match="commit .* is unknown"):
+        update.update_project(project, default_config=True)
+    with pytest.raises(ProjectUpdateError, match="not a git repository"):
+        update._template_source(str(tmp_path / "missing"), {"abbreviations": {}})
+
+
+def test_update_missing_project(tmp_path):
+    """Only directories can be updated."""
+    with pytest.raises(ProjectUpdateError, match="not a directory"):
+        update.update_project(str(tmp_path / "missing"), default_config=True)
+
+
+def test_update_without_git(monkeypatch, tmp_path):
+    """Updates need git."""
+
+    def run(*args, **kwargs):
+        raise FileNotFoundError("git")
+
+    monkeypatch.setattr(subprocess, "run", run)
+    with pytest.raises(ProjectUpdateError, match="git is needed"):
+        update._git("status")
+    (tmp_path / "project").write_text("project\n")
+    (tmp_path / "new").write_text("new\n")
+    with pytest.raises(ProjectUpdateError, match="git is needed"):
+        update._merge_file(str(tmp_path / "project"), None, str(tmp_path / "new"))
+
+
+def test_checkout_concurrently(template, tmp_path, monkeypatch):
+    """A version checked out meanwhile is used, other errors are raised."""
+    commit = _rev_parse(template)
+    versions_dir = tmp_path / "versions"
+    rename = os.rename
+
+    def concurrent_rename(src, dst):
+        # Another process checks the same commit out first
+        shutil.copytree(src, dst)
+        rename(src, dst)
+
+    monkeypatch.setattr(os, "rename", concurrent_rename)
+    path = update._checkout(str(template), commit, str(versions_dir))
+    assert os.listdir(versions_dir) == [commit]
+    assert os.path.isfile(os.path.join(path, "cookiecutter.json"))
+
+    def failing_rename(src, dst):
+        raise PermissionError(errno.EACCES, "Permission denied")
+
+    monkeypatch.setattr(os, "rename", failing_rename)
+    with pytest.raises(PermissionError):
+        update._checkout(str(template), "HEAD", str(versions_dir))
+    with pytest.raises(ProjectUpdateError):
+        update._checkout(str(template), "unknown", str(versions_dir))
+    assert os.listdir(versions_dir) == [commit]
+
+
+def _tree(root, files):
+    """Write ``files`` under ``root`` and return its path."""
+    for name, data in files.items():
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+    return str(root)
+
+
+def test_merge_trees(tmp_path):
+    """Each combination of local and template changes is merged."""
+    base = _tree(
+        tmp_path / "base",
+        {
+            "deleted-changed": b"base\n",
+            "deleted-removed": b"base\n",
+            "edited-removed": b"base\n",
+            "binary": BINARY + b"base",
+            "unchanged": b"same\n",
+            "already-updated": b"base\n",
+            "broken-link": b"base\n",
+        },
+    )
+    new = _tree(
+        tmp_path / "new",
+        {
+            "deleted-changed": b"new\n",
+            "binary": BINARY + b"new",
+            "added-both": b"one\ntemplate\n",
+            "unchanged": b"same\n",
+            "already-updated": b"new\n",
+        },
+    )
+    project = _tree(
+        tmp_path / "project",
+        {
+            "edited-removed": b"local\n",
+            "binary": BINARY + b"local",
+            "added-both": b"one\nlocal\n",
+            "unchanged": b"local\n",
+            "already-updated": b"new\n",
+        },
+    )
+    os.symlink("missing", tmp_path / "project" / "broken-link")
+
+    updated, added, removed, conflicts = update.merge_trees(base, new, project)
+
+    assert (updated, added, removed) == ([], [], [])
+    assert conflicts == [
+        "added-both",
+        "binary",
+        "broken-link",
+        "deleted-changed",
+        "edited-removed",
+    ]
+    assert (tmp_path / "project" / "binary").read_bytes() == BINARY + b"local"
+
+
+def test_merge_file_error(tmp_path, monkeypatch):
+    """Failures of git merge-file are raised."""
+    (tmp_path / "project").write_text("project\n")
+    (tmp_path / "new").write_text("new\n")
+    monkeypatch.setattr(
+        subprocess,
+        "run",
+        lambda *args, **kwargs: subprocess.CompletedProcess(args, 255, "", "error"),
+    )
+
+    with pytest.raises(ProjectUpdateError, match="Unable to merge"):
+        update._merge_file(str(tmp_path / "project"), None, str(tmp_path / "new"))
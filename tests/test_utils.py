@@ -1,4 +1,6 @@
 """Tests for `cookiecutter.utils` module."""
+import ctypes
+import errno
 import stat
 import sys
 from pathlib import Path
@@ -71,6 +73,114 @@ def test_make_sure_path_exists_correctly_handle_os_error(mocker):
     assert str(err.value) == "Unable to create directory at protected_path"
 
 
+def test_reflink(mocker, tmp_path):
+    """Verify `utils.reflink` clones the file with the FICLONE ioctl."""
+    fcntl = pytest.importorskip("fcntl")
+    ioctl = mocker.patch.object(fcntl, "ioctl")
+    src = Path(tmp_path, "src")
+    src.write_text("Test data")
+
+    utils.reflink(src, Path(tmp_path, "dst"))
+
+    assert ioctl.call_args[0][1] == utils._FICLONE
+
+
+def test_reflink_unsupported_platform(mocker, tmp_path):
+    """Verify `utils.reflink` raises OSError without the fcntl module."""
+    mocker.patch.dict(sys.modules, {"fcntl": None})
+
+    with pytest.raises(OSError, match="not supported on this platform"):
+        utils.reflink(Path(tmp_path, "src"), Path(tmp_path, "dst"))
+
+
+def test_fsync_path(mocker, tmp_path):
+    """Verify `utils.fsync_path` flushes files and directories."""
+    fsync = mocker.patch("os.fsync")
+    file_path = Path(tmp_path, "bar")
+    file_path.write_text("Test data")
+
+    utils.fsync_path(file_path)
+    utils.fsync_path(tmp_path)
+
+    assert fsync.call_count == 2
+
+
+def test_fsync_path_unsupported_directory(mocker, tmp_path):
+    """Verify directories that cannot be opened or flushed are ignored."""
+    mocker.patch("os.fsync", side_effect=OSError(errno.EINVAL, "Invalid"))
+    utils.fsync_path(tmp_path)
+
+    mocker.patch("os.open", side_effect=PermissionError(errno.EACCES, "Denied"))
+    utils.fsync_path(tmp_path)
+
+
+def test_fsync_path_file_errors(mocker, tmp_path):
+    """Verify errors flushing files are raised."""
+    file_path = Path(tmp_path, "bar")
+    file_path.write_text("Test data")
+    mocker.patch("os.fsync", side_effect=OSError(errno.EIO, "I/O error"))
+    with pytest.raises(OSError):
+        utils.fsync_path(file_path)
+
+    with pytest.raises(FileNotFoundError):
+        utils.fsync_path(Path(tmp_path, "missing"))
+
+
+@pytest.fixture
+def no_syncfs_cache(monkeypatch):
+    """Fixture. Look the ``syncfs`` function up again."""
+    monkeypatch.setattr(utils, "_syncfs", None)
+
+
+@pytest.mark.usefixtures("no_syncfs_cache")
+def test_get_syncfs(mocker):
+    """Verify `utils._get_syncfs` looks the C function up once."""
+    function = mocker.Mock()
+    cdll = mocker.patch("ctypes.CDLL", return_value=mocker.Mock(syncfs=function))
+
+    assert utils._get_syncfs() is function
+    assert utils._get_syncfs() is function
+    assert function.argtypes == [ctypes.c_int]
+    cdll.assert_called_once_with(None, use_errno=True)
+
+
+@pytest.mark.usefixtures("no_syncfs_cache")
+def test_get_syncfs_unsupported(mocker):
+    """Verify platforms without ``syncfs`` are remembered."""
+    cdll = mocker.patch("ctypes.CDLL", return_value=object())
+
+    assert utils._get_syncfs() is None
+    assert utils._get_syncfs() is None
+    cdll.assert_called_once()
+
+
+def test_syncfs(mocker, tmp_path):
+    """Verify `utils.syncfs` flushes the filesystem of a path."""
+    function = mocker.patch("cookieninja.utils._get_syncfs").return_value
+    function.return_value = 0
+
+    assert utils.syncfs(tmp_path) is True
+    function.assert_called_once()
+
+
+def test_syncfs_unsupported(mocker, tmp_path):
+    """Verify `utils.syncfs` reports platforms without ``syncfs``."""
+    mocker.patch("cookieninja.utils._get_syncfs", return_value=None)
+
+    assert utils.syncfs(tmp_path) is False
+
+
+def test_syncfs_failure(mocker, tmp_path):
+    """Verify `utils.syncfs` raises the error of a failed call."""
+    mocker.patch("cookieninja.utils._get_syncfs").return_value.return_value = -1
+    mocker.patch("ctypes.get_errno", return_value=errno.EIO)
+
+    with pytest.raises(OSError) as err:
+        utils.syncfs(tmp_path)
+    assert err.value.errno == errno.EIO
+    assert err.value.filename == tmp_path
+
+
 def test_work_in(tmp_path):
     """Verify returning to original folder after `utils.work_in` use."""
     cwd = Path.cwd()
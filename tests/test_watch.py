@@ -0,0 +1,215 @@
+"""Tests for regenerating a project as its template changes."""
+import os
+
+import pytest
+
+from cookieninja import watch
+
+
+@pytest.fixture
+def template(tmp_path):
+    """Return a template with a shared template and a post generation hook."""
+    path = tmp_path / "template"
+    project = path / "{{cookiecutter.name}}"
+    project.mkdir(parents=True)
+    (path / "templates").mkdir()
+    (path / "hooks").mkdir()
+    (path / "cookiecutter.json").write_text('{"name": "demo", "version": "1.0"}')
+    (project / "README.md").write_text("# {{ cookiecutter.name }}\n")
+    (project / "setup.cfg").write_text('{% include "metadata.cfg" %}\n')
+    (project / "VERSION").write_text("{{ cookiecutter.version }}\n")
+    (path / "templates" / "metadata.cfg").write_text("[metadata]")
+    (path / "hooks" / "post_gen_project.py").write_text(
+        "with open('hook-runs.txt', 'a') as fh:\n    fh.write('run\\n')\n"
+    )
+    return path
+
+
+def _edit(path, text):
+    """Write ``text`` to ``path`` with a modification time that surely changed."""
+    path.write_text(text)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+
+def _watch(template, output_dir, edits):
+    """Watch ``template``, applying one edit after each run but the last."""
+    runs = []
+
+    def callback(run):
+        runs.append(run)
+        if len(runs) <= len(edits):
+            edits[len(runs) - 1]()
+
+    watch.watch(
+        str(template),
+        output_dir=str(output_dir),
+        no_input=True,
+        default_config=True,
+        interval=0.01,
+        callback=callback,
+        max_runs=len(edits) + 1,
+    )
+    return runs
+
+
+def test_watch_renders_changed_files(template, tmp_path):
+    """Only the files affected by a change are rendered again."""
+    output_dir = tmp_path / "output"
+    project = template / "{{cookiecutter.name}}"
+
+    runs = _watch(
+        template,
+        output_dir,
+        [
+            lambda: _edit(project / "README.md", "# {{ cookiecutter.name }}!\n"),
+            lambda: _edit(template / "templates" / "metadata.cfg", "[options]"),
+        ],
+    )
+
+    assert [run.error for run in runs] == [None, None, None]
+    assert [run.files_written for run in runs] == [3, 1, 1]
+    assert runs[1].changed == [os.path.join("{{cookiecutter.name}}", "README.md")]
+    assert (output_dir / "demo" / "README.md").read_text() == "# demo!\n"
+    assert (output_dir / "demo" / "setup.cfg").read_text() == "[options]\n"
+    # Hooks run with the first generation only
+    assert (output_dir / "demo" / "hook-runs.txt").read_text() == "run\n"
+
+
+def test_watch_prompts_on_context_change(template, tmp_path):
+    """The context is built again when cookiecutter.json changes."""
+    output_dir = tmp_path / "output"
+
+    runs = _watch(
+        template,
+        output_dir,
+        [
+            lambda: _edit(
+                template / "cookiecutter.json", '{"name": "demo", "version": "2.0"}'
+            )
+        ],
+    )
+
+    assert [run.prompted for run in runs] == [True, True]
+    assert runs[1].files_written == 1
+    assert (output_dir / "demo" / "VERSION").read_text() == "2.0\n"
+    assert (output_dir / "demo" / "hook-runs.txt").read_text() == "run\nrun\n"
+
+
+def test_watch_survives_errors(template, tmp_path):
+    """A broken template is reported and generated again once fixed."""
+    output_dir = tmp_path / "output"
+    readme = template / "{{cookiecutter.name}}" / "README.md"
+
+    runs = _watch(
+        template,
+        output_dir,
+        [
+            lambda: _edit(readme, "# {{ cookiecutter.name }\n"),
+            lambda: _edit(readme, "# {{ cookiecutter.name }} fixed\n"),
+        ],
+    )
+
+    assert runs[1].project_dir is None
+    assert runs[1].error is not None
+    assert runs[2].error is None
+    assert (output_dir / "demo" / "README.md").read_text() == "# demo fixed\n"
+
+
+def test_snapshot_excludes(template):
+    """Excluded directories, such as a project generated inside, are ignored."""
+    (template / "demo").mkdir()
+    (template / "demo" / "README.md").write_text("# demo\n")
+
+    files = watch.snapshot(str(template), exclude={str(template / "demo")})
+
+    assert "cookiecutter.json" in files
+    assert not any(path.startswith("demo") for path in files)
+
+
+def test_watch_excludes_partial_project(template):
+    """A project generated inside the template is excluded after a failed run."""
+    readme = template / "{{cookiecutter.name}}" / "README.md"
+    _edit(readme, "# {{ cookiecutter.name }\n")
+
+    def fix():
+        (template / "demo" / "partial.txt").write_text("partial")
+        _edit(readme, "# {{ cookiecutter.name }} fixed\n")
+
+    runs = _watch(template, template, [fix])
+
+    assert runs[0].error is not None
+    assert (template / "demo").is_dir()
+    assert runs[1].changed == [os.path.join("{{cookiecutter.name}}", "README.md")]
+    assert (template / "demo" / "README.md").read_text() == "# demo fixed\n"
+
+
+def test_watch_nested_template(tmp_path):
+    """The nested template chosen in the context is generated and watched."""
+    path = tmp_path / "nested"
+    project = path / "inner" / "{{cookiecutter.name}}"
+    project.mkdir(parents=True)
+    (path / "cookiecutter.json").write_text('{"template": ["Inner (inner)"]}')
+    (path / "inner" / "cookiecutter.json").write_text('{"name": "demo"}')
+    (project / "README.md").write_text("# {{ cookiecutter.name }}\n")
+    output_dir = tmp_path / "output"
+
+    runs = _watch(
+        path,
+        output_dir,
+        [
+            lambda: _edit(project / "README.md", "# {{ cookiecutter.name }}!\n"),
+            lambda: _edit(path / "inner" / "cookiecutter.json", '{"name": "other"}'),
+        ],
+    )
+
+    assert [run.error for run in runs] == [None, None, None]
+    assert [run.prompted for run in runs] == [True, False, True]
+    assert runs[0].project_dir == str(output_dir / "demo")
+    assert (output_dir / "demo" / "README.md").read_text() == "# demo!\n"
+    assert (output_dir / "other" / "README.md").read_text() == "# other!\n"
+
+
+def test_watch_polls_until_changed(template, tmp_path, mocker):
+    """Polls without changes generate nothing, cloned templates are removed."""
+    mocker.patch(
+        "cookieninja.watch.determine_repo_dir", return_value=(str(template), True)
+    )
+    readme = template / "{{cookiecutter.name}}" / "README.md"
+    sleeps = []
+
+    def sleep(interval):
+        sleeps.append(interval)
+        if len(sleeps) == 2:
+            _edit(readme, "# {{ cookiecutter.name }}!\n")
+
+    mocker.patch("cookieninja.watch.time.sleep", side_effect=sleep)
+
+    watch.watch(
+        "gh:someone/template",
+        output_dir=str(tmp_path / "output"),
+        no_input=True,
+        default_config=True,
+        max_runs=2,
+    )
+
+    assert len(sleeps) == 2
+    assert (tmp_path / "output" / "demo" / "README.md").read_text() == "# demo!\n"
+    assert not template.exists()
+
+
+def test_snapshot_ignores_removed_files(template, mocker):
+    """Files removed while the template is walked are left out."""
+    stat = os.stat
+
+    def flaky_stat(path, *args, **kwargs):
+        if str(path).endswith("VERSION"):
+            raise FileNotFoundError(path)
+        return stat(path, *args, **kwargs)
+
+    mocker.patch("cookieninja.watch.os.stat", side_effect=flaky_stat)
+
+    files = watch.snapshot(str(template))
+
+    assert "cookiecutter.json" in files
+    assert not any(path.endswith("VERSION") for path in files)
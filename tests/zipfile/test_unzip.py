@@ -169,7 +169,7 @@ def test_unzip_url(mocker, clone_dir):
     request.iter_content.return_value = mock_download()
 
     mocker.patch(
-        "cookieninja.zipfile.requests.get",
+        "requests.get",
         return_value=request,
         autospec=True,
     )
@@ -194,7 +194,7 @@ def test_unzip_url_with_empty_chunks(mocker, clone_dir):
     request.iter_content.return_value = mock_download_with_empty_chunks()
 
     mocker.patch(
-        "cookieninja.zipfile.requests.get",
+        "requests.get",
         return_value=request,
         autospec=True,
     )
@@ -219,7 +219,7 @@ def test_unzip_url_existing_cache(mocker, clone_dir):
     request.iter_content.return_value = mock_download()
 
     mocker.patch(
-        "cookieninja.zipfile.requests.get",
+        "requests.get",
         return_value=request,
         autospec=True,
     )
@@ -244,7 +244,7 @@ def test_unzip_url_existing_cache_no_input(mocker, clone_dir):
     request.iter_content.return_value = mock_download()
 
     mocker.patch(
-        "cookieninja.zipfile.requests.get",
+        "requests.get",
         return_value=request,
         autospec=True,
     )
@@ -270,7 +270,7 @@ def test_unzip_should_abort_if_no_redownload(mocker, clone_dir):
     )
 
     mock_requests_get = mocker.patch(
-        "cookieninja.zipfile.requests.get",
+        "requests.get",
         autospec=True,
     )
 